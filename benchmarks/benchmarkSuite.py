@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+End-to-end benchmark suite against the local FIX acceptor simulator.
+
+Usage: python benchmarks/benchmarkSuite.py [--output results.json] [--baseline previous.json]
+                                           [--set MessageView=true ...]
+Measures:
+    encode (build + encode) and decode (FixParser and FIXViewParser) cost per MsgType
+    NewOrderSingle -> ExecutionReport round trip latency percentiles, one order in flight
+    burst order throughput, every order sent before waiting for the acknowledgements
+    inbound MarketDataIncrementalRefresh messages/s through the engine to the listener
+The simulator runs in a child process so it does not share the engine's event
+loop. --set overrides engine configuration options (e.g. CoalesceWrites=true) to
+compare settings. Results are written as JSON; with --baseline every metric is
+compared against a previous run and the exit status is 1 when one regressed by
+more than --tolerance.
+"""
+import argparse
+import asyncio
+import configparser
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+import simplefix
+import acceptorSimulator
+from connectionHandler import SocketConnectionState
+from fixClientMessages import FixClientMessages
+from fixEngine import FIXClient
+from messageView import FIXViewParser
+
+GATEWAY = "BENCHMARK"
+FIX_VERSION = "FIX.4.4"
+PASSWORD = "benchmark"
+
+
+class Results:
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name, value, unit, better):
+        self.metrics[name] = {"value": value, "unit": unit, "better": better}
+        print(f"{name:45s} {value:14.2f} {unit}")
+
+
+def timePerCall(function, number=2000, repeat=3):
+    """ Best of repeat runs, in microseconds per call."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            function()
+        elapsed = (time.perf_counter_ns() - start) / number / 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# Encode / decode
+def outboundMessages(messages):
+    """ MsgType -> function building an outbound message the way the engine does."""
+    template = messages.newOrderSingleTemplate("PARTY", 3, "USD", simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+    replaceTemplate = messages.orderCancelReplaceRequestTemplate(simplefix.ORDTYPE_LIMIT)
+    return {
+        "A": lambda: messages.sendLogOn(),
+        "0": lambda: messages.sendHeartbeat(),
+        "D": lambda: messages.newOrderSingle("C1", "PARTY", 3, "USD", "1", "BTC-USD", 1, 100.5, simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL),
+        "D.template": lambda: template.message("C1", "1", "BTC-USD", 1, 100.5),
+        "G": lambda: messages.orderCancelReplaceRequest("C2", "O1", "C1", "1", "BTC-USD", 101, simplefix.ORDTYPE_LIMIT, quantity=1),
+        "G.template": lambda: replaceTemplate.message("O1", "C1", "C2", "1", "BTC-USD", 1, 101),
+        "F": lambda: messages.orderCancelRequest(clOrdID="C3", orderID="O1", origClOrdID="C2", side="1", symbol="BTC-USD"),
+        "V": lambda: messages.marketDataRequest(["BTC-USD"], "1", 10, 1)[0],
+        "AD": lambda: messages.sendTradeCaptureReportRequest(),
+        "AR": lambda: messages.sendTradeCaptureReportAck("T1"),
+    }
+
+
+def inboundMessages():
+    """ MsgType -> encoded message as received from the simulator."""
+    order = {"orderID": "O1", "clOrdID": "C1", "symbol": "BTC-USD", "side": "1", "orderQty": 1.0, "price": 100.5, "ordStatus": simplefix.ORDSTATUS_NEW, "cumQty": 0.0, "leavesQty": 1.0}
+    trade = {"execID": "E1", "symbol": "BTC-USD", "side": "1", "lastQty": 1.0, "lastPx": 100.5, "orderID": "O1", "clOrdID": "C1", "tradeDate": "20240101"}
+    bodies = {
+        "8": acceptorSimulator.executionReport(FIX_VERSION, order, simplefix.EXECTYPE_NEW, "E1"),
+        "W": acceptorSimulator.marketDataSnapshot(FIX_VERSION, "R1", "BTC-USD", 100.0, 10),
+        "X": acceptorSimulator.marketDataIncrementalRefresh(FIX_VERSION, "R1", [(1, 0, "BTC-USD", "99.50", "1.5"), (0, 1, "BTC-USD", "100.50", "2.0")]),
+        "AE": acceptorSimulator.tradeCaptureReport(FIX_VERSION, "T1", "R1", trade),
+    }
+    encoded = {}
+    for msgType, msg in bodies.items():
+        msg.append_pair(simplefix.TAG_SENDER_COMPID, "SIMULATOR", header=True)
+        msg.append_pair(simplefix.TAG_TARGET_COMPID, "CLIENT", header=True)
+        msg.append_pair(simplefix.TAG_MSGSEQNUM, 1, header=True)
+        msg.append_utc_timestamp(simplefix.TAG_SENDING_TIME, precision=3, header=True)
+        encoded[msgType] = msg.encode()
+    return encoded
+
+
+def decodeCost(parserClass, encoded):
+    """ One message per append, as read from the socket, then the header fields every message is dispatched on."""
+    parser = parserClass()
+    def parse():
+        parser.append_buffer(encoded)
+        message = parser.get_message()
+        message.get(simplefix.TAG_MSGTYPE)
+        message.get(simplefix.TAG_MSGSEQNUM)
+    return timePerCall(parse)
+
+
+def benchmarkCodec(results):
+    messages = FixClientMessages("CLIENT", "SIMULATOR", PASSWORD, FIX_VERSION, 30)
+    encoded = {}
+    for msgType, build in outboundMessages(messages).items():
+        if msgType.endswith(".template"):
+            def encode():
+                build().encode(1)
+        else:
+            def encode():
+                msg = build()
+                msg.append_pair(simplefix.TAG_MSGSEQNUM, 1, header=True)
+                return msg.encode()
+        results.add(f"encode.{msgType}.us", timePerCall(encode), "us", "lower")
+        if not msgType.endswith(".template"):
+            encoded[msgType] = encode()
+    encoded.update(inboundMessages())
+    for msgType, data in encoded.items():
+        for parserClass in (simplefix.FixParser, FIXViewParser):
+            results.add(f"decode.{msgType}.{parserClass.__name__}.us", decodeCost(parserClass, data), "us", "lower")
+
+
+# Simulator and engine sessions
+def runSimulator(port, options):
+    simulator = acceptorSimulator.FIXAcceptorSimulator(password=PASSWORD, **options)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    port.put(loop.run_until_complete(simulator.start()))
+    loop.run_forever()
+
+
+def writeConfig(directory, port, overrides):
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config[GATEWAY] = {
+        "SocketHost": "127.0.0.1",
+        "SocketPort": str(port),
+        "SenderCompID": "CLIENT",
+        "TargetCompID": "SIMULATOR",
+        "SenderPassword": PASSWORD,
+        "BeginString": FIX_VERSION,
+        "HeartBeatInterval": "30",
+        "MaxReconnectAttemps": "3",
+        "ReconnectInterval": "1",
+        "FileLogPath": directory,
+    }
+    config[GATEWAY].update(overrides)
+    filename = os.path.join(directory, "benchmark.ini")
+    with open(filename, "w") as f:
+        config.write(f)
+    return filename
+
+
+async def connect(configFile, listener, timeout=10):
+    client = FIXClient(configFile, GATEWAY, listener)
+    await client.startClient()
+    engine = client.getClient()
+    deadline = time.monotonic() + timeout
+    while engine.getConnectionState() != SocketConnectionState.LOGGED_IN:
+        if time.monotonic() > deadline:
+            raise TimeoutError("Logon to the simulator timed out")
+        await asyncio.sleep(0.01)
+    return engine
+
+
+async def benchmarkOrders(results, configFile, orders):
+    loop = asyncio.get_event_loop()
+    pending = {}
+    async def listener(message):
+        if message.get(simplefix.TAG_MSGTYPE) == simplefix.MSGTYPE_EXECUTION_REPORT:
+            future = pending.pop(message.get(simplefix.TAG_CLORDID), None)
+            if future is not None:
+                future.set_result(time.perf_counter_ns())
+    engine = await connect(configFile, listener)
+    template = engine.clientMessage.newOrderSingleTemplate("PARTY", 3, "USD", simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+    latencies = []
+    for i in range(orders):
+        clOrdID = f"RTT{i}"
+        future = pending[clOrdID.encode()] = loop.create_future()
+        start = time.perf_counter_ns()
+        await engine.sendMessage(template.message(clOrdID, "1", "BTC-USD", 1, 100.5))
+        latencies.append((await asyncio.wait_for(future, 5) - start) / 1000)
+    latencies.sort()
+    for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p999", 0.999)):
+        results.add(f"order.rtt.{name}.us", percentile(latencies, q), "us", "lower")
+    results.add("order.rtt.max.us", latencies[-1], "us", "lower")
+
+    futures = []
+    start = time.perf_counter_ns()
+    for i in range(orders):
+        clOrdID = f"BURST{i}"
+        futures.append(pending.setdefault(clOrdID.encode(), loop.create_future()))
+        await engine.sendMessage(template.message(clOrdID, "2", "ETH-USD", 1, 200.5))
+    await asyncio.wait_for(asyncio.gather(*futures), 30)
+    results.add("order.burst.ordersPerSecond", orders / ((time.perf_counter_ns() - start) / 1e9), "orders/s", "higher")
+    await engine.disconnect()
+
+
+async def benchmarkMarketData(results, configFile, mdMessages):
+    done = asyncio.Event()
+    received = [0, None, None]
+    async def listener(message):
+        if message.get(simplefix.TAG_MSGTYPE) == simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH:
+            received[0] += 1
+            if received[1] is None:
+                received[1] = time.perf_counter()
+            if received[0] == mdMessages:
+                received[2] = time.perf_counter()
+                done.set()
+    engine = await connect(configFile, listener)
+    await engine.sendMessage(engine.clientMessage.marketDataRequest(["BTC-USD", "ETH-USD"], "1", 10, 1)[0])
+    await asyncio.wait_for(done.wait(), 120)
+    results.add("marketData.messagesPerSecond", (mdMessages - 1) / (received[2] - received[1]), "msg/s", "higher")
+    await engine.disconnect()
+
+
+# Results
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(metrics, baselineFile, tolerance):
+    """ Print the change of every metric against a baseline run. Returns the regressed metric names."""
+    with open(baselineFile) as f:
+        baseline = json.load(f)["metrics"]
+    regressions = []
+    print(f"\nAgainst {baselineFile} (tolerance {tolerance:.0%}):")
+    for name, metric in metrics.items():
+        if name not in baseline or not baseline[name]["value"]:
+            continue
+        change = metric["value"] / baseline[name]["value"] - 1
+        worse = change > tolerance if metric["better"] == "lower" else change < -tolerance
+        if worse:
+            regressions.append(name)
+        print(f"{name:45s} {change:+8.1%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ExchangeConnector benchmark suite")
+    parser.add_argument("--orders", type=int, default=2000, help="Orders for the round trip and for the burst test")
+    parser.add_argument("--md-messages", type=int, default=20000, help="Incremental refreshes streamed by the simulator")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Previous JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change counted as a regression")
+    parser.add_argument("--set", action="append", default=[], metavar="OPTION=VALUE", help="Engine configuration override")
+    args = parser.parse_args()
+
+    overrides = dict(option.split("=", 1) for option in args.set)
+    results = Results()
+    benchmarkCodec(results)
+
+    port = multiprocessing.Queue()
+    simulator = multiprocessing.Process(target=runSimulator, args=(port, {"mdMessages": args.md_messages, "mdRate": 0}), daemon=True)
+    simulator.start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            configFile = writeConfig(directory, port.get(timeout=10), overrides)
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(benchmarkOrders(results, configFile, args.orders))
+            loop.run_until_complete(benchmarkMarketData(results, configFile, args.md_messages))
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+    finally:
+        simulator.terminate()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": gitCommit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "engineConfig": overrides,
+        "parameters": {"orders": args.orders, "mdMessages": args.md_messages},
+        "metrics": results.metrics,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline and compare(results.metrics, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Consumer lag under load: every market data entry through a queue against the
+MarketDataConflationCache.
+
+Usage: python benchmarks/conflationBenchmark.py [messagesPerSecond] [consumerMicroseconds] [seconds]
+A producer task applies MarketDataIncrementalRefresh messages (5 entries, 8
+symbols) at the given rate. The consumer spends consumerMicroseconds of CPU per
+item it handles: per entry taken from an asyncio.Queue, or per changed key read
+from a ConflationConsumer. Reports the rate the producer achieved, the age of
+the data when the consumer handles it and the largest backlog held in memory.
+"""
+import asyncio
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+from marketDataCache import MarketDataConflationCache
+from messageView import FIXViewParser
+from orderBook import iterEntries
+from orderBookBenchmark import syntheticRecording
+
+SYMBOLS = ("BTC-USD", "ETH-USD", "SOL-USD", "LTC-USD", "BCH-USD", "XRP-USD", "ADA-USD", "DOT-USD")
+
+
+def spin(microseconds):
+    end = time.perf_counter() + microseconds / 1e6
+    while time.perf_counter() < end:
+        pass
+
+
+def percentiles(ages):
+    ages.sort()
+    if not ages:
+        return "no data"
+    pick = lambda q: ages[min(len(ages) - 1, int(q * len(ages)))] / 1e6
+    return f"age p50 {pick(0.5):9.2f} ms  p99 {pick(0.99):9.2f} ms  max {ages[-1] / 1e6:9.2f} ms"
+
+
+async def produce(messages, rate, seconds, publish):
+    """ Publish at rate messages per second, catching up in bursts when the loop was busy."""
+    start = time.perf_counter()
+    published = 0
+    while time.perf_counter() - start < seconds:
+        due = int((time.perf_counter() - start) * rate)
+        while published < due:
+            publish(messages[published % len(messages)], time.time_ns())
+            published += 1
+        await asyncio.sleep(0.001)
+    return published / (time.perf_counter() - start)
+
+
+async def queued(messages, rate, consumerMicroseconds, seconds):
+    queue = asyncio.Queue()
+    ages = []
+    backlog = 0
+
+    def publish(message, timestamp):
+        nonlocal backlog
+        for entry in iterEntries(message, False):
+            queue.put_nowait((entry, timestamp))
+        backlog = max(backlog, queue.qsize())
+
+    async def consume():
+        while True:
+            entry, timestamp = await queue.get()
+            spin(consumerMicroseconds)
+            ages.append(time.time_ns() - timestamp)
+            await asyncio.sleep(0)
+
+    consumer = asyncio.ensure_future(consume())
+    achieved = await produce(messages, rate, seconds, publish)
+    consumer.cancel()
+    return achieved, ages, backlog, f"{queue.qsize()} entries still queued"
+
+
+async def conflated(messages, rate, consumerMicroseconds, seconds):
+    cache = MarketDataConflationCache(capacity=64)
+    reader = cache.consumer()
+    ages = []
+
+    async def consume():
+        while True:
+            await reader.wait()
+            for value in reader.read():
+                spin(consumerMicroseconds)
+                ages.append(time.time_ns() - value.timestamp)
+                await asyncio.sleep(0)
+
+    consumer = asyncio.ensure_future(consume())
+    achieved = await produce(messages, rate, seconds, cache.apply)
+    consumer.cancel()
+    return achieved, ages, len(cache.keys()), f"{reader.received} values read, {reader.conflated} updates conflated"
+
+
+async def main(rate, consumerMicroseconds, seconds):
+    parser = FIXViewParser()
+    parser.append_buffer(syntheticRecording(20000, symbols=SYMBOLS))
+    messages = parser.get_messages()
+    print(f"{rate} msg/s x 5 entries, consumer {consumerMicroseconds} us per item, {seconds} s")
+    for name, run in (("asyncio.Queue", queued), ("ConflationCache", conflated)):
+        achieved, ages, backlog, detail = await run(messages, rate, consumerMicroseconds, seconds)
+        print(f"{name:16s} produced {achieved:8.0f} msg/s  {percentiles(ages)}  max backlog {backlog:7d}  ({detail})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000, float(sys.argv[2]) if len(sys.argv) > 2 else 20, float(sys.argv[3]) if len(sys.argv) > 3 else 3))
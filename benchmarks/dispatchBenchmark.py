@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Socket reader throughput with a listener that falls behind.
+
+Usage: python benchmarks/dispatchBenchmark.py [messages] [listenerDelay]
+Replays a synthetic MarketDataIncrementalRefresh recording through
+FIXConnectionHandler.readMessage from an in-memory StreamReader. The listener
+awaits listenerDelay seconds per message (I/O bound consumer). Inline dispatch
+is compared with DispatchWorkers (keyed by Symbol) under each overflow policy: reader msg/s (time
+until the whole recording is read), time until the listener is done, listener
+queue lag and messages dropped or conflated.
+"""
+import asyncio
+import configparser
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+from connectionHandler import FIXConnectionHandler, SocketConnectionState
+from latencyMetricsBenchmark import NullWriter
+from orderBookBenchmark import syntheticRecording
+
+SYMBOLS = ("BTC-USD", "ETH-USD", "SOL-USD", "LTC-USD", "BCH-USD", "XRP-USD", "ADA-USD", "DOT-USD")
+
+
+def makeConfig(directory, workers, overflow, queueSize):
+    config = configparser.ConfigParser()
+    config["BENCHMARK"] = {
+        "SenderCompID": "CLIENT",
+        "TargetCompID": "SERVER",
+        "BeginString": "FIX.4.4",
+        "HeartBeatInterval": "30",
+        "FileLogPath": directory,
+        "HumanReadableLog": "false",
+        "MessageView": "true",
+        "BatchRead": "true",
+        "ReadBufferSize": "4096",
+        "DispatchWorkers": str(workers),
+        "DispatchQueueSize": str(queueSize),
+        "DispatchOverflow": overflow,
+    }
+    return config["BENCHMARK"]
+
+
+async def run(config, recording, messages, listenerDelay):
+    delivered = 0
+
+    async def listener(message):
+        nonlocal delivered
+        await asyncio.sleep(listenerDelay)
+        delivered += 1
+
+    reader = asyncio.StreamReader()
+    reader.feed_data(recording)
+    reader.feed_eof()
+    handler = FIXConnectionHandler(config, reader, NullWriter(), listener)
+    start = time.perf_counter()
+    while handler._connectionState != SocketConnectionState.DISCONNECTED:
+        await handler.readMessage()
+    readElapsed = time.perf_counter() - start
+    if handler._dispatcher is not None:
+        await handler._dispatcher.join()
+    return readElapsed, time.perf_counter() - start, delivered, handler.getDispatchStats()
+
+
+async def main(messages, listenerDelay):
+    recording = syntheticRecording(messages, symbols=SYMBOLS)
+    print(f"{messages} messages over {len(SYMBOLS)} symbols, listener awaits {listenerDelay * 1e3:.1f} ms per message")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, workers, overflow in (("inline", 0, "block"), ("block 4 workers", 4, "block"), ("dropOldest 4 workers", 4, "dropOldest"), ("conflate 4 workers", 4, "conflate")):
+            readElapsed, elapsed, delivered, stats = await run(makeConfig(directory, workers, overflow, 256), recording, messages, listenerDelay)
+            line = f"{name:22s} reader {messages / readElapsed:10.0f} msg/s  listener done after {elapsed:6.2f} s  delivered {delivered:6d}"
+            if stats is not None:
+                lag = stats["lag"]
+                line += f"  lag p50 {lag['p50'] / 1e3:8.1f} ms  p99 {lag['p99'] / 1e3:8.1f} ms  dropped {stats['dropped']}  conflated {stats['conflated']}  reader blocked {stats['blockedSeconds']:.2f} s"
+            print(line)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000, float(sys.argv[2]) if len(sys.argv) > 2 else 0.0005))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of NewOrderSingle / OrderCancelReplaceRequest encoding.
+Compares the simplefix path (FixClientMessages + sequenceNumHandler + encode) with precompiled templates.
+
+Usage: python benchmarks/encodeBenchmark.py [iterations]
+"""
+import os
+import sys
+import timeit
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+from fixClientMessages import FixClientMessages
+from sessionHandler import FIXSessionHandler
+
+
+def main(iterations):
+    client = FixClientMessages("SENDER", "TARGET", "password", "FIX.4.4", 30)
+    session = FIXSessionHandler("TARGET", "SENDER")
+    newOrderTemplate = client.newOrderSingleTemplate("PARTY", 3, "USD", "2", 4, "1")
+    replaceTemplate = client.orderCancelReplaceRequestTemplate("2", currency="USD", product=4, tif="1")
+
+    def simplefixNewOrder():
+        msg = client.newOrderSingle("CLORD1", "PARTY", 3, "USD", "1", "BTC-USD", 1.5, 10250.5, "2", 4, "1")
+        session.sequenceNumHandler(msg)
+        return msg.encode()
+
+    def templateNewOrder():
+        return newOrderTemplate.message("CLORD1", "1", "BTC-USD", 1.5, 10250.5).encode(session.nextOutboundSeqNo())
+
+    def simplefixReplace():
+        msg = client.orderCancelReplaceRequest("CLORD2", "ORDER1", "CLORD1", "1", "BTC-USD", 10251.0, "2", quantity=1.5, currency="USD", product=4, tif="1")
+        session.sequenceNumHandler(msg)
+        return msg.encode()
+
+    def templateReplace():
+        return replaceTemplate.message("ORDER1", "CLORD1", "CLORD2", "1", "BTC-USD", 1.5, 10251.0).encode(session.nextOutboundSeqNo())
+
+    results = {}
+    for name, function in [("newOrderSingle simplefix", simplefixNewOrder), ("newOrderSingle template", templateNewOrder),
+                           ("orderCancelReplace simplefix", simplefixReplace), ("orderCancelReplace template", templateReplace)]:
+        seconds = min(timeit.repeat(function, number=iterations, repeat=3))
+        results[name] = seconds / iterations * 1e6
+        print(f"{name:32s} {results[name]:8.2f} us/msg")
+    print(f"newOrderSingle speedup:      {results['newOrderSingle simplefix'] / results['newOrderSingle template']:.1f}x")
+    print(f"orderCancelReplace speedup:  {results['orderCancelReplace simplefix'] / results['orderCancelReplace template']:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fixed-point prices and sizes against float and Decimal.
+
+Usage: python benchmarks/fixedPointBenchmark.py [messages]
+Takes the MDEntryPx and MDEntrySize values of a synthetic
+MarketDataIncrementalRefresh recording (orderBookBenchmark) and decodes them
+with float(), Decimal() and FixedPointCodec (with and without its cache), then
+encodes them back to wire bytes. Replays the recording through OrderBookManager
+with float, Decimal and fixed-point (FIXInstruments) values and compares the
+memory of the book levels as lists of floats and as int64 arrays.
+"""
+import os
+import sys
+import time
+import tracemalloc
+from array import array
+from decimal import Decimal
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+from fixedPoint import FixedPointCodec, FIXInstruments
+from messageView import FIXViewParser
+from orderBook import OrderBookManager
+from orderBookBenchmark import syntheticRecording, replay
+
+
+def wireValues(recording):
+    parser = FIXViewParser()
+    parser.append_buffer(recording)
+    prices = []
+    sizes = []
+    for message in parser.get_messages():
+        for tag, value in message.pairs:
+            if tag == b"270":
+                prices.append(value)
+            elif tag == b"271":
+                sizes.append(value)
+    return prices, sizes
+
+
+def timed(function, values):
+    start = time.perf_counter()
+    for value in values:
+        function(value)
+    return (time.perf_counter() - start) / len(values) * 1e9
+
+
+def best(function, values):
+    return min(timed(function, values) for _ in range(3))
+
+
+def main(messages):
+    recording = syntheticRecording(messages)
+    prices, sizes = wireValues(recording)
+    codec = FixedPointCodec(2)
+    uncached = FixedPointCodec(2, cacheSize=0)
+    print(f"{len(prices)} prices ({len(set(prices))} distinct), {len(sizes)} sizes ({len(set(sizes))} distinct)\n")
+    print("decode ns/value")
+    for name, function in [("float", float), ("Decimal", lambda value: Decimal(value.decode())), ("FixedPoint", codec.decode), ("FixedPoint no cache", uncached.decode)]:
+        print(f"  {name:20s} {best(function, prices):8.0f}")
+
+    floats = [float(price) for price in prices]
+    decimals = [Decimal(price.decode()) for price in prices]
+    units = [codec.decode(price) for price in prices]
+    print("encode ns/value")
+    for name, function, values in [("float", lambda value: b"%.2f" % value, floats), ("Decimal", lambda value: str(value).encode(), decimals),
+                                   ("FixedPoint", codec.encode, units), ("FixedPoint no cache", uncached.encode, units)]:
+        print(f"  {name:20s} {best(function, values):8.0f}")
+
+    print("order books parse + apply")
+    instruments = FIXInstruments(priceDecimals=2, sizeDecimals=1)
+    for name, manager in [("float", OrderBookManager()), ("Decimal", OrderBookManager(lambda value: Decimal(value.decode()), lambda value: Decimal(value.decode()))),
+                          ("FixedPoint", OrderBookManager(instruments=instruments))]:
+        start = time.perf_counter()
+        count = replay(FIXViewParser, recording, manager)
+        elapsed = time.perf_counter() - start
+        print(f"  {name:20s} {count / elapsed:8.0f} msg/s  {sum(len(book.bids) + len(book.offers) for book in manager.books())} levels")
+
+    print("memory of 100000 levels (keys, prices, sizes)")
+    for name, build in [("float lists", lambda: [[float(i) for i in range(100000)] for _ in range(3)]),
+                        ("int64 arrays", lambda: [array("q", range(100000)) for _ in range(3)])]:
+        tracemalloc.start()
+        levels = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del levels
+        print(f"  {name:20s} {size / 1024:8.0f} KiB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
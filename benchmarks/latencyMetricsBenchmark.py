@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cost of the hot path latency instrumentation.
+
+Usage: python benchmarks/latencyMetricsBenchmark.py [messages]
+Replays a synthetic MarketDataIncrementalRefresh recording (FIXViewParser) through
+FIXConnectionHandler.readMessage (socket read, parse, dispatch to a no-op
+listener, sequence validation) from an in-memory StreamReader, and sends
+NewOrderSingle templates to a writer that discards the bytes, with
+LatencyMetrics off and on. Prints the cost per message of both and the
+inbound stage summary recorded with instrumentation on.
+"""
+import asyncio
+import configparser
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+import simplefix
+from connectionHandler import FIXConnectionHandler, SocketConnectionState
+from fixClientMessages import FixClientMessages
+from orderBookBenchmark import syntheticRecording
+
+
+class NullWriter:
+    """ StreamWriter stand-in that discards everything written."""
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def makeConfig(directory, latency, batchRead):
+    config = configparser.ConfigParser()
+    config["BENCHMARK"] = {
+        "SenderCompID": "CLIENT",
+        "TargetCompID": "SERVER",
+        "BeginString": "FIX.4.4",
+        "HeartBeatInterval": "30",
+        "FileLogPath": directory,
+        "HumanReadableLog": "false",
+        "MessageView": "true",
+        "ReadBufferSize": "4096",
+        "BatchRead": str(batchRead),
+        "LatencyMetrics": str(latency),
+    }
+    return config["BENCHMARK"]
+
+
+async def noop(message):
+    pass
+
+
+async def inbound(config, recording, messages):
+    reader = asyncio.StreamReader()
+    reader.feed_data(recording)
+    reader.feed_eof()
+    handler = FIXConnectionHandler(config, reader, NullWriter(), noop)
+    start = time.perf_counter()
+    while handler._connectionState != SocketConnectionState.DISCONNECTED:
+        await handler.readMessage()
+    return (time.perf_counter() - start) / messages * 1e6, handler
+
+
+async def outbound(config, orders):
+    handler = FIXConnectionHandler(config, asyncio.StreamReader(), NullWriter(), noop)
+    template = FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30).newOrderSingleTemplate("PARTY", 3, "USD", simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+    start = time.perf_counter()
+    for i in range(orders):
+        await handler.sendMessage(template.message(i, "1", "BTC-USD", 1, 100.5))
+    return (time.perf_counter() - start) / orders * 1e6
+
+
+async def run(messages):
+    recording = syntheticRecording(messages)
+    with tempfile.TemporaryDirectory() as directory:
+        for batchRead in (False, True):
+            costs = {}
+            for latency in (False, True, False, True): # Interleaved, best of two
+                cost, handler = await inbound(makeConfig(directory, latency, batchRead), recording, messages)
+                costs[latency] = min(cost, costs.get(latency, cost))
+            print(f"inbound  BatchRead={batchRead!s:5s} off {costs[False]:6.2f} us/msg  on {costs[True]:6.2f} us/msg  overhead {costs[True] - costs[False]:+5.2f} us ({costs[True] / costs[False] - 1:+.1%})")
+        costs = {}
+        for latency in (False, True, False, True):
+            cost = await outbound(makeConfig(directory, latency, False), messages)
+            costs[latency] = min(cost, costs.get(latency, cost))
+        print(f"outbound                 off {costs[False]:6.2f} us/msg  on {costs[True]:6.2f} us/msg  overhead {costs[True] - costs[False]:+5.2f} us ({costs[True] / costs[False] - 1:+.1%})")
+        print("\nInbound stages with instrumentation on (BatchRead), microseconds:")
+        for stage, summaries in handler.getLatencySnapshot()["stages"].items():
+            summary = summaries["ALL"]
+            print(f"  {stage:13s} p50 {summary['p50']:8.2f}  p99 {summary['p99']:8.2f}  max {summary['max']:9.2f}  ({summary['count']} messages)")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inbound market data with and without the FIXMarketDataMultiplexer.
+
+Usage: python benchmarks/marketDataMultiplexerBenchmark.py [consumers] [mdMessages]
+Starts the acceptor simulator in a separate process streaming mdMessages
+incremental refreshes per subscription as fast as possible. consumers
+strategies subscribe to the same book (BTC-USD, ETH-USD): with a
+MarketDataRequest each, the messages of every request reaching a listener that
+hands each strategy the messages of its MDReqID, then through the multiplexer.
+Reports the bytes and messages received, and the wall and CPU time of the
+client process until every strategy has mdMessages refreshes.
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+import simplefix
+from benchmarkSuite import connect, runSimulator, writeConfig
+
+SYMBOLS = ["BTC-USD", "ETH-USD"]
+
+
+class Strategy:
+    def __init__(self, mdMessages, done):
+        self.refreshes = 0
+        self._mdMessages = mdMessages
+        self._done = done
+
+    async def onMarketData(self, message):
+        if message.get(simplefix.TAG_MSGTYPE) == simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH:
+            self.refreshes += 1
+            if self.refreshes == self._mdMessages:
+                self._done()
+
+
+async def run(configFile, consumers, mdMessages, multiplexed):
+    finished = asyncio.Event()
+    remaining = [consumers]
+    def done():
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            finished.set()
+    strategies = [Strategy(mdMessages, done) for _ in range(consumers)]
+    byMDReqID = {}
+    async def listener(message):
+        strategy = byMDReqID.get(message.get(262))
+        if strategy is not None:
+            await strategy.onMarketData(message)
+    engine = await connect(configFile, listener)
+    startCPU = time.process_time()
+    start = time.perf_counter()
+    if multiplexed:
+        for strategy in strategies:
+            engine.marketData.subscribe(SYMBOLS, strategy.onMarketData, depth=10)
+    else:
+        for i, strategy in enumerate(strategies):
+            byMDReqID[f"S{i}".encode()] = strategy
+            await engine.sendMessage(engine.clientMessage.marketDataRequest(SYMBOLS, "1", 10, "Y", mdReqID=f"S{i}")[0])
+    await asyncio.wait_for(finished.wait(), 300)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - startCPU
+    stats = engine.getStats()
+    await engine.disconnect()
+    return stats["bytesReceived"], stats["messagesReceived"], elapsed, cpu
+
+
+def main(consumers, mdMessages):
+    port = multiprocessing.Queue()
+    simulator = multiprocessing.Process(target=runSimulator, args=(port, {"mdMessages": mdMessages, "mdRate": 0}), daemon=True)
+    simulator.start()
+    try:
+        port = port.get(timeout=10)
+        print(f"{consumers} strategies, {mdMessages} refreshes each\n")
+        print(f"{'':12s} {'KiB in':>10s} {'messages':>10s} {'wall s':>8s} {'cpu s':>8s}")
+        with tempfile.TemporaryDirectory() as directory:
+            for name, multiplexed in (("direct", False), ("multiplexed", True)):
+                configFile = writeConfig(directory, port, {"HumanReadableLog": "false", "MarketDataMultiplexer": str(multiplexed).lower()})
+                received, messages, elapsed, cpu = asyncio.run(run(configFile, consumers, mdMessages, multiplexed))
+                print(f"{name:12s} {received / 1024:10.0f} {messages:10d} {elapsed:8.2f} {cpu:8.2f}")
+    finally:
+        simulator.terminate()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8, int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
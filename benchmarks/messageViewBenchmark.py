@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parse cost and allocations of simplefix.FixParser against FIXViewParser on
+MarketDataIncrementalRefresh messages with large repeating groups, reading the
+handful of fields a typical listener looks at.
+
+Usage: python benchmarks/messageViewBenchmark.py [messages] [entries]
+"""
+import os
+import sys
+import time
+import tracemalloc
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+import simplefix
+from messageView import FIXViewParser
+
+
+def incrementalRefresh(seqNo, entries):
+    msg = simplefix.FixMessage()
+    msg.append_pair(8, "FIX.4.4")
+    msg.append_pair(35, "X")
+    msg.append_pair(49, "EXCHANGE")
+    msg.append_pair(56, "CLIENT")
+    msg.append_pair(34, seqNo)
+    msg.append_utc_timestamp(52)
+    msg.append_pair(262, "BTC-USD_1")
+    msg.append_pair(268, entries)
+    for i in range(entries):
+        msg.append_pair(279, "0")
+        msg.append_pair(269, i % 2)
+        msg.append_pair(55, "BTC-USD")
+        msg.append_pair(270, f"{10000 + i * 0.5:.2f}")
+        msg.append_pair(271, f"{1 + i % 7}.25")
+        msg.append_pair(290, i // 2 + 1)
+    return msg.encode()
+
+
+def readFields(message):
+    return message.get(8), message.get(34), message.get(35), message.get(262)
+
+
+def run(parserClass, stream, chunkSize=65536, retained=None):
+    parser = parserClass()
+    count = 0
+    for offset in range(0, len(stream), chunkSize):
+        parser.append_buffer(stream[offset:offset + chunkSize])
+        message = parser.get_message()
+        while message is not None:
+            readFields(message)
+            if retained is not None:
+                retained.append(message)
+            count += 1
+            message = parser.get_message()
+    return count
+
+
+def main(messages, entries):
+    stream = b"".join(incrementalRefresh(seqNo, entries) for seqNo in range(1, messages + 1))
+    results = {}
+    for name, parserClass in [("simplefix.FixParser", simplefix.FixParser), ("FIXViewParser", FIXViewParser)]:
+        start = time.perf_counter()
+        count = run(parserClass, stream)
+        elapsed = time.perf_counter() - start
+        # Memory held by parsed messages, e.g. while they wait in a listener queue
+        retained = []
+        tracemalloc.start()
+        retainedCount = run(parserClass, stream[:len(stream) // 10], retained=retained)
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = elapsed / count * 1e6
+        print(f"{name:20s} {results[name]:9.2f} us/msg {count / elapsed:12.0f} msg/s  {allocated / retainedCount:9.0f} bytes allocated per retained message")
+    print(f"Speedup: {results['simplefix.FixParser'] / results['FIXViewParser']:.1f}x ({entries} MD entries per message)")
+    return results
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, int(sys.argv[2]) if len(sys.argv) > 2 else 40)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Order book update throughput on a recorded stream of MarketDataIncrementalRefresh messages.
+
+Usage: python benchmarks/orderBookBenchmark.py [recording]
+recording is a file of raw FIX messages (SOH separated, e.g. a capture of the
+socket). Without it a synthetic random-walk recording of 20000 messages is used.
+"""
+import os
+import random
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+import simplefix
+from messageView import FIXViewParser
+from orderBook import OrderBookManager
+
+
+def syntheticRecording(messages=20000, entriesPerMessage=5, symbols=("BTC-USD", "ETH-USD"), seed=1):
+    rng = random.Random(seed)
+    mid = {symbol: 10000.0 for symbol in symbols}
+    chunks = []
+    for seqNo in range(1, messages + 1):
+        msg = simplefix.FixMessage()
+        msg.append_pair(8, "FIX.4.4")
+        msg.append_pair(35, "X")
+        msg.append_pair(34, seqNo)
+        msg.append_pair(262, "BOOK")
+        msg.append_pair(268, entriesPerMessage)
+        for _ in range(entriesPerMessage):
+            symbol = rng.choice(symbols)
+            mid[symbol] += rng.choice((-0.5, 0, 0.5))
+            side = rng.randint(0, 1)
+            price = mid[symbol] - (rng.randint(1, 50) * 0.5 if side == 0 else -rng.randint(1, 50) * 0.5)
+            action = 2 if rng.random() < 0.2 else rng.randint(0, 1)
+            msg.append_pair(279, action)
+            msg.append_pair(269, side)
+            msg.append_pair(55, symbol)
+            msg.append_pair(270, f"{price:.2f}")
+            if action != 2:
+                msg.append_pair(271, f"{rng.randint(1, 100) / 10:.1f}")
+        chunks.append(msg.encode())
+    return b"".join(chunks)
+
+
+def replay(parserClass, recording, manager, chunkSize=65536):
+    """ Feed the recording in socket sized chunks, parse and apply every message."""
+    parser = parserClass()
+    count = 0
+    for offset in range(0, len(recording), chunkSize):
+        parser.append_buffer(recording[offset:offset + chunkSize])
+        message = parser.get_message()
+        while message is not None:
+            manager.apply(message)
+            count += 1
+            message = parser.get_message()
+    return count
+
+
+def main(recording):
+    results = {}
+    for name, parserClass in [("simplefix.FixParser", simplefix.FixParser), ("FIXViewParser", FIXViewParser)]:
+        manager = OrderBookManager()
+        start = time.perf_counter()
+        count = replay(parserClass, recording, manager)
+        elapsed = time.perf_counter() - start
+        updates = sum(book.updates for book in manager.books())
+        results[name] = updates / elapsed
+        print(f"{name:22s} {count / elapsed:10.0f} msg/s {updates / elapsed:12.0f} book updates/s parse + apply ({updates} updates, {len(manager.books())} books)")
+    book = manager.books()[0]
+    start = time.perf_counter()
+    for _ in range(100000):
+        book.bestBid()
+        book.bestOffer()
+    print(f"Top of book read: {(time.perf_counter() - start) / 100000 * 1e9:.0f} ns")
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            main(f.read())
+    else:
+        main(syntheticRecording())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FIX log replay throughput.
+
+Usage: python benchmarks/replayBenchmark.py [messages]
+Writes a synthetic MarketDataIncrementalRefresh recording (orderBookBenchmark)
+as a binary message journal and as a text message log, then reads them back
+line by line / record by record with simplefix.FixParser and with FIXLogReplay,
+and replays them as fast as possible through the dispatch of an offline handler
+building order books. Prints messages per second of each.
+"""
+import asyncio
+import configparser
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+import simplefix
+from logReplay import FIXLogReplay, offlineHandler
+from messageJournal import FIXMessageJournal, INBOUND
+from messageView import FIXViewParser
+from orderBook import OrderBookManager
+from orderBookBenchmark import syntheticRecording
+
+
+def writeJournal(filename, recording, readSize=4096):
+    journal = FIXMessageJournal(filename)
+    for offset in range(0, len(recording), readSize): # One record per socket read
+        journal.record(INBOUND, recording[offset:offset + readSize])
+    journal.close()
+
+
+def writeLog(filename, recording):
+    parser = FIXViewParser()
+    parser.append_buffer(recording)
+    with open(filename, "w") as f:
+        for message in parser.get_messages():
+            f.write(f"2020-01-01 00:00:00,000 - {message}\n")
+
+
+def perLineLog(filename):
+    count = 0
+    with open(filename, "rb") as f:
+        for line in f:
+            parser = simplefix.FixParser()
+            parser.append_buffer(line.split(b" - ", 1)[1].rstrip(b"\n").replace(b"|", b"\x01"))
+            if parser.get_message() is not None:
+                count += 1
+    return count
+
+
+def timed(name, messages, function):
+    start = time.perf_counter()
+    count = function()
+    elapsed = time.perf_counter() - start
+    assert count == messages, (name, count)
+    print(f"{name:42s} {messages / elapsed:12,.0f} msg/s")
+
+
+def makeConfig(directory):
+    config = configparser.ConfigParser()
+    config["REPLAY"] = {"SenderCompID": "REPLAY", "TargetCompID": "SERVER", "BeginString": "FIX.4.4", "HeartBeatInterval": "30", "FileLogPath": directory, "HumanReadableLog": "false"}
+    return config["REPLAY"]
+
+
+async def dispatchReplay(filename, directory, direction):
+    async def noop(message):
+        pass
+    handler = offlineHandler(makeConfig(directory), noop)
+    OrderBookManager().attach(handler, forward=False)
+    return await FIXLogReplay(filename, direction).run(handler.dispatch)
+
+
+def run(messages):
+    recording = syntheticRecording(messages)
+    with tempfile.TemporaryDirectory() as directory:
+        journal = os.path.join(directory, "CLIENT-fixMessages.journal")
+        log = os.path.join(directory, "CLIENT-fixMessages.log")
+        writeJournal(journal, recording)
+        writeLog(log, recording)
+        print(f"{messages} messages, journal {os.path.getsize(journal) / 1e6:.1f} MB, log {os.path.getsize(log) / 1e6:.1f} MB\n")
+        timed("journal FIXMessageJournal.readMessages", messages, lambda: sum(1 for _ in FIXMessageJournal.readMessages(journal, INBOUND)))
+        timed("journal FIXLogReplay", messages, lambda: sum(1 for _ in FIXLogReplay(journal)))
+        timed("log per line FixParser", messages, lambda: perLineLog(log))
+        timed("log FIXLogReplay", messages, lambda: sum(1 for _ in FIXLogReplay(log, direction=None))) # Synthetic messages have no CompIDs
+        for name, filename, direction in (("journal", journal, INBOUND), ("log", log, None)):
+            result = asyncio.run(dispatchReplay(filename, directory, direction))
+            print(f"{name + ' replay through dispatch + order books':42s} {result['messagesPerSecond']:12,.0f} msg/s")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fan-out of market data events to consumer processes: shared memory ring buffer
+against a multiprocessing.Queue per consumer (one pickled tuple per event).
+
+Usage: python benchmarks/ringBufferBenchmark.py [consumers] [messages]
+The publisher replays a synthetic MarketDataIncrementalRefresh recording
+(5 entries per message), first as fast as possible and then paced at 2000 msg/s
+to show latency without queueing. Ring consumers block in RingBufferReader.wait
+when they have read everything, the paced publisher sleeps between messages.
+Reports the publisher hand-off rate, the rate at which every consumer has the
+records, and per consumer records/s, publish to read latency percentiles and
+records lost to overruns. Run on a host with a core per process: on fewer cores
+latency measures the OS scheduler.
+"""
+import multiprocessing
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+from messageView import FIXViewParser
+from sharedRingBuffer import FIXEventPublisher, FIXEventReader, SharedRingBuffer
+from orderBookBenchmark import syntheticRecording
+
+
+class QueueFanout:
+    """ Stands in for SharedRingBuffer: the same records, pickled into one Queue per consumer."""
+    def __init__(self, queues):
+        self.queues = queues
+
+    def publish(self, record, *values):
+        for queue in self.queues:
+            queue.put(values)
+
+
+def percentiles(latencies):
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] / 1000
+    return f"p50 {pick(0.5):8.1f} us  p99 {pick(0.99):8.1f} us  max {latencies[-1] / 1000:9.1f} us"
+
+
+def ringConsumer(name, expected, ready, results):
+    reader = FIXEventReader(name, fromLatest=True)
+    ready.set()
+    latencies = []
+    start = None
+    deadline = time.time() + 120
+    while reader.received + reader.lost < expected and time.time() < deadline:
+        events = reader.pollEvents(4096)
+        if not events:
+            reader.wait(0.1)
+            continue
+        now = time.time_ns()
+        if events and start is None:
+            start = time.perf_counter()
+        for event in events:
+            latencies.append(now - event.timestamp)
+    results.put((reader.received, reader.lost, reader.overruns, time.perf_counter() - start, time.monotonic(), percentiles(latencies)))
+    reader.close()
+
+
+def queueConsumer(queue, expected, ready, results):
+    ready.set()
+    latencies = []
+    start = None
+    received = 0
+    while received < expected:
+        values = queue.get()
+        now = time.time_ns()
+        if start is None:
+            start = time.perf_counter()
+        latencies.append(now - values[0])
+        received += 1
+    results.put((received, 0, 0, time.perf_counter() - start, time.monotonic(), percentiles(latencies)))
+
+
+def publish(publisher, messages, rate):
+    published = 0
+    interval = 1 / rate if rate else 0
+    start = time.perf_counter()
+    for i, message in enumerate(messages):
+        if interval:
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay) # Leaves the CPU to the consumers between messages
+        published += publisher.publish(message)
+    return published, time.perf_counter() - start
+
+
+def run(name, messages, consumers, capacity, rate=None):
+    expected = sum(1 for _ in messages[0].iterGroup(268, 279)) * len(messages)
+    results = multiprocessing.Queue()
+    ready = [multiprocessing.Event() for _ in range(consumers)]
+    if name == "SharedRingBuffer":
+        transport = SharedRingBuffer(capacity=capacity)
+        processes = [multiprocessing.Process(target=ringConsumer, args=(transport.name, expected, ready[i], results)) for i in range(consumers)]
+    else:
+        transport = QueueFanout([multiprocessing.Queue() for _ in range(consumers)])
+        processes = [multiprocessing.Process(target=queueConsumer, args=(transport.queues[i], expected, ready[i], results)) for i in range(consumers)]
+    for process in processes:
+        process.start()
+    for event in ready:
+        event.wait()
+    publishStart = time.monotonic() # CLOCK_MONOTONIC is shared by every process
+    published, elapsed = publish(FIXEventPublisher(transport), messages, rate)
+    lines = []
+    lastDelivery = publishStart
+    for _ in processes:
+        received, lost, overruns, consumeElapsed, finished, latency = results.get()
+        lastDelivery = max(lastDelivery, finished)
+        lines.append(f"    consumer {received / consumeElapsed:10.0f} records/s  {latency}  lost {lost} ({overruns} overruns)")
+    delivered = published / (lastDelivery - publishStart)
+    print(f"{name:22s} {'paced' if rate else 'flat out':8s} publish {published / elapsed:10.0f} records/s  delivered to all {delivered:10.0f} records/s")
+    print("\n".join(lines))
+    for process in processes:
+        process.join()
+    if name == "SharedRingBuffer":
+        transport.close()
+    return delivered
+
+
+def main(consumers, messages, capacity=1 << 20, pacedRate=2000):
+    parser = FIXViewParser()
+    parser.append_buffer(syntheticRecording(messages))
+    parsed = parser.get_messages()
+    print(f"{consumers} consumer processes, {len(parsed)} messages")
+    rates = {}
+    for name in ("SharedRingBuffer", "multiprocessing.Queue"):
+        rates[name] = run(name, parsed, consumers, capacity)
+        run(name, parsed[:pacedRate], consumers, capacity, rate=pacedRate)
+    print(f"Delivery speedup: {rates['SharedRingBuffer'] / rates['multiprocessing.Queue']:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2, int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cost of the pre-trade risk gate.
+
+Usage: python benchmarks/riskGateBenchmark.py [orders]
+Times every check of a FIXRiskGate with all limits set on the same order
+request, the whole gate (parse, checks and counter reservation) on
+NewOrderSingle templates spread over 100 symbols with float and fixed-point
+(FIXInstruments) values, the counter update from an ExecutionReport, and
+sendMessage through a FIXConnectionHandler writing to a discarding writer with
+and without the gate.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+import simplefix
+from acceptorSimulator import executionReport
+from connectionHandler import FIXConnectionHandler
+from fixClientMessages import FixClientMessages
+from fixedPoint import FIXInstruments
+from latencyMetricsBenchmark import NullWriter, makeConfig, noop
+from riskGate import FIXRiskGate
+
+SYMBOLS = [f"SYM{i}-USD" for i in range(100)]
+
+
+def makeGate(instruments=None):
+    return FIXRiskGate(maxOrderQty=1000, maxNotional=1e9, maxPosition=1e9, maxOpenOrders=10 ** 7, priceBand=0.5,
+                       fatFingerFactor=100, fatFingerOrders=10, duplicateWindow=10 ** 7, instruments=instruments)
+
+
+def perCheck(gate, message, repeat=100000):
+    """ ns per call of each check on the same order."""
+    order = gate._order(message.get(simplefix.TAG_MSGTYPE), message)
+    gate.updateLastTrade(order.symbol, order.price)
+    results = {"parse": _timed(lambda: gate._order(simplefix.MSGTYPE_NEW_ORDER_SINGLE, message), repeat)}
+    for name, check in gate.getChecks():
+        results[name] = _timed(lambda: check(order), repeat)
+    return results
+
+
+def _timed(function, repeat):
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        elapsed = (time.perf_counter() - start) / repeat * 1e9
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def gateThroughput(gate, template, orders):
+    messages = [template.message(f"C{i}", "1" if i % 2 else "2", SYMBOLS[i % len(SYMBOLS)], "1.5", "100.25") for i in range(orders)]
+    start = time.perf_counter()
+    for message in messages:
+        gate.check((message,))
+    return (time.perf_counter() - start) / orders * 1e9
+
+
+def executionReports(gate, orders):
+    reports = []
+    for i in range(orders):
+        order = {"orderID": f"O{i}", "clOrdID": f"C{i}", "ordStatus": simplefix.ORDSTATUS_FILLED, "symbol": SYMBOLS[i % len(SYMBOLS)],
+                 "side": "1" if i % 2 else "2", "orderQty": "1.5", "price": "100.25", "cumQty": "1.5", "leavesQty": "0"}
+        message = executionReport("FIX.4.4", order, simplefix.EXECTYPE_TRADE, f"E{i}", lastQty="1.5", lastPx="100.25")
+        reports.append(message)
+    start = time.perf_counter()
+    for message in reports:
+        gate.applyExecutionReport(message)
+    return (time.perf_counter() - start) / orders * 1e9
+
+
+async def sendPath(template, orders, gate):
+    with tempfile.TemporaryDirectory() as directory:
+        handler = FIXConnectionHandler(makeConfig(directory, False, False), asyncio.StreamReader(), NullWriter(), noop)
+        handler.riskGate = gate
+        messages = [template.message(f"C{i}", "1", SYMBOLS[i % len(SYMBOLS)], "1.5", "100.25") for i in range(orders)]
+        start = time.perf_counter()
+        for message in messages:
+            await handler.sendMessage(message)
+        return (time.perf_counter() - start) / orders * 1e6
+
+
+def main(orders):
+    clientMessages = FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30)
+    template = clientMessages.newOrderSingleTemplate("PARTY", 3, "USD", simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+    message = template.message("C", "1", "SYM0-USD", "1.5", "100.25")
+    instruments = FIXInstruments(priceDecimals=2, sizeDecimals=1)
+    floats = perCheck(makeGate(), message)
+    units = perCheck(makeGate(instruments), message)
+    print(f"{'check':18s} {'float ns':>9s} {'units ns':>9s}")
+    for name in floats:
+        print(f"{name:18s} {floats[name]:9.0f} {units[name]:9.0f}")
+    print(f"\n{'whole gate':18s} {gateThroughput(makeGate(), template, orders):9.0f} {gateThroughput(makeGate(instruments), template, orders):9.0f}  ns/order")
+    print(f"{'ExecutionReport':18s} {executionReports(makeGate(), orders):9.0f} {executionReports(makeGate(instruments), orders):9.0f}  ns/report")
+    costs = {}
+    for gate in (None, makeGate(), None, makeGate()): # Interleaved, best of two
+        cost = asyncio.run(sendPath(template, orders, gate))
+        costs[gate is not None] = min(cost, costs.get(gate is not None, cost))
+    print(f"\nsendMessage without gate {costs[False]:6.2f} us/order  with gate {costs[True]:6.2f} us/order  overhead {costs[True] - costs[False]:+5.2f} us")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
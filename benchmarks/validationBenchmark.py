@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cost of data dictionary validation per message.
+
+Usage: python benchmarks/validationBenchmark.py [messages]
+Outbound: FIXDataDictionary.check of NewOrderSingle built with simplefix and
+from a FIXMessageTemplate. Inbound: FIXDataDictionary.validate of parsed
+(FIXViewParser) ExecutionReport, MarketDataIncrementalRefresh and
+MarketDataSnapshotFullRefresh messages. Prints the cost per message next to
+building (outbound) or parsing and reading a few fields (inbound) the same
+message without validation.
+"""
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+import simplefix
+from acceptorSimulator import executionReport, marketDataIncrementalRefresh, marketDataSnapshot
+from dataDictionary import FIXDataDictionary
+from fixClientMessages import FixClientMessages
+from messageView import FIXViewParser
+
+
+def stamp(msg, seqNo):
+    msg.append_pair(simplefix.TAG_SENDER_COMPID, "SERVER", header=True)
+    msg.append_pair(simplefix.TAG_TARGET_COMPID, "CLIENT", header=True)
+    msg.append_pair(simplefix.TAG_MSGSEQNUM, seqNo, header=True)
+    msg.append_utc_timestamp(simplefix.TAG_SENDING_TIME, precision=3, header=True)
+    return msg.encode()
+
+
+def inboundMessages(messages):
+    order = {"orderID": "O1", "clOrdID": "C1", "ordStatus": simplefix.ORDSTATUS_PARTIALLY_FILLED, "symbol": "BTC-USD", "side": simplefix.SIDE_BUY,
+             "orderQty": 10, "price": "10000.50", "cumQty": 4, "leavesQty": 6}
+    entries = [(b"0", b"0" if i % 2 else b"1", "BTC-USD", f"{10000 + i * 0.5:.2f}", "1.25") for i in range(5)]
+    builders = {
+        "8": lambda seqNo: executionReport("FIX.4.4", order, simplefix.EXECTYPE_TRADE, f"E{seqNo}", lastQty=1, lastPx="10000.50"),
+        "X": lambda seqNo: marketDataIncrementalRefresh("FIX.4.4", "BOOK", entries),
+        "W": lambda seqNo: marketDataSnapshot("FIX.4.4", "BOOK", "BTC-USD", 10000.0, 10),
+    }
+    return {msgType: b"".join(stamp(build(seqNo), seqNo) for seqNo in range(1, messages + 1)) for msgType, build in builders.items()}
+
+
+def parse(stream, validate=None):
+    parser = FIXViewParser()
+    parser.append_buffer(stream)
+    start = time.perf_counter()
+    message = parser.get_message()
+    while message is not None:
+        message.get(35), message.get(34)
+        if validate is not None and validate(message) is not None:
+            raise ValueError(validate(message))
+        message = parser.get_message()
+    return time.perf_counter() - start
+
+
+def outbound(build, messages, check=None):
+    start = time.perf_counter()
+    for i in range(messages):
+        message = build(i)
+        if check is not None:
+            check(message)
+    return time.perf_counter() - start
+
+
+def best(measure, *args):
+    return min(measure(*args) for _ in range(3))
+
+
+def main(messages):
+    dictionary = FIXDataDictionary.default()
+    clientMessages = FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30)
+    template = clientMessages.newOrderSingleTemplate("PARTY", 3, "USD", simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+    builders = {
+        "D simplefix": lambda i: clientMessages.newOrderSingle(f"C{i}", "PARTY", 3, "USD", simplefix.SIDE_BUY, "BTC-USD", 1, 100.5, simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL),
+        "D template": lambda i: template.message(f"C{i}", simplefix.SIDE_BUY, "BTC-USD", 1, 100.5),
+    }
+    print(f"{'outbound':14s} {'build':>9s} {'check':>9s}  us/msg")
+    for name, build in builders.items():
+        base = best(outbound, build, messages) / messages * 1e6
+        validated = best(outbound, build, messages, dictionary.check) / messages * 1e6
+        print(f"{name:14s} {base:9.2f} {validated - base:9.2f}  ({validated / base - 1:+.0%})")
+    print(f"\n{'inbound':14s} {'parse':>9s} {'validate':>9s}  us/msg")
+    for msgType, stream in inboundMessages(messages).items():
+        base = best(parse, stream) / messages * 1e6
+        validated = best(parse, stream, dictionary.validate) / messages * 1e6
+        print(f"{msgType:14s} {base:9.2f} {validated - base:9.2f}  ({validated / base - 1:+.0%})")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
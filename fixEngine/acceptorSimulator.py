@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Local FIX acceptor that speaks the dialect of FixClientMessages, for testing and
+benchmarking the engine without connecting to an exchange.
+
+Supported flows:
+    Logon (password in 554 checked when configured), Heartbeat, TestRequest,
+    ResendRequest (answered with a GapFill), Logout. Outbound sequence numbers
+    carry over to the next connection of a TargetCompID unless it logs on with
+    ResetSeqNumFlag=Y. With dropEvery every nth application message is lost on
+    the way and sent again (PossDupFlag=Y) when a ResendRequest covers it
+    NewOrderSingle, OrderCancelReplaceRequest, OrderCancelRequest (including the
+    7559=Y cancel all, scoped to Symbol unless NA) and OrderMassStatusRequest ->
+    ExecutionReports, with optional immediate fills
+    MarketDataRequest -> one snapshot (W) per symbol, then a stream of
+    incremental refreshes (X) until unsubscribed (263=2)
+    TradeCaptureReportRequest -> ack (AQ) and TradeCaptureReports (AE) for past
+    and, when subscribed, future fills. A fill keeps its TradeReportID when
+    reported again, TradeCaptureReportAcks (AR) are recorded per session
+
+Usage: python fixEngine/acceptorSimulator.py [--port 9878] [--password secret] [--fill]
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import time
+import simplefix
+from messageTemplates import FIXMessageTemplate, DYNAMIC
+
+logger = logging.getLogger(__name__)
+
+TAG_PASSWORD = 554
+TAG_MDREQID = 262
+TAG_SUBSCRIPTIONREQUESTTYPE = 263
+TAG_MARKETDEPTH = 264
+TAG_NOMDENTRIES = 268
+TAG_MDUPDATEACTION = 279
+TAG_MDENTRYTYPE = 269
+TAG_MDENTRYPX = 270
+TAG_MDENTRYSIZE = 271
+TAG_MDENTRYPOSITIONNO = 290
+TAG_TRADEREQUESTID = 568
+TAG_TRADEREQUESTTYPE = 569
+TAG_TRADEREPORTID = 571
+TAG_TRADEREQUESTRESULT = 749
+TAG_TRADEREQUESTSTATUS = 750
+TAG_TOTNUMTRADEREPORTS = 748
+TAG_MASSSTATUSREQID = 584
+TAG_LASTRPTREQUESTED = 912
+TAG_CANCEL_ALL = 7559
+MSGTYPE_TRADE_CAPTURE_REPORT_REQUEST_ACK = b"AQ"
+EXECTYPE_ORDER_STATUS = b"I"
+ADMIN_MSGTYPES = frozenset([simplefix.MSGTYPE_HEARTBEAT, simplefix.MSGTYPE_TEST_REQUEST, simplefix.MSGTYPE_RESEND_REQUEST, simplefix.MSGTYPE_REJECT, simplefix.MSGTYPE_SEQUENCE_RESET, simplefix.MSGTYPE_LOGOUT, simplefix.MSGTYPE_LOGON])
+
+
+def _message(fixVersion, msgType):
+    msg = simplefix.FixMessage()
+    msg.append_pair(simplefix.TAG_BEGINSTRING, fixVersion)
+    msg.append_pair(simplefix.TAG_MSGTYPE, msgType)
+    return msg
+
+
+def executionReport(fixVersion, order, execType, execID, lastQty=None, lastPx=None, origClOrdID=None, massStatusReqID=None, lastReport=False):
+    """ ExecutionReport body for a simulated order (dict with the order fields)."""
+    msg = _message(fixVersion, simplefix.MSGTYPE_EXECUTION_REPORT)
+    msg.append_pair(simplefix.TAG_ORDERID, order["orderID"])
+    msg.append_pair(simplefix.TAG_CLORDID, order["clOrdID"])
+    if origClOrdID is not None:
+        msg.append_pair(simplefix.TAG_ORIGCLORDID, origClOrdID)
+    if massStatusReqID is not None:
+        msg.append_pair(TAG_MASSSTATUSREQID, massStatusReqID)
+        msg.append_pair(TAG_LASTRPTREQUESTED, "Y" if lastReport else "N")
+    msg.append_pair(simplefix.TAG_EXECID, execID)
+    msg.append_pair(simplefix.TAG_EXECTYPE, execType)
+    msg.append_pair(simplefix.TAG_ORDSTATUS, order["ordStatus"])
+    msg.append_pair(simplefix.TAG_SYMBOL, order["symbol"])
+    msg.append_pair(simplefix.TAG_SIDE, order["side"])
+    msg.append_pair(simplefix.TAG_ORDERQTY, order["orderQty"])
+    msg.append_pair(simplefix.TAG_PRICE, order["price"])
+    if lastQty is not None:
+        msg.append_pair(simplefix.TAG_LASTQTY, lastQty)
+        msg.append_pair(simplefix.TAG_LASTPX, lastPx)
+    msg.append_pair(simplefix.TAG_CUMQTY, order["cumQty"])
+    msg.append_pair(simplefix.TAG_LEAVESQTY, order["leavesQty"])
+    msg.append_pair(simplefix.TAG_AVGPX, order["price"] if order["cumQty"] else 0)
+    msg.append_utc_timestamp(simplefix.TAG_TRANSACTTIME, precision=6)
+    return msg
+
+
+def orderCancelReject(fixVersion, clOrdID, origClOrdID, orderID, responseTo, text):
+    msg = _message(fixVersion, simplefix.MSGTYPE_ORDER_CANCEL_REJECT)
+    msg.append_pair(simplefix.TAG_ORDERID, orderID or "NONE")
+    msg.append_pair(simplefix.TAG_CLORDID, clOrdID)
+    msg.append_pair(simplefix.TAG_ORIGCLORDID, origClOrdID)
+    msg.append_pair(simplefix.TAG_ORDSTATUS, simplefix.ORDSTATUS_REJECTED)
+    msg.append_pair(simplefix.TAG_CXLREJRESPONSETO, responseTo)
+    msg.append_pair(simplefix.TAG_TEXT, text)
+    return msg
+
+
+def marketDataSnapshot(fixVersion, mdReqID, symbol, mid, depth, tickSize=0.5):
+    """ MarketDataSnapshotFullRefresh with depth bid and offer levels around mid."""
+    msg = _message(fixVersion, simplefix.MSGTYPE_MARKET_DATA_SNAPSHOT_FULL_REFRESH)
+    msg.append_pair(TAG_MDREQID, mdReqID)
+    msg.append_pair(simplefix.TAG_SYMBOL, symbol)
+    msg.append_pair(TAG_NOMDENTRIES, depth * 2)
+    for entryType, sign in ((b"0", -1), (b"1", 1)):
+        for level in range(1, depth + 1):
+            msg.append_pair(TAG_MDENTRYTYPE, entryType)
+            msg.append_pair(TAG_MDENTRYPX, f"{mid + sign * level * tickSize:.2f}")
+            msg.append_pair(TAG_MDENTRYSIZE, f"{level:.2f}")
+            msg.append_pair(TAG_MDENTRYPOSITIONNO, level)
+    return msg
+
+
+def marketDataIncrementalRefresh(fixVersion, mdReqID, entries):
+    """ MarketDataIncrementalRefresh from (action, entryType, symbol, price, size) entries."""
+    msg = _message(fixVersion, simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH)
+    msg.append_pair(TAG_MDREQID, mdReqID)
+    msg.append_pair(TAG_NOMDENTRIES, len(entries))
+    for action, entryType, symbol, price, size in entries:
+        msg.append_pair(TAG_MDUPDATEACTION, action)
+        msg.append_pair(TAG_MDENTRYTYPE, entryType)
+        msg.append_pair(simplefix.TAG_SYMBOL, symbol)
+        msg.append_pair(TAG_MDENTRYPX, price)
+        msg.append_pair(TAG_MDENTRYSIZE, size)
+    return msg
+
+
+def tradeCaptureReport(fixVersion, tradeReportID, tradeRequestID, trade, previouslyReported=False):
+    """ TradeCaptureReport for a simulated fill (dict with the trade fields)."""
+    msg = _message(fixVersion, simplefix.MSGTYPE_TRADE_CAPTURE_REPORT)
+    msg.append_pair(TAG_TRADEREPORTID, tradeReportID)
+    if tradeRequestID is not None:
+        msg.append_pair(TAG_TRADEREQUESTID, tradeRequestID)
+    msg.append_pair(487, 0) # TradeReportTransType
+    msg.append_pair(570, "Y" if previouslyReported else "N") # PreviouslyReported
+    msg.append_pair(simplefix.TAG_EXECID, trade["execID"])
+    msg.append_pair(simplefix.TAG_SYMBOL, trade["symbol"])
+    msg.append_pair(simplefix.TAG_LASTQTY, trade["lastQty"])
+    msg.append_pair(simplefix.TAG_LASTPX, trade["lastPx"])
+    msg.append_pair(75, trade["tradeDate"]) # TradeDate
+    msg.append_utc_timestamp(simplefix.TAG_TRANSACTTIME, precision=6)
+    msg.append_pair(552, 1) # NoSides (Repeating Group)
+    msg.append_pair(simplefix.TAG_SIDE, trade["side"])
+    msg.append_pair(simplefix.TAG_ORDERID, trade["orderID"])
+    msg.append_pair(simplefix.TAG_CLORDID, trade["clOrdID"])
+    return msg
+
+
+class FIXAcceptorSimulator:
+    def __init__(self, host="127.0.0.1", port=0, senderCompID="SIMULATOR", fixVersion="FIX.4.4", password=None,
+                 symbols=("BTC-USD", "ETH-USD"), fillOrders=False, mdMessages=0, mdRate=0, mdEntriesPerMessage=2, tradeReports=0, seed=1, dropEvery=0):
+        """ mdMessages bounds each MD stream (0 streams until unsubscribed), mdRate is in messages/s (0 as fast as possible).
+        tradeReports synthetic trades are reported to every TradeCaptureReportRequest on top of the simulated fills.
+        dropEvery > 0 loses every nth application message, to exercise gap detection and resends."""
+        self.host = host
+        self.port = port
+        self.senderCompID = senderCompID
+        self.fixVersion = fixVersion
+        self.password = password
+        self.symbols = list(symbols)
+        self.fillOrders = fillOrders
+        self.mdMessages = mdMessages
+        self.mdRate = mdRate
+        self.mdEntriesPerMessage = mdEntriesPerMessage
+        self.tradeReports = tradeReports
+        self.dropEvery = dropEvery
+        self.outboundSeqNos = {} # TargetCompID -> last MsgSeqNum sent, for sessions resumed without reset
+        self.sentMessages = {} # TargetCompID -> MsgSeqNum -> encoded application message, when dropEvery is set
+        self.random = random.Random(seed)
+        self.ids = itertools.count(1)
+        self.sessions = []
+        self._server = None
+
+    async def start(self):
+        """ Start listening. Returns the bound port."""
+        self._server = await asyncio.start_server(self._onConnection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"FIX acceptor simulator listening on {self.host}:{self.port}")
+        return self.port
+
+    async def stop(self):
+        sessions = list(self.sessions)
+        for session in sessions:
+            await session.close()
+        await asyncio.gather(*(session.task for session in sessions), return_exceptions=True)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _onConnection(self, reader, writer):
+        session = _SimulatorSession(self, reader, writer)
+        session.task = asyncio.current_task()
+        self.sessions.append(session)
+        try:
+            await session.run()
+        finally:
+            self.sessions.remove(session)
+
+    def nextID(self, prefix):
+        return f"{prefix}{next(self.ids)}"
+
+
+class _SimulatorSession:
+    """ One accepted connection."""
+    def __init__(self, simulator, reader, writer):
+        self.simulator = simulator
+        self.fixVersion = simulator.fixVersion
+        self.reader = reader
+        self.writer = writer
+        self.parser = simplefix.FixParser()
+        self.targetCompID = None
+        self.loggedIn = False
+        self.outboundSeqNo = 0
+        self.lastSent = 0
+        self.received = {}
+        self.orders = {}
+        self.trades = []
+        self.tradeSubscriptions = []
+        self.acknowledgedTradeReports = set()
+        self.sent = {}
+        self.applicationMessages = 0
+        self.dropped = 0
+        self.mdStreams = {}
+        self._heartbeatTask = None
+        self.task = None
+        self._handlers = {
+            simplefix.MSGTYPE_LOGON: self.onLogon,
+            simplefix.MSGTYPE_LOGOUT: self.onLogout,
+            simplefix.MSGTYPE_HEARTBEAT: self.onHeartbeat,
+            simplefix.MSGTYPE_TEST_REQUEST: self.onTestRequest,
+            simplefix.MSGTYPE_RESEND_REQUEST: self.onResendRequest,
+            simplefix.MSGTYPE_SEQUENCE_RESET: self.onHeartbeat,
+            simplefix.MSGTYPE_REJECT: self.onReject,
+            simplefix.MSGTYPE_NEW_ORDER_SINGLE: self.onNewOrderSingle,
+            simplefix.MSGTYPE_ORDER_CANCEL_REPLACE_REQUEST: self.onOrderCancelReplaceRequest,
+            simplefix.MSGTYPE_ORDER_CANCEL_REQUEST: self.onOrderCancelRequest,
+            simplefix.MSGTYPE_ORDER_MASS_STATUS_REQUEST: self.onOrderMassStatusRequest,
+            simplefix.MSGTYPE_MARKET_DATA_REQUEST: self.onMarketDataRequest,
+            simplefix.MSGTYPE_TRADE_CAPTURE_REPORT_REQUEST: self.onTradeCaptureReportRequest,
+            simplefix.MSGTYPE_TRADE_CAPTURE_REPORT_ACK: self.onTradeCaptureReportAck,
+        }
+
+    async def run(self):
+        try:
+            while True:
+                data = await self.reader.read(65536)
+                if not data:
+                    break
+                self.parser.append_buffer(data)
+                message = self.parser.get_message()
+                while message is not None:
+                    msgType = message.get(simplefix.TAG_MSGTYPE)
+                    self.received[msgType] = self.received.get(msgType, 0) + 1
+                    if msgType != simplefix.MSGTYPE_LOGON and not self.loggedIn:
+                        logger.warning(f"{msgType.decode()} received before Logon. Ignoring")
+                    else:
+                        await self._handlers.get(msgType, self.onUnsupported)(message)
+                    if self.writer.is_closing():
+                        return
+                    message = self.parser.get_message()
+                await self.writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            await self.close()
+
+    async def close(self):
+        self.loggedIn = False
+        if self.targetCompID is not None:
+            self.simulator.outboundSeqNos[self.targetCompID] = self.outboundSeqNo
+        if self._heartbeatTask is not None:
+            self._heartbeatTask.cancel()
+            self._heartbeatTask = None
+        for task in self.mdStreams.values():
+            task.cancel()
+        self.mdStreams.clear()
+        if not self.writer.is_closing():
+            self.writer.close()
+
+    def send(self, msg):
+        self.outboundSeqNo += 1
+        self._stamp(msg, self.outboundSeqNo)
+        encoded = msg.encode()
+        if self.simulator.dropEvery and msg.get(simplefix.TAG_MSGTYPE) not in ADMIN_MSGTYPES:
+            self.sent[self.outboundSeqNo] = encoded
+            self.applicationMessages += 1
+            if self.applicationMessages % self.simulator.dropEvery == 0:
+                self.dropped += 1
+                return
+        self.writeBytes(encoded)
+
+    def _stamp(self, msg, seqNo):
+        msg.append_pair(simplefix.TAG_SENDER_COMPID, self.simulator.senderCompID, header=True)
+        msg.append_pair(simplefix.TAG_TARGET_COMPID, self.targetCompID, header=True)
+        msg.append_pair(simplefix.TAG_MSGSEQNUM, seqNo, header=True)
+        msg.append_utc_timestamp(simplefix.TAG_SENDING_TIME, precision=3, header=True)
+
+    def writeBytes(self, data):
+        self.writer.write(data)
+        self.lastSent = asyncio.get_event_loop().time()
+
+    # Session messages
+    async def onLogon(self, message):
+        self.targetCompID = message.get(simplefix.TAG_SENDER_COMPID).decode()
+        if self.simulator.password is not None and message.get(TAG_PASSWORD) != self.simulator.password.encode():
+            msg = _message(self.fixVersion, simplefix.MSGTYPE_LOGOUT)
+            msg.append_pair(simplefix.TAG_TEXT, "Invalid password")
+            self.send(msg)
+            await self.writer.drain()
+            await self.close()
+            return
+        if self.simulator.dropEvery:
+            self.sent = self.simulator.sentMessages.setdefault(self.targetCompID, {})
+        if message.get(simplefix.TAG_RESETSEQNUMFLAG) == simplefix.RESETSEQNUMFLAG_YES:
+            self.outboundSeqNo = 0
+            self.sent.clear()
+        elif self.outboundSeqNo == 0: # New connection resuming the previous one
+            self.outboundSeqNo = self.simulator.outboundSeqNos.get(self.targetCompID, 0)
+        heartbeatInterval = int(message.get(simplefix.TAG_HEARTBTINT) or 30)
+        msg = _message(self.fixVersion, simplefix.MSGTYPE_LOGON)
+        msg.append_pair(simplefix.TAG_ENCRYPTMETHOD, simplefix.ENCRYPTMETHOD_NONE)
+        msg.append_pair(simplefix.TAG_HEARTBTINT, heartbeatInterval)
+        if message.get(simplefix.TAG_RESETSEQNUMFLAG) is not None:
+            msg.append_pair(simplefix.TAG_RESETSEQNUMFLAG, message.get(simplefix.TAG_RESETSEQNUMFLAG))
+        self.send(msg)
+        self.loggedIn = True
+        if self._heartbeatTask is None:
+            self._heartbeatTask = asyncio.ensure_future(self._sendHeartbeats(heartbeatInterval))
+
+    async def onLogout(self, message):
+        self.send(_message(self.fixVersion, simplefix.MSGTYPE_LOGOUT))
+        await self.writer.drain()
+        await self.close()
+
+    async def onHeartbeat(self, message):
+        pass
+
+    async def onReject(self, message):
+        logger.warning(f"Session Reject of {message.get(simplefix.TAG_REFSEQNUM).decode()}: {(message.get(simplefix.TAG_TEXT) or b'').decode()}")
+
+    async def onTestRequest(self, message):
+        msg = _message(self.fixVersion, simplefix.MSGTYPE_HEARTBEAT)
+        msg.append_pair(simplefix.TAG_TESTREQID, message.get(simplefix.TAG_TESTREQID))
+        self.send(msg)
+
+    async def onResendRequest(self, message):
+        # Kept application messages are sent again with PossDupFlag=Y, every other sequence number is gap filled
+        beginSeqNo = int(message.get(simplefix.TAG_BEGINSEQNO))
+        endSeqNo = int(message.get(simplefix.TAG_ENDSEQNO))
+        if endSeqNo == 0 or endSeqNo > self.outboundSeqNo:
+            endSeqNo = self.outboundSeqNo
+        gapStart = beginSeqNo
+        for seqNo in range(beginSeqNo, endSeqNo + 1):
+            encoded = self.sent.get(seqNo)
+            if encoded is None:
+                continue
+            if gapStart < seqNo:
+                self._gapFill(gapStart, seqNo)
+            parser = simplefix.FixParser()
+            parser.append_buffer(encoded)
+            msg = parser.get_message()
+            origSendingTime = msg.get(simplefix.TAG_SENDING_TIME)
+            msg.remove(simplefix.TAG_SENDING_TIME)
+            msg.append_utc_timestamp(simplefix.TAG_SENDING_TIME, precision=3, header=True)
+            msg.append_pair(simplefix.TAG_POSSDUPFLAG, simplefix.POSSDUPFLAG_YES, header=True)
+            msg.append_pair(simplefix.TAG_ORIGSENDINGTIME, origSendingTime, header=True)
+            self.writeBytes(msg.encode())
+            gapStart = seqNo + 1
+        if gapStart <= endSeqNo:
+            self._gapFill(gapStart, endSeqNo + 1)
+
+    def _gapFill(self, seqNo, newSeqNo):
+        msg = _message(self.fixVersion, simplefix.MSGTYPE_SEQUENCE_RESET)
+        msg.append_pair(simplefix.TAG_POSSDUPFLAG, simplefix.POSSDUPFLAG_YES, header=True)
+        msg.append_pair(simplefix.TAG_GAPFILLFLAG, simplefix.GAPFILLFLAG_YES)
+        msg.append_pair(simplefix.TAG_NEWSEQNO, newSeqNo)
+        self._stamp(msg, seqNo)
+        self.writeBytes(msg.encode())
+
+    async def onUnsupported(self, message):
+        msg = _message(self.fixVersion, simplefix.MSGTYPE_BUSINESS_MESSAGE_REJECT)
+        msg.append_pair(simplefix.TAG_REFSEQNUM, message.get(simplefix.TAG_MSGSEQNUM))
+        msg.append_pair(372, message.get(simplefix.TAG_MSGTYPE)) # RefMsgType
+        msg.append_pair(380, 3) # BusinessRejectReason: Unsupported Message Type
+        self.send(msg)
+
+    async def _sendHeartbeats(self, interval):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(max(0.0, self.lastSent + interval - loop.time()))
+            if loop.time() - self.lastSent >= interval and self.loggedIn:
+                self.send(_message(self.fixVersion, simplefix.MSGTYPE_HEARTBEAT))
+
+    # Orders
+    def _executionReport(self, order, execType, **kwargs):
+        self.send(executionReport(self.fixVersion, order, execType, self.simulator.nextID("E"), **kwargs))
+
+    async def onNewOrderSingle(self, message):
+        clOrdID = message.get(simplefix.TAG_CLORDID).decode()
+        order = {
+            "orderID": self.simulator.nextID("O"),
+            "clOrdID": clOrdID,
+            "symbol": message.get(simplefix.TAG_SYMBOL).decode(),
+            "side": message.get(simplefix.TAG_SIDE).decode(),
+            "orderQty": float(message.get(simplefix.TAG_ORDERQTY)),
+            "price": float(message.get(simplefix.TAG_PRICE) or 0),
+            "ordStatus": simplefix.ORDSTATUS_NEW,
+            "cumQty": 0.0,
+            "leavesQty": float(message.get(simplefix.TAG_ORDERQTY)),
+        }
+        self.orders[clOrdID] = order
+        self._executionReport(order, simplefix.EXECTYPE_NEW)
+        if self.simulator.fillOrders:
+            self._fill(order)
+
+    def _fill(self, order):
+        lastQty = order["leavesQty"]
+        order["cumQty"] += lastQty
+        order["leavesQty"] = 0.0
+        order["ordStatus"] = simplefix.ORDSTATUS_FILLED
+        execID = self.simulator.nextID("E")
+        self.send(executionReport(self.fixVersion, order, simplefix.EXECTYPE_TRADE, execID, lastQty=lastQty, lastPx=order["price"]))
+        trade = {"tradeReportID": self.simulator.nextID("T"), "execID": execID, "symbol": order["symbol"], "side": order["side"], "lastQty": lastQty, "lastPx": order["price"],
+                 "orderID": order["orderID"], "clOrdID": order["clOrdID"], "tradeDate": self._tradeDate()}
+        self.trades.append(trade)
+        for tradeRequestID in self.tradeSubscriptions:
+            self.send(tradeCaptureReport(self.fixVersion, trade["tradeReportID"], tradeRequestID, trade))
+
+    def _openOrder(self, message):
+        order = self.orders.get(message.get(simplefix.TAG_ORIGCLORDID).decode())
+        if order is None or order["ordStatus"] in (simplefix.ORDSTATUS_FILLED, simplefix.ORDSTATUS_CANCELED):
+            return None
+        return order
+
+    def _reject(self, message, responseTo, text):
+        orderID = message.get(simplefix.TAG_ORDERID)
+        self.send(orderCancelReject(self.fixVersion, message.get(simplefix.TAG_CLORDID), message.get(simplefix.TAG_ORIGCLORDID), orderID, responseTo, text))
+
+    async def onOrderCancelReplaceRequest(self, message):
+        order = self._openOrder(message)
+        if order is None:
+            self._reject(message, simplefix.CXLREJRESPONSETO_ORDER_CANCEL_REPLACE_REQUEST, "Unknown order")
+            return
+        origClOrdID = order["clOrdID"]
+        order["clOrdID"] = message.get(simplefix.TAG_CLORDID).decode()
+        order["price"] = float(message.get(simplefix.TAG_PRICE))
+        if message.get(simplefix.TAG_ORDERQTY) is not None:
+            order["orderQty"] = float(message.get(simplefix.TAG_ORDERQTY))
+            order["leavesQty"] = max(0.0, order["orderQty"] - order["cumQty"])
+        order["ordStatus"] = simplefix.ORDSTATUS_REPLACED
+        self.orders[order["clOrdID"]] = order
+        self._executionReport(order, simplefix.EXECTYPE_REPLACE, origClOrdID=origClOrdID)
+        order["ordStatus"] = simplefix.ORDSTATUS_NEW if order["cumQty"] == 0 else simplefix.ORDSTATUS_PARTIALLY_FILLED
+
+    async def onOrderCancelRequest(self, message):
+        if message.get(TAG_CANCEL_ALL) == b"Y":
+            symbol = message.get(simplefix.TAG_SYMBOL)
+            symbol = None if symbol in (None, b"NA") else symbol.decode()
+            for order in self._uniqueOrders():
+                if order["ordStatus"] not in (simplefix.ORDSTATUS_FILLED, simplefix.ORDSTATUS_CANCELED) and symbol in (None, order["symbol"]):
+                    self._cancel(order, order["clOrdID"])
+            return
+        order = self._openOrder(message)
+        if order is None:
+            self._reject(message, simplefix.CXLREJRESPONSETO_ORDER_CANCEL_REQUEST, "Unknown order")
+            return
+        origClOrdID = order["clOrdID"]
+        order["clOrdID"] = message.get(simplefix.TAG_CLORDID).decode()
+        self.orders[order["clOrdID"]] = order
+        self._cancel(order, origClOrdID)
+
+    def _cancel(self, order, origClOrdID):
+        order["ordStatus"] = simplefix.ORDSTATUS_CANCELED
+        order["leavesQty"] = 0.0
+        self._executionReport(order, simplefix.EXECTYPE_CANCELED, origClOrdID=origClOrdID)
+
+    def _uniqueOrders(self):
+        return list({order["orderID"]: order for order in self.orders.values()}.values())
+
+    async def onOrderMassStatusRequest(self, message):
+        massStatusReqID = message.get(TAG_MASSSTATUSREQID).decode()
+        orders = [order for order in self._uniqueOrders() if order["ordStatus"] not in (simplefix.ORDSTATUS_FILLED, simplefix.ORDSTATUS_CANCELED)]
+        for i, order in enumerate(orders):
+            self._executionReport(order, EXECTYPE_ORDER_STATUS, massStatusReqID=massStatusReqID, lastReport=i == len(orders) - 1)
+
+    # Market data
+    async def onMarketDataRequest(self, message):
+        mdReqID = message.get(TAG_MDREQID)
+        requestType = message.get(TAG_SUBSCRIPTIONREQUESTTYPE)
+        if requestType == b"2":
+            task = self.mdStreams.pop(mdReqID, None)
+            if task is not None:
+                task.cancel()
+            return
+        symbols = [value.decode() for tag, value in message.pairs if tag == b"55"] or self.simulator.symbols
+        depth = int(message.get(TAG_MARKETDEPTH) or 5) or 5
+        mids = {symbol: 100.0 * (i + 1) for i, symbol in enumerate(symbols)}
+        for symbol in symbols:
+            self.send(marketDataSnapshot(self.fixVersion, mdReqID, symbol, mids[symbol], depth))
+        if requestType == b"1" and mdReqID not in self.mdStreams:
+            self.mdStreams[mdReqID] = asyncio.ensure_future(self._streamMarketData(mdReqID, symbols, mids))
+
+    async def _streamMarketData(self, mdReqID, symbols, mids):
+        """ Random walk of incremental refreshes. Uses a precompiled template: the stream is meant to outrun the client."""
+        simulator = self.simulator
+        entriesPerMessage = simulator.mdEntriesPerMessage
+        fields = [(TAG_MDREQID, mdReqID), (TAG_NOMDENTRIES, entriesPerMessage)]
+        for _ in range(entriesPerMessage):
+            fields += [(TAG_MDUPDATEACTION, DYNAMIC), (TAG_MDENTRYTYPE, DYNAMIC), (simplefix.TAG_SYMBOL, DYNAMIC), (TAG_MDENTRYPX, DYNAMIC), (TAG_MDENTRYSIZE, DYNAMIC)]
+        template = FIXMessageTemplate(self.fixVersion, simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH, simulator.senderCompID, self.targetCompID, fields, precision=3)
+        rng = simulator.random
+        loop = asyncio.get_event_loop()
+        interval = 1 / simulator.mdRate if simulator.mdRate else 0
+        start = loop.time()
+        sent = 0
+        try:
+            while simulator.mdMessages == 0 or sent < simulator.mdMessages:
+                values = []
+                for _ in range(entriesPerMessage):
+                    symbol = rng.choice(symbols)
+                    mids[symbol] += rng.choice((-0.5, 0, 0.5))
+                    entryType = rng.randint(0, 1)
+                    price = mids[symbol] + (rng.randint(1, 10) * 0.5 if entryType else -rng.randint(1, 10) * 0.5)
+                    values += [rng.choice((0, 1, 1, 2)), entryType, symbol, f"{price:.2f}", f"{rng.randint(1, 100) / 10:.1f}"]
+                self.outboundSeqNo += 1
+                self.writeBytes(template.encode(self.outboundSeqNo, values))
+                sent += 1
+                if interval:
+                    await asyncio.sleep(max(0.0, start + sent * interval - loop.time()))
+                elif sent % 100 == 0:
+                    await self.writer.drain()
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if self.mdStreams.get(mdReqID) is asyncio.current_task():
+                del self.mdStreams[mdReqID]
+
+    # Drop copy
+    async def onTradeCaptureReportRequest(self, message):
+        tradeRequestID = message.get(TAG_TRADEREQUESTID).decode()
+        requestType = message.get(TAG_SUBSCRIPTIONREQUESTTYPE)
+        trades = [] if requestType == b"9" else list(self.trades)
+        for _ in range(self.simulator.tradeReports if requestType != b"9" else 0):
+            trades.append(self._syntheticTrade())
+        ack = _message(self.fixVersion, MSGTYPE_TRADE_CAPTURE_REPORT_REQUEST_ACK)
+        ack.append_pair(TAG_TRADEREQUESTID, tradeRequestID)
+        ack.append_pair(TAG_TRADEREQUESTTYPE, message.get(TAG_TRADEREQUESTTYPE) or 0)
+        ack.append_pair(TAG_TOTNUMTRADEREPORTS, len(trades))
+        ack.append_pair(TAG_TRADEREQUESTRESULT, 0)
+        ack.append_pair(TAG_TRADEREQUESTSTATUS, 0)
+        self.send(ack)
+        for i, trade in enumerate(trades):
+            self.send(tradeCaptureReport(self.fixVersion, trade["tradeReportID"], tradeRequestID, trade, previouslyReported=True))
+            if i % 100 == 99:
+                await self.writer.drain()
+        if requestType in (b"1", b"9"):
+            self.tradeSubscriptions.append(tradeRequestID)
+
+    async def onTradeCaptureReportAck(self, message):
+        self.acknowledgedTradeReports.add(message.get(TAG_TRADEREPORTID).decode())
+
+    def _syntheticTrade(self):
+        rng = self.simulator.random
+        symbol = rng.choice(self.simulator.symbols)
+        return {"tradeReportID": self.simulator.nextID("T"), "execID": self.simulator.nextID("E"), "symbol": symbol, "side": rng.choice("12"), "lastQty": rng.randint(1, 100) / 10,
+                "lastPx": f"{100 + rng.randint(-100, 100) * 0.5:.2f}", "orderID": self.simulator.nextID("O"), "clOrdID": self.simulator.nextID("C"), "tradeDate": self._tradeDate()}
+
+    @staticmethod
+    def _tradeDate():
+        return time.strftime("%Y%m%d", time.gmtime())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local FIX acceptor simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9878)
+    parser.add_argument("--sender-comp-id", default="SIMULATOR")
+    parser.add_argument("--fix-version", default="FIX.4.4")
+    parser.add_argument("--password")
+    parser.add_argument("--fill", action="store_true", help="Fill every order right after acknowledging it")
+    parser.add_argument("--md-messages", type=int, default=0, help="Incremental refreshes per subscription, 0 until unsubscribed")
+    parser.add_argument("--md-rate", type=float, default=10, help="Incremental refreshes per second, 0 as fast as possible")
+    parser.add_argument("--trade-reports", type=int, default=0, help="Synthetic trades reported to every TradeCaptureReportRequest")
+    parser.add_argument("--drop-every", type=int, default=0, help="Lose every nth application message until it is requested again")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    simulator = FIXAcceptorSimulator(args.host, args.port, args.sender_comp_id, args.fix_version, args.password, fillOrders=args.fill,
+                                     mdMessages=args.md_messages, mdRate=args.md_rate, tradeReports=args.trade_reports, dropEvery=args.drop_every)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(simulator.start())
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(simulator.stop())
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -29,8 +29,27 @@ import sys
 import simplefix
 import logging
 import time
+from collections import deque, defaultdict
 from enum import Enum
 from sessionHandler import FIXSessionHandler
+from messageJournal import FIXMessageJournal, INBOUND, OUTBOUND
+from messageStore import FIXMessageStore
+from sequenceStore import FIXSequenceStore
+from messageTemplates import TemplateMessage, UTCTimestampCache
+from heartbeatScheduler import FIXHeartbeatScheduler
+from messageView import FIXMessageView, FIXViewParser
+from latencyMetrics import FIXLatencyMetrics, STAGE_WRITE, STAGE_DRAIN, STAGE_ENCODE, BATCH
+from outboundScheduler import FIXOutboundScheduler, parseRateLimits
+from listenerDispatcher import FIXListenerDispatcher
+from dataDictionary import FIXDataDictionary
+
+VALIDATION_OFF = "off"
+VALIDATION_OUTBOUND = "outbound"
+VALIDATION_FULL = "full"
+
+ADMIN_MSGTYPES = frozenset([simplefix.MSGTYPE_HEARTBEAT, simplefix.MSGTYPE_TEST_REQUEST, simplefix.MSGTYPE_RESEND_REQUEST, simplefix.MSGTYPE_REJECT, simplefix.MSGTYPE_SEQUENCE_RESET, simplefix.MSGTYPE_LOGOUT, simplefix.MSGTYPE_LOGON])
+# Processed as soon as they arrive, even ahead of a gap. SequenceReset too unless it is a GapFill
+UNSEQUENCED_MSGTYPES = frozenset([simplefix.MSGTYPE_LOGON, simplefix.MSGTYPE_LOGOUT, simplefix.MSGTYPE_RESEND_REQUEST])
 
 class SocketConnectionState(Enum):
     UNKOWN = 0
@@ -39,6 +58,15 @@ class SocketConnectionState(Enum):
     LOGGED_OUT = 3
     DISCONNECTED = 4
 
+class _SymbolRouter:
+    """ Second level of dispatch for MsgTypes with per Symbol handlers."""
+    def __init__(self, fallback):
+        self.handlers = {}
+        self.fallback = fallback
+
+    async def __call__(self, message):
+        await self.handlers.get(message.get(simplefix.TAG_SYMBOL), self.fallback)(message)
+
 class FIXConnectionHandler(object):
     def __init__(self, config, reader, writer, messageListener):
         self._config = config
@@ -46,68 +74,458 @@ class FIXConnectionHandler(object):
         self._reader = reader
         self._writer = writer
         self._sequenceNum = 0
-        self.fixParser = simplefix.FixParser()
-        self._session = FIXSessionHandler(config["TargetCompID"], config["SenderCompID"])
+        self.fixParser = FIXViewParser() if config.getboolean('MessageView', fallback=False) else simplefix.FixParser()
+        sequenceStore = None
+        if config.getboolean('SequenceStore', fallback=False):
+            sequenceStore = FIXSequenceStore(f"{config['FileLogPath']}/{config['SenderCompID']}-sequence.dat")
+        self._gapBufferSize = config.getint('GapBufferSize', fallback=0)
+        self._session = FIXSessionHandler(config["TargetCompID"], config["SenderCompID"], sequenceStore, self._gapBufferSize)
         self.clientMessage = None
+        self.orderCache = None
+        self.riskGate = None
         self._listener = messageListener
-        self._lastRcvMsg = None
-        self._missedHeartbeats = 0
+        self._handlers = {}
+        self._sessionMsgTypes = frozenset()
+        self._dispatchCounts = defaultdict(int)
+        self._loop = asyncio.get_event_loop()
+        self._heartbeat = FIXHeartbeatScheduler(config.getint('HeartBeatInterval'), config.getint('MaxMissedHeartBeats', fallback=2), clock=self._loop.time)
         self._lastLogonAttempt = 0
         self._logonCount = 0
-        self._bufferSize = 128
-        self._fixLogger = self.setupLogger(name=config["BeginString"],filename=f"{config['SenderCompID']}-fixMessages")
+        self._bufferSize = config.getint('ReadBufferSize', fallback=128)
+        self._batchRead = config.getboolean('BatchRead', fallback=False)
+        self._coalesceWrites = config.getboolean('CoalesceWrites', fallback=False)
+        self._sendQueueSize = config.getint('SendQueueSize', fallback=1024)
+        self._writing = False # Writer task between taking a batch off the queue and the end of its drain
+        self._sendQueue = deque()
+        self._sendLock = asyncio.Lock()
+        self._sendQueueReady = asyncio.Event()
+        self._sendQueueSpace = asyncio.Event()
+        self._sendQueueSpace.set()
+        self._writerTask = None
+        self._logout = False
+        self._logoutReceived = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._bytesReceived = 0
+        self._bytesSent = 0
+        if config.get('WriteBufferHighWater') is not None:
+            self._writer.transport.set_write_buffer_limits(high=config.getint('WriteBufferHighWater'))
+        self._fixLogger = self.setupLogger(name=f"{config['BeginString']}.{config['SenderCompID']}",filename=f"{config['SenderCompID']}-fixMessages")
+        self._humanReadableLog = config.getboolean('HumanReadableLog', fallback=True)
+        self._journal = None
+        if config.getboolean('MessageJournal', fallback=False):
+            self._journal = FIXMessageJournal(f"{config['FileLogPath']}/{config['SenderCompID']}-fixMessages.journal", bufferSize=config.getint('JournalBufferSize', fallback=1 << 20), flushInterval=config.getfloat('JournalFlushInterval', fallback=0.05), fsync=config.getboolean('JournalFsync', fallback=False))
+        self._store = None
+        self._resendTimestamps = UTCTimestampCache(3)
+        if config.getboolean('MessageStore', fallback=False):
+            self._store = FIXMessageStore(f"{config['FileLogPath']}/{config['SenderCompID']}-store", segmentMessages=config.getint('StoreSegmentMessages', fallback=65536), retainSegments=config.getint('StoreRetainSegments', fallback=4))
         self._engineLogger = self.setupLogger(name=config["SenderCompID"], filename=f"{config['SenderCompID']}-session", formatter="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        self._dispatcher = None
+        if config.getint('DispatchWorkers', fallback=0) > 0:
+            self._dispatcher = FIXListenerDispatcher(messageListener, config.getint('DispatchWorkers'), config.getint('DispatchQueueSize', fallback=1024), config.get('DispatchOverflow', fallback='block'), config.get('DispatchKey', fallback='symbol'), logger=self._engineLogger)
+        self._latency = None
+        self._latencyDumpTask = None
+        if config.getboolean('LatencyMetrics', fallback=False):
+            self._latency = FIXLatencyMetrics(config['SenderCompID'])
+            if config.getfloat('LatencyDumpInterval', fallback=0) > 0:
+                self._latencyLogger = self.setupLogger(name=f"{config['SenderCompID']}.latency", filename=f"{config['SenderCompID']}-latency", formatter="%(message)s")
+                self._latencyDumpTask = asyncio.ensure_future(self._dumpLatency(config.getfloat('LatencyDumpInterval'), config.getboolean('LatencyDumpReset', fallback=False)))
+        validation = config.get('Validation', fallback=VALIDATION_OFF)
+        if validation not in (VALIDATION_OFF, VALIDATION_OUTBOUND, VALIDATION_FULL):
+            raise ValueError(f"Validation must be {VALIDATION_OFF}, {VALIDATION_OUTBOUND} or {VALIDATION_FULL}, not {validation}")
+        self._dictionary = None
+        if validation != VALIDATION_OFF:
+            self._dictionary = FIXDataDictionary.default() if config.getboolean('ValidationUserDefinedFields', fallback=True) else FIXDataDictionary(allowUserDefined=False)
+        self._validateInbound = validation == VALIDATION_FULL
+        self._scheduler = None
+        self._schedulerTask = None
+        if config.getfloat('RateLimit', fallback=0) > 0 or config.get('RateLimitMsgTypes'):
+            self._scheduler = FIXOutboundScheduler(config.getfloat('RateLimit', fallback=0), config.getfloat('RateLimitBurst', fallback=0), parseRateLimits(config.get('RateLimitMsgTypes')), now=self._loop.time())
+            self._schedulerReady = asyncio.Event()
 
 
     def setupLogger(self, name, filename, level=logging.INFO, formatter="%(asctime)s - %(message)s"):
-        handler = logging.FileHandler(filename=f"{self._config['FileLogPath']}/{filename}.log")
-        handler.setFormatter(logging.Formatter(formatter))
         logger = logging.getLogger(name)
         logger.setLevel(level)
-        logger.addHandler(handler)
+        if not logger.handlers: # Reconnects reuse the logger of the previous connection
+            handler = logging.FileHandler(filename=f"{self._config['FileLogPath']}/{filename}.log")
+            handler.setFormatter(logging.Formatter(formatter))
+            logger.addHandler(handler)
         return logger
 
-    async def disconnect(self):
-        """ Disconnect Session."""
-        if self._connectionState != SocketConnectionState.LOGGED_OUT:
+    async def disconnect(self, logoutTimeout=None):
+        """ Disconnect Session. Sends Logout and waits up to logoutTimeout seconds for the counterparty Logout."""
+        self._logout = True
+        if self._connectionState == SocketConnectionState.LOGGED_IN or self._connectionState == SocketConnectionState.CONNECTED:
             await self.logout()
+            await self.flush()
+            if logoutTimeout is None:
+                logoutTimeout = self._config.getfloat('LogoutTimeout', fallback=2)
+            try:
+                await asyncio.wait_for(self._logoutReceived.wait(), logoutTimeout)
+            except asyncio.TimeoutError:
+                self._engineLogger.warning("Logout not acknowledged by counterparty")
         await self.handleClose()
 
     async def handleClose(self):
         """ Handle Close Writer Socket Connection."""
-        if self._connectionState == SocketConnectionState.DISCONNECTED:
+        if self._connectionState != SocketConnectionState.DISCONNECTED:
             self._engineLogger.info(f"{self._config['SenderCompID']} session -> DISCONNECTED")
+            self._heartbeat.stop()
+            if self._latencyDumpTask is not None:
+                self._latencyDumpTask.cancel()
+                self._latencyDumpTask = None
+            if self._writerTask is not None:
+                self._writerTask.cancel()
+                self._writerTask = None
+            if self._sendQueue:
+                self._discardQueued()
+            self._sendQueueSpace.set() # Wake senders waiting for space and flush
+            if self._scheduler is not None:
+                self._discardScheduled()
+            if self._dispatcher is not None:
+                self._dispatcher.close() # Messages already read still reach the listener
             self._writer.close()
+            if self._journal is not None:
+                self._journal.close()
+            if self._store is not None:
+                self._store.close()
+            self._session.close()
             self._connectionState = SocketConnectionState.DISCONNECTED
+            self._closed.set()
+
+    async def waitClosed(self):
+        """ Wait until the session is disconnected."""
+        await self._closed.wait()
     
     async def sendMessage(self, message: simplefix.FixMessage):
-        """ Send FIX Message to Server."""
+        """ Send FIX Message to Server. With RateLimit set application messages wait for the outbound scheduler,
+        raising ConnectionError if the session closes before they are sent. With Validation on an invalid message
+        raises FIXValidationError and is not sent, with a risk gate an order failing a pre-trade check raises
+        FIXRiskRejected."""
         if self._connectionState != SocketConnectionState.CONNECTED and self._connectionState != SocketConnectionState.LOGGED_IN:
             self._engineLogger.warning("Cannot Send Message. Socket is closed or Session is LOGGED OUT")
             return
-        self._session.sequenceNumHandler(message)
-        message = message.encode()
-        self._writer.write(message)
-        await self._writer.drain()
-        self._lastMsgSent = time.time()
-        self._fixLogger.info(f"{FIXConnectionHandler.printFix(message)}")
+        if self._dictionary is not None:
+            self._dictionary.check(message)
+        if self.riskGate is not None:
+            self.riskGate.check((message,))
+        if self._scheduler is not None:
+            msgType = message.get(simplefix.TAG_MSGTYPE)
+            if msgType in ADMIN_MSGTYPES:
+                self._scheduler.consume(msgType, self._loop.time())
+            elif not self._scheduler.tryRelease(msgType, self._loop.time()):
+                await self._schedule([message])
+                return
+        await self._sendOne(message)
+
+    async def _sendOne(self, message):
+        if self._coalesceWrites:
+            await self._enqueueMessages([message])
+            return
+        encoded = self._encodeOutbound(message)
+        if self._latency is None:
+            self._writeBuffer(encoded)
+            await self._writer.drain()
+        else:
+            await self._writeInstrumented(encoded, message.get(simplefix.TAG_MSGTYPE))
+        self._logSent([encoded])
+
+    async def sendMany(self, messages):
+        """ Send a list of FIX Messages to Server with consecutive sequence numbers and a single write."""
+        if self._connectionState != SocketConnectionState.CONNECTED and self._connectionState != SocketConnectionState.LOGGED_IN:
+            self._engineLogger.warning("Cannot Send Messages. Socket is closed or Session is LOGGED OUT")
+            return
+        if not messages:
+            return
+        if self._dictionary is not None:
+            for message in messages: # Nothing is sent unless every message is valid
+                self._dictionary.check(message)
+        if self.riskGate is not None:
+            self.riskGate.check(messages)
+        if self._scheduler is not None:
+            if any(message.get(simplefix.TAG_MSGTYPE) not in ADMIN_MSGTYPES for message in messages):
+                await self._schedule(list(messages))
+                return
+            for message in messages:
+                self._scheduler.consume(message.get(simplefix.TAG_MSGTYPE), self._loop.time())
+        await self._sendBatch(messages)
+
+    async def _sendBatch(self, messages):
+        if self._coalesceWrites:
+            await self._enqueueMessages(messages)
+            return
+        encoded = [self._encodeOutbound(message) for message in messages]
+        if self._latency is None:
+            self._writeBuffer(b"".join(encoded))
+            await self._writer.drain()
+        else:
+            await self._writeInstrumented(b"".join(encoded), BATCH)
+        self._logSent(encoded)
+
+    async def _schedule(self, messages):
+        """ Send now if the rate limits allow it and nothing is queued, otherwise queue and wait for the release."""
+        scheduler = self._scheduler
+        now = self._loop.time()
+        idle = not scheduler.depth
+        entry = scheduler.submit(messages, now)
+        if idle and scheduler.poll(now)[0]:
+            await (self._sendOne(messages[0]) if len(messages) == 1 else self._sendBatch(messages))
+            return
+        entry.future = self._loop.create_future()
+        self._schedulerReady.set()
+        if self._schedulerTask is None:
+            self._schedulerTask = asyncio.ensure_future(self._releaseScheduled())
+        await entry.future
+
+    async def _releaseScheduled(self):
+        """ Scheduler task. Sends what the rate limits release, every entry released together in a single write."""
+        scheduler = self._scheduler
+        while True:
+            released, nextRelease = scheduler.poll(self._loop.time())
+            if released:
+                messages = [message for entry in released for message in entry.messages]
+                try:
+                    await (self._sendOne(messages[0]) if len(messages) == 1 else self._sendBatch(messages))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._engineLogger.error("Error sending rate limited messages", exc_info=True)
+                    for entry in released:
+                        if not entry.future.done():
+                            entry.future.set_exception(e)
+                    continue
+                for entry in released:
+                    if not entry.future.done():
+                        entry.future.set_result(None)
+                continue
+            self._schedulerReady.clear()
+            timeout = None if nextRelease is None else max(0.0, nextRelease - self._loop.time())
+            try:
+                await asyncio.wait_for(self._schedulerReady.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _discardScheduled(self):
+        if self._schedulerTask is not None:
+            self._schedulerTask.cancel()
+            self._schedulerTask = None
+        entries = self._scheduler.drain()
+        if entries:
+            self._engineLogger.warning(f"Discarding {sum(len(entry.messages) for entry in entries)} rate limited messages queued at disconnect")
+        for entry in entries:
+            if self.riskGate is not None:
+                self.riskGate.release(entry.messages)
+            if entry.future is not None and not entry.future.done():
+                entry.future.set_exception(ConnectionError(f"Session closed before {len(entry.messages)} rate limited messages were sent"))
+
+    def _discardQueued(self):
+        """ Drop the coalesced writes still queued at disconnect. Their orders give back what they reserved in the risk gate."""
+        self._engineLogger.warning(f"Discarding {len(self._sendQueue)} queued messages not written at disconnect")
+        if self.riskGate is not None:
+            parser = FIXViewParser()
+            parser.append_buffer(b"".join(self._sendQueue))
+            self.riskGate.release(parser.get_messages())
+        self._sendQueue.clear()
+
+    async def flush(self):
+        """ Wait until every queued message has been written to the Socket and drained."""
+        while (self._sendQueue or self._writing) and self._writerTask is not None and not self._writerTask.done():
+            self._sendQueueSpace.clear()
+            await self._sendQueueSpace.wait()
+
+    async def _enqueueMessages(self, messages):
+        """ Assign sequence numbers and queue encoded messages for the writer task.
+        Waits while the queue is over SendQueueSize so senders are throttled instead of buffering without bound."""
+        if self._sendLock.locked() or (self._sendQueue and len(self._sendQueue) + len(messages) > self._sendQueueSize):
+            async with self._sendLock:
+                while self._sendQueue and len(self._sendQueue) + len(messages) > self._sendQueueSize:
+                    self._sendQueueSpace.clear()
+                    await self._sendQueueSpace.wait()
+                if self._connectionState == SocketConnectionState.DISCONNECTED:
+                    raise ConnectionError(f"Session closed before {len(messages)} messages were queued")
+                self._appendToQueue([self._encodeOutbound(message) for message in messages])
+        else:
+            # Sequence numbers are assigned in queue order so they stay strictly increasing on the wire
+            self._appendToQueue([self._encodeOutbound(message) for message in messages])
+
+    def _appendToQueue(self, encoded):
+        self._sendQueue.extend(encoded)
+        self._sendQueueReady.set()
+        if self._writerTask is None:
+            self._writerTask = asyncio.ensure_future(self._writeQueuedMessages())
+
+    async def _writeQueuedMessages(self):
+        """ Writer task. Packs every message queued since the last loop iteration into a single write."""
+        try:
+            while True:
+                await self._sendQueueReady.wait()
+                self._sendQueueReady.clear()
+                if not self._sendQueue:
+                    continue
+                encoded = list(self._sendQueue)
+                self._sendQueue.clear()
+                self._writing = True
+                if self._latency is None:
+                    self._writeBuffer(b"".join(encoded))
+                    self._sendQueueSpace.set()
+                    await self._writer.drain()
+                else:
+                    await self._writeInstrumented(b"".join(encoded), BATCH, self._sendQueueSpace)
+                self._writing = False
+                self._sendQueueSpace.set() # Drained, for flush
+                self._logSent(encoded)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The batch already has its sequence numbers: close so the counterparty asks for them again on the next logon
+            self._engineLogger.error("Error writing queued messages. Closing session", exc_info=True)
+            self._writing = False
+            self._writerTask = None # Not cancelled by handleClose, it is this task
+            await self.handleClose()
     
+    def _encodeOutbound(self, message):
+        """ Assign the next sequence number, encode and keep a copy in the Message Store."""
+        if self._latency is not None:
+            start = time.perf_counter_ns()
+        if self.orderCache is not None:
+            self.orderCache.onOutbound(message)
+        if isinstance(message, TemplateMessage):
+            seqNo = self._session.nextOutboundSeqNo()
+            encoded = message.encode(seqNo)
+        else:
+            seqNo = self._session.sequenceNumHandler(message)
+            encoded = message.encode()
+        if self._store is not None:
+            self._store.append(seqNo, encoded)
+        if self._latency is not None:
+            self._latency.record(STAGE_ENCODE, message.get(simplefix.TAG_MSGTYPE), time.perf_counter_ns() - start)
+        return encoded
+
+    async def resendMessages(self, beginSeqNo, endSeqNo):
+        """ Answer a Resend Request. Stored application messages are sent again with PossDupFlag=Y,
+        admin messages and messages missing from the store are replaced by SequenceReset-GapFill."""
+        lastSeqNo = self._session.getOutboundSeqNo()
+        if endSeqNo == 0 or endSeqNo > lastSeqNo:
+            endSeqNo = lastSeqNo
+        self._engineLogger.info(f"Resending messages: {beginSeqNo} to {endSeqNo}")
+        encoded = []
+        gapStart = None
+        sendingTime = self._resendTimestamps.now()
+        for seqNo in range(beginSeqNo, endSeqNo + 1):
+            stored = self._store.get(seqNo) if self._store is not None else None
+            if stored is not None:
+                stored = bytes(stored) # memoryviews have no find
+            if stored is None or FIXConnectionHandler._storedMsgType(stored) in ADMIN_MSGTYPES:
+                if gapStart is None:
+                    gapStart = seqNo
+                continue
+            if gapStart is not None:
+                encoded.append(self._gapFill(gapStart, seqNo))
+                gapStart = None
+            encoded.append(FIXConnectionHandler._possDuplicate(stored, sendingTime))
+        if gapStart is not None:
+            encoded.append(self._gapFill(gapStart, endSeqNo + 1))
+        if not encoded:
+            return
+        if self._scheduler is not None:
+            self._scheduler.consume(None, self._loop.time(), len(encoded))
+        if self._coalesceWrites:
+            self._appendToQueue(encoded)
+            return
+        self._writeBuffer(b"".join(encoded))
+        await self._writer.drain()
+        self._logSent(encoded)
+
+    def _gapFill(self, gapStart, newSeqNo):
+        msg = self.clientMessage.sendSequenceReset(newSeqNo, gapFill=True)
+        msg.append_pair(34, gapStart, header=True)
+        msg.append_pair(simplefix.TAG_POSSDUPFLAG, simplefix.POSSDUPFLAG_YES, header=True)
+        return msg.encode()
+
+    @staticmethod
+    def _storedMsgType(stored):
+        start = stored.find(b"\x0135=") + 4
+        return stored[start:stored.find(b"\x01", start)]
+
+    @staticmethod
+    def _possDuplicate(stored, sendingTime):
+        """ Stored bytes with a new SendingTime, PossDupFlag=Y and OrigSendingTime spliced in after SendingTime.
+        Only BodyLength and CheckSum are computed again, the message is not parsed."""
+        lengthStart = stored.find(b"\x019=") + 1
+        bodyStart = stored.find(b"\x01", lengthStart) + 1
+        bodyEnd = stored.rfind(b"\x0110=") + 1
+        timeStart = stored.find(b"\x0152=", bodyStart - 1) + 4
+        timeEnd = stored.find(b"\x01", timeStart)
+        body = b"".join((stored[bodyStart:timeStart], sendingTime, b"\x0143=Y\x01122=", stored[timeStart:timeEnd], stored[timeEnd:bodyEnd]))
+        message = b"%s9=%d\x01%s" % (stored[:lengthStart], len(body), body)
+        return message + b"10=%03d\x01" % (sum(message) % 256)
+
+    def _writeBuffer(self, buffer):
+        self._writer.write(buffer)
+        self._bytesSent += len(buffer)
+        self._heartbeat.lastSent = self._loop.time()
+        if self._journal is not None:
+            self._journal.record(OUTBOUND, buffer)
+
+    async def _writeInstrumented(self, buffer, msgType, written=None):
+        """ Write and drain recording both in the latency histograms. Sets the written event between the two."""
+        start = time.perf_counter_ns()
+        self._writeBuffer(buffer)
+        writeTime = time.perf_counter_ns()
+        if written is not None:
+            written.set()
+        await self._writer.drain()
+        self._latency.record(STAGE_WRITE, msgType, writeTime - start)
+        self._latency.record(STAGE_DRAIN, msgType, time.perf_counter_ns() - writeTime)
+
+    def _logSent(self, encoded):
+        if self._humanReadableLog:
+            for message in encoded:
+                self._fixLogger.info(f"{FIXConnectionHandler.printFix(message)}")
+
+    async def _readBuffer(self):
+        buffer = await self._reader.read(self._bufferSize)
+        if self._latency is not None:
+            self._readTime = time.perf_counter_ns()
+        self._bytesReceived += len(buffer)
+        if buffer and self._journal is not None:
+            self._journal.record(INBOUND, buffer)
+        return buffer
+
     async def readMessage(self):
         try:
-            message = None
-            while message is None:
-                buffer = await self._reader.read(self._bufferSize)
-                if not buffer:
-                    break
+            if self._batchRead:
+                messages = await self.readBatch()
+            else:
+                message = self.fixParser.get_message() # A previous read may have brought several messages
+                while message is None:
+                    buffer = await self._readBuffer()
+                    if not buffer:
+                        break
 
-                self.fixParser.append_buffer(buffer)
-                message = self.fixParser.get_message()
+                    self.fixParser.append_buffer(buffer)
+                    message = self.fixParser.get_message()
+                messages = [message] if message is not None else []
+                if self._latency is not None:
+                    self._parsedTimes = [time.perf_counter_ns()]
 
-            if message is None:
+            if not messages and self._reader.at_eof():
+                if self._logout:
+                    self._engineLogger.info("Connection closed by counterparty after Logout")
+                else:
+                    self._engineLogger.warning("Connection closed by counterparty")
+                await self.handleClose()
                 return
-            self._fixLogger.info(f"{message}")
-            assert isinstance(message, simplefix.FixMessage)
-            await self.processMessage(message)
+
+            latency = self._latency
+            for index, message in enumerate(messages):
+                if self._humanReadableLog:
+                    self._fixLogger.info(f"{message}")
+                assert isinstance(message, (simplefix.FixMessage, FIXMessageView))
+                if latency is None:
+                    await self.processMessage(message)
+                else:
+                    await self.processMessage(message, self._readTime, self._parsedTimes[index])
         except ConnectionError as e:
             self._engineLogger.error("Connection Closed Unexpected.", exc_info=True)
             raise e
@@ -117,12 +535,39 @@ class FIXConnectionHandler(object):
         except Exception as e:
             self._engineLogger.error("Error reading message", exc_info=True)
             raise e
+
+    async def readBatch(self):
+        """ Read from Socket until at least one message is complete and return every complete message in the Parser."""
+        messages = []
+        while not messages:
+            buffer = await self._readBuffer()
+            if not buffer:
+                break
+
+            self.fixParser.append_buffer(buffer)
+            if self._latency is not None:
+                self._parsedTimes = parsedTimes = []
+            message = self.fixParser.get_message()
+            while message is not None:
+                if self._latency is not None:
+                    parsedTimes.append(time.perf_counter_ns())
+                messages.append(message)
+                message = self.fixParser.get_message()
+        return messages
+
+    async def iterMessages(self):
+        """ Async Iterator over inbound messages. Yields every message of each batch read until the Socket is closed."""
+        while True:
+            messages = await self.readBatch()
+            if not messages:
+                return
+            for message in messages:
+                yield message
     
-    async def processMessage(self, message: simplefix.FixMessage):
-        print("Processing Message")
-        
-        self._lastRcvMsg = time.time()
-        self._missedHeartbeats = 0
+    async def processMessage(self, message: simplefix.FixMessage, readTime=None, parsedTime=None):
+        """ Check, dispatch and validate the sequence number of an inbound message.
+        readTime and parsedTime (perf_counter_ns) are recorded in the latency histograms when enabled."""
+        self._heartbeat.lastReceived = self._loop.time()
         beginString = message.get(8).decode()
 
         if beginString != self._config['BeginString']:
@@ -130,52 +575,225 @@ class FIXConnectionHandler(object):
             await self.disconnect()
             return
         
-        if not await self._sessionMessageHandler(message):
-            await self.messageNotification(message)
-        recvSeqNo = message.get(34).decode()
-
-        seqNoState, expectedSeqNo = self._session.validateRecvSeqNo(recvSeqNo)
-        if seqNoState == False:
-            # Unexpected sequence number. Send resend request
-            self._engineLogger.info(f"Sending Resend Request of messages: {expectedSeqNo} to {recvSeqNo}")
-            msg = self.clientMessage.sendResendRequest(expectedSeqNo, recvSeqNo)
-            await self.sendMessage(msg)
+        if self._validateInbound:
+            error = self._dictionary.validate(message)
+            if error is not None:
+                await self._rejectInbound(message, error)
+                if not (message.get(simplefix.TAG_MSGSEQNUM) or b"").isdigit():
+                    return # Cannot be sequenced
+
+        if readTime is not None:
+            dispatchTime = time.perf_counter_ns()
+        if self._gapBufferSize:
+            await self._dispatchInSequence(message)
         else:
-            self._session.updateRecvSeqNo(recvSeqNo)
+            await self.dispatch(message)
+        if readTime is not None:
+            handledTime = time.perf_counter_ns()
+        if not self._gapBufferSize:
+            recvSeqNo = message.get(34).decode()
+
+            seqNoState, expectedSeqNo = self._session.validateRecvSeqNo(recvSeqNo)
+            if seqNoState == False:
+                # Unexpected sequence number. Send resend request
+                self._engineLogger.info(f"Sending Resend Request of messages: {expectedSeqNo} to {recvSeqNo}")
+                msg = self.clientMessage.sendResendRequest(expectedSeqNo, recvSeqNo)
+                await self.sendMessage(msg)
+            else:
+                self._session.updateRecvSeqNo(recvSeqNo)
+        if readTime is not None and self._latency is not None:
+            self._latency.recordInbound(message.get(simplefix.TAG_MSGTYPE), readTime, parsedTime, dispatchTime, handledTime, time.perf_counter_ns())
+
+    async def _rejectInbound(self, message, error):
+        """ Session level Reject (35=3) of a message that failed validation. Its sequence number is used, so it is
+        still dispatched: the counterparty will not send it again and a fill must not be lost."""
+        self._engineLogger.warning(f"Rejecting inbound message: {error}")
+        if message.get(simplefix.TAG_MSGTYPE) == simplefix.MSGTYPE_REJECT:
+            return # Never answer a Reject with a Reject
+        refSeqNum = message.get(simplefix.TAG_MSGSEQNUM) or b""
+        await self.sendMessage(self.clientMessage.sendReject(refSeqNum if refSeqNum.isdigit() else 0, error.refTagID, error.refMsgType, error.reason, error.text))
+
+    async def _dispatchInSequence(self, message):
+        """ Gap buffer. Messages ahead of the expected sequence number are held back and a Resend Request is sent
+        for the gap. They are dispatched in order once the resent messages (or a GapFill) arrive."""
+        session = self._session
+        recvSeqNo = int(message.get(simplefix.TAG_MSGSEQNUM))
+        expectedSeqNo = session.getNextExpectedSeqNo()
+        if recvSeqNo > expectedSeqNo:
+            msgType = message.get(simplefix.TAG_MSGTYPE)
+            unsequenced = msgType in UNSEQUENCED_MSGTYPES or (msgType == simplefix.MSGTYPE_SEQUENCE_RESET and message.get(simplefix.TAG_GAPFILLFLAG) != simplefix.GAPFILLFLAG_YES)
+            if unsequenced:
+                await self.dispatch(message)
+                if session.getNextExpectedSeqNo() > recvSeqNo: # SequenceReset-Reset past it
+                    await self._dispatchBuffered()
+                    return
+            try:
+                gap = session.bufferMessage(recvSeqNo, None if unsequenced else message)
+            except OverflowError as e:
+                self._engineLogger.error(f"{e}. Closing session")
+                await self.handleClose()
+                return
+            if gap is not None:
+                self._engineLogger.info(f"Sending Resend Request of messages: {gap[0]} to {gap[1]}")
+                await self.sendMessage(self.clientMessage.sendResendRequest(*gap))
+            await self._dispatchBuffered() # A Logon with ResetSeqNumFlag may have reset the expected number
+            return
+        if recvSeqNo < expectedSeqNo and message.get(simplefix.TAG_POSSDUPFLAG) == simplefix.POSSDUPFLAG_YES:
+            return # Already processed
+        await self.dispatch(message)
+        session.updateRecvSeqNo(recvSeqNo)
+        await self._dispatchBuffered()
+
+    async def _dispatchBuffered(self):
+        buffered = self._session.popBuffered()
+        while buffered is not None and self._connectionState != SocketConnectionState.DISCONNECTED:
+            await self.dispatch(buffered[1])
+            self._session.updateRecvSeqNo(buffered[0])
+            buffered = self._session.popBuffered()
+
+    async def dispatch(self, message):
+        """ Route message to the handler registered for its MsgType. Unhandled types go to the listener.
+        A handler failing on a message is logged and the session moves on to the next one."""
+        msgType = message.get(simplefix.TAG_MSGTYPE)
+        self._dispatchCounts[msgType] += 1
+        try:
+            await self._handlers.get(msgType, self.messageNotification)(message)
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception:
+            self._engineLogger.error(f"Error handling message {msgType} {message.get(simplefix.TAG_MSGSEQNUM)}", exc_info=True)
 
     async def messageNotification(self, message):
-        await self._listener(message)
+        if self._dispatcher is None:
+            await self._listener(message)
+        else:
+            await self._dispatcher.put(message)
+
+    def registerHandler(self, msgType, handler, symbol=None):
+        """ Route application messages of msgType to handler (coroutine function) instead of the listener.
+        If symbol is given only messages for that Symbol (55) are routed."""
+        msgType = msgType.encode() if isinstance(msgType, str) else msgType
+        if msgType in self._sessionMsgTypes:
+            raise ValueError(f"{msgType.decode()} is a session message type handled by the engine")
+        if symbol is None:
+            current = self._handlers.get(msgType)
+            if isinstance(current, _SymbolRouter):
+                current.fallback = handler
+            else:
+                self._handlers[msgType] = handler
+            return
+        router = self._handlers.get(msgType)
+        if not isinstance(router, _SymbolRouter):
+            router = _SymbolRouter(router if router is not None else self.messageNotification)
+            self._handlers[msgType] = router
+        router.handlers[symbol.encode() if isinstance(symbol, str) else symbol] = handler
+
+    def unregisterHandler(self, msgType, symbol=None):
+        msgType = msgType.encode() if isinstance(msgType, str) else msgType
+        if msgType in self._sessionMsgTypes:
+            raise ValueError(f"{msgType.decode()} is a session message type handled by the engine")
+        current = self._handlers.get(msgType)
+        if isinstance(current, _SymbolRouter):
+            if symbol is None:
+                current.fallback = self.messageNotification
+            else:
+                current.handlers.pop(symbol.encode() if isinstance(symbol, str) else symbol, None)
+            if not current.handlers:
+                self._handlers[msgType] = current.fallback
+            if self._handlers[msgType] == self.messageNotification:
+                del self._handlers[msgType]
+        elif symbol is None:
+            self._handlers.pop(msgType, None)
+
+    def getHandler(self, msgType):
+        """ Handler currently receiving msgType messages that have no per Symbol handler. Used to chain handlers."""
+        msgType = msgType.encode() if isinstance(msgType, str) else msgType
+        handler = self._handlers.get(msgType, self.messageNotification)
+        return handler.fallback if isinstance(handler, _SymbolRouter) else handler
+
+    def _registerSessionHandlers(self, handlers):
+        self._handlers.update(handlers)
+        self._sessionMsgTypes = frozenset(handlers)
+
+    def getStats(self):
+        """ Session health and traffic counters."""
+        return {
+            "state": self._connectionState.name,
+            "messagesReceived": sum(self._dispatchCounts.values()),
+            "messagesSent": self._session.getOutboundSeqNo(),
+            "gapBuffered": self._session.getBufferedCount(),
+            "bytesReceived": self._bytesReceived,
+            "bytesSent": self._bytesSent,
+            "secondsSinceReceived": self._loop.time() - self._heartbeat.lastReceived,
+            "secondsSinceSent": self._loop.time() - self._heartbeat.lastSent,
+        }
+
+    def getLatencySnapshot(self, reset=False):
+        """ Latency histogram summaries per stage and MsgType, None when LatencyMetrics is off."""
+        if self._latency is None:
+            return None
+        return self._latency.snapshot(reset)
+
+    def getSchedulerStats(self, reset=False):
+        """ Outbound queue depth and wait time summaries per priority, None when RateLimit is off."""
+        if self._scheduler is None:
+            return None
+        return self._scheduler.getStats(reset)
+
+    def getDispatchStats(self, reset=False):
+        """ Listener queue depths, overflow counters and queue lag, None when DispatchWorkers is off."""
+        if self._dispatcher is None:
+            return None
+        return self._dispatcher.getStats(reset)
+
+    async def _dumpLatency(self, interval, reset):
+        while True:
+            await asyncio.sleep(interval)
+            self._latencyLogger.info(self._latency.dumps(reset))
+
+    def getDispatchCounts(self):
+        """ Number of messages dispatched per MsgType."""
+        return {msgType.decode(): count for msgType, count in self._dispatchCounts.items()}
 
     async def logon(self):
+        """ Send a Logon, at most one every ReconnectInterval seconds. After MaxReconnectAttemps Logons without a
+        successful one the session is disconnected."""
         if self._logonCount >= self._config.getint('MaxReconnectAttemps'):
             self._engineLogger.warning("Max Logon attemps reached. Disconnecting")
-            self.disconnect()
+            await self.disconnect()
+            return
+        wait = self._lastLogonAttempt + self._config.getfloat('ReconnectInterval') - time.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
         self._engineLogger.info(f"{self._config['SenderCompID']} session -> Sending LOGON")
-        if time.time() - self._lastLogonAttempt > self._config.getint('ReconnectInterval'):
-            msg = self.clientMessage.sendLogOn()
-            await self.sendMessage(msg)
-            self._lastLogonAttempt = time.time()
+        # Persisted sequence numbers carry on from the previous connection
+        msg = self.clientMessage.sendLogOn(simplefix.RESETSEQNUMFLAG_NO if self._session.isResumable() else simplefix.RESETSEQNUMFLAG_YES)
+        self._logonCount += 1
+        self._lastLogonAttempt = time.time()
+        await self.sendMessage(msg)
 
     async def logout(self):
         self._engineLogger.info(f"{self._config['SenderCompID']} session -> Sending LOGOUT")
-        self._connectionState = SocketConnectionState.LOGGED_OUT
+        self._heartbeat.stop()
         await self.sendMessage(self.clientMessage.sendLogOut())
+        self._connectionState = SocketConnectionState.LOGGED_OUT
 
-    async def expectedHeartbeat(self, heartbeatInterval):
-        if self._lastRcvMsg is None:
-            return
-        if time.time() - self._lastRcvMsg > heartbeatInterval:
-            self._engineLogger.warning(f"Heartbeat expected not received. Missed Heartbeats: {self._missedHeartbeats}")
-            self._missedHeartbeats += 1
-        if self._missedHeartbeats >= self._config.getint('MaxMissedHeartBeats'):
-            self._engineLogger.warning(f"Max Missed Heartbeats reached. Loging out")
-            self.logout()
+    def startHeartbeat(self):
+        """ Start sending Heartbeats when idle and TestRequests when the counterparty goes quiet."""
+        self._heartbeat.setHeartbeatInterval(self._config.getint('HeartBeatInterval'), self._config.getint('MaxMissedHeartBeats', fallback=2))
+        self._heartbeat.start(self._sendHeartbeat, self._sendTestRequest, self._sessionDead)
+
+    async def _sendHeartbeat(self):
+        await self.sendMessage(self.clientMessage.sendHeartbeat())
+
+    async def _sendTestRequest(self, testReqID):
+        self._engineLogger.warning(f"Heartbeat expected not received. Sending Test Request {testReqID}")
+        await self.sendMessage(self.clientMessage.sendTestRequest(testReqID))
+
+    async def _sessionDead(self, reason):
+        self._engineLogger.warning(f"{reason}. Closing session")
+        await self.handleClose()
 
-        
-    # Template functions to be overwritten in child class
-    def _sessionMessageHandler(self, message):
-        return -1
-    
     @staticmethod
     def printFix(msg):
         return msg.replace(b"\x01", b"|").decode()
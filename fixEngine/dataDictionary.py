@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+Data dictionary validation of inbound and outbound FIX messages.
+
+The dictionary describes, per MsgType, the required and optional fields, the
+repeating groups (count tag, delimiter and member tags) and conditional rules
+such as StopPx being required for stop limit orders. It is compiled once into
+lookup tables: per MsgType a dict from tag to the check of its value (None, a
+frozenset of valid values or a format matcher) whose keys are the allowed tags,
+frozensets of required tags and a dict of group layouts. Tags stay bytes, so a
+message is checked in a single pass over its (tag, value) pairs without
+converting anything.
+
+validate() returns the first problem of an inbound message as a
+FIXValidationError carrying the SessionRejectReason to send in a Reject (35=3).
+check() raises it for an outbound message before it gets a sequence number.
+Precompiled templates are checked once and only their dynamic values are
+checked per message. The dictionary only lists the fields the engine reads or
+sends: any other tag number is let through, its format checked when the field
+is known, so a valid message carrying a field the dictionary does not list
+(LastMkt, 30, on an ExecutionReport) is never rejected. Tags of the user
+defined range (5000 and up, e.g. 7559) are rejected only when allowUserDefined
+is off.
+
+FIX44 is the FIX 4.4 dialect spoken by FixClientMessages and the acceptor
+simulator. Pass extra messages or fields to FIXDataDictionary to extend it.
+"""
+import re
+import weakref
+from collections import namedtuple
+from messageTemplates import TemplateMessage, SEQNO, SENDING_TIME, TRANSACT_TIME, DYNAMIC, _fixValue
+
+# SessionRejectReason (373)
+REASON_INVALID_TAG = 0
+REASON_REQUIRED_TAG_MISSING = 1
+REASON_TAG_NOT_DEFINED = 2
+REASON_TAG_WITHOUT_VALUE = 4
+REASON_VALUE_OUT_OF_RANGE = 5
+REASON_INCORRECT_FORMAT = 6
+REASON_INVALID_MSGTYPE = 11
+REASON_TAG_MORE_THAN_ONCE = 13
+REASON_TAG_OUT_OF_ORDER = 14
+REASON_GROUP_OUT_OF_ORDER = 15
+REASON_INCORRECT_GROUP_COUNT = 16
+
+USER_DEFINED_TAGS = 5000
+# Added by the engine when the message is encoded, so not checked on outbound messages
+ENCODED_TAGS = frozenset([b"9", b"10", b"34"])
+
+INT = re.compile(rb"-?\d+\Z").match
+FLOAT = re.compile(rb"-?(\d+\.?\d*|\.\d+)\Z").match
+UTCTIMESTAMP = re.compile(rb"\d{8}-\d\d:\d\d:\d\d(\.\d{1,9})?\Z").match
+LOCALMKTDATE = re.compile(rb"\d{8}\Z").match
+CHECKSUM = re.compile(rb"\d{3}\Z").match
+BOOLEAN = "YN"
+
+MessageSpec = namedtuple("MessageSpec", "required optional groups requiredWhen onlyWhen")
+MessageSpec.__new__.__defaults__ = ((), (), {}, (), ())
+# groups: count tag -> (delimiter tag, member tags). requiredWhen: (tag, value, required tag).
+# onlyWhen: (tag, condition tag, condition values), tag may only be present if the condition tag has one of the values
+
+HEADER = MessageSpec(required=(8, 9, 35, 49, 56, 34, 52), optional=(43, 97, 122, 50, 57, 115, 128, 90, 91, 369))
+TRAILER = MessageSpec(required=(10,), optional=(93, 89))
+
+FIX44_FIELDS = {
+    6: FLOAT, 7: INT, 9: INT, 10: CHECKSUM, 14: FLOAT, 16: INT, 21: "123", 31: FLOAT, 32: FLOAT, 34: INT, 36: INT,
+    38: FLOAT, 39: "0123456789ABCDE", 40: "123456789ABCDEGHIJKP", 43: BOOLEAN, 44: FLOAT, 45: INT, 52: UTCTIMESTAMP,
+    54: "123456789ABCDEFG", 59: "01234567", 60: UTCTIMESTAMP, 75: LOCALMKTDATE, 97: BOOLEAN, 98: "0123456",
+    99: FLOAT, 108: INT, 110: FLOAT, 122: UTCTIMESTAMP, 123: BOOLEAN, 141: BOOLEAN, 146: INT, 150: "0123456789ABCDEFGHI",
+    151: FLOAT, 264: INT, 265: "01", 267: INT, 268: INT, 270: FLOAT, 271: FLOAT, 279: "012345", 290: INT, 371: INT,
+    373: INT, 380: INT, 383: INT, 432: LOCALMKTDATE, 434: "12", 452: INT, 453: INT, 460: INT, 487: INT, 552: INT,
+    569: "01234", 570: BOOLEAN, 581: INT, 582: INT, 585: "12345678", 748: INT, 749: INT, 750: "012", 912: BOOLEAN, 924: "1234",
+}
+
+_ORDER_GROUPS = {453: (448, (448, 447, 452))} # NoPartyIDs
+_ORDER_RULES = ((40, b"4", 99),) # StopPx for stop limit orders
+_MIN_QTY_RULE = ((110, 59, (b"3",)),) # MinQty only with ImmediateOrCancel
+FIX44_MESSAGES = {
+    b"0": MessageSpec(optional=(112,)),
+    b"1": MessageSpec(required=(112,)),
+    b"2": MessageSpec(required=(7, 16)),
+    b"3": MessageSpec(required=(45,), optional=(371, 372, 373, 58, 354, 355)),
+    b"4": MessageSpec(required=(36,), optional=(123,)),
+    b"5": MessageSpec(optional=(58, 354, 355)),
+    b"A": MessageSpec(required=(98, 108), optional=(95, 96, 141, 383, 464, 553, 554, 925, 1137)),
+    b"j": MessageSpec(required=(372, 380), optional=(45, 379, 58)),
+    b"D": MessageSpec(required=(11, 54, 55, 60, 38, 40), optional=(1, 15, 18, 21, 44, 58, 59, 99, 110, 126, 432, 453, 460, 581, 582),
+                      groups=_ORDER_GROUPS, requiredWhen=_ORDER_RULES + ((59, b"6", 432),), onlyWhen=_MIN_QTY_RULE),
+    b"G": MessageSpec(required=(41, 11, 54, 55, 60, 40), optional=(1, 15, 18, 21, 37, 38, 44, 58, 59, 99, 110, 126, 432, 453, 460, 581, 582),
+                      groups=_ORDER_GROUPS, requiredWhen=_ORDER_RULES, onlyWhen=_MIN_QTY_RULE),
+    b"F": MessageSpec(required=(41, 11, 54, 55, 60), optional=(1, 37, 38, 40, 58)),
+    b"AF": MessageSpec(required=(584, 585), optional=(1, 54, 55, 60)),
+    b"8": MessageSpec(required=(37, 17, 150, 39, 54, 151, 14, 6),
+                      optional=(1, 11, 15, 18, 21, 31, 32, 38, 40, 41, 44, 55, 58, 59, 60, 75, 99, 103, 110, 126, 198, 432, 453, 460, 526, 527, 584, 851, 880, 912),
+                      groups=_ORDER_GROUPS),
+    b"9": MessageSpec(required=(37, 11, 41, 39, 434), optional=(1, 58, 60, 66, 102)),
+    b"V": MessageSpec(required=(262, 263, 264, 267, 146), optional=(265, 266), groups={267: (269, (269,)), 146: (55, (55, 48, 22))}),
+    b"W": MessageSpec(required=(268,), optional=(262, 55, 48, 22),
+                      groups={268: (269, (269, 270, 271, 272, 273, 276, 277, 290, 346, 1023))}),
+    b"X": MessageSpec(required=(268,), optional=(262,),
+                      groups={268: (279, (279, 269, 278, 280, 55, 48, 22, 270, 271, 272, 273, 290, 346, 1023))}),
+    b"Y": MessageSpec(required=(262,), optional=(281, 58)),
+    b"AD": MessageSpec(required=(568, 569), optional=(1, 55, 60, 75, 263)),
+    b"AQ": MessageSpec(required=(568, 569, 749, 750), optional=(55, 58, 263, 748)),
+    b"AE": MessageSpec(required=(571, 31, 32, 55, 75, 60, 552), optional=(15, 17, 64, 150, 487, 568, 570, 828, 856, 912),
+                       groups={552: (54, (54, 37, 11, 1, 581, 582))}),
+    b"AR": MessageSpec(required=(571,), optional=(17, 55, 58, 150, 487, 568, 856, 939)),
+    b"BE": MessageSpec(required=(924, 553), optional=(923, 554, 925)),
+    b"BF": MessageSpec(required=(553,), optional=(923, 926, 927)),
+}
+
+_UNDEFINED = object()
+_compiled = {}
+
+
+class FIXValidationError(ValueError):
+    def __init__(self, reason, refTagID=None, refMsgType=None, text=None):
+        """ reason is the SessionRejectReason (373), refTagID the offending tag."""
+        self.reason = reason
+        self.refTagID = refTagID
+        self.refMsgType = refMsgType
+        self.text = text
+        ValueError.__init__(self, f"{text} (MsgType {_text(refMsgType)}, tag {_text(refTagID)}, reason {reason})")
+
+
+class _CompiledMessage:
+    __slots__ = ("msgType", "fields", "required", "outboundRequired", "groups", "requiredWhen", "onlyWhen")
+
+
+class _CompiledTemplate:
+    __slots__ = ("dynamicChecks", "rules")
+
+
+class FIXDataDictionary:
+    def __init__(self, messages=None, fields=None, allowUserDefined=True):
+        """ messages (MsgType -> MessageSpec) and fields (tag -> format matcher or string of valid single character
+        values or iterable of valid values) extend and override FIX44."""
+        self._allowUserDefined = allowUserDefined
+        checks = {}
+        for tag, check in dict(FIX44_FIELDS, **{str(tag): check for tag, check in (fields or {}).items()}).items():
+            checks[_fixValue(tag)] = frozenset(_fixValue(value) for value in check) if not callable(check) else check
+        self._messages = {}
+        for msgType, spec in dict(FIX44_MESSAGES, **{_fixValue(msgType): spec for msgType, spec in (messages or {}).items()}).items():
+            self._messages[_fixValue(msgType)] = self._compile(_fixValue(msgType), spec, checks)
+        self._checks = checks
+        self._templates = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def default():
+        """ Shared compiled FIX44 dictionary."""
+        if "FIX44" not in _compiled:
+            _compiled["FIX44"] = FIXDataDictionary()
+        return _compiled["FIX44"]
+
+    @staticmethod
+    def _compile(msgType, spec, checks):
+        compiled = _CompiledMessage()
+        compiled.msgType = msgType
+        tags = [_fixValue(tag) for part in (HEADER, spec, TRAILER) for tag in part.required + part.optional]
+        compiled.groups = {}
+        for countTag, (delimiter, members) in spec.groups.items():
+            members = frozenset(_fixValue(tag) for tag in members)
+            compiled.groups[_fixValue(countTag)] = (_fixValue(delimiter), members)
+            tags += members
+        compiled.fields = {tag: checks.get(tag) for tag in tags}
+        compiled.required = frozenset(_fixValue(tag) for part in (HEADER, spec, TRAILER) for tag in part.required)
+        compiled.outboundRequired = compiled.required - ENCODED_TAGS
+        compiled.requiredWhen = tuple((_fixValue(tag), _fixValue(value), _fixValue(required)) for tag, value, required in spec.requiredWhen)
+        compiled.onlyWhen = tuple((_fixValue(tag), _fixValue(condition), frozenset(_fixValue(value) for value in values)) for tag, condition, values in spec.onlyWhen)
+        return compiled
+
+    def validate(self, message):
+        """ First problem of an inbound message (FIXMessageView or simplefix.FixMessage) as a FIXValidationError,
+        None if it is valid. Header order (8, 9, 35 first) and the trailer (10 last) are checked too."""
+        pairs = message.pairs
+        if len(pairs) < 4 or pairs[0][0] != b"8" or pairs[1][0] != b"9" or pairs[2][0] != b"35" or pairs[-1][0] != b"10":
+            return FIXValidationError(REASON_TAG_OUT_OF_ORDER, next((tag for tag, required in zip((pair[0] for pair in pairs), (b"8", b"9", b"35")) if tag != required), b"10"),
+                                      message.get(35), "BeginString, BodyLength and MsgType must be first and CheckSum last")
+        compiled = self._messages.get(pairs[2][1])
+        if compiled is None:
+            return FIXValidationError(REASON_INVALID_MSGTYPE, b"35", pairs[2][1], "Invalid MsgType")
+        return self._validatePairs(compiled, pairs, compiled.required)
+
+    def check(self, message):
+        """ Raise FIXValidationError if an outbound message (simplefix.FixMessage or TemplateMessage) is invalid.
+        Fields added by the engine on encode (BodyLength, MsgSeqNum, CheckSum) are not required."""
+        if isinstance(message, TemplateMessage):
+            error = self._checkTemplate(message)
+        else:
+            msgType = message.get(35)
+            compiled = self._messages.get(msgType)
+            if compiled is None:
+                error = FIXValidationError(REASON_INVALID_MSGTYPE, b"35", msgType, "Invalid MsgType")
+            else:
+                error = self._validatePairs(compiled, message.pairs, compiled.outboundRequired)
+        if error is not None:
+            raise error
+
+    def _validatePairs(self, compiled, pairs, required):
+        """ Single pass over the fields. Group member tags may repeat while their group lasts."""
+        fields = compiled.fields
+        groups = compiled.groups
+        msgType = compiled.msgType
+        seen = {}
+        members = None
+        for tag, value in pairs:
+            check = fields.get(tag, _UNDEFINED)
+            if check is _UNDEFINED: # Not listed for the message type. Let through, even inside a group
+                error = self._checkUnlisted(tag, value, msgType)
+                if error is not None:
+                    return error
+                continue
+            if not value:
+                return FIXValidationError(REASON_TAG_WITHOUT_VALUE, tag, msgType, "Tag specified without a value")
+            if members is not None:
+                if tag in members:
+                    if tag == delimiter:
+                        entries += 1
+                    elif entries == 0:
+                        return FIXValidationError(REASON_GROUP_OUT_OF_ORDER, tag, msgType, f"Group entry must start with {delimiter.decode()}")
+                elif entries != expected:
+                    return FIXValidationError(REASON_INCORRECT_GROUP_COUNT, countTag, msgType, f"{entries} entries in the group, {expected} expected")
+                else:
+                    members = None
+            if members is None:
+                if tag in seen:
+                    return FIXValidationError(REASON_TAG_MORE_THAN_ONCE, tag, msgType, "Tag appears more than once")
+                seen[tag] = value
+                group = groups.get(tag)
+                if group is not None:
+                    if not value.isdigit():
+                        return FIXValidationError(REASON_INCORRECT_FORMAT, tag, msgType, "Incorrect data format for value")
+                    expected = int(value)
+                    if expected:
+                        countTag = tag
+                        delimiter, members = group
+                        entries = 0
+                    continue
+            if check is not None:
+                if check.__class__ is frozenset:
+                    if value not in check:
+                        return FIXValidationError(REASON_VALUE_OUT_OF_RANGE, tag, msgType, "Value is incorrect (out of range) for this tag")
+                elif check(value) is None:
+                    return FIXValidationError(REASON_INCORRECT_FORMAT, tag, msgType, "Incorrect data format for value")
+        if members is not None and entries != expected:
+            return FIXValidationError(REASON_INCORRECT_GROUP_COUNT, countTag, msgType, f"{entries} entries in the group, {expected} expected")
+        if not seen.keys() >= required:
+            return FIXValidationError(REASON_REQUIRED_TAG_MISSING, min(required.difference(seen), key=int), msgType, "Required tag missing")
+        return self._checkRules(compiled, seen.get)
+
+    def _checkUnlisted(self, tag, value, msgType):
+        """ Only the tag number and the format of known fields are checked for a tag the message type does not list."""
+        error = self._checkTagNumber(tag, msgType)
+        if error is not None:
+            return error
+        if not value:
+            return FIXValidationError(REASON_TAG_WITHOUT_VALUE, tag, msgType, "Tag specified without a value")
+        check = self._checks.get(tag)
+        if check is not None:
+            if check.__class__ is frozenset:
+                if value not in check:
+                    return FIXValidationError(REASON_VALUE_OUT_OF_RANGE, tag, msgType, "Value is incorrect (out of range) for this tag")
+            elif check(value) is None:
+                return FIXValidationError(REASON_INCORRECT_FORMAT, tag, msgType, "Incorrect data format for value")
+        return None
+
+    def _checkTagNumber(self, tag, msgType):
+        if not tag.isdigit() or tag[:1] == b"0" or (not self._allowUserDefined and int(tag) >= USER_DEFINED_TAGS):
+            return FIXValidationError(REASON_INVALID_TAG, tag, msgType, "Invalid tag number")
+        return None
+
+    @staticmethod
+    def _checkRules(compiled, get):
+        for tag, value, requiredTag in compiled.requiredWhen:
+            if get(tag) == value and get(requiredTag) is None:
+                return FIXValidationError(REASON_REQUIRED_TAG_MISSING, requiredTag, compiled.msgType, f"Required tag missing when {tag.decode()}={value.decode()}")
+        for tag, condition, values in compiled.onlyWhen:
+            if get(tag) is not None and get(condition) not in values:
+                return FIXValidationError(REASON_TAG_NOT_DEFINED, tag, compiled.msgType, f"Only allowed when {condition.decode()} is {b'/'.join(sorted(values)).decode()}")
+        return None
+
+    def _checkTemplate(self, message):
+        template = message.template
+        compiledTemplate = self._templates.get(template)
+        if compiledTemplate is None:
+            compiledTemplate = self._templates[template] = self._compileTemplate(template)
+        if isinstance(compiledTemplate, FIXValidationError):
+            return compiledTemplate
+        values = message.values
+        for index, tag, check, msgType in compiledTemplate.dynamicChecks:
+            value = _fixValue(values[index])
+            if not value:
+                return FIXValidationError(REASON_TAG_WITHOUT_VALUE, tag, msgType, "Tag specified without a value")
+            if check is not None:
+                if check.__class__ is frozenset:
+                    if value not in check:
+                        return FIXValidationError(REASON_VALUE_OUT_OF_RANGE, tag, msgType, "Value is incorrect (out of range) for this tag")
+                elif check(value) is None:
+                    return FIXValidationError(REASON_INCORRECT_FORMAT, tag, msgType, "Incorrect data format for value")
+        if compiledTemplate.rules is not None:
+            return self._checkRules(compiledTemplate.rules, lambda tag: template.get(values, tag))
+        return None
+
+    def _compileTemplate(self, template):
+        """ Check the static fields of a template once. Returns the checks left for the dynamic values or the error."""
+        msgType = template.get((), 35)
+        compiled = self._messages.get(msgType)
+        if compiled is None:
+            return FIXValidationError(REASON_INVALID_MSGTYPE, b"35", msgType, "Invalid MsgType")
+        pairs = []
+        dynamicChecks = []
+        for tag, value in template.fields:
+            if value is DYNAMIC:
+                if tag not in compiled.fields:
+                    error = self._checkTagNumber(tag, msgType)
+                    if error is not None:
+                        return error
+                dynamicChecks.append((len(dynamicChecks), tag, compiled.fields.get(tag, self._checks.get(tag)), msgType))
+            elif value is SENDING_TIME or value is TRANSACT_TIME:
+                pairs.append((tag, b"20000101-00:00:00"))
+            elif value is not SEQNO:
+                pairs.append((tag, value))
+        dynamicTags = frozenset(tag for _, tag, _, _ in dynamicChecks)
+        # Dynamic values are left out of the single pass and checked on each message
+        error = self._validatePairs(compiled, pairs, compiled.outboundRequired - dynamicTags)
+        if error is not None:
+            return error
+        compiledTemplate = _CompiledTemplate()
+        compiledTemplate.dynamicChecks = tuple(dynamicChecks)
+        involved = {tag for rule in compiled.requiredWhen + compiled.onlyWhen for tag in rule[:2]} | {rule[2] for rule in compiled.requiredWhen}
+        compiledTemplate.rules = compiled if involved & dynamicTags else None
+        return compiledTemplate
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Drop copy pipeline for TradeCaptureReports (35=AE).
+
+DropCopyPipeline decodes every report into typed columns, appends it to a
+TradeCaptureStore and acknowledges it. Acks are collected and sent together
+through sendMany (a single write, or the CoalesceWrites queue) once AckBatchSize
+reports are pending or AckInterval seconds after the first one, after the
+store has been flushed so nothing is acked before it is on disk.
+
+TradeCaptureStore is a chunked columnar store: each chunk is a directory with
+one NumPy .npy file per column, preallocated for ChunkRows rows and mapped
+in memory, plus the number of rows stored. Rows are buffered and written a
+column slice at a time on each flush. Scans map the chunks
+read-only, so analytics read the columns without parsing or copying them, and
+the arrays can be handed to pandas or pyarrow as they are. Reports already in
+the store (e.g. PreviouslyReported resends) are detected by TradeReportID and
+acknowledged again without being stored twice. NumPy is only needed when the
+store is used.
+"""
+import asyncio
+import calendar
+import logging
+import os
+import simplefix
+from connectionHandler import SocketConnectionState
+
+TAG_TRADEREPORTID = 571
+COLUMNS = (
+    ("tradeReportID", "S64"),
+    ("execID", "S64"),
+    ("orderID", "S64"),
+    ("symbol", "S32"),
+    ("side", "S1"),
+    ("quantity", "f8"),
+    ("price", "f8"),
+    ("transactTime", "i8"), # Nanoseconds since the epoch, UTC
+)
+ROWS_FILE = "rows.npy"
+REPORT_TAGS = (TAG_TRADEREPORTID, simplefix.TAG_EXECID, simplefix.TAG_ORDERID, simplefix.TAG_SYMBOL, simplefix.TAG_SIDE, simplefix.TAG_LASTQTY, simplefix.TAG_LASTPX, simplefix.TAG_TRANSACTTIME)
+NAN = float("nan")
+_DAYS = {} # YYYYMMDD -> epoch seconds at midnight UTC
+
+logger = logging.getLogger(__name__)
+
+
+def parseUTCTimestamp(value):
+    """ FIX UTCTimestamp (YYYYMMDD-HH:MM:SS[.fraction]) to nanoseconds since the epoch."""
+    if not value:
+        return 0
+    day = _DAYS.get(value[:8])
+    if day is None:
+        day = _DAYS[bytes(value[:8])] = calendar.timegm((int(value[0:4]), int(value[4:6]), int(value[6:8]), 0, 0, 0))
+    seconds = day + int(value[9:11]) * 3600 + int(value[12:14]) * 60 + int(value[15:17])
+    fraction = value[18:27]
+    return seconds * 1000000000 + (int(fraction.ljust(9, b"0")) if fraction else 0)
+
+
+def decodeTradeCaptureReport(message):
+    """ Row of a TradeCaptureReport in COLUMNS order. Side and OrderID come from the first NoSides entry."""
+    if hasattr(message, "getFields"): # FIXMessageView, one pass over the message
+        tradeReportID, execID, orderID, symbol, side, quantity, price, transactTime = message.getFields(*REPORT_TAGS)
+    else:
+        tradeReportID, execID, orderID, symbol, side, quantity, price, transactTime = (message.get(tag) for tag in REPORT_TAGS)
+    return (tradeReportID or b"", execID or b"", orderID or b"", symbol or b"", side or b"",
+            float(quantity) if quantity is not None else NAN, float(price) if price is not None else NAN,
+            parseUTCTimestamp(transactTime))
+
+
+class _Chunk:
+    def __init__(self, np, path, chunkRows, create):
+        mode = "w+" if create else "r+"
+        if create:
+            os.makedirs(path)
+        self.columns = {name: np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode=mode, dtype=dtype, shape=(chunkRows,) if create else None) for name, dtype in COLUMNS}
+        self.rows = np.lib.format.open_memmap(os.path.join(path, ROWS_FILE), mode=mode, dtype="i8", shape=(1,) if create else None)
+        self.capacity = len(self.columns["tradeReportID"])
+        self.count = int(self.rows[0])
+
+    def __len__(self):
+        return self.count
+
+    def flush(self):
+        for column in self.columns.values():
+            column.flush()
+
+
+class TradeCaptureStore:
+    def __init__(self, directory, chunkRows=65536):
+        import numpy as np
+        self._np = np
+        self._directory = directory
+        self._chunkRows = chunkRows
+        self._widths = {name: np.dtype(dtype).itemsize for name, dtype in COLUMNS if dtype.startswith("S")}
+        os.makedirs(directory, exist_ok=True)
+        self._chunks = [_Chunk(np, os.path.join(directory, name), chunkRows, create=False) for name in sorted(os.listdir(directory)) if name.startswith("chunk-")]
+        self._pending = []
+        self._closed = False
+        self._tradeReportIDs = set()
+        for chunk in self._chunks:
+            self._tradeReportIDs.update(chunk.columns["tradeReportID"][:len(chunk)].tolist())
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self._chunks) + len(self._pending)
+
+    def __contains__(self, tradeReportID):
+        tradeReportID = tradeReportID.encode() if isinstance(tradeReportID, str) else tradeReportID
+        return tradeReportID[:self._widths["tradeReportID"]] in self._tradeReportIDs
+
+    def append(self, row):
+        """ Append a row in COLUMNS order. Returns False, storing nothing, if its TradeReportID is already stored.
+        Rows are buffered and written to the chunks column by column on flush. Raises ValueError once closed."""
+        if self._closed:
+            raise ValueError(f"TradeCaptureStore {self._directory} is closed")
+        tradeReportID = row[0][:self._widths["tradeReportID"]]
+        if tradeReportID in self._tradeReportIDs:
+            return False
+        self._tradeReportIDs.add(tradeReportID)
+        self._pending.append(row)
+        return True
+
+    def flush(self, sync=True):
+        """ Write the buffered rows to the chunks. With sync the chunks written are flushed to disk (msync)."""
+        pending = self._pending
+        start = 0
+        while start < len(pending):
+            chunk = self._chunks[-1] if self._chunks else None
+            if chunk is None or len(chunk) >= chunk.capacity:
+                chunk = _Chunk(self._np, os.path.join(self._directory, f"chunk-{len(self._chunks):06d}"), self._chunkRows, create=True)
+                self._chunks.append(chunk)
+            position = len(chunk)
+            rows = pending[start:start + chunk.capacity - position]
+            for (name, _), values in zip(COLUMNS, zip(*rows)):
+                chunk.columns[name][position:position + len(rows)] = values
+            if sync:
+                chunk.flush()
+            chunk.rows[0] = chunk.count = position + len(rows) # Row count last: a crash mid write leaves the rows unused
+            if sync:
+                chunk.rows.flush()
+            start += len(rows)
+        self._pending = []
+
+    def chunks(self, columns=None):
+        """ Yield {column: array} per chunk, read-only memory maps cut to the rows stored."""
+        self.flush()
+        np = self._np
+        names = [name for name, _ in COLUMNS] if columns is None else columns
+        for chunk in self._chunks:
+            rows = len(chunk)
+            if rows:
+                yield {name: np.load(chunk.columns[name].filename, mmap_mode="r")[:rows] for name in names}
+
+    def column(self, name):
+        """ Every value of a column in one array."""
+        arrays = [chunk[name] for chunk in self.chunks([name])]
+        return self._np.concatenate(arrays) if arrays else self._np.empty(0, dtype=dict(COLUMNS)[name])
+
+    def close(self):
+        """ Write the buffered rows and release the chunks. Nothing can be appended afterwards."""
+        if not self._closed:
+            self.flush()
+            self._closed = True
+            self._chunks = []
+
+
+class DropCopyPipeline:
+    def __init__(self, store, clientMessage, ackBatchSize=64, ackInterval=0.05, durable=True):
+        """ The store is flushed before each batch of acks, to disk (msync) when durable."""
+        self._store = store
+        self._ackTemplate = clientMessage.tradeCaptureReportAckTemplate()
+        self._ackBatchSize = ackBatchSize
+        self._ackInterval = ackInterval
+        self._durable = durable
+        self._engine = None
+        self._forward = None
+        self._pendingAcks = []
+        self._ackTask = None
+        self.received = 0
+        self.stored = 0
+        self.duplicates = 0
+        self.acked = 0
+
+    def attach(self, engine, forward=False):
+        """ Handle TradeCaptureReports. With forward the current AE handler (the listener by default) still gets them."""
+        self._engine = engine
+        self._forward = engine.getHandler(simplefix.MSGTYPE_TRADE_CAPTURE_REPORT) if forward else None
+        engine.registerHandler(simplefix.MSGTYPE_TRADE_CAPTURE_REPORT, self.onMessage)
+
+    def getStore(self):
+        return self._store
+
+    async def onMessage(self, message):
+        self.apply(message)
+        if self._forward is not None:
+            await self._forward(message)
+        if len(self._pendingAcks) >= self._ackBatchSize:
+            await self.flushAcks()
+        elif self._ackTask is None:
+            self._ackTask = asyncio.ensure_future(self._ackLater())
+
+    def apply(self, message):
+        """ Store a TradeCaptureReport and queue its ack. Returns False for a duplicate."""
+        self.received += 1
+        stored = self._store.append(decodeTradeCaptureReport(message))
+        if stored:
+            self.stored += 1
+        else:
+            self.duplicates += 1
+        tradeReportID = message.get(TAG_TRADEREPORTID)
+        if tradeReportID is not None:
+            self._pendingAcks.append(tradeReportID)
+        return stored
+
+    async def flushAcks(self):
+        """ Flush the store and send every pending ack in a single write. If the session is closed or the send raises
+        the acks stay pending and ConnectionError (or the send error) is raised."""
+        if not self._pendingAcks:
+            return
+        if self._engine.getConnectionState() not in (SocketConnectionState.CONNECTED, SocketConnectionState.LOGGED_IN):
+            raise ConnectionError(f"Session closed with {len(self._pendingAcks)} TradeCaptureReportAcks pending")
+        self._store.flush(sync=self._durable)
+        tradeReportIDs = self._pendingAcks
+        self._pendingAcks = [] # Reports arriving while the acks are written go to the next batch
+        try:
+            await self._engine.sendMany([self._ackTemplate.message(tradeReportID) for tradeReportID in tradeReportIDs])
+        except BaseException:
+            self._pendingAcks = tradeReportIDs + self._pendingAcks
+            raise
+        self.acked += len(tradeReportIDs)
+
+    async def _ackLater(self):
+        await asyncio.sleep(self._ackInterval)
+        self._ackTask = None # Reports arriving while the acks are written start a new timer
+        try:
+            await self.flushAcks()
+        except Exception:
+            logger.error(f"Could not send {len(self._pendingAcks)} TradeCaptureReportAcks", exc_info=True)
+
+    def getStats(self):
+        return {"received": self.received, "stored": self.stored, "duplicates": self.duplicates, "acked": self.acked, "pendingAcks": len(self._pendingAcks), "rows": len(self._store)}
+
+    def close(self):
+        """ Stop the ack timer and close the store. Unsent acks are left to the counterparty resend, deduplicated on restart."""
+        if self._ackTask is not None:
+            self._ackTask.cancel()
+            self._ackTask = None
+        self._store.close()
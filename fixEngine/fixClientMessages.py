@@ -26,6 +26,7 @@ SOFTWARE.
 
 import simplefix
 import time
+from messageTemplates import FIXMessageTemplate, DYNAMIC, TRANSACT_TIME
 
 class FixClientMessages():
     def __init__(self, senderCompID, targetComptID, password, fixVersion, heartbeatInterval):
@@ -39,7 +40,7 @@ class FixClientMessages():
     def createMessage(self, messageType: bytes) -> simplefix.FixMessage():
         """ Creates Basic Structure of FIX Message. """
         assert isinstance(messageType, bytes)
-        assert len(messageType) == 1
+        assert 1 <= len(messageType) <= 2
 
         msg = simplefix.FixMessage()
         msg.append_pair(simplefix.TAG_BEGINSTRING, self._fixVersion)
@@ -68,8 +69,33 @@ class FixClientMessages():
         msg.append_pair(simplefix.TAG_ENDSEQNO, endSeqNo)
         return msg
 
+    def sendReject(self, refSeqNum, refTagID=None, refMsgType=None, sessionRejectReason=None, text=None):
+        msg = self.createMessage(simplefix.MSGTYPE_REJECT)
+        msg.append_pair(simplefix.TAG_REFSEQNUM, refSeqNum)
+        if refTagID is not None:
+            msg.append_pair(371, refTagID) # RefTagID
+        if refMsgType is not None:
+            msg.append_pair(372, refMsgType) # RefMsgType
+        if sessionRejectReason is not None:
+            msg.append_pair(373, sessionRejectReason) # SessionRejectReason
+        if text is not None:
+            msg.append_pair(simplefix.TAG_TEXT, text)
+        return msg
+
+    def sendSequenceReset(self, newSeqNo, gapFill=True):
+        msg = self.createMessage(simplefix.MSGTYPE_SEQUENCE_RESET)
+        if gapFill:
+            msg.append_pair(simplefix.TAG_GAPFILLFLAG, simplefix.GAPFILLFLAG_YES)
+        msg.append_pair(simplefix.TAG_NEWSEQNO, newSeqNo)
+        return msg
+
     def sendHeartbeat(self):
-        return self.createMessage("0")
+        return self.createMessage(simplefix.MSGTYPE_HEARTBEAT)
+
+    def sendTestRequest(self, testReqID):
+        msg = self.createMessage(simplefix.MSGTYPE_TEST_REQUEST)
+        msg.append_pair(simplefix.TAG_TESTREQID, testReqID)
+        return msg
 
     def sendChangePasswordRequest(self, newPassword):
         msg = self.createMessage(simplefix.MSGTYPE_USER_REQUEST)
@@ -98,7 +124,10 @@ class FixClientMessages():
         return msg
 
     # Market Data messages (Market Data Gateway messages)
-    def marketDataRequest(self, symbols, requestType, bookDepth, aggregateBook, unsubscribeFrom=None, correlation=None):
+    def marketDataRequest(self, symbols, requestType, bookDepth, aggregateBook, unsubscribeFrom=None, correlation=None, mdReqID=None):
+        """ Subscription, snapshot or unsubscribe (requestType "2", correlation is the MDReqID of the subscription).
+        mdReqID defaults to a millisecond timestamp. Returns the message and {symbols_requestType: MDReqID}, only
+        the message when unsubscribing."""
         msg = self.createMessage(simplefix.MSGTYPE_MARKET_DATA_REQUEST)
         assert isinstance(symbols, list)
 
@@ -109,15 +138,15 @@ class FixClientMessages():
             msg.append_pair(262, correlation) # MDReqID
 
         else:
-            mdCorrelation = {f"{'_'.join(symbols)}_{str(requestType)}": str(int(round(time.time() * 1000)))}
-            msg.append_pair(262, mdCorrelation) # MDReqID
+            mdCorrelation = {f"{'_'.join(symbols)}_{str(requestType)}": mdReqID if mdReqID is not None else str(int(round(time.time() * 1000)))}
+            msg.append_pair(262, next(iter(mdCorrelation.values()))) # MDReqID
         msg.append_pair(263, requestType) # SubscriptionRequestType
         msg.append_pair(264, bookDepth) # MarketDepth
-        msg.setField(265, 1) # MDUpdateType
+        msg.append_pair(265, 1) # MDUpdateType
         if requestType != "T" and unsubscribeFrom != "T":
             msg.append_pair(266, aggregateBook) # AggregatedBook
 
-        if requestType == "1" or unsubscribeFrom == "1":
+        if requestType in ("0", "1") or unsubscribeFrom == "1":
             msg.append_pair(267, 2) # NoMDEntryTypes (Repeating Group)
             msg.append_pair(269, "0") # MDEntryType
             msg.append_pair(269, "1")
@@ -212,6 +241,59 @@ class FixClientMessages():
 
         return msg
 
+    # Precompiled templates for hot order messages. Only the fields passed to template.message() change per order
+    def newOrderSingleTemplate(self, partyID, partyRole, currency, orderType, product, tif, execInst=None, accountType=None, custOrderCapacity=None, precision=6):
+        """ Template for newOrderSingle. template.message(clOrdID, side, symbol, quantity, price)."""
+        assert orderType != simplefix.ORDTYPE_STOP_LIMIT and tif != simplefix.TIMEINFORCE_GOOD_TILL_DATE
+        return FIXMessageTemplate(self._fixVersion, simplefix.MSGTYPE_NEW_ORDER_SINGLE, self._senderCompID, self._targetCompID, [
+            (simplefix.TAG_CLORDID, DYNAMIC),
+            (453, 1), # NoPartyIDs (Repeating Group)
+            (448, partyID), # PartyID
+            (452, partyRole), # PartyRole
+            (581, accountType), # AccountType
+            (582, custOrderCapacity), # CustOrderCapacity
+            (simplefix.TAG_HANDLINST, simplefix.HANDLINST_AUTO_PRIVATE),
+            (simplefix.TAG_EXECINST, execInst),
+            (simplefix.TAG_CURRENCY, currency),
+            (simplefix.TAG_SIDE, DYNAMIC),
+            (simplefix.TAG_SYMBOL, DYNAMIC),
+            (460, product), # Product
+            (simplefix.TAG_TRANSACTTIME, TRANSACT_TIME),
+            (simplefix.TAG_ORDERQTY, DYNAMIC),
+            (simplefix.TAG_ORDTYPE, orderType),
+            (simplefix.TAG_PRICE, DYNAMIC),
+            (simplefix.TAG_TIMEINFORCE, tif),
+        ], precision=precision)
+
+    def orderCancelReplaceRequestTemplate(self, orderType, currency=None, product=None, tif=None, execInst=None, accountType=None, custOrderCapacity=None, precision=6):
+        """ Template for orderCancelReplaceRequest. template.message(orderID, origClOrdID, clOrdID, side, symbol, quantity, price)."""
+        assert orderType != simplefix.ORDTYPE_STOP_LIMIT and tif != simplefix.TIMEINFORCE_GOOD_TILL_DATE
+        return FIXMessageTemplate(self._fixVersion, simplefix.MSGTYPE_ORDER_CANCEL_REPLACE_REQUEST, self._senderCompID, self._targetCompID, [
+            (simplefix.TAG_ORDERID, DYNAMIC),
+            (simplefix.TAG_ORIGCLORDID, DYNAMIC),
+            (simplefix.TAG_CLORDID, DYNAMIC),
+            (581, accountType), # AccountType
+            (582, custOrderCapacity), # CustOrderCapacity
+            (simplefix.TAG_HANDLINST, simplefix.HANDLINST_AUTO_PRIVATE),
+            (simplefix.TAG_EXECINST, execInst),
+            (simplefix.TAG_CURRENCY, currency),
+            (simplefix.TAG_SIDE, DYNAMIC),
+            (simplefix.TAG_SYMBOL, DYNAMIC),
+            (460, product), # Product
+            (simplefix.TAG_TRANSACTTIME, TRANSACT_TIME),
+            (simplefix.TAG_ORDERQTY, DYNAMIC),
+            (simplefix.TAG_ORDTYPE, orderType),
+            (simplefix.TAG_PRICE, DYNAMIC),
+            (simplefix.TAG_TIMEINFORCE, tif),
+        ], precision=precision)
+
+    def tradeCaptureReportAckTemplate(self):
+        """ Template for sendTradeCaptureReportAck. template.message(tradeReportID)."""
+        return FIXMessageTemplate(self._fixVersion, simplefix.MSGTYPE_TRADE_CAPTURE_REPORT_ACK, self._senderCompID, self._targetCompID, [
+            (571, DYNAMIC), # TradeReportID
+            (simplefix.TAG_SYMBOL, "NA"),
+        ])
+
     def orderCancelRequest(self, cancelAll=False, clOrdID=None, orderID=None, origClOrdID=None, side=None, symbol=None, orderType=None):
         msg = self.createMessage(simplefix.MSGTYPE_ORDER_CANCEL_REQUEST)
         assert isinstance(cancelAll, bool)
@@ -219,7 +301,7 @@ class FixClientMessages():
             msg.append_pair(simplefix.TAG_ORDERID, "OPEN_ORDER")
             msg.append_pair(simplefix.TAG_ORIGCLORDID, "OPEN_ORDER")
             msg.append_pair(simplefix.TAG_CLORDID, "OPEN_ORDER")
-            msg.append_pair(simplefix.TAG_SYMBOL, "NA")
+            msg.append_pair(simplefix.TAG_SYMBOL, symbol if symbol is not None else "NA") # Symbol scopes the cancel all
             msg.append_pair(simplefix.TAG_SIDE, "1")
             msg.append_pair(7559, "Y")
         else:
@@ -31,74 +31,238 @@ import logging
 import time
 import sys
 import configparser
+import math
+import random
 from fixClientMessages import FixClientMessages
 from connectionHandler import FIXConnectionHandler, SocketConnectionState
+from orderCache import OrderCache, OrderHandle
+from fixedPoint import FIXInstruments
+from riskGate import FIXRiskGate
+from dropCopy import DropCopyPipeline, TradeCaptureStore
+from marketDataMultiplexer import FIXMarketDataMultiplexer
+
+ORDER_SIDES = frozenset([simplefix.SIDE_BUY, simplefix.SIDE_SELL])
+MAX_BACKOFF_EXPONENT = 16
+
+logger = logging.getLogger(__name__)
 
 
 class FixEngine(FIXConnectionHandler):
 
-    def __init__(self, config, reader, writer, messageListener):
+    def __init__(self, config, reader, writer, messageListener, riskGate=None, marketData=None):
+        """ riskGate and marketData are carried over from the previous connection of a client, otherwise built from
+        the Risk* and MarketDataMultiplexer options."""
         FIXConnectionHandler.__init__(self, config, reader, writer, messageListener)
         self._config = config
-        self._logout = False
+        self.logonTime = None
         self._engineLogger.info(f"Socket Connection Open to {config['SocketHost']}:{config['SocketPort']}")
         self.clientMessage = FixClientMessages(config['SenderCompID'], config['TargetCompID'], config['SenderPassword'], config['BeginString'], config.getint('HeartBeatInterval'))
+        self._registerSessionHandlers({
+            simplefix.MSGTYPE_LOGON: self._handleLogon,
+            simplefix.MSGTYPE_TEST_REQUEST: self._handleTestRequest,
+            simplefix.MSGTYPE_LOGOUT: self._handleLogout,
+            simplefix.MSGTYPE_HEARTBEAT: self._handleHeartbeat,
+            simplefix.MSGTYPE_RESEND_REQUEST: self._handleResendRequest,
+            simplefix.MSGTYPE_SEQUENCE_RESET: self._handleSequenceReset,
+        })
+        self.instruments = FIXInstruments.fromConfig(config)
+        if config.getboolean('OrderCache', fallback=False):
+            self.orderCache = OrderCache(self.clientMessage, config.getint('MaxTerminalOrders', fallback=10000), self.instruments, config.getfloat('MassStatusTimeout', fallback=60.0))
+            self.orderCache.attach(self)
+        self.dropCopy = None
+        if config.getboolean('DropCopy', fallback=False):
+            store = TradeCaptureStore(f"{config['FileLogPath']}/{config['SenderCompID']}-tradeCapture", config.getint('DropCopyChunkRows', fallback=65536))
+            self.dropCopy = DropCopyPipeline(store, self.clientMessage, config.getint('DropCopyAckBatchSize', fallback=64), config.getfloat('DropCopyAckInterval', fallback=0.05), config.getboolean('DropCopyDurable', fallback=True))
+            self.dropCopy.attach(self, forward=config.getboolean('DropCopyForward', fallback=False))
+        if marketData is None and config.getboolean('MarketDataMultiplexer', fallback=False):
+            marketData = FIXMarketDataMultiplexer(config.getboolean('MarketDataAggregateBook', fallback=True), config.getboolean('MarketDataSnapshots', fallback=True))
+        self.marketData = marketData
+        if self.marketData is not None:
+            self.marketData.attach(self)
+        self.riskGate = riskGate if riskGate is not None else FIXRiskGate.fromConfig(config, self.instruments)
+        if self.riskGate is not None:
+            self.riskGate.attach(self) # After the market data handlers so it sees every trade
         asyncio.ensure_future(self._handleEngine())
     
     def getConnectionState(self):
         return self._connectionState
 
-    async def _sessionMessageHandler(self, message: simplefix.FixMessage) -> bool:
-        """ Handle Session Message."""
-        assert isinstance(message, simplefix.FixMessage)
-        # NEED TO ADD HANDLING OF BUSINESS REJECTS
+    def killSwitch(self, reason="manual"):
+        """ Reject every new order in the risk gate and send a cancel all (7559=Y) request."""
+        if self.riskGate is None:
+            raise ValueError("killSwitch requires the risk gate")
+        self.riskGate.kill(reason)
 
-        msgType = message.get(simplefix.TAG_MSGTYPE)
-        if msgType == simplefix.MSGTYPE_LOGON: # Handle logon
-            if self._connectionState == SocketConnectionState.LOGGED_IN:
-                self._engineLogger.warning(f"{self._config['SenderCompID']} already looged in -> Ignoring Login Request.")
-            else:
-                self._connectionState = SocketConnectionState.LOGGED_IN
-                self._engineLogger.info(f"{self._config['SenderCompID']} session -> LOGON")
-                self._config['HeartBeatInterval'] = str(message.get(simplefix.TAG_HEARTBTINT).decode())
-                return True
-        elif self._connectionState == SocketConnectionState.LOGGED_IN:
-            if msgType == simplefix.MSGTYPE_TEST_REQUEST: # Send test heartbeat when requested
-                msg = self.clientMessage.sendHeartbeat()
-                msg.append_pair(simplefix.TAG_TESTREQID, message.get(simplefix.TAG_TESTREQID))
-                await self.sendMessage(msg)
-                return True
-            elif msgType == simplefix.MSGTYPE_LOGOUT: # Handle Logout
-                self._connectionState = SocketConnectionState.LOGGED_OUT
-                self._engineLogger.info(f"{self._config['SenderCompID']} session -> LOGOUT")
-                self.handleClose()
-                return True
-            elif msgType == simplefix.MSGTYPE_HEARTBEAT:
-                msg = self.clientMessage.sendHeartbeat()
-                msg.append_pair(simplefix.TAG_TESTREQID, message.get(simplefix.TAG_TESTREQID))
-                await self.sendMessage(msg)
-                return True
-            elif message.get(simplefix.TAG_RESETSEQNUMFLAG) == simplefix.RESETSEQNUMFLAG_YES: # If ResetSeqNum = Y Then Reset sequence
+    async def cancelOrder(self, clOrdID, newClOrdID=None):
+        """ Cancel an order by ClOrdID using the Order Cache. Returns the ClOrdID of the cancel request."""
+        msg = self.orderCache.cancelRequest(clOrdID, newClOrdID)
+        await self.sendMessage(msg)
+        return msg.get(simplefix.TAG_CLORDID).decode()
+
+    async def replaceOrder(self, clOrdID, price, quantity=None, newClOrdID=None, **kwargs):
+        """ Replace an order by ClOrdID using the Order Cache. Returns the ClOrdID of the replace request."""
+        msg = self.orderCache.replaceRequest(clOrdID, price, quantity, newClOrdID, **kwargs)
+        await self.sendMessage(msg)
+        return msg.get(simplefix.TAG_CLORDID).decode()
+
+    async def sendOrders(self, template, orders):
+        """ Send a NewOrderSingle built from a newOrderSingleTemplate per (clOrdID, side, symbol, quantity, price)
+        with consecutive sequence numbers and a single write. The whole batch is validated first: ValueError is raised
+        and nothing is sent if any order is invalid. clOrdID may be None when the Order Cache is enabled.
+        Returns an OrderHandle per order."""
+        messages = []
+        handles = []
+        clOrdIDs = set()
+        for index, order in enumerate(orders):
+            if len(order) != 5:
+                raise ValueError(f"Order {index}: expected (clOrdID, side, symbol, quantity, price)")
+            clOrdID, side, symbol, quantity, price = order
+            if clOrdID is None:
+                if self.orderCache is None:
+                    raise ValueError(f"Order {index}: ClOrdID is required without Order Cache")
+                clOrdID = self.orderCache.nextClOrdID()
+            handle = OrderHandle(clOrdID, symbol, side, self.orderCache)
+            error = _orderError(handle, quantity, price)
+            if error is None and (handle.clOrdID in clOrdIDs or (self.orderCache is not None and self.orderCache.getByClOrdID(handle.clOrdID) is not None)):
+                error = "duplicate ClOrdID"
+            if error is not None:
+                raise ValueError(f"Order {index} ({clOrdID}): {error}")
+            clOrdIDs.add(handle.clOrdID)
+            messages.append(template.message(clOrdID, side, symbol, quantity, price))
+            handles.append(handle)
+        await self.sendMany(messages)
+        return handles
+
+    async def replaceOrders(self, replaces, template=None):
+        """ Replace orders known by the Order Cache, (clOrdID, price) or (clOrdID, price, quantity) each, with
+        consecutive sequence numbers and a single write. Validated like sendOrders. Messages are built from template
+        (orderCancelReplaceRequestTemplate) when given. Returns an OrderHandle per order under its new ClOrdID."""
+        if self.orderCache is None:
+            raise ValueError("replaceOrders requires the Order Cache")
+        messages = []
+        handles = []
+        replaced = set()
+        for index, replace in enumerate(replaces):
+            clOrdID, price, quantity = (tuple(replace) + (None,))[:3]
+            order = self.orderCache.getByClOrdID(clOrdID)
+            try:
+                message = self.orderCache.replaceRequest(clOrdID, price, quantity, template=template)
+            except (KeyError, ValueError) as e:
+                raise ValueError(f"Replace {index} ({clOrdID}): {e.args[0]}") from e
+            handle = OrderHandle(message.get(simplefix.TAG_CLORDID), order.symbol, order.side, self.orderCache)
+            error = _orderError(handle, quantity if quantity is not None else order.orderQty, price)
+            if error is None and order.pendingClOrdID is not None:
+                error = "cancel or replace already pending"
+            if error is None and id(order) in replaced:
+                error = "order replaced twice in the batch"
+            if error is not None:
+                raise ValueError(f"Replace {index} ({clOrdID}): {error}")
+            replaced.add(id(order))
+            messages.append(message)
+            handles.append(handle)
+        await self.sendMany(messages)
+        return handles
+
+    async def cancelOrders(self, symbol=None, side=None):
+        """ Cancel every open order, or those of symbol and/or side. Without side a single cancel all request
+        (7559=Y) is sent, scoped to symbol when given. side needs the Order Cache: an OrderCancelRequest per
+        acknowledged open order is sent in a single write. Returns an OrderHandle per open order known to be cancelled."""
+        if side is None:
+            orders = self.orderCache.openOrders(symbol) if self.orderCache is not None else []
+            await self.sendMessage(self.clientMessage.orderCancelRequest(cancelAll=True, symbol=symbol))
+        else:
+            if self.orderCache is None:
+                raise ValueError("Cancelling by side requires the Order Cache")
+            side = OrderHandle(None, None, side).side
+            orders = [order for order in self.orderCache.openOrders(symbol) if order.side == side and order.orderID is not None and order.pendingClOrdID is None]
+            await self.sendMany([self.orderCache.cancelRequest(order.clOrdID) for order in orders])
+        return [OrderHandle(order.clOrdID, order.symbol, order.side, self.orderCache) for order in orders]
+
+    async def handleClose(self):
+        await FIXConnectionHandler.handleClose(self)
+        if self.dropCopy is not None:
+            self.dropCopy.close()
+
+    def _isLoggedIn(self, message):
+        if self._connectionState == SocketConnectionState.LOGGED_IN:
+            return True
+        self._engineLogger.warning(f"Cannot process message. {self._config['SenderCompID']} is not logged in.")
+        return False
+
+    async def _handleLogon(self, message: simplefix.FixMessage):
+        if self._connectionState == SocketConnectionState.LOGGED_IN:
+            if message.get(simplefix.TAG_RESETSEQNUMFLAG) == simplefix.RESETSEQNUMFLAG_YES: # If ResetSeqNum = Y Then Reset sequence
                 self._session.resetSeqNo()
                 self._engineLogger.info("Resetting Sequence Number to 1")
-                return True
             else:
-                return False
+                self._engineLogger.warning(f"{self._config['SenderCompID']} already looged in -> Ignoring Login Request.")
         else:
-            self._engineLogger.warning(f"Cannot process message. {self._config['SenderCompID']} is not logged in.")
-            return False
+            self._connectionState = SocketConnectionState.LOGGED_IN
+            self._logonCount = 0
+            self.logonTime = self._loop.time()
+            self._engineLogger.info(f"{self._config['SenderCompID']} session -> LOGON")
+            self._config['HeartBeatInterval'] = str(message.get(simplefix.TAG_HEARTBTINT).decode())
+            self.startHeartbeat()
+            if self.marketData is not None:
+                self.marketData.onLogon()
+
+    async def _handleTestRequest(self, message: simplefix.FixMessage):
+        if self._isLoggedIn(message): # Send test heartbeat when requested
+            msg = self.clientMessage.sendHeartbeat()
+            msg.append_pair(simplefix.TAG_TESTREQID, message.get(simplefix.TAG_TESTREQID))
+            await self.sendMessage(msg)
+
+    async def _handleLogout(self, message: simplefix.FixMessage):
+        self._logoutReceived.set()
+        if self._connectionState == SocketConnectionState.LOGGED_IN: # Logout initiated by counterparty. Confirm and close
+            self._engineLogger.info(f"{self._config['SenderCompID']} session -> LOGOUT")
+            self._logout = True
+            await self.logout()
+            await self.flush()
+            await self.handleClose()
+
+    async def _handleHeartbeat(self, message: simplefix.FixMessage):
+        pass # Liveness is tracked by the Heartbeat Scheduler
+
+    async def _handleResendRequest(self, message: simplefix.FixMessage):
+        if self._isLoggedIn(message): # Counterparty missed messages. Replay from the Message Store
+            await self.resendMessages(int(message.get(simplefix.TAG_BEGINSEQNO)), int(message.get(simplefix.TAG_ENDSEQNO)))
+
+    async def _handleSequenceReset(self, message: simplefix.FixMessage):
+        if self._isLoggedIn(message): # GapFill or Reset. Move expected sequence number forward
+            self._session.updateRecvSeqNo(int(message.get(simplefix.TAG_NEWSEQNO)) - 1)
+            self._engineLogger.info(f"Sequence Reset received. Next expected sequence number: {message.get(simplefix.TAG_NEWSEQNO).decode()}")
 
     async def _handleEngine(self):
         await self.logon()
 
-        while self._connectionState != SocketConnectionState.DISCONNECTED:
-            if self._connectionState != SocketConnectionState.LOGGED_OUT:
-                await self.readMessage()
-                await self.expectedHeartbeat(self._config.getint('HeartBeatInterval'))
-            else:
-                await self.logon()
+        try:
+            while self._connectionState != SocketConnectionState.DISCONNECTED:
+                if self._connectionState != SocketConnectionState.LOGGED_OUT or self._logout:
+                    await self.readMessage()
+                else:
+                    await self.logon()
+        except ConnectionError:
+            await self.handleClose()
+        except Exception:
+            self._engineLogger.error("Session task failed. Closing session", exc_info=True)
+            await self.handleClose() # Lets the client reconnect
 
             
+def _orderError(handle, quantity, price):
+    if handle.side not in ORDER_SIDES:
+        return f"invalid Side {handle.side}"
+    if not handle.symbol:
+        return "missing Symbol"
+    for name, value in (("OrderQty", quantity), ("Price", price)):
+        try:
+            if not math.isfinite(float(value)) or float(value) <= 0:
+                return f"{name} must be positive"
+        except (TypeError, ValueError):
+            return f"invalid {name} {value}"
+    return None
+
+
 class FIXClient:
     def __init__(self, configFile, gateway, listener):
         self._config = self.loadConfig(configFile, gateway)
@@ -106,15 +270,65 @@ class FIXClient:
         self._writer = None
         self._client = None
         self._messageListener = listener
+        self._reconnectAttempts = 0
+        self._countedClient = None
+        self._stopping = False
+        self._stopped = None
 
-    async def startClient(self, loop):
+    async def startClient(self, loop=None):
         """ Creates Socket Connection and Runs Main Loop."""
-        self._reader, self._writer = await asyncio.open_connection(self._config["SocketHost"], self._config["SocketPort"], loop=loop)
+        self._reader, self._writer = await asyncio.open_connection(self._config["SocketHost"], self._config["SocketPort"])
         self._connectionState = SocketConnectionState.CONNECTED
-        self._client = FixEngine(self._config, self._reader, self._writer, self._messageListener)
+        previous = self._client
+        self._client = FixEngine(self._config, self._reader, self._writer, self._messageListener,
+                                 previous.riskGate if previous is not None else None, previous.marketData if previous is not None else None)
+
+    def nextReconnectDelay(self):
+        """ Seconds to wait before the next connection attempt. ReconnectInterval after a session that logged on,
+        doubled after every attempt since that failed to connect or log on, up to ReconnectMaxInterval. Up to
+        ReconnectJitter of the delay is taken off at random so sessions dropped together do not reconnect together."""
+        if self._client is not None and self._client is not self._countedClient and self._client.logonTime is not None:
+            self._reconnectAttempts = 0
+        else:
+            self._reconnectAttempts += 1
+        self._countedClient = self._client
+        interval = self._config.getfloat('ReconnectInterval', fallback=5)
+        delay = min(interval * 2 ** min(max(self._reconnectAttempts - 1, 0), MAX_BACKOFF_EXPONENT), self._config.getfloat('ReconnectMaxInterval', fallback=60))
+        return delay * (1 - self._config.getfloat('ReconnectJitter', fallback=0.1) * random.random())
+
+    async def runClient(self):
+        """ Keep the session connected until stopClient: reconnect with backoff after the connection drops or cannot
+        be established. With SequenceStore the session resumes its sequence numbers instead of resetting them."""
+        self._stopping = False
+        self._stopped = asyncio.Event()
+        gateway = self._config.name
+        while not self._stopping:
+            try:
+                await self.startClient()
+                if self._stopping: # stopClient while connecting
+                    await self._client.disconnect()
+                await self._client.waitClosed()
+            except OSError as e:
+                logger.warning(f"{gateway} connection failed: {e}")
+            if self._stopping:
+                break
+            delay = self.nextReconnectDelay()
+            logger.info(f"{gateway} reconnecting in {delay:.1f} seconds")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stopClient(self, logoutTimeout=None):
+        """ Stop runClient, logging out of the current session."""
+        self._stopping = True
+        if self._stopped is not None:
+            self._stopped.set()
+        if self._client is not None and self._client.getConnectionState() != SocketConnectionState.DISCONNECTED:
+            await self._client.disconnect(logoutTimeout)
 
     def loadConfig(self, filePath, gateway):
-        parser = configparser.SafeConfigParser()
+        parser = configparser.ConfigParser()
         parser.read(filePath)
         if parser.has_section(gateway):
             return parser[gateway]
@@ -122,4 +336,7 @@ class FIXClient:
             raise Exception(f"{gateway} section not found in configuration file {filePath}")
 
     def getClient(self):
-        return self._client
\ No newline at end of file
+        return self._client
+
+    def getConfig(self):
+        return self._config
\ No newline at end of file
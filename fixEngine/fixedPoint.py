@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+Fixed-point prices and quantities.
+
+A value is an int number of units of 10^-decimals (for a price with 2 decimals
+10000.50 is 1000050), with the decimals configured per symbol. Ints compare,
+add and hash exactly, and fit in int64 arrays (array('q')) where books and
+columns of floats would need boxing or rounding care.
+
+FixedPointCodec converts between wire bytes and units. Market data repeats a
+small set of prices and sizes, so both directions go through a bounded dict
+of the values already seen, and the fractional digits of the common scales
+come from a precomputed table: a cache hit is a single dict lookup.
+FIXInstruments holds the price and size codec of every configured symbol,
+from instrument definitions such as "BTC-USD:2/4,ETH-USD:2/3" (price/size decimals).
+"""
+from decimal import Decimal
+
+MAX_TABLE_DECIMALS = 4
+
+
+class FixedPointCodec:
+    def __init__(self, decimals, cacheSize=65536):
+        """ decimals is the number of decimal places of a unit. cacheSize bounds each of the decode and encode caches."""
+        if decimals < 0:
+            raise ValueError(f"decimals must be non-negative, not {decimals}")
+        self.decimals = decimals
+        self.scale = 10 ** decimals
+        self._cacheSize = cacheSize
+        self._powers = tuple(10 ** exponent for exponent in range(decimals + 1))
+        # Fraction digits of every unit below 1 for the common scales
+        self._fractions = tuple(b"%0*d" % (decimals, fraction) for fraction in range(self.scale)) if 0 < decimals <= MAX_TABLE_DECIMALS else None
+        self._decoded = {}
+        self._encoded = {}
+
+    def decode(self, value):
+        """ Units of a wire value (bytes or str). Digits beyond the scale are rounded half away from zero."""
+        units = self._decoded.get(value)
+        if units is None:
+            units = self._parse(value if isinstance(value, bytes) else value.encode())
+            if len(self._decoded) >= self._cacheSize:
+                self._decoded.clear()
+            self._decoded[value] = units
+        return units
+
+    def _parse(self, value):
+        negative = value[:1] == b"-"
+        whole, _, fraction = (value[1:] if negative else value).partition(b".")
+        if not (whole + fraction).isdigit():
+            raise ValueError(f"Invalid decimal value {value!r}")
+        extra = len(fraction) - self.decimals
+        if extra <= 0:
+            units = int(whole + fraction) * self._powers[-extra]
+        else: # More digits than the scale
+            units, dropped = divmod(int(whole + fraction), 10 ** extra)
+            units += 1 if dropped * 2 >= 10 ** extra else 0
+        return -units if negative else units
+
+    def encode(self, units):
+        """ Wire bytes of units, with exactly decimals fraction digits."""
+        encoded = self._encoded.get(units)
+        if encoded is None:
+            whole, fraction = divmod(-units if units < 0 else units, self.scale)
+            if self._fractions is not None:
+                encoded = b"%d.%s" % (whole, self._fractions[fraction])
+            elif self.decimals:
+                encoded = b"%d.%0*d" % (whole, self.decimals, fraction)
+            else:
+                encoded = b"%d" % whole
+            if units < 0:
+                encoded = b"-" + encoded
+            if len(self._encoded) >= self._cacheSize:
+                self._encoded.clear()
+            self._encoded[units] = encoded
+        return encoded
+
+    def fromFloat(self, value):
+        return round(value * self.scale)
+
+    def toFloat(self, units):
+        return units / self.scale
+
+    def fromDecimal(self, value):
+        return int(value.scaleb(self.decimals).to_integral_value())
+
+    def toDecimal(self, units):
+        return Decimal(units).scaleb(-self.decimals)
+
+
+def parseInstruments(value):
+    """ Parse instrument definitions "BTC-USD:2/4,ETH-USD:2" (Symbol:priceDecimals/sizeDecimals, sizeDecimals optional)
+    into {symbol: (priceDecimals, sizeDecimals)}."""
+    instruments = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        symbol, _, decimals = item.rpartition(":")
+        priceDecimals, _, sizeDecimals = decimals.partition("/")
+        instruments[symbol.strip().encode()] = (int(priceDecimals), int(sizeDecimals) if sizeDecimals else None)
+    return instruments
+
+
+class FIXInstruments:
+    def __init__(self, instruments=None, priceDecimals=None, sizeDecimals=0, cacheSize=65536):
+        """ instruments is {symbol: (priceDecimals, sizeDecimals)}, sizeDecimals None for the default.
+        Symbols not listed use the default priceDecimals (KeyError when None) and sizeDecimals.
+        Symbols with the same decimals share codecs and their caches."""
+        self._codecs = {}
+        self._cacheSize = cacheSize
+        self._instruments = {}
+        for symbol, (symbolPriceDecimals, symbolSizeDecimals) in (instruments or {}).items():
+            symbol = symbol.encode() if isinstance(symbol, str) else symbol
+            self._instruments[symbol] = (self._codec(symbolPriceDecimals), self._codec(sizeDecimals if symbolSizeDecimals is None else symbolSizeDecimals))
+        self._default = (self._codec(priceDecimals), self._codec(sizeDecimals)) if priceDecimals is not None else None
+
+    @staticmethod
+    def fromConfig(config):
+        """ FIXInstruments from the Instruments, DefaultPriceDecimals and DefaultSizeDecimals options, None without Instruments."""
+        if not config.get('Instruments'):
+            return None
+        defaultPriceDecimals = config.get('DefaultPriceDecimals')
+        return FIXInstruments(parseInstruments(config.get('Instruments')), int(defaultPriceDecimals) if defaultPriceDecimals else None, config.getint('DefaultSizeDecimals', fallback=0))
+
+    def _codec(self, decimals):
+        codec = self._codecs.get(decimals)
+        if codec is None:
+            codec = self._codecs[decimals] = FixedPointCodec(decimals, self._cacheSize)
+        return codec
+
+    def codecs(self, symbol):
+        """ (priceCodec, sizeCodec) of a symbol (bytes or str). KeyError when the symbol has no definition."""
+        codecs = self.find(symbol)
+        if codecs is None:
+            raise KeyError(f"No instrument definition for symbol {symbol!r}")
+        return codecs
+
+    def find(self, symbol):
+        """ (priceCodec, sizeCodec) of a symbol (bytes or str), None for a symbol without definition or None."""
+        codecs = self._instruments.get(symbol)
+        if codecs is None:
+            if isinstance(symbol, str):
+                return self.find(symbol.encode())
+            if symbol is not None:
+                codecs = self._default
+        return codecs
+
+    def symbols(self):
+        return list(self._instruments)
+
+    def decodePrice(self, symbol, value):
+        return self.codecs(symbol)[0].decode(value)
+
+    def decodeSize(self, symbol, value):
+        return self.codecs(symbol)[1].decode(value)
+
+    def encodePrice(self, symbol, units):
+        """ Wire bytes of a price in units, to pass to newOrderSingle, templates and the bulk order requests."""
+        return self.codecs(symbol)[0].encode(units)
+
+    def encodeSize(self, symbol, units):
+        return self.codecs(symbol)[1].encode(units)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Timer driven session liveness.
+
+The connection only records the loop time of the last message sent and received.
+A single task wakes up at the next deadline and decides whether to send a
+Heartbeat (we have been idle for HeartBtInt), a TestRequest (counterparty has been
+silent for HeartBtInt plus a grace period) or to declare the session dead. A
+Heartbeat or TestRequest that cannot be sent also ends the session: a session
+that cannot prove it is alive must not look alive.
+"""
+import asyncio
+import logging
+
+SEND_HEARTBEAT = "sendHeartbeat"
+SEND_TEST_REQUEST = "sendTestRequest"
+SESSION_DEAD = "sessionDead"
+
+logger = logging.getLogger(__name__)
+
+
+class FIXHeartbeatScheduler:
+    def __init__(self, heartbeatInterval, maxMissedHeartbeats=2, graceRatio=0.2, clock=None):
+        self._clock = clock if clock is not None else asyncio.get_event_loop().time
+        self._heartbeatInterval = heartbeatInterval
+        self._silenceThreshold = heartbeatInterval * (1 + graceRatio)
+        self._deadThreshold = self._silenceThreshold * max(2, maxMissedHeartbeats)
+        self._testRequestSent = None
+        self._testRequestCount = 0
+        self._task = None
+        now = self._clock()
+        self.lastSent = now
+        self.lastReceived = now
+
+    def setHeartbeatInterval(self, heartbeatInterval, maxMissedHeartbeats=2, graceRatio=0.2):
+        self._heartbeatInterval = heartbeatInterval
+        self._silenceThreshold = heartbeatInterval * (1 + graceRatio)
+        self._deadThreshold = self._silenceThreshold * max(2, maxMissedHeartbeats)
+
+    def poll(self, now):
+        """ Return (actions due at time now, time of the next deadline)."""
+        actions = []
+        if self._testRequestSent is not None and self.lastReceived >= self._testRequestSent:
+            self._testRequestSent = None # Counterparty answered
+        silence = now - self.lastReceived
+        if silence >= self._deadThreshold:
+            return [SESSION_DEAD], None
+        if silence >= self._silenceThreshold and self._testRequestSent is None:
+            self._testRequestSent = now
+            self._testRequestCount += 1
+            actions.append(SEND_TEST_REQUEST)
+        elif now - self.lastSent >= self._heartbeatInterval:
+            actions.append(SEND_HEARTBEAT)
+        if actions:
+            self.lastSent = now
+        if self._testRequestSent is None:
+            nextReceiveDeadline = self.lastReceived + self._silenceThreshold
+        else:
+            nextReceiveDeadline = self.lastReceived + self._deadThreshold
+        return actions, min(self.lastSent + self._heartbeatInterval, nextReceiveDeadline)
+
+    def nextTestReqID(self):
+        return f"TEST{self._testRequestCount}"
+
+    def start(self, sendHeartbeat, sendTestRequest, sessionDead):
+        """ Start the scheduler task. Callbacks are coroutine functions; sendTestRequest receives the TestReqID and
+        sessionDead the reason the session is considered dead."""
+        self.stop()
+        self.lastReceived = self.lastSent = self._clock()
+        self._testRequestSent = None
+        self._task = asyncio.ensure_future(self._run(sendHeartbeat, sendTestRequest, sessionDead))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self, sendHeartbeat, sendTestRequest, sessionDead):
+        while True:
+            actions, wakeup = self.poll(self._clock())
+            try:
+                for action in actions:
+                    if action == SEND_HEARTBEAT:
+                        await sendHeartbeat()
+                    elif action == SEND_TEST_REQUEST:
+                        await sendTestRequest(self.nextTestReqID())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.error("Heartbeat scheduler could not send", exc_info=True)
+                self._task = None
+                await sessionDead("Heartbeat could not be sent")
+                return
+            if SESSION_DEAD in actions:
+                self._task = None
+                await sessionDead("Test Request not answered")
+                return
+            await asyncio.sleep(max(0.0, wakeup - self._clock()))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Hot path latency instrumentation.
+
+Inbound messages are timestamped with perf_counter_ns when the socket read
+returns, when the parser returns the message, when dispatch starts, when the
+handler (or listener) returns and after sequence number validation. Outbound
+messages are timestamped around encoding, the transport write and the drain.
+The intervals are recorded in LatencyHistograms per stage and MsgType.
+
+LatencyHistogram is log-linear like HdrHistogram: values below 2^SUB_BUCKET_BITS
+ns are counted exactly and every following power of two is split into
+2^(SUB_BUCKET_BITS - 1) buckets, so the relative error of a percentile is below
+1/64 and memory is fixed (2240 counters covering 1 ns to 2^40 ns, about 18 minutes).
+
+Instrumentation is off unless LatencyMetrics is set in the session configuration.
+When off the engine only tests one attribute for None per message.
+"""
+import json
+import time
+
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+MAX_VALUE_BITS = 40
+MAX_SHIFT = MAX_VALUE_BITS - SUB_BUCKET_BITS
+BUCKETS = SUB_BUCKET_COUNT + MAX_SHIFT * SUB_BUCKET_HALF
+PERCENTILES = ((50, 0.5), (90, 0.9), (99, 0.99), (999, 0.999))
+
+# Stages. Inbound intervals start at the previous timestamp, total at the socket read
+STAGE_PARSE = "parse"
+STAGE_QUEUE = "queue" # Parsed until dispatch starts, i.e. waiting behind the rest of the batch
+STAGE_HANDLER = "handler"
+STAGE_SEQUENCE = "sequence"
+STAGE_INBOUND_TOTAL = "inboundTotal"
+STAGE_ENCODE = "encode"
+STAGE_WRITE = "write"
+STAGE_DRAIN = "drain"
+INBOUND_STAGES = (STAGE_PARSE, STAGE_QUEUE, STAGE_HANDLER, STAGE_SEQUENCE, STAGE_INBOUND_TOTAL)
+BATCH = "BATCH" # MsgType of writes from sendMany and the CoalesceWrites writer task
+NO_VALUE = 1 << 63
+
+
+def bucketIndex(value):
+    if value < SUB_BUCKET_COUNT:
+        return value if value > 0 else 0
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    if shift > MAX_SHIFT:
+        return BUCKETS - 1
+    return SUB_BUCKET_COUNT + (shift - 1) * SUB_BUCKET_HALF + (value >> shift) - SUB_BUCKET_HALF
+
+
+def bucketValue(index):
+    """ Highest value counted in a bucket."""
+    if index < SUB_BUCKET_COUNT:
+        return index
+    shift, offset = divmod(index - SUB_BUCKET_COUNT, SUB_BUCKET_HALF)
+    shift += 1
+    return ((SUB_BUCKET_HALF + offset + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = NO_VALUE
+        self.max = 0
+
+    def record(self, value):
+        """ Record a latency in nanoseconds."""
+        if value < SUB_BUCKET_COUNT:
+            index = value if value > 0 else 0
+        else:
+            shift = value.bit_length() - SUB_BUCKET_BITS
+            index = SUB_BUCKET_COUNT + (shift - 1) * SUB_BUCKET_HALF + (value >> shift) - SUB_BUCKET_HALF if shift <= MAX_SHIFT else BUCKETS - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if value < self.min:
+            self.min = value
+
+    def merge(self, other):
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.min = min(self.min, other.min)
+
+    def percentile(self, q):
+        """ Value at quantile q (0 to 1) in nanoseconds, capped at the maximum recorded."""
+        if not self.count:
+            return 0
+        target = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(bucketValue(index), self.max) if index < BUCKETS - 1 else self.max # Last bucket is unbounded
+        return self.max
+
+    def reset(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = NO_VALUE
+        self.max = 0
+
+    def snapshot(self):
+        """ Summary in microseconds."""
+        summary = {"count": self.count, "min": (self.min if self.count else 0) / 1000, "mean": self.total / self.count / 1000 if self.count else 0}
+        for name, q in PERCENTILES:
+            summary[f"p{name}"] = self.percentile(q) / 1000
+        summary["max"] = self.max / 1000
+        return summary
+
+
+class FIXLatencyMetrics:
+    """ Histograms of one session, keyed by (stage, MsgType)."""
+    def __init__(self, session):
+        self.session = session
+        self._histograms = {}
+        self._inbound = {}
+        self.started = time.time()
+
+    def histogram(self, stage, msgType):
+        key = (stage, msgType)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = LatencyHistogram()
+        return histogram
+
+    def recordInbound(self, msgType, readTime, parsedTime, dispatchTime, handledTime, validatedTime):
+        histograms = self._inbound.get(msgType)
+        if histograms is None:
+            histograms = self._inbound[msgType] = tuple(self.histogram(stage, msgType) for stage in INBOUND_STAGES)
+        parse, queue, handler, sequence, total = histograms
+        parse.record(parsedTime - readTime)
+        queue.record(dispatchTime - parsedTime)
+        handler.record(handledTime - dispatchTime)
+        sequence.record(validatedTime - handledTime)
+        total.record(validatedTime - readTime)
+
+    def record(self, stage, msgType, value):
+        self.histogram(stage, msgType).record(value)
+
+    def snapshot(self, reset=False):
+        """ {stage: {MsgType: summary}} in microseconds. "ALL" merges every MsgType of a stage."""
+        stages = {}
+        merged = {}
+        for (stage, msgType), histogram in self._histograms.items():
+            msgType = msgType.decode() if isinstance(msgType, bytes) else msgType
+            stages.setdefault(stage, {})[msgType] = histogram.snapshot()
+            merged.setdefault(stage, LatencyHistogram()).merge(histogram)
+        for stage, histogram in merged.items():
+            stages[stage]["ALL"] = histogram.snapshot()
+        snapshot = {"session": self.session, "since": self.started, "time": time.time(), "stages": stages}
+        if reset:
+            self.reset()
+        return snapshot
+
+    def reset(self):
+        for histogram in self._histograms.values():
+            histogram.reset()
+        self.started = time.time()
+
+    def dumps(self, reset=False):
+        return json.dumps(self.snapshot(reset))
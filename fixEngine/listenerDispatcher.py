@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Listener dispatch decoupled from the socket reader.
+
+Without it processMessage awaits the listener before validating the sequence
+number, so a slow listener stalls socket reads and heartbeat processing. With
+DispatchWorkers set, messages for the listener are put on one of N bounded
+worker queues chosen by key (Symbol or ClOrdID, falling back to the other) and
+the reader goes back to the socket. Messages with the same key always go to the
+same worker, so they reach the listener in the order they were received.
+
+When a worker queue is full the overflow policy decides:
+    block - the reader waits for space (nothing lost, backpressure on the socket)
+    dropOldest - the oldest queued message is discarded
+    conflate - a message carrying the latest state replaces the queued message
+        with the same state when nothing was queued after it: snapshots (W) per
+        MDReqID and Symbol, order status ExecutionReports (150=I) per ClOrdID.
+        Incremental refreshes, fills and everything else are never conflated,
+        since a listener building a book or a position needs all of them. The
+        reader waits when the queue is full.
+
+Workers share the event loop: a listener that never awaits still holds up the
+reader while it runs. Queue lag is the time from enqueue to the listener call.
+"""
+import asyncio
+import logging
+import time
+import simplefix
+from collections import deque
+from latencyMetrics import LatencyHistogram
+
+BLOCK = "block"
+DROP_OLDEST = "dropOldest"
+CONFLATE = "conflate"
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, CONFLATE)
+KEY_TAGS = {
+    "symbol": (simplefix.TAG_SYMBOL, simplefix.TAG_CLORDID),
+    "clOrdID": (simplefix.TAG_CLORDID, simplefix.TAG_SYMBOL),
+}
+
+
+TAG_MDREQID = 262
+EXECTYPE_ORDER_STATUS = b"I"
+
+
+def conflationKey(message):
+    """ Key of the state a message replaces entirely, None when every message of its kind must be delivered."""
+    msgType = message.get(simplefix.TAG_MSGTYPE)
+    if msgType == simplefix.MSGTYPE_MARKET_DATA_SNAPSHOT_FULL_REFRESH:
+        return msgType, message.get(TAG_MDREQID), message.get(simplefix.TAG_SYMBOL)
+    if msgType == simplefix.MSGTYPE_EXECUTION_REPORT and message.get(simplefix.TAG_EXECTYPE) == EXECTYPE_ORDER_STATUS:
+        return msgType, message.get(simplefix.TAG_CLORDID) or message.get(simplefix.TAG_ORDERID)
+    return None
+
+
+class _Worker:
+    __slots__ = ("queue", "pending", "ready", "space", "task", "maxDepth", "processed", "dropped", "conflated", "blocked", "blockedTime", "errors", "lag")
+
+    def __init__(self):
+        self.queue = deque()
+        self.pending = {} # Conflation key -> queued entry
+        self.ready = asyncio.Event()
+        self.space = asyncio.Event()
+        self.task = None
+        self.maxDepth = 0
+        self.processed = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.blocked = 0
+        self.blockedTime = 0
+        self.errors = 0
+        self.lag = LatencyHistogram()
+
+
+class FIXListenerDispatcher:
+    def __init__(self, listener, workers=4, queueSize=1024, overflow=BLOCK, key="symbol", logger=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow}. Expected one of {', '.join(OVERFLOW_POLICIES)}")
+        if key not in KEY_TAGS:
+            raise ValueError(f"Unknown dispatch key {key}. Expected one of {', '.join(KEY_TAGS)}")
+        if workers < 1 or queueSize < 1:
+            raise ValueError("Dispatch needs at least one worker and a queue size of at least one")
+        self._listener = listener
+        self._workers = [_Worker() for _ in range(workers)]
+        self._queueSize = queueSize
+        self._overflow = overflow
+        self._keyTags = KEY_TAGS[key]
+        self._logger = logger if logger is not None else logging.getLogger(__name__)
+        self._closing = False
+
+    def workerFor(self, key):
+        return self._workers[hash(key) % len(self._workers)] if key is not None else self._workers[0]
+
+    async def put(self, message):
+        """ Queue message for the listener. Only waits when the worker queue is full and the policy blocks."""
+        primary, secondary = self._keyTags
+        key = message.get(primary)
+        if key is None:
+            key = message.get(secondary)
+        worker = self.workerFor(key)
+        stateKey = None
+        if self._overflow == CONFLATE:
+            stateKey = conflationKey(message)
+            if stateKey is not None:
+                entry = worker.pending.get(stateKey)
+                if entry is not None and entry is worker.queue[-1]: # Keeps its enqueue time, the lag is that of the oldest data
+                    entry[0] = message
+                    worker.conflated += 1
+                    return
+        if len(worker.queue) >= self._queueSize:
+            if self._overflow == DROP_OLDEST:
+                self._discard(worker, worker.queue.popleft())
+                worker.dropped += 1
+            else:
+                await self._waitForSpace(worker)
+        entry = [message, time.perf_counter_ns(), stateKey]
+        worker.queue.append(entry)
+        if stateKey is not None:
+            worker.pending[stateKey] = entry
+        if len(worker.queue) > worker.maxDepth:
+            worker.maxDepth = len(worker.queue)
+        worker.ready.set()
+        if worker.task is None:
+            worker.task = asyncio.ensure_future(self._run(worker))
+
+    async def _waitForSpace(self, worker):
+        worker.blocked += 1
+        start = time.perf_counter_ns()
+        while len(worker.queue) >= self._queueSize:
+            worker.space.clear()
+            await worker.space.wait()
+        worker.blockedTime += time.perf_counter_ns() - start
+
+    @staticmethod
+    def _discard(worker, entry):
+        if entry[2] is not None and worker.pending.get(entry[2]) is entry:
+            del worker.pending[entry[2]]
+
+    async def _run(self, worker):
+        queue = worker.queue
+        while True:
+            if not queue:
+                if self._closing:
+                    worker.task = None # Messages put after close start a new worker
+                    return
+                worker.ready.clear()
+                await worker.ready.wait()
+                continue
+            entry = queue.popleft()
+            self._discard(worker, entry)
+            worker.space.set()
+            worker.lag.record(time.perf_counter_ns() - entry[1])
+            try:
+                await self._listener(entry[0])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                worker.errors += 1
+                self._logger.error("Error in message listener", exc_info=True)
+            worker.processed += 1
+
+    def close(self):
+        """ Let the workers exit once every queued message has been passed to the listener."""
+        self._closing = True
+        for worker in self._workers:
+            worker.ready.set()
+
+    async def join(self):
+        """ Close and wait for the workers to finish."""
+        self.close()
+        await asyncio.gather(*(worker.task for worker in self._workers if worker.task is not None))
+
+    def cancel(self):
+        """ Stop the workers now, discarding queued messages."""
+        self._closing = True
+        for worker in self._workers:
+            if worker.task is not None:
+                worker.task.cancel()
+            worker.queue.clear()
+            worker.pending.clear()
+
+    def getStats(self, reset=False):
+        """ Queue depths, overflow counters and queue lag (microseconds) over every worker."""
+        lag = LatencyHistogram()
+        for worker in self._workers:
+            lag.merge(worker.lag)
+        workers = self._workers
+        stats = {
+            "workers": len(workers),
+            "overflow": self._overflow,
+            "depth": sum(len(worker.queue) for worker in workers),
+            "maxDepth": [worker.maxDepth for worker in workers],
+            "processed": sum(worker.processed for worker in workers),
+            "dropped": sum(worker.dropped for worker in workers),
+            "conflated": sum(worker.conflated for worker in workers),
+            "blocked": sum(worker.blocked for worker in workers),
+            "blockedSeconds": sum(worker.blockedTime for worker in workers) / 1e9,
+            "errors": sum(worker.errors for worker in workers),
+            "lag": lag.snapshot(),
+        }
+        if reset:
+            for worker in workers:
+                worker.lag.reset()
+                worker.maxDepth = len(worker.queue)
+        return stats
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+Replay of recorded FIX traffic through the engine dispatch path.
+
+FIXLogReplay reads back the {SenderCompID}-fixMessages.log written by the
+engine (HumanReadableLog) or a binary message journal (MessageJournal, files
+ending in .journal). Files are memory mapped and split in bulk with bytes.find
+instead of being parsed line by line or field by field, and messages are
+yielded as FIXMessageView objects, so only the fields a handler reads are ever
+decoded.
+
+Text logs are scanned in chunks of whole lines. The "|" separators of a chunk
+are turned back into SOH with a single regular expression substitution, only
+where a "|" is followed by the next tag or ends the line, so values holding a
+"|" (Text, 58) are kept. Every line becomes a view over the chunk. Inbound and outbound messages are told apart by TargetCompID,
+timestamps come from the log record and have millisecond resolution. Journal
+records are framed by BodyLength (FIXViewParser) per direction, so messages
+split across socket reads are put back together. Their timestamps are the read
+and write times in nanoseconds.
+
+run() awaits a coroutine function for every message, typically the dispatch
+method of an offlineHandler with order books, caches or a listener attached. It
+replays as fast as possible or paced by the recorded timestamps (speed 1.0 is
+wall clock, 2.0 twice as fast) and returns the throughput in messages/s.
+"""
+import asyncio
+import mmap
+import os
+import re
+import time
+from connectionHandler import FIXConnectionHandler
+from messageJournal import RECORD_HEADER, INBOUND, OUTBOUND
+from messageView import FIXMessageView, FIXViewParser, SOH
+
+LOG_SUFFIX = "-fixMessages.log"
+JOURNAL_SUFFIX = ".journal"
+LOG_MESSAGE_START = b" - 8=" # Between the log record time and the message
+LOG_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+FIELD_SEPARATOR = re.compile(rb"\|(?=\d+=|\r?\n|\Z)") # "|" before the next tag or at the end of a line
+CHUNK_SIZE = 1 << 22
+PACE_RESOLUTION = 0.001 # Seconds ahead of the recorded time before sleeping
+YIELD_EVERY = 1024 # Messages replayed as fast as possible between yields to the event loop
+
+
+class FIXLogReplay:
+    def __init__(self, filename, direction=INBOUND, senderCompID=None, chunkSize=CHUNK_SIZE):
+        """ direction is INBOUND, OUTBOUND or None for both. senderCompID tells the directions of a text log apart,
+        it defaults to the one in the log file name."""
+        self._filename = filename
+        self._direction = direction
+        self._chunkSize = chunkSize
+        self._isJournal = filename.endswith(JOURNAL_SUFFIX)
+        name = os.path.basename(filename)
+        if senderCompID is None and name.endswith(LOG_SUFFIX):
+            senderCompID = name[:-len(LOG_SUFFIX)]
+        if not self._isJournal and direction is not None and senderCompID is None:
+            raise ValueError(f"SenderCompID needed to tell inbound from outbound messages in {filename}")
+        self._senderCompID = senderCompID.encode() if isinstance(senderCompID, str) else senderCompID
+
+    def __iter__(self):
+        return self.messages()
+
+    def messages(self):
+        """ Generator of (timestamp ns, direction, FIXMessageView) in file order."""
+        with open(self._filename, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if self._isJournal:
+                    yield from self._journalMessages(data)
+                else:
+                    yield from self._logMessages(data)
+
+    def _journalMessages(self, data):
+        parsers = {INBOUND: FIXViewParser(), OUTBOUND: FIXViewParser()}
+        offset = 0
+        end = len(data)
+        while offset + RECORD_HEADER.size <= end:
+            timestamp, direction, length = RECORD_HEADER.unpack_from(data, offset)
+            offset += RECORD_HEADER.size
+            if offset + length > end:
+                break # Truncated record from a crash mid-write
+            if self._direction is None or direction == self._direction:
+                parser = parsers[direction]
+                parser.append_buffer(data[offset:offset + length]) # Copied out of the map, views outlive it
+                message = parser.get_message()
+                while message is not None:
+                    yield timestamp, direction, message
+                    message = parser.get_message()
+            offset += length
+
+    def _logMessages(self, data):
+        senderCompID = self._senderCompID
+        wanted = self._direction
+        lastSecond = None
+        position = 0
+        end = len(data)
+        while position < end:
+            chunkEnd = min(position + self._chunkSize, end)
+            if chunkEnd < end:
+                lineEnd = data.rfind(b"\n", position, chunkEnd)
+                chunkEnd = lineEnd + 1 if lineEnd != -1 else _lineEnd(data, chunkEnd, end)
+            chunk = FIELD_SEPARATOR.sub(SOH, data[position:chunkEnd])
+            position = chunkEnd
+            lineStart = 0
+            start = chunk.find(LOG_MESSAGE_START)
+            while start != -1:
+                lineStart = chunk.rfind(b"\n", lineStart, start) + 1 or lineStart
+                lineEnd = _lineEnd(chunk, start, len(chunk))
+                message = FIXMessageView(chunk, start + 3, lineEnd)
+                direction = None
+                if senderCompID is not None:
+                    direction = INBOUND if message.get(56) == senderCompID else OUTBOUND
+                if wanted is None or direction == wanted:
+                    second = chunk[lineStart:lineStart + 19]
+                    if second != lastSecond:
+                        lastSecond = second
+                        epoch = int(time.mktime(time.strptime(second.decode(), LOG_TIME_FORMAT))) * 1000000000 # Log times are local
+                    yield epoch + int(chunk[lineStart + 20:lineStart + 23]) * 1000000, direction, message
+                lineStart = lineEnd + 1
+                start = chunk.find(LOG_MESSAGE_START, lineStart)
+
+    async def run(self, target, speed=None):
+        """ Await target(message) for every message. speed None replays as fast as possible, otherwise at speed
+        times the recorded pace. Returns the number of messages, the seconds taken and messages per second."""
+        loop = asyncio.get_event_loop()
+        count = 0
+        firstTimestamp = None
+        start = time.perf_counter()
+        for timestamp, direction, message in self.messages():
+            if speed is not None:
+                if firstTimestamp is None:
+                    firstTimestamp = timestamp
+                    origin = loop.time()
+                delay = origin + (timestamp - firstTimestamp) / 1e9 / speed - loop.time()
+                if delay > PACE_RESOLUTION:
+                    await asyncio.sleep(delay)
+            elif count % YIELD_EVERY == YIELD_EVERY - 1:
+                await asyncio.sleep(0) # Let dispatch workers and consumers run
+            await target(message)
+            count += 1
+        elapsed = time.perf_counter() - start
+        return {"messages": count, "seconds": elapsed, "messagesPerSecond": count / elapsed if elapsed else 0.0}
+
+
+def _lineEnd(data, start, end):
+    lineEnd = data.find(b"\n", start, end)
+    return end if lineEnd == -1 else lineEnd
+
+
+class _ClosedStream:
+    """ Reader and writer of a handler that is not connected to anything."""
+    transport = None
+
+    def at_eof(self):
+        return True
+
+    async def read(self, size=-1):
+        return b""
+
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def offlineHandler(config, listener):
+    """ FIXConnectionHandler without a connection, to replay into its dispatch: messages reach the handlers
+    registered on it (OrderBookManager, MarketDataConflationCache, OrderCache...) and then listener."""
+    stream = _ClosedStream()
+    return FIXConnectionHandler(config, stream, stream, listener)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Conflated market data for consumers that cannot keep up with every update.
+
+MarketDataConflationCache keeps only the latest value per (Symbol, MDEntryType)
+from W and X messages in preallocated arrays of capacity slots, so memory does
+not depend on the update rate. Updated slots are moved to the tail of a
+recency list (linked through two more arrays) and stamped with a global version.
+A ConflationConsumer remembers the version of its last read and walks the list
+back from the tail, so a read costs the number of keys that changed, not the
+number of updates, and consumers never block the engine or each other.
+
+Without an OrderBookManager the value of a key is its latest entry (action,
+price, size). With one, messages are applied to the books and bid and offer
+slots hold the best level, trades the last trade: the consumer reads top of book.
+"""
+import asyncio
+import time
+from array import array
+from collections import namedtuple
+import simplefix
+from orderBook import iterEntries, MDENTRY_BID, MDENTRY_OFFER, MDENTRY_TRADE, MDUPDATE_CHANGE
+
+NAN = float("nan")
+ConflatedValue = namedtuple("ConflatedValue", "symbol entryType action price size timestamp updates")
+
+
+class MarketDataConflationCache:
+    def __init__(self, capacity=1024, parsePrice=float, parseSize=float, books=None):
+        """ capacity is the number of (Symbol, MDEntryType) keys. books is an OrderBookManager owned by the cache:
+        messages are applied to it here, it must not be attached to the engine as well."""
+        self.capacity = capacity
+        self._parsePrice = parsePrice
+        self._parseSize = parseSize
+        self._books = books
+        self._lastTrades = {}
+        self._slots = {}
+        self._keys = []
+        self.prices = array("d", [NAN]) * capacity
+        self.sizes = array("d", [NAN]) * capacity
+        self.actions = array("B", [0]) * capacity
+        self.timestamps = array("q", [0]) * capacity
+        self.updates = array("q", [0]) * capacity # Updates received per key, conflated or not
+        self.versions = array("q", [0]) * capacity
+        self._next = array("l", [capacity]) * (capacity + 1) # Index capacity is the list head
+        self._prev = array("l", [capacity]) * (capacity + 1)
+        self.version = 0
+        self.overflows = 0
+        self._changed = None
+        self._forward = None
+
+    def attach(self, engine, forward=True):
+        """ Register in front of the current W and X handlers. With forward they still get every message."""
+        self._forward = {}
+        for msgType in (simplefix.MSGTYPE_MARKET_DATA_SNAPSHOT_FULL_REFRESH, simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH):
+            self._forward[msgType] = engine.getHandler(msgType) if forward else None
+            engine.registerHandler(msgType, self.onMessage)
+
+    async def onMessage(self, message):
+        self.apply(message)
+        forward = self._forward.get(message.get(simplefix.TAG_MSGTYPE))
+        if forward is not None:
+            await forward(message)
+
+    def consumer(self, fromStart=True):
+        """ New consumer. With fromStart its first read returns every key, otherwise only later changes."""
+        return ConflationConsumer(self, 0 if fromStart else self.version)
+
+    def apply(self, message, timestamp=None):
+        """ Apply a W or X message. Returns the number of keys updated."""
+        if timestamp is None:
+            timestamp = time.time_ns()
+        isSnapshot = message.get(simplefix.TAG_MSGTYPE) == simplefix.MSGTYPE_MARKET_DATA_SNAPSHOT_FULL_REFRESH
+        if self._books is not None:
+            return self._applyBooks(self._books.apply(message), timestamp)
+        symbol = message.get(simplefix.TAG_SYMBOL)
+        parsePrice = self._parsePrice
+        parseSize = self._parseSize
+        count = 0
+        for action, entryType, entrySymbol, price, size in iterEntries(message, isSnapshot):
+            count += self.update(entrySymbol or symbol, entryType, parsePrice(price) if price is not None else NAN, parseSize(size) if size is not None else NAN, action or MDUPDATE_CHANGE, timestamp)
+        return count
+
+    def _applyBooks(self, books, timestamp):
+        count = 0
+        for book in books:
+            for entryType, best in ((MDENTRY_BID, book.bids.best()), (MDENTRY_OFFER, book.offers.best())):
+                price, size = best if best is not None else (NAN, NAN)
+                count += self.update(book.symbol, entryType, price, size, MDUPDATE_CHANGE, timestamp, onlyChanges=True)
+            if book.lastTrade is not None and self._lastTrades.get(book) is not book.lastTrade:
+                self._lastTrades[book] = book.lastTrade
+                count += self.update(book.symbol, MDENTRY_TRADE, book.lastTrade[0], book.lastTrade[1], MDUPDATE_CHANGE, timestamp)
+        return count
+
+    def update(self, symbol, entryType, price, size, action=MDUPDATE_CHANGE, timestamp=0, onlyChanges=False):
+        """ Store the latest value of a key. Returns 1 if stored, 0 if unchanged or the cache is full."""
+        key = (symbol, entryType)
+        slot = self._slots.get(key)
+        if slot is None:
+            if len(self._keys) == self.capacity:
+                self.overflows += 1
+                return 0
+            slot = self._slots[key] = len(self._keys)
+            self._keys.append(key)
+        elif onlyChanges and _same(self.prices[slot], price) and _same(self.sizes[slot], size):
+            return 0
+        self.version += 1
+        self.prices[slot] = price
+        self.sizes[slot] = size
+        self.actions[slot] = action[0]
+        self.timestamps[slot] = timestamp
+        self.updates[slot] += 1
+        self.versions[slot] = self.version
+        # Move to the tail of the recency list
+        head = self.capacity
+        following, preceding = self._next, self._prev
+        if self.updates[slot] > 1:
+            following[preceding[slot]] = following[slot]
+            preceding[following[slot]] = preceding[slot]
+        tail = preceding[head]
+        following[tail] = slot
+        preceding[slot] = tail
+        following[slot] = head
+        preceding[head] = slot
+        if self._changed is not None:
+            self._changed.set()
+        return 1
+
+    def get(self, symbol, entryType):
+        """ Latest ConflatedValue of a key or None."""
+        symbol = symbol.encode() if isinstance(symbol, str) else symbol
+        entryType = entryType.encode() if isinstance(entryType, str) else entryType
+        slot = self._slots.get((symbol, entryType))
+        return self._value(slot) if slot is not None else None
+
+    def keys(self):
+        return list(self._keys)
+
+    def _value(self, slot):
+        symbol, entryType = self._keys[slot]
+        return ConflatedValue(symbol, entryType, bytes((self.actions[slot],)), self.prices[slot], self.sizes[slot], self.timestamps[slot], self.updates[slot])
+
+    def _changedSince(self, version):
+        """ Slots updated after version, oldest first."""
+        slots = []
+        head = self.capacity
+        prev, versions = self._prev, self.versions
+        slot = prev[head]
+        while slot != head and versions[slot] > version:
+            slots.append(slot)
+            slot = prev[slot]
+        slots.reverse()
+        return slots
+
+    async def _wait(self):
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        self._changed.clear()
+        await self._changed.wait()
+
+
+class ConflationConsumer:
+    """ Reader of a MarketDataConflationCache. Each read returns the keys changed since the previous one."""
+    def __init__(self, cache, version=0):
+        self._cache = cache
+        self.version = version
+        self.reads = 0
+        self.received = 0
+        self.conflated = 0
+        self._seenUpdates = array("q", cache.updates) if version else array("q", [0]) * cache.capacity
+
+    def lag(self):
+        """ Updates stored in the cache since the last read."""
+        return self._cache.version - self.version
+
+    def read(self):
+        """ ConflatedValues of the keys changed since the last read, in update order."""
+        cache = self._cache
+        values = []
+        seenUpdates = self._seenUpdates
+        for slot in cache._changedSince(self.version):
+            value = cache._value(slot)
+            self.conflated += value.updates - seenUpdates[slot] - 1
+            seenUpdates[slot] = value.updates
+            values.append(value)
+        self.version = cache.version
+        self.reads += 1
+        self.received += len(values)
+        return values
+
+    async def wait(self):
+        """ Wait until there is something to read."""
+        while self._cache.version == self.version:
+            await self._cache._wait()
+
+    async def __aiter__(self):
+        while True:
+            await self.wait()
+            yield self.read()
+
+
+def _same(a, b):
+    return a == b or (a != a and b != b) # NaN is an empty side
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+Shared market data subscriptions.
+
+FIXMarketDataMultiplexer reference counts the interest of every subscriber in
+each (Symbol, request type, MarketDepth) key, the request type standing for the
+entry types as in marketDataRequest ("1" bids and offers, "T" trades). Only
+keys nobody was subscribed to yet are requested: the subscriptions made in the
+same event loop iteration are merged into one MarketDataRequest per request
+type and depth, and every request of an iteration is sent in a single write.
+Each W and X message is parsed once and handed to the listeners of the
+subscriptions on its MDReqID, found with a dict lookup. Subscribers joining a
+book that is already streaming get their own snapshot (263=0) request.
+
+The venue only unsubscribes whole requests, so the unsubscribe (263=2) of a
+request is sent when the last subscriber of its last symbol leaves. Until then
+entries of symbols nobody wants any more still arrive: listeners read the
+symbols they asked for. On every logon the live keys are requested again. A
+MarketDataRequestReject (Y) drops the keys of its request and reaches the
+listeners that were waiting for it; their subscriptions end once none of their
+symbols is left.
+"""
+import asyncio
+import itertools
+import logging
+import time
+import simplefix
+from connectionHandler import SocketConnectionState
+
+REQUEST_SNAPSHOT = "0"
+REQUEST_BOOK = "1"
+REQUEST_UNSUBSCRIBE = "2"
+REQUEST_TRADES = "T"
+TAG_MDREQID = 262
+MSGTYPES = (simplefix.MSGTYPE_MARKET_DATA_SNAPSHOT_FULL_REFRESH, simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH, simplefix.MSGTYPE_MARKET_DATA_REQUEST_REJECT)
+
+logger = logging.getLogger(__name__)
+
+
+class MarketDataSubscription:
+    __slots__ = ("symbols", "requestType", "depth", "listener", "active")
+
+    def __init__(self, symbols, requestType, depth, listener):
+        self.symbols = symbols
+        self.requestType = requestType
+        self.depth = depth
+        self.listener = listener
+        self.active = True
+
+    def __repr__(self):
+        return f"MarketDataSubscription(symbols={self.symbols}, requestType={self.requestType}, depth={self.depth}, active={self.active})"
+
+
+class _MarketDataRequest:
+    """ One MarketDataRequest. symbols are every symbol requested, live those someone is still subscribed to."""
+    __slots__ = ("mdReqID", "requestType", "depth", "symbols", "live", "listeners")
+
+    def __init__(self, requestType, depth):
+        self.mdReqID = None
+        self.requestType = requestType
+        self.depth = depth
+        self.symbols = []
+        self.live = 0
+        self.listeners = ()
+
+
+class FIXMarketDataMultiplexer:
+    def __init__(self, aggregateBook=True, snapshots=True):
+        """ aggregateBook is sent on every book request. With snapshots a subscriber joining a streaming book gets
+        a snapshot of its symbols."""
+        self._aggregateBook = "Y" if aggregateBook else "N"
+        self._snapshots = snapshots
+        self._interest = {} # (symbol, requestType, depth) -> {subscription: None}
+        self._requestByKey = {}
+        self._requests = {} # MDReqID -> _MarketDataRequest
+        self._pending = {} # (requestType, depth) -> _MarketDataRequest not sent yet
+        self._pendingSnapshots = {} # depth -> {subscription: symbols}
+        self._snapshotRequests = {} # MDReqID -> {symbol: listeners} of the snapshots still expected
+        self._pendingUnsubscribes = []
+        self._mdReqIDs = itertools.count(1)
+        self._mdReqIDPrefix = f"MD{int(time.time() * 1000)}"
+        self._engine = None
+        self._forward = {}
+        self._flushing = None
+        self.requestsSent = 0
+        self.unsubscribesSent = 0
+        self.messages = 0
+        self.deliveries = 0
+
+    def attach(self, engine, forward=True):
+        """ Register in front of the current W, X and Y handlers of the engine. With forward messages of other MDReqIDs
+        still reach them. Called again for every new connection of a client: subscriptions are requested again on logon."""
+        self._engine = engine
+        for msgType in MSGTYPES:
+            handler = engine.getHandler(msgType)
+            if handler != self.onMessage:
+                self._forward[msgType] = handler if forward else None
+                engine.registerHandler(msgType, self.onMessage)
+
+    def subscribe(self, symbols, listener, requestType=REQUEST_BOOK, depth=0):
+        """ Call listener (coroutine function) with every W and X message of symbols, and the MarketDataRequestReject
+        of their request if the venue rejects it. Returns the subscription."""
+        symbols = list(dict.fromkeys(symbol.encode() if isinstance(symbol, str) else symbol for symbol in symbols))
+        subscription = MarketDataSubscription(symbols, requestType, depth, listener)
+        changed = set()
+        late = []
+        for symbol in symbols:
+            key = (symbol, requestType, depth)
+            subscribers = self._interest.get(key)
+            if subscribers is None:
+                subscribers = self._interest[key] = {}
+                request = self._pending.get((requestType, depth))
+                if request is None:
+                    request = self._pending[(requestType, depth)] = _MarketDataRequest(requestType, depth)
+                request.symbols.append(symbol)
+                request.live += 1
+                self._requestByKey[key] = request
+            else:
+                request = self._requestByKey[key]
+                if request.mdReqID is not None:
+                    late.append(symbol)
+            subscribers[subscription] = None
+            changed.add(request)
+        if late and self._snapshots and requestType == REQUEST_BOOK:
+            self._pendingSnapshots.setdefault(depth, {})[subscription] = late
+        for request in changed:
+            self._updateListeners(request)
+        self._scheduleFlush()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """ Stop delivering to subscription. Requests nobody is subscribed to any more are unsubscribed (263=2)."""
+        if not subscription.active:
+            return
+        subscription.active = False
+        changed = set()
+        for symbol in subscription.symbols:
+            key = (symbol, subscription.requestType, subscription.depth)
+            subscribers = self._interest.get(key)
+            if subscribers is None or subscription not in subscribers: # Dropped by a reject
+                continue
+            del subscribers[subscription]
+            request = self._requestByKey[key]
+            changed.add(request)
+            if subscribers:
+                continue
+            del self._interest[key]
+            del self._requestByKey[key]
+            request.live -= 1
+            if request.mdReqID is None: # Not sent yet
+                request.symbols.remove(symbol)
+                if not request.symbols:
+                    del self._pending[(request.requestType, request.depth)]
+            elif request.live == 0:
+                self._pendingUnsubscribes.append(request)
+        pendingSnapshots = self._pendingSnapshots.get(subscription.depth)
+        if pendingSnapshots is not None:
+            pendingSnapshots.pop(subscription, None)
+        for request in changed:
+            self._updateListeners(request)
+        self._scheduleFlush()
+
+    def _updateListeners(self, request):
+        """ Distinct listeners of the subscriptions to any live symbol of the request, in subscription order."""
+        listeners = {}
+        for symbol in request.symbols:
+            for subscription in self._interest.get((symbol, request.requestType, request.depth), ()):
+                listeners[subscription.listener] = None
+        request.listeners = tuple(listeners)
+
+    def _scheduleFlush(self):
+        if self._flushing is None:
+            self._flushing = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        """ Send what the current event loop iteration subscribed and unsubscribed in a single write."""
+        try:
+            await asyncio.sleep(0)
+            engine = self._engine
+            if engine is None or engine.getConnectionState() != SocketConnectionState.LOGGED_IN:
+                return # Requested on logon
+            clientMessage = engine.clientMessage
+            messages = []
+            for request in self._pending.values():
+                request.mdReqID = self._nextMDReqID()
+                self._requests[request.mdReqID.encode()] = request
+                messages.append(clientMessage.marketDataRequest([symbol.decode() for symbol in request.symbols], request.requestType, request.depth, self._aggregateBook, mdReqID=request.mdReqID)[0])
+            self._pending.clear()
+            for depth, subscriptions in self._pendingSnapshots.items():
+                listeners = {}
+                for subscription, symbols in subscriptions.items():
+                    for symbol in symbols:
+                        listeners.setdefault(symbol, {})[subscription.listener] = None
+                mdReqID = self._nextMDReqID()
+                self._snapshotRequests[mdReqID.encode()] = {symbol: tuple(symbolListeners) for symbol, symbolListeners in listeners.items()}
+                messages.append(clientMessage.marketDataRequest([symbol.decode() for symbol in listeners], REQUEST_SNAPSHOT, depth, self._aggregateBook, mdReqID=mdReqID)[0])
+            self._pendingSnapshots.clear()
+            for request in self._pendingUnsubscribes:
+                del self._requests[request.mdReqID.encode()]
+                messages.append(clientMessage.marketDataRequest([symbol.decode() for symbol in request.symbols], REQUEST_UNSUBSCRIBE, request.depth, self._aggregateBook, unsubscribeFrom=request.requestType, correlation=request.mdReqID))
+                self.unsubscribesSent += 1
+            self._pendingUnsubscribes.clear()
+            if messages:
+                self.requestsSent += len(messages)
+                await engine.sendMany(messages)
+        except Exception:
+            logger.error("Market data requests not sent", exc_info=True)
+        finally:
+            self._flushing = None
+
+    def _nextMDReqID(self):
+        return f"{self._mdReqIDPrefix}-{next(self._mdReqIDs)}"
+
+    def onLogon(self):
+        """ Request every live key again, merged as new subscriptions. Previous MDReqIDs died with the connection."""
+        live = {}
+        for (symbol, requestType, depth) in self._interest:
+            live.setdefault((requestType, depth), []).append(symbol)
+        self._requests.clear()
+        self._snapshotRequests.clear()
+        self._pendingSnapshots.clear()
+        self._pendingUnsubscribes.clear()
+        self._pending.clear()
+        for (requestType, depth), symbols in live.items():
+            request = self._pending[(requestType, depth)] = _MarketDataRequest(requestType, depth)
+            request.symbols = symbols
+            request.live = len(symbols)
+            for symbol in symbols:
+                self._requestByKey[(symbol, requestType, depth)] = request
+            self._updateListeners(request)
+        self._scheduleFlush()
+
+    async def onMessage(self, message):
+        mdReqID = message.get(TAG_MDREQID)
+        request = self._requests.get(mdReqID)
+        if request is not None:
+            listeners = request.listeners
+            if message.get(simplefix.TAG_MSGTYPE) == simplefix.MSGTYPE_MARKET_DATA_REQUEST_REJECT:
+                self._rejected(request)
+        else:
+            snapshot = self._snapshotRequests.get(mdReqID)
+            if snapshot is None:
+                forward = self._forward.get(message.get(simplefix.TAG_MSGTYPE))
+                if forward is not None:
+                    await forward(message)
+                return
+            if message.get(simplefix.TAG_MSGTYPE) == simplefix.MSGTYPE_MARKET_DATA_REQUEST_REJECT:
+                listeners = tuple(dict.fromkeys(listener for symbolListeners in snapshot.values() for listener in symbolListeners))
+                snapshot.clear()
+            else:
+                listeners = snapshot.pop(message.get(simplefix.TAG_SYMBOL), ())
+            if not snapshot:
+                del self._snapshotRequests[mdReqID]
+        self.messages += 1
+        self.deliveries += len(listeners)
+        for listener in listeners:
+            try:
+                await listener(message)
+            except Exception:
+                logger.error(f"Market data listener {listener} failed", exc_info=True)
+
+    def _rejected(self, request):
+        """ Drop the keys of a rejected request. Subscriptions left without any key end."""
+        del self._requests[request.mdReqID.encode()]
+        if request in self._pendingUnsubscribes:
+            self._pendingUnsubscribes.remove(request)
+        subscriptions = {}
+        for symbol in request.symbols:
+            key = (symbol, request.requestType, request.depth)
+            if self._requestByKey.get(key) is request:
+                del self._requestByKey[key]
+                subscriptions.update(self._interest.pop(key))
+        request.live = 0
+        for subscription in subscriptions:
+            if not any(subscription in self._interest.get((symbol, subscription.requestType, subscription.depth), ()) for symbol in subscription.symbols):
+                subscription.active = False
+        logger.warning(f"Market data request {request.mdReqID} rejected for {b','.join(request.symbols).decode()}")
+
+    def getSubscriberCount(self, symbol, requestType=REQUEST_BOOK, depth=0):
+        return len(self._interest.get((symbol.encode() if isinstance(symbol, str) else symbol, requestType, depth), ()))
+
+    def getStats(self):
+        return {
+            "keys": len(self._interest),
+            "liveRequests": sum(1 for request in self._requests.values() if request.live),
+            "requestsSent": self.requestsSent,
+            "unsubscribesSent": self.unsubscribesSent,
+            "messages": self.messages,
+            "deliveries": self.deliveries,
+        }
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Binary FIX message journal written off the hot path.
+
+Raw wire bytes are copied into a preallocated buffer together with a nanosecond
+timestamp and a direction flag. A background thread swaps the buffer out and
+writes it to disk in a single call every flush interval.
+
+File format: a sequence of length-prefixed records
+    <int64 timestamp ns><1 byte direction><uint32 length><length bytes of raw FIX data>
+Inbound records hold the bytes returned by one socket read, outbound records the
+bytes handed to one socket write, so a record can contain several messages or a
+partial one. Use FixParser (or FIXMessageJournal.readMessages) to split them.
+
+Data loss bound: records are only in process memory until the next flush, so a
+crash loses at most the last JournalFlushInterval seconds of traffic (plus any
+buffers queued behind a stalled disk). With JournalFsync enabled every flush is
+fsync'ed, extending the same bound to an OS crash or power loss.
+"""
+import os
+import struct
+import threading
+import time
+import simplefix
+from collections import deque
+
+RECORD_HEADER = struct.Struct("<qcI")
+INBOUND = b"R"
+OUTBOUND = b"S"
+MAX_SPARE_BUFFERS = 4
+
+
+class FIXMessageJournal:
+    def __init__(self, filename, bufferSize=1 << 20, flushInterval=0.05, fsync=False):
+        self._filename = filename
+        self._bufferSize = bufferSize
+        self._flushInterval = flushInterval
+        self._fsync = fsync
+        self._active = bytearray(bufferSize)
+        self._offset = 0
+        self._filled = deque()
+        self._spare = [bytearray(bufferSize)]
+        self._lock = threading.Lock()
+        self._flushLock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = True
+        self._file = open(filename, "ab")
+        self.recordsWritten = 0
+        self.bytesWritten = 0
+        self.buffersAllocated = 2
+        self._thread = threading.Thread(target=self._run, name=f"FIXMessageJournal-{os.path.basename(filename)}", daemon=True)
+        self._thread.start()
+
+    def record(self, direction, data, timestamp=None):
+        """ Copy raw FIX bytes into the journal buffer. Never touches the disk."""
+        if timestamp is None:
+            timestamp = time.time_ns()
+        size = RECORD_HEADER.size + len(data)
+        with self._lock:
+            if self._offset + size > len(self._active):
+                self._swapActive(size)
+            RECORD_HEADER.pack_into(self._active, self._offset, timestamp, direction, len(data))
+            start = self._offset + RECORD_HEADER.size
+            self._active[start:start + len(data)] = data
+            self._offset += size
+            self.recordsWritten += 1
+
+    def _swapActive(self, size):
+        # Caller holds the lock. Queue the current buffer for the writer thread and take a spare one
+        if self._offset:
+            self._filled.append((self._active, self._offset))
+        if size > self._bufferSize:
+            self._active = bytearray(size)
+            self.buffersAllocated += 1
+        elif self._spare:
+            self._active = self._spare.pop()
+        else:
+            # Disk is not keeping up. Grow instead of blocking the event loop
+            self._active = bytearray(self._bufferSize)
+            self.buffersAllocated += 1
+        self._offset = 0
+        self._wakeup.set()
+
+    def flush(self):
+        """ Write every buffered record to disk."""
+        with self._flushLock:
+            with self._lock:
+                if self._offset:
+                    self._swapActive(0)
+                filled = list(self._filled)
+                self._filled.clear()
+            if not filled:
+                return
+            for buffer, length in filled:
+                self._file.write(memoryview(buffer)[:length])
+                self.bytesWritten += length
+            self._file.flush()
+            if self._fsync:
+                os.fsync(self._file.fileno())
+            with self._lock:
+                self._spare.extend(buffer for buffer, _ in filled if len(buffer) == self._bufferSize)
+                del self._spare[MAX_SPARE_BUFFERS:]
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self._flushInterval)
+            self._wakeup.clear()
+            self.flush()
+        self.flush()
+
+    def close(self):
+        """ Stop the writer thread after a final flush."""
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        self._thread.join()
+        self._file.close()
+
+    @staticmethod
+    def readRecords(filename):
+        """ Generator of (timestamp ns, direction, raw bytes) records from a journal file."""
+        with open(filename, "rb") as f:
+            data = f.read()
+        offset = 0
+        end = len(data)
+        while offset + RECORD_HEADER.size <= end:
+            timestamp, direction, length = RECORD_HEADER.unpack_from(data, offset)
+            offset += RECORD_HEADER.size
+            if offset + length > end:
+                break # Truncated record from a crash mid-write
+            yield timestamp, direction, data[offset:offset + length]
+            offset += length
+
+    @staticmethod
+    def readMessages(filename, direction=None):
+        """ Generator of (timestamp ns, direction, simplefix.FixMessage) from a journal file."""
+        parsers = {INBOUND: simplefix.FixParser(), OUTBOUND: simplefix.FixParser()}
+        for timestamp, recordDirection, data in FIXMessageJournal.readRecords(filename):
+            if direction is not None and recordDirection != direction:
+                continue
+            parser = parsers[recordDirection]
+            parser.append_buffer(data)
+            message = parser.get_message()
+            while message is not None:
+                yield timestamp, recordDirection, message
+                message = parser.get_message()
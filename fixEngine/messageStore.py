@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Persistent outbound message store indexed by MsgSeqNum.
+
+Messages are appended to segment data files that each hold a fixed number of
+sequence numbers. Every segment has a preallocated index file mapped with mmap
+holding one (offset, length) entry per sequence number, so finding a message is
+a single array access and replaying it returns a memoryview over the mapped data
+file without copying. Index entries referencing data lost in a crash are
+dropped when a segment is opened.
+"""
+import mmap
+import os
+import re
+import struct
+
+INDEX_ENTRY = struct.Struct("<QI") # Data offset + 1 (0 = not stored), Length
+SEGMENT_FILE = re.compile(r"segment-(\d+)\.idx$")
+
+
+class _StoreSegment:
+    def __init__(self, directory, number, firstSeqNo, capacity):
+        self.number = number
+        self.firstSeqNo = firstSeqNo
+        self._capacity = capacity
+        self._indexPath = os.path.join(directory, f"segment-{number:010d}.idx")
+        self._dataPath = os.path.join(directory, f"segment-{number:010d}.dat")
+        indexSize = capacity * INDEX_ENTRY.size
+        with open(self._indexPath, "a+b") as f:
+            if os.path.getsize(self._indexPath) < indexSize:
+                f.truncate(indexSize)
+        self._indexFile = open(self._indexPath, "r+b")
+        self._index = mmap.mmap(self._indexFile.fileno(), indexSize)
+        self._dataFile = open(self._dataPath, "a+b")
+        self._dataSize = os.path.getsize(self._dataPath)
+        self._dataMap = None
+        self._mappedSize = 0
+        self._dropTornEntries()
+
+    def _dropTornEntries(self):
+        # The index is mapped and the data file is buffered: after a crash the index can reference data never written
+        for position, (offset, length) in enumerate(INDEX_ENTRY.iter_unpack(self._index)):
+            if offset and offset - 1 + length > self._dataSize:
+                INDEX_ENTRY.pack_into(self._index, position * INDEX_ENTRY.size, 0, 0)
+
+    def append(self, seqNo, data):
+        self._dataFile.write(data)
+        INDEX_ENTRY.pack_into(self._index, (seqNo - self.firstSeqNo) * INDEX_ENTRY.size, self._dataSize + 1, len(data))
+        self._dataSize += len(data)
+
+    def get(self, seqNo):
+        offset, length = INDEX_ENTRY.unpack_from(self._index, (seqNo - self.firstSeqNo) * INDEX_ENTRY.size)
+        if not offset:
+            return None
+        offset -= 1
+        if offset + length > self._mappedSize:
+            self._remap()
+        return memoryview(self._dataMap)[offset:offset + length]
+
+    def lastSeqNo(self):
+        for position in range(self._capacity - 1, -1, -1):
+            if INDEX_ENTRY.unpack_from(self._index, position * INDEX_ENTRY.size)[0]:
+                return self.firstSeqNo + position
+        return None
+
+    def _remap(self):
+        # Earlier maps stay alive while memoryviews over them are still referenced
+        self._dataFile.flush()
+        self._dataMap = mmap.mmap(self._dataFile.fileno(), self._dataSize, access=mmap.ACCESS_READ)
+        self._mappedSize = self._dataSize
+
+    def flush(self):
+        self._dataFile.flush()
+        self._index.flush()
+
+    def close(self):
+        self.flush()
+        self._dataFile.close()
+        self._index.close()
+        self._indexFile.close()
+
+    def delete(self):
+        self.close()
+        os.remove(self._indexPath)
+        os.remove(self._dataPath)
+
+
+class FIXMessageStore:
+    def __init__(self, directory, segmentMessages=65536, retainSegments=4):
+        assert segmentMessages > 0
+        assert retainSegments > 0
+        self._directory = directory
+        self._segmentMessages = segmentMessages
+        self._retainSegments = retainSegments
+        self._segments = {}
+        self.lastSeqNo = 0
+        os.makedirs(directory, exist_ok=True)
+        for filename in sorted(os.listdir(directory)):
+            match = SEGMENT_FILE.match(filename)
+            if match:
+                self._openSegment(int(match.group(1)))
+        if self._segments:
+            self.lastSeqNo = self._segments[max(self._segments)].lastSeqNo() or 0
+
+    def _openSegment(self, number):
+        segment = _StoreSegment(self._directory, number, number * self._segmentMessages + 1, self._segmentMessages)
+        self._segments[number] = segment
+        return segment
+
+    def append(self, seqNo, data):
+        """ Store an encoded outbound message under its MsgSeqNum."""
+        if seqNo == 1 and self.lastSeqNo:
+            self.reset() # Sequence numbers restarted with the session
+        number = (seqNo - 1) // self._segmentMessages
+        segment = self._segments.get(number)
+        if segment is None:
+            segment = self._openSegment(number)
+            self._applyRetention(number)
+        segment.append(seqNo, data)
+        if seqNo > self.lastSeqNo:
+            self.lastSeqNo = seqNo
+
+    def get(self, seqNo):
+        """ Return a memoryview over the stored message or None if it is not in the store."""
+        segment = self._segments.get((seqNo - 1) // self._segmentMessages)
+        if segment is None:
+            return None
+        return segment.get(seqNo)
+
+    def getRange(self, beginSeqNo, endSeqNo=0):
+        """ Generator of (MsgSeqNum, memoryview or None). EndSeqNo 0 means up to the last stored message."""
+        if endSeqNo == 0 or endSeqNo > self.lastSeqNo:
+            endSeqNo = self.lastSeqNo
+        for seqNo in range(beginSeqNo, endSeqNo + 1):
+            yield seqNo, self.get(seqNo)
+
+    def _applyRetention(self, newestSegment):
+        for number in [n for n in self._segments if n <= newestSegment - self._retainSegments]:
+            self._segments.pop(number).delete()
+
+    def reset(self):
+        """ Delete every stored message."""
+        for segment in self._segments.values():
+            segment.delete()
+        self._segments = {}
+        self.lastSeqNo = 0
+
+    def flush(self):
+        for segment in self._segments.values():
+            segment.flush()
+
+    def close(self):
+        for segment in self._segments.values():
+            segment.close()
+        self._segments = {}
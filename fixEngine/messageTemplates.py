@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Precompiled FIX message templates.
+
+A template is compiled once per session: every static tag=value pair, the
+header and the tag prefixes of the dynamic fields are encoded to bytes and their
+checksums are summed up front. Encoding a message only writes MsgSeqNum,
+SendingTime/TransactTime and the dynamic values into a reusable bytearray and
+adds their byte sums to the precomputed checksum.
+"""
+import time
+import simplefix
+
+SOH = b"\x01"
+SEQNO = object()
+SENDING_TIME = object()
+TRANSACT_TIME = object()
+DYNAMIC = object()
+
+
+def _fixValue(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode()
+    return str(value).encode()
+
+
+class UTCTimestampCache:
+    """ UTCTimestamp generator that only formats the date and time once per second."""
+    def __init__(self, precision=6):
+        assert precision in (0, 3, 6)
+        self._precision = precision
+        self._second = None
+        self._prefix = b""
+
+    def now(self):
+        ns = time.time_ns()
+        second, fraction = divmod(ns, 1000000000)
+        if second != self._second:
+            self._second = second
+            self._prefix = time.strftime("%Y%m%d-%H:%M:%S", time.gmtime(second)).encode()
+        if self._precision == 6:
+            return b"%s.%06d" % (self._prefix, fraction // 1000)
+        if self._precision == 3:
+            return b"%s.%03d" % (self._prefix, fraction // 1000000)
+        return self._prefix
+
+
+class FIXMessageTemplate:
+    def __init__(self, fixVersion, msgType, senderCompID, targetCompID, fields, precision=6):
+        """ Fields is a list of (tag, value). Use DYNAMIC as value for fields given on each encode
+        and TRANSACT_TIME for a timestamp equal to SendingTime."""
+        self._beginString = b"8=" + _fixValue(fixVersion) + SOH + b"9="
+        self._beginStringSum = sum(self._beginString) + sum(SOH)
+        self._timestamps = UTCTimestampCache(precision)
+        self._buffer = bytearray()
+        self._tags = {}
+        self._staticValues = {}
+
+        slots = []
+        statics = []
+        current = bytearray(b"35=" + _fixValue(msgType) + SOH + b"49=" + _fixValue(senderCompID) + SOH + b"56=" + _fixValue(targetCompID) + SOH)
+        self._staticValues[simplefix.TAG_MSGTYPE] = _fixValue(msgType)
+        # Every (tag, value) in message order, values being bytes or the SEQNO, SENDING_TIME, TRANSACT_TIME and DYNAMIC markers
+        self.fields = [(b"8", _fixValue(fixVersion)), (b"35", _fixValue(msgType)), (b"49", _fixValue(senderCompID)), (b"56", _fixValue(targetCompID))]
+        for tag, value in [(simplefix.TAG_MSGSEQNUM, SEQNO), (simplefix.TAG_SENDING_TIME, SENDING_TIME)] + list(fields):
+            if value is None: # Optional field not used by this template
+                continue
+            tag = _fixValue(tag)
+            self.fields.append((tag, value if value is SEQNO or value is SENDING_TIME or value is TRANSACT_TIME or value is DYNAMIC else _fixValue(value)))
+            if value is SEQNO or value is SENDING_TIME or value is TRANSACT_TIME or value is DYNAMIC:
+                # Static chunk ends with the tag of the dynamic field. The value is followed by SOH
+                current += tag + b"="
+                statics.append(bytes(current))
+                current = bytearray(SOH)
+                if value is DYNAMIC:
+                    self._tags[tag] = sum(1 for slot in slots if slot is DYNAMIC)
+                slots.append(value)
+            else:
+                current += tag + b"=" + _fixValue(value) + SOH
+                self._staticValues.setdefault(tag, _fixValue(value))
+        statics.append(bytes(current))
+        self._statics = statics
+        self._slots = slots
+        self._staticSum = sum(sum(chunk) for chunk in statics)
+        self.dynamicFields = len(self._tags)
+
+    def encode(self, seqNo, values):
+        """ Encode a message with the given MsgSeqNum and dynamic values (in template order)."""
+        timestamp = self._timestamps.now()
+        body = self._buffer
+        del body[:]
+        statics = self._statics
+        checksum = self._staticSum
+        body += statics[0]
+        index = 0
+        for position, slot in enumerate(self._slots):
+            if slot is SEQNO:
+                value = b"%d" % seqNo
+            elif slot is DYNAMIC:
+                value = _fixValue(values[index])
+                index += 1
+            else:
+                value = timestamp
+            body += value
+            body += statics[position + 1]
+            checksum += sum(value)
+        length = b"%d" % len(body)
+        checksum = (checksum + self._beginStringSum + sum(length)) % 256
+        return b"".join((self._beginString, length, SOH, body, b"10=%03d" % checksum, SOH))
+
+    def message(self, *values):
+        """ Message ready to be passed to sendMessage. Sequence number is assigned when sent."""
+        assert len(values) == self.dynamicFields
+        return TemplateMessage(self, values)
+
+    def get(self, values, tag):
+        tag = _fixValue(tag)
+        if tag in self._tags:
+            return _fixValue(values[self._tags[tag]])
+        return self._staticValues.get(tag)
+
+
+class TemplateMessage:
+    __slots__ = ("template", "values")
+
+    def __init__(self, template, values):
+        self.template = template
+        self.values = values
+
+    def encode(self, seqNo):
+        return self.template.encode(seqNo, self.values)
+
+    def get(self, tag):
+        """ Same lookup as simplefix.FixMessage.get for static and dynamic fields."""
+        return self.template.get(self.values, tag)
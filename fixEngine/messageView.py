@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Lazy FIX message views over the receive buffer.
+
+FIXViewParser frames messages using BodyLength, checked against the position
+of the CheckSum field, and returns FIXMessageView objects that reference the
+received bytes without copying or splitting them.
+A field is located the first time it is requested with a single bytes.find for
+"<SOH>tag=" and its offsets are cached, so repeated lookups are O(1). Values are
+only turned into bytes objects when accessed. Views offer the read interface of
+simplefix.FixMessage (get, __contains__, count, encode, pairs) so they can be
+passed to listeners unchanged.
+"""
+import simplefix
+
+SOH = b"\x01"
+_NEEDLES = {}
+_NEEDLE_SETS = {}
+
+
+def _needle(tag):
+    needle = _NEEDLES.get(tag)
+    if needle is None:
+        if isinstance(tag, bytes):
+            encoded = tag
+        elif isinstance(tag, str):
+            encoded = tag.encode()
+        else:
+            encoded = str(tag).encode()
+        needle = SOH + encoded + b"="
+        _NEEDLES[tag] = needle
+    return needle
+
+
+class FIXMessageView:
+    __slots__ = ("_data", "_start", "_end", "_index")
+
+    def __init__(self, data, start=0, end=None):
+        self._data = data
+        self._start = start
+        self._end = len(data) if end is None else end
+        self._index = None
+
+    def _locate(self, tag, nth=1):
+        """ Return (valueStart, valueEnd) of the nth occurrence of tag or None."""
+        data = self._data
+        needle = _needle(tag)
+        if data.startswith(needle[1:], self._start):
+            found = self._start - 1 # First field of the view has no leading SOH
+        else:
+            found = data.find(needle, self._start, self._end)
+            if found == -1:
+                return None
+        while True:
+            nth -= 1
+            if nth == 0:
+                valueStart = found + len(needle)
+                valueEnd = data.find(SOH, valueStart, self._end)
+                return valueStart, (self._end if valueEnd == -1 else valueEnd)
+            found = data.find(needle, found + len(needle), self._end)
+            if found == -1:
+                return None
+
+    def _offsets(self, tag):
+        index = self._index
+        if index is None:
+            index = self._index = {}
+        elif tag in index:
+            return index[tag]
+        offsets = index[tag] = self._locate(tag)
+        return offsets
+
+    def get(self, tag, nth=1):
+        """ Value of the nth occurrence of tag as bytes or None. Same semantics as simplefix.FixMessage.get."""
+        offsets = self._offsets(tag) if nth == 1 else self._locate(tag, nth)
+        if offsets is None:
+            return None
+        return self._data[offsets[0]:offsets[1]]
+
+    def getView(self, tag, nth=1):
+        """ Value of the nth occurrence of tag as a memoryview over the receive buffer."""
+        offsets = self._offsets(tag) if nth == 1 else self._locate(tag, nth)
+        if offsets is None:
+            return None
+        return memoryview(self._data)[offsets[0]:offsets[1]]
+
+    def getFields(self, *tags):
+        """ Values of the first occurrence of each tag without caching offsets. Cheapest way to read a group entry."""
+        data = self._data
+        start = self._start
+        end = self._end
+        needles = _NEEDLE_SETS.get(tags)
+        if needles is None:
+            needles = _NEEDLE_SETS[tags] = tuple((_needle(tag), _needle(tag)[1:]) for tag in tags)
+        values = []
+        for needle, firstField in needles:
+            if data.startswith(firstField, start):
+                found = start - 1
+            else:
+                found = data.find(needle, start, end)
+                if found == -1:
+                    values.append(None)
+                    continue
+            valueStart = found + len(needle)
+            valueEnd = data.find(SOH, valueStart, end)
+            values.append(data[valueStart:end if valueEnd == -1 else valueEnd])
+        return values
+
+    def getInt(self, tag, default=None):
+        offsets = self._offsets(tag)
+        if offsets is None:
+            return default
+        return int(self._data[offsets[0]:offsets[1]])
+
+    def __contains__(self, tag):
+        return self._offsets(tag) is not None
+
+    def iterGroup(self, countTag, delimiterTag):
+        """ Yield a view per entry of a repeating group. Each entry spans from its delimiter field to the next one."""
+        counter = self._offsets(countTag)
+        if counter is None:
+            return
+        needle = _needle(delimiterTag)
+        data = self._data
+        entryStart = data.find(needle, counter[1], self._end)
+        for _ in range(int(data[counter[0]:counter[1]])):
+            if entryStart == -1:
+                return
+            entryEnd = data.find(needle, entryStart + len(needle), self._end)
+            yield FIXMessageView(data, entryStart + 1, self._end if entryEnd == -1 else entryEnd + 1)
+            entryStart = entryEnd
+
+    def count(self):
+        return self._data.count(SOH, self._start, self._end)
+
+    def encode(self, raw=False):
+        return self._data[self._start:self._end]
+
+    @property
+    def pairs(self):
+        """ Every (tag, value) pair. Materialises the whole message."""
+        fields = self._data[self._start:self._end].split(SOH)
+        return [tuple(field.split(b"=", 1)) for field in fields if field]
+
+    def toFixMessage(self):
+        message = simplefix.FixMessage()
+        for tag, value in self.pairs:
+            message.append_pair(tag, value)
+        return message
+
+    def __str__(self):
+        return self._data[self._start:self._end].replace(SOH, b"|").decode(errors="replace")
+
+
+class FIXViewParser:
+    """ Drop-in replacement of simplefix.FixParser returning FIXMessageView."""
+    def __init__(self):
+        self._buffer = b""
+        self._position = 0
+
+    def append_buffer(self, buffer):
+        if self._position < len(self._buffer):
+            self._buffer = self._buffer[self._position:] + bytes(buffer)
+        else:
+            self._buffer = bytes(buffer)
+        self._position = 0
+
+    def get_buffer(self):
+        return self._buffer[self._position:]
+
+    def reset(self):
+        self._buffer = b""
+        self._position = 0
+
+    def get_message(self):
+        """ Next complete message or None. A frame whose BodyLength is not a number or does not end at a CheckSum
+        field is skipped and parsing resumes at the next BeginString."""
+        buffer = self._buffer
+        while True:
+            if buffer.startswith(b"8=", self._position):
+                start = self._position
+            else:
+                start = buffer.find(b"\x018=FIX", self._position)
+                if start == -1:
+                    return None
+                start += 1
+            lengthStart = buffer.find(b"\x019=", start)
+            if lengthStart == -1:
+                return None
+            lengthStart += 3
+            lengthEnd = buffer.find(SOH, lengthStart)
+            if lengthEnd == -1:
+                return None
+            length = buffer[lengthStart:lengthEnd]
+            if not length.isdigit():
+                self._position = start + 1
+                continue
+            end = lengthEnd + 1 + int(length) + 7 # Body plus "10=nnn<SOH>"
+            if end > len(buffer):
+                return None
+            if buffer[end - 8:end - 4] != b"\x0110=" or buffer[end - 1] != 1:
+                self._position = start + 1
+                continue
+            self._position = end
+            return FIXMessageView(buffer, start, end)
+
+    def get_messages(self):
+        messages = []
+        message = self.get_message()
+        while message is not None:
+            messages.append(message)
+            message = self.get_message()
+        return messages
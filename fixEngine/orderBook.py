@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Incremental L2 order books built from MarketDataSnapshotFullRefresh (W) and
+MarketDataIncrementalRefresh (X) messages.
+
+Each side keeps its levels in parallel sorted lists ordered so the best price is
+the last element: updates are a bisect (O(log n)) and, since most activity is at
+the top of the book, the list insert or delete only moves a few elements.
+Top-of-book is an O(1) read of the last element.
+
+With FIXInstruments prices and sizes are fixed-point units of each symbol
+(see fixedPoint) and the levels are int64 arrays instead of lists of floats.
+"""
+import logging
+from array import array
+from bisect import bisect_left
+import simplefix
+
+MDENTRY_BID = b"0"
+MDENTRY_OFFER = b"1"
+MDENTRY_TRADE = b"2"
+MDUPDATE_NEW = b"0"
+MDUPDATE_CHANGE = b"1"
+MDUPDATE_DELETE = b"2"
+TAG_MDREQID = 262
+TAG_NOMDENTRIES = 268
+TAG_MDUPDATEACTION = 279
+TAG_MDENTRYTYPE = 269
+TAG_MDENTRYPX = 270
+TAG_MDENTRYSIZE = 271
+
+logger = logging.getLogger(__name__)
+
+
+class PriceLevels:
+    """ One side of the book. Bids are keyed by price and offers by -price so the best level is always last.
+    typecode ('q' for fixed-point units) stores the levels in arrays instead of lists."""
+    def __init__(self, isBid, typecode=None):
+        self._sign = 1 if isBid else -1
+        self._keys = array(typecode) if typecode else []
+        self._prices = array(typecode) if typecode else []
+        self._sizes = array(typecode) if typecode else []
+
+    def update(self, price, size):
+        key = price * self._sign
+        keys = self._keys
+        position = bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            self._sizes[position] = size
+        else:
+            keys.insert(position, key)
+            self._prices.insert(position, price)
+            self._sizes.insert(position, size)
+
+    def delete(self, price):
+        key = price * self._sign
+        keys = self._keys
+        position = bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            del keys[position]
+            del self._prices[position]
+            del self._sizes[position]
+
+    def clear(self):
+        del self._keys[:]
+        del self._prices[:]
+        del self._sizes[:]
+
+    def best(self):
+        """ (price, size) of the top level or None."""
+        if not self._keys:
+            return None
+        return self._prices[-1], self._sizes[-1]
+
+    def depth(self, levels=None):
+        """ Prices and sizes from best to worst."""
+        if levels is None or levels >= len(self._keys):
+            return self._prices[::-1], self._sizes[::-1]
+        stop = len(self._keys) - levels - 1
+        return self._prices[:stop:-1], self._sizes[:stop:-1]
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class OrderBook:
+    def __init__(self, symbol, mdReqID=None, typecode=None):
+        self.symbol = symbol
+        self.mdReqID = mdReqID
+        self.typecode = typecode
+        self.bids = PriceLevels(isBid=True, typecode=typecode)
+        self.offers = PriceLevels(isBid=False, typecode=typecode)
+        self.lastTrade = None
+        self.updates = 0
+
+    def bestBid(self):
+        return self.bids.best()
+
+    def bestOffer(self):
+        return self.offers.best()
+
+    def apply(self, action, entryType, price, size):
+        if entryType == MDENTRY_TRADE:
+            self.lastTrade = (price, size)
+        else:
+            side = self.bids if entryType == MDENTRY_BID else self.offers
+            if action == MDUPDATE_DELETE:
+                side.delete(price)
+            else:
+                side.update(price, size)
+        self.updates += 1
+
+    def depthArrays(self, levels=None):
+        """ Depth snapshot as NumPy arrays (bidPrices, bidSizes, offerPrices, offerSizes), best level first.
+        float64, or int64 units for fixed-point books."""
+        import numpy as np
+        dtype = np.int64 if self.typecode == "q" else np.float64
+        bidPrices, bidSizes = self.bids.depth(levels)
+        offerPrices, offerSizes = self.offers.depth(levels)
+        return np.array(bidPrices, dtype=dtype), np.array(bidSizes, dtype=dtype), np.array(offerPrices, dtype=dtype), np.array(offerSizes, dtype=dtype)
+
+
+class OrderBookManager:
+    """ Keeps one OrderBook per (MDReqID, Symbol) from W and X messages."""
+    def __init__(self, parsePrice=float, parseSize=float, instruments=None):
+        """ With instruments (FIXInstruments) prices and sizes are decoded to the fixed-point units of their symbol
+        and kept in int64 arrays, parsePrice and parseSize are not used. Entries of symbols without an instrument
+        definition are skipped."""
+        self._parsePrice = parsePrice
+        self._parseSize = parseSize
+        self._instruments = instruments
+        self._books = {}
+        self._bySymbol = {}
+        self._unknownSymbols = set()
+        self._forward = None
+
+    def attach(self, engine, forward=True):
+        """ Register with the engine dispatch table. With forward the messages still reach the engine listener."""
+        engine.registerHandler(simplefix.MSGTYPE_MARKET_DATA_SNAPSHOT_FULL_REFRESH, self.onMessage)
+        engine.registerHandler(simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH, self.onMessage)
+        self._forward = engine.messageNotification if forward else None
+
+    async def onMessage(self, message):
+        self.apply(message)
+        if self._forward is not None:
+            await self._forward(message)
+
+    def getBook(self, symbol, mdReqID=None):
+        symbol = symbol.encode() if isinstance(symbol, str) else symbol
+        if mdReqID is None:
+            return self._bySymbol.get(symbol)
+        mdReqID = mdReqID.encode() if isinstance(mdReqID, str) else mdReqID
+        return self._books.get((mdReqID, symbol))
+
+    def books(self):
+        return list(self._books.values())
+
+    def _book(self, mdReqID, symbol):
+        book = self._books.get((mdReqID, symbol))
+        if book is None:
+            book = self._books[(mdReqID, symbol)] = OrderBook(symbol, mdReqID, "q" if self._instruments is not None else None)
+            self._bySymbol.setdefault(symbol, book)
+        return book
+
+    def apply(self, message):
+        """ Apply a W or X message. Returns the set of books that changed."""
+        msgType = message.get(simplefix.TAG_MSGTYPE)
+        isSnapshot = msgType == simplefix.MSGTYPE_MARKET_DATA_SNAPSHOT_FULL_REFRESH
+        mdReqID = message.get(TAG_MDREQID)
+        symbol = message.get(simplefix.TAG_SYMBOL)
+        changed = set()
+        if isSnapshot:
+            book = self._book(mdReqID, symbol)
+            book.bids.clear()
+            book.offers.clear()
+            changed.add(book)
+        parsePrice = self._parsePrice
+        parseSize = self._parseSize
+        instruments = self._instruments
+        for action, entryType, entrySymbol, price, size in iterEntries(message, isSnapshot):
+            if price is None:
+                continue
+            entrySymbol = entrySymbol or symbol
+            if instruments is not None:
+                codecs = instruments.find(entrySymbol)
+                if codecs is None:
+                    self._unknownSymbol(entrySymbol)
+                    continue
+                book = self._book(mdReqID, entrySymbol)
+                priceCodec, sizeCodec = codecs
+                book.apply(action, entryType, priceCodec.decode(price), sizeCodec.decode(size) if size is not None else None)
+            else:
+                book = self._book(mdReqID, entrySymbol)
+                book.apply(action, entryType, parsePrice(price), parseSize(size) if size is not None else None)
+            changed.add(book)
+        return changed
+
+    def _unknownSymbol(self, symbol):
+        if symbol not in self._unknownSymbols:
+            self._unknownSymbols.add(symbol)
+            logger.warning(f"No instrument definition for symbol {symbol!r}. Skipping its market data entries")
+
+
+def iterEntries(message, isSnapshot):
+    """ Yield (MDUpdateAction, MDEntryType, Symbol, MDEntryPx, MDEntrySize) per entry of a W or X message."""
+    delimiter = TAG_MDENTRYTYPE if isSnapshot else TAG_MDUPDATEACTION
+    if hasattr(message, "iterGroup"): # FIXMessageView
+        for entry in message.iterGroup(TAG_NOMDENTRIES, delimiter):
+            if isSnapshot:
+                entryType, price, size = entry.getFields(TAG_MDENTRYTYPE, TAG_MDENTRYPX, TAG_MDENTRYSIZE)
+                yield MDUPDATE_NEW, entryType, None, price, size
+            else:
+                yield entry.getFields(TAG_MDUPDATEACTION, TAG_MDENTRYTYPE, simplefix.TAG_SYMBOL, TAG_MDENTRYPX, TAG_MDENTRYSIZE)
+        return
+    delimiter = str(delimiter).encode()
+    entry = None
+    for tag, value in message.pairs:
+        if tag == delimiter:
+            if entry is not None:
+                yield _entryTuple(entry, isSnapshot)
+            entry = {}
+        if entry is not None:
+            entry.setdefault(tag, value)
+    if entry is not None:
+        yield _entryTuple(entry, isSnapshot)
+
+
+def _entryTuple(entry, isSnapshot):
+    return (MDUPDATE_NEW if isSnapshot else entry.get(b"279")), entry.get(b"269"), (None if isSnapshot else entry.get(b"55")), entry.get(b"270"), entry.get(b"271")
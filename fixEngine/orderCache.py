@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+In-memory order state.
+
+Orders are tracked from outgoing NewOrderSingle / OrderCancelReplaceRequest /
+OrderCancelRequest messages and updated from ExecutionReports and
+OrderCancelRejects. Every ClOrdID an order has been known by and its OrderID map
+to the same OrderState, so lookups are a single dict access. Open orders are
+also indexed per symbol. Terminal orders are kept in a bounded FIFO and evicted
+from every index once MaxTerminalOrders is exceeded. Prices and quantities are
+floats, or fixed-point units of the symbol when the session has Instruments.
+A pending OrderMassStatusRequest is dropped when it is rejected or after
+MassStatusTimeout seconds without its last report.
+"""
+import itertools
+import logging
+import time
+from collections import deque
+import simplefix
+
+TERMINAL_STATUS = frozenset([simplefix.ORDSTATUS_FILLED, simplefix.ORDSTATUS_CANCELED, simplefix.ORDSTATUS_REJECTED, simplefix.ORDSTATUS_EXPIRED, simplefix.ORDSTATUS_DONE_FOR_DAY])
+TAG_MASSSTATUSREQID = 584
+TAG_LASTRPTREQUESTED = 912
+TAG_CANCEL_ALL = 7559
+TAG_REFMSGTYPE = 372
+TAG_BUSINESSREJECTREFID = 379
+
+logger = logging.getLogger(__name__)
+
+
+def _key(value):
+    if value is None or isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+class OrderState:
+    __slots__ = ("clOrdID", "origClOrdID", "orderID", "symbol", "side", "orderQty", "price", "ordType", "ordStatus",
+                 "cumQty", "leavesQty", "avgPx", "pendingClOrdID", "text", "lastUpdate", "aliases")
+
+    def __init__(self, clOrdID, symbol=None, side=None, orderQty=None, price=None, ordType=None):
+        self.clOrdID = clOrdID
+        self.origClOrdID = None
+        self.orderID = None
+        self.symbol = symbol
+        self.side = side
+        self.orderQty = orderQty
+        self.price = price
+        self.ordType = ordType
+        self.ordStatus = simplefix.ORDSTATUS_PENDING_NEW
+        self.cumQty = 0.0
+        self.leavesQty = orderQty
+        self.avgPx = None
+        self.pendingClOrdID = None
+        self.text = None
+        self.lastUpdate = time.time()
+        self.aliases = [clOrdID]
+
+    def isOpen(self):
+        return self.ordStatus not in TERMINAL_STATUS
+
+    def __repr__(self):
+        return f"OrderState(clOrdID={self.clOrdID}, orderID={self.orderID}, symbol={self.symbol}, side={self.side}, status={self.ordStatus}, qty={self.orderQty}, cumQty={self.cumQty}, price={self.price})"
+
+
+class OrderHandle:
+    """ Returned per order by the bulk order requests. state follows the order through the Order Cache."""
+    __slots__ = ("clOrdID", "symbol", "side", "_orderCache")
+
+    def __init__(self, clOrdID, symbol, side, orderCache=None):
+        self.clOrdID = _key(clOrdID)
+        self.symbol = _key(symbol)
+        self.side = _key(side)
+        self._orderCache = orderCache
+
+    @property
+    def state(self):
+        """ OrderState of the order, None without Order Cache or once evicted."""
+        return self._orderCache.getByClOrdID(self.clOrdID) if self._orderCache is not None else None
+
+    def __repr__(self):
+        return f"OrderHandle(clOrdID={self.clOrdID}, symbol={self.symbol}, side={self.side})"
+
+
+class OrderCache:
+    def __init__(self, clientMessage, maxTerminalOrders=10000, instruments=None, massStatusTimeout=60.0):
+        """ With instruments (FIXInstruments) prices and quantities are kept as the fixed-point units of their symbol
+        instead of floats. Orders of symbols without an instrument definition are not tracked."""
+        self._clientMessage = clientMessage
+        self._maxTerminalOrders = maxTerminalOrders
+        self._massStatusTimeout = massStatusTimeout
+        self._instruments = instruments
+        self._byClOrdID = {}
+        self._byOrderID = {}
+        self._openBySymbol = {}
+        self._terminal = deque()
+        self._massStatus = {} # MassStatusReqID -> (deadline, reported orders)
+        self._clOrdIDs = itertools.count(1)
+        self._clOrdIDPrefix = str(int(time.time() * 1000))
+        self._forward = None
+
+    def attach(self, engine, forward=True):
+        """ Register ExecutionReport, OrderCancelReject and BusinessMessageReject handlers. With forward the messages
+        still reach the listener."""
+        engine.registerHandler(simplefix.MSGTYPE_EXECUTION_REPORT, self.onExecutionReport)
+        engine.registerHandler(simplefix.MSGTYPE_ORDER_CANCEL_REJECT, self.onCancelReject)
+        engine.registerHandler(simplefix.MSGTYPE_BUSINESS_MESSAGE_REJECT, self.onBusinessReject)
+        self._forward = engine.messageNotification if forward else None
+
+    # Lookups
+    def getByClOrdID(self, clOrdID):
+        return self._byClOrdID.get(_key(clOrdID))
+
+    def getByOrderID(self, orderID):
+        return self._byOrderID.get(_key(orderID))
+
+    def openOrders(self, symbol=None):
+        if symbol is None:
+            return [order for orders in self._openBySymbol.values() for order in orders]
+        return list(self._openBySymbol.get(_key(symbol), ()))
+
+    def __len__(self):
+        return len(set(map(id, self._byClOrdID.values())))
+
+    def nextClOrdID(self):
+        return f"{self._clOrdIDPrefix}-{next(self._clOrdIDs)}"
+
+    # Convenience requests
+    def cancelRequest(self, clOrdID, newClOrdID=None):
+        """ OrderCancelRequest for an order known by clOrdID."""
+        order = self._requireOpen(clOrdID)
+        return self._clientMessage.orderCancelRequest(clOrdID=newClOrdID or self.nextClOrdID(), orderID=order.orderID, origClOrdID=order.clOrdID, side=order.side, symbol=order.symbol)
+
+    def replaceRequest(self, clOrdID, price, quantity=None, newClOrdID=None, template=None, **kwargs):
+        """ OrderCancelReplaceRequest for an order known by clOrdID. Keeps side, symbol and order type.
+        With an orderCancelReplaceRequestTemplate the message is built from it and quantity defaults to the order quantity."""
+        order = self._requireOpen(clOrdID)
+        if template is not None:
+            if quantity is None:
+                quantity = self._instruments.encodeSize(order.symbol, order.orderQty) if self._instruments is not None else order.orderQty
+            return template.message(order.orderID, order.clOrdID, newClOrdID or self.nextClOrdID(), order.side, order.symbol, quantity, price)
+        return self._clientMessage.orderCancelReplaceRequest(newClOrdID or self.nextClOrdID(), order.orderID, order.clOrdID, order.side, order.symbol, price, order.ordType, quantity=quantity, **kwargs)
+
+    def _requireOpen(self, clOrdID):
+        order = self.getByClOrdID(clOrdID)
+        if order is None:
+            raise KeyError(f"Unknown ClOrdID {clOrdID}")
+        if not order.isOpen():
+            raise ValueError(f"Order {clOrdID} is not open: OrdStatus {order.ordStatus}")
+        if order.orderID is None:
+            raise ValueError(f"Order {clOrdID} has not been acknowledged yet")
+        return order
+
+    # Outbound
+    def onOutbound(self, message):
+        """ Track an order request before it is sent."""
+        msgType = message.get(simplefix.TAG_MSGTYPE)
+        if msgType == simplefix.MSGTYPE_NEW_ORDER_SINGLE:
+            if not self._isKnown(message):
+                return
+            order = self._newOrder(message.get(simplefix.TAG_CLORDID), message)
+            self._byClOrdID[order.clOrdID] = order
+            self._openBySymbol.setdefault(order.symbol, set()).add(order)
+        elif msgType == simplefix.MSGTYPE_ORDER_CANCEL_REPLACE_REQUEST or msgType == simplefix.MSGTYPE_ORDER_CANCEL_REQUEST:
+            if message.get(TAG_CANCEL_ALL) == b"Y":
+                return
+            order = self._byClOrdID.get(message.get(simplefix.TAG_ORIGCLORDID)) or self._byOrderID.get(message.get(simplefix.TAG_ORDERID))
+            if order is None:
+                return
+            order.pendingClOrdID = message.get(simplefix.TAG_CLORDID)
+            self._alias(order, order.pendingClOrdID)
+        elif msgType == simplefix.MSGTYPE_ORDER_MASS_STATUS_REQUEST:
+            now = time.time()
+            self._expireMassStatus(now)
+            self._massStatus[message.get(TAG_MASSSTATUSREQID)] = (now + self._massStatusTimeout, set())
+
+    # Inbound
+    async def onExecutionReport(self, message):
+        self.applyExecutionReport(message)
+        if self._forward is not None:
+            await self._forward(message)
+
+    async def onCancelReject(self, message):
+        self.applyCancelReject(message)
+        if self._forward is not None:
+            await self._forward(message)
+
+    async def onBusinessReject(self, message):
+        self.applyBusinessReject(message)
+        if self._forward is not None:
+            await self._forward(message)
+
+    def applyExecutionReport(self, message):
+        clOrdID = message.get(simplefix.TAG_CLORDID)
+        origClOrdID = message.get(simplefix.TAG_ORIGCLORDID)
+        orderID = message.get(simplefix.TAG_ORDERID)
+        order = self._byClOrdID.get(clOrdID) or self._byClOrdID.get(origClOrdID) or self._byOrderID.get(orderID)
+        if order is None: # Entered by another session or before a restart
+            if not self._isKnown(message):
+                return None
+            order = self._newOrder(clOrdID, message)
+            self._byClOrdID[clOrdID] = order
+            self._openBySymbol.setdefault(order.symbol, set()).add(order)
+        status = message.get(simplefix.TAG_ORDSTATUS)
+        if status == simplefix.ORDSTATUS_REJECTED and clOrdID is not None and clOrdID != order.clOrdID:
+            # Replace or cancel rejected. The order keeps working under its current ClOrdID
+            self._dropPending(order, clOrdID)
+            if message.get(simplefix.TAG_TEXT) is not None:
+                order.text = message.get(simplefix.TAG_TEXT)
+            order.lastUpdate = time.time()
+            return order
+        if origClOrdID is not None and clOrdID != order.clOrdID:
+            # Replace or cancel accepted. The order is now known by the request ClOrdID
+            order.origClOrdID = order.clOrdID
+            order.clOrdID = clOrdID
+            self._alias(order, clOrdID)
+            if order.pendingClOrdID == clOrdID:
+                order.pendingClOrdID = None
+        if orderID is not None and order.orderID != orderID:
+            order.orderID = orderID
+            self._byOrderID[orderID] = order
+        if self._instruments is not None:
+            priceCodec, sizeCodec = self._instruments.codecs(order.symbol)
+            parsers = (sizeCodec.decode, priceCodec.decode, sizeCodec.decode, sizeCodec.decode, priceCodec.decode)
+        else:
+            parsers = (float,) * 5
+        for attribute, tag, parse in zip(("orderQty", "price", "cumQty", "leavesQty", "avgPx"), (simplefix.TAG_ORDERQTY, simplefix.TAG_PRICE, simplefix.TAG_CUMQTY, simplefix.TAG_LEAVESQTY, simplefix.TAG_AVGPX), parsers):
+            value = message.get(tag)
+            if value is not None:
+                setattr(order, attribute, parse(value))
+        if message.get(simplefix.TAG_TEXT) is not None:
+            order.text = message.get(simplefix.TAG_TEXT)
+        order.lastUpdate = time.time()
+        if status is not None:
+            self._setStatus(order, status)
+
+        if self._massStatus:
+            self._expireMassStatus(order.lastUpdate)
+            massStatusReqID = message.get(TAG_MASSSTATUSREQID)
+            if massStatusReqID in self._massStatus:
+                self._massStatus[massStatusReqID][1].add(order)
+                if message.get(TAG_LASTRPTREQUESTED) == b"Y":
+                    self._reconcile(self._massStatus.pop(massStatusReqID)[1])
+        return order
+
+    def applyCancelReject(self, message):
+        order = self._byClOrdID.get(message.get(simplefix.TAG_ORIGCLORDID)) or self._byOrderID.get(message.get(simplefix.TAG_ORDERID))
+        if order is None:
+            return None
+        self._dropPending(order, message.get(simplefix.TAG_CLORDID))
+        order.text = message.get(simplefix.TAG_TEXT)
+        status = message.get(simplefix.TAG_ORDSTATUS)
+        if status is not None and status not in (simplefix.ORDSTATUS_PENDING_CANCEL, simplefix.ORDSTATUS_PENDING_REPLACE):
+            self._setStatus(order, status)
+        return order
+
+    def applyBusinessReject(self, message):
+        """ A rejected OrderMassStatusRequest gets no reports. Forget it so its orders are not reconciled."""
+        if message.get(TAG_REFMSGTYPE) == simplefix.MSGTYPE_ORDER_MASS_STATUS_REQUEST:
+            self._massStatus.pop(message.get(TAG_BUSINESSREJECTREFID), None)
+
+    def _expireMassStatus(self, now):
+        for massStatusReqID in [reqID for reqID, (deadline, _) in self._massStatus.items() if deadline <= now]:
+            del self._massStatus[massStatusReqID]
+            logger.warning(f"No last report for OrderMassStatusRequest {massStatusReqID!r} within {self._massStatusTimeout}s. Dropped")
+
+    def _dropPending(self, order, rejected):
+        """ Forget the ClOrdID of a rejected replace or cancel request."""
+        if rejected is not None and rejected != order.clOrdID:
+            self._byClOrdID.pop(rejected, None)
+            if rejected in order.aliases:
+                order.aliases.remove(rejected)
+        order.pendingClOrdID = None
+
+    def _reconcile(self, reported):
+        """ End of a mass status response. Open orders the venue did not report are no longer working."""
+        for order in self.openOrders():
+            if order not in reported and order.ordStatus != simplefix.ORDSTATUS_PENDING_NEW:
+                self._setStatus(order, simplefix.ORDSTATUS_CANCELED)
+
+    def _isKnown(self, message):
+        """ False, with a warning, for an order of a symbol without an instrument definition."""
+        if self._instruments is None:
+            return True
+        symbol = message.get(simplefix.TAG_SYMBOL)
+        if self._instruments.find(symbol) is not None:
+            return True
+        logger.warning(f"No instrument definition for symbol {symbol!r}. Order {message.get(simplefix.TAG_CLORDID)!r} is not tracked")
+        return False
+
+    def _newOrder(self, clOrdID, message):
+        symbol = message.get(simplefix.TAG_SYMBOL)
+        quantity = message.get(simplefix.TAG_ORDERQTY)
+        price = message.get(simplefix.TAG_PRICE)
+        if self._instruments is None:
+            return OrderState(clOrdID, symbol, message.get(simplefix.TAG_SIDE), _float(quantity), _float(price), message.get(simplefix.TAG_ORDTYPE))
+        priceCodec, sizeCodec = self._instruments.codecs(symbol)
+        order = OrderState(clOrdID, symbol, message.get(simplefix.TAG_SIDE), sizeCodec.decode(quantity) if quantity is not None else None, priceCodec.decode(price) if price is not None else None, message.get(simplefix.TAG_ORDTYPE))
+        order.cumQty = 0
+        return order
+
+    def _alias(self, order, clOrdID):
+        if clOrdID is not None and clOrdID not in order.aliases:
+            order.aliases.append(clOrdID)
+        self._byClOrdID[clOrdID] = order
+
+    def _setStatus(self, order, status):
+        wasOpen = order.isOpen()
+        order.ordStatus = status
+        if wasOpen and not order.isOpen():
+            orders = self._openBySymbol.get(order.symbol)
+            if orders is not None:
+                orders.discard(order)
+                if not orders:
+                    del self._openBySymbol[order.symbol]
+            self._terminal.append(order)
+            while len(self._terminal) > self._maxTerminalOrders:
+                self._evict(self._terminal.popleft())
+
+    def _evict(self, order):
+        for clOrdID in order.aliases:
+            if self._byClOrdID.get(clOrdID) is order:
+                del self._byClOrdID[clOrdID]
+        if order.orderID is not None and self._byOrderID.get(order.orderID) is order:
+            del self._byOrderID[order.orderID]
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Venue rate limiting of outbound application messages.
+
+Exchanges cap the message rate of a session, overall and per MsgType. Messages
+over the limit are queued, never dropped, and released in priority order when
+the token buckets refill: mass cancels, then cancels, then replaces, then new
+orders and everything else, FIFO within a priority. A priority whose head is
+held back by the limit of its own MsgType does not block lower priorities.
+
+A list submitted together (sendMany) is released as one entry so it keeps
+consecutive sequence numbers and a single write. It needs as many tokens as it
+has messages, or a full bucket when larger than the burst, and leaves the bucket
+in debt for the remainder so the average rate still holds.
+
+FIXOutboundScheduler has no timers: poll(now) returns the entries released at
+time now and the time of the next release, so it can be driven by the event loop
+clock or deterministically by a VirtualClock. Session messages bypass the queue
+but still take their tokens through consume().
+"""
+import simplefix
+from collections import deque
+from latencyMetrics import LatencyHistogram
+
+PRIORITY_CANCEL_ALL = 0
+PRIORITY_CANCEL = 1
+PRIORITY_REPLACE = 2
+PRIORITY_NEW = 3
+PRIORITY_NAMES = ("cancelAll", "cancel", "replace", "new")
+MSGTYPE_ORDER_MASS_CANCEL_REQUEST = b"q"
+TOKEN_EPSILON = 1e-9 # Refills are floating point, (1 - 0.8) * 5 is not quite one token
+
+
+def messagePriority(message):
+    msgType = message.get(simplefix.TAG_MSGTYPE)
+    if msgType == simplefix.MSGTYPE_ORDER_CANCEL_REQUEST:
+        return PRIORITY_CANCEL_ALL if message.get(7559) == b"Y" else PRIORITY_CANCEL
+    if msgType == simplefix.MSGTYPE_ORDER_CANCEL_REPLACE_REQUEST:
+        return PRIORITY_REPLACE
+    if msgType == MSGTYPE_ORDER_MASS_CANCEL_REQUEST:
+        return PRIORITY_CANCEL_ALL
+    return PRIORITY_NEW
+
+
+def parseRateLimits(value):
+    """ Parse per MsgType limits "D:50/100,F:200" (MsgType:rate/burst, burst optional) into {msgType: (rate, burst)}."""
+    limits = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        msgType, _, limit = item.partition(":")
+        rate, _, burst = limit.partition("/")
+        limits[msgType.strip().encode()] = (float(rate), float(burst) if burst else None)
+    return limits
+
+
+class VirtualClock:
+    """ Clock for deterministic runs. Only moves when advanced."""
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+        return self.now
+
+
+class TokenBucket:
+    """ rate tokens per second up to burst. Tokens may go negative, the debt is repaid before the next release."""
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst=None, now=0.0):
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst else max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def available(self, now, count=1):
+        self._refill(now)
+        return self.tokens + TOKEN_EPSILON >= min(count, self.burst)
+
+    def take(self, now, count=1):
+        self._refill(now)
+        self.tokens -= count
+
+    def delay(self, now, count=1):
+        """ Seconds until count tokens (at most a full bucket) are available."""
+        self._refill(now)
+        missing = min(count, self.burst) - self.tokens
+        return missing / self.rate if missing > TOKEN_EPSILON else 0.0
+
+
+class ScheduledMessages:
+    """ Queue entry: messages submitted together and what the caller waits on."""
+    __slots__ = ("messages", "msgTypes", "priority", "submitted", "future")
+
+    def __init__(self, messages, msgTypes, priority, submitted, future):
+        self.messages = messages
+        self.msgTypes = msgTypes
+        self.priority = priority
+        self.submitted = submitted
+        self.future = future
+
+
+class FIXOutboundScheduler:
+    def __init__(self, rate=None, burst=None, msgTypeLimits=None, now=0.0):
+        self._session = TokenBucket(rate, burst, now) if rate else None
+        self._msgTypes = {msgType: TokenBucket(limitRate, limitBurst, now) for msgType, (limitRate, limitBurst) in (msgTypeLimits or {}).items()}
+        self._queues = tuple(deque() for _ in PRIORITY_NAMES)
+        self.depth = 0
+        self.maxDepth = 0
+        self.submittedCount = 0
+        self.immediate = 0
+        self.released = [0] * len(PRIORITY_NAMES)
+        self._wait = {}
+
+    def limited(self, msgType):
+        """ True when messages of msgType are subject to any limit."""
+        return self._session is not None or msgType in self._msgTypes
+
+    def tryRelease(self, msgType, now):
+        """ Take the tokens of one message and return True if it can be sent right away: nothing queued and within limits."""
+        if self.depth:
+            return False
+        session = self._session
+        bucket = self._msgTypes.get(msgType)
+        if (session is not None and not session.available(now)) or (bucket is not None and not bucket.available(now)):
+            return False
+        if session is not None:
+            session.take(now)
+        if bucket is not None:
+            bucket.take(now)
+        self.submittedCount += 1
+        self.immediate += 1
+        return True
+
+    def submit(self, messages, now, future=None):
+        """ Queue messages to be released together. Returns the queue entry."""
+        msgTypes = {}
+        priority = PRIORITY_NEW
+        for message in messages:
+            msgType = message.get(simplefix.TAG_MSGTYPE)
+            msgTypes[msgType] = msgTypes.get(msgType, 0) + 1
+            priority = min(priority, messagePriority(message))
+        entry = ScheduledMessages(messages, msgTypes, priority, now, future)
+        self._queues[priority].append(entry)
+        self.depth += len(messages)
+        self.maxDepth = max(self.maxDepth, self.depth)
+        self.submittedCount += len(messages)
+        return entry
+
+    def consume(self, msgType, now, count=1):
+        """ Take tokens for messages sent without queueing (session messages, resends)."""
+        if self._session is not None:
+            self._session.take(now, count)
+        bucket = self._msgTypes.get(msgType)
+        if bucket is not None:
+            bucket.take(now, count)
+
+    def _releasable(self, entry, now):
+        for msgType, count in entry.msgTypes.items():
+            bucket = self._msgTypes.get(msgType)
+            if bucket is not None and not bucket.available(now, count):
+                return False
+        return True
+
+    def poll(self, now):
+        """ Return (entries released at time now in send order, time of the next release or None when idle)."""
+        released = []
+        session = self._session
+        while self.depth:
+            entry = None
+            for queue in self._queues:
+                if queue and self._releasable(queue[0], now):
+                    entry = queue[0]
+                    break
+            if entry is None or (session is not None and not session.available(now, len(entry.messages))):
+                break
+            self._queues[entry.priority].popleft()
+            count = len(entry.messages)
+            if session is not None:
+                session.take(now, count)
+            for msgType, typeCount in entry.msgTypes.items():
+                bucket = self._msgTypes.get(msgType)
+                if bucket is not None:
+                    bucket.take(now, typeCount)
+            self.depth -= count
+            self.released[entry.priority] += count
+            self._waitHistogram(entry.priority).record(int((now - entry.submitted) * 1e9))
+            released.append(entry)
+        return released, self._nextRelease(now)
+
+    def _nextRelease(self, now):
+        if not self.depth:
+            return None
+        delay = None
+        for queue in self._queues:
+            if queue:
+                entry = queue[0]
+                entryDelay = 0.0
+                for msgType, count in entry.msgTypes.items():
+                    bucket = self._msgTypes.get(msgType)
+                    if bucket is not None:
+                        entryDelay = max(entryDelay, bucket.delay(now, count))
+                if self._session is not None:
+                    entryDelay = max(entryDelay, self._session.delay(now, len(entry.messages)))
+                delay = entryDelay if delay is None else min(delay, entryDelay)
+        return now + delay
+
+    def _waitHistogram(self, priority):
+        histogram = self._wait.get(priority)
+        if histogram is None:
+            histogram = self._wait[priority] = LatencyHistogram()
+        return histogram
+
+    def drain(self):
+        """ Remove and return every queued entry, e.g. when the session closes."""
+        entries = []
+        for queue in self._queues:
+            entries.extend(queue)
+            queue.clear()
+        self.depth = 0
+        return entries
+
+    def getStats(self, reset=False):
+        """ Queue depth, messages sent without queueing, messages released from the queue and queue wait time
+        summaries (microseconds) per priority."""
+        stats = {
+            "depth": self.depth,
+            "maxDepth": self.maxDepth,
+            "queued": {PRIORITY_NAMES[priority]: sum(len(entry.messages) for entry in queue) for priority, queue in enumerate(self._queues)},
+            "submitted": self.submittedCount,
+            "sentImmediately": self.immediate,
+            "released": dict(zip(PRIORITY_NAMES, self.released)),
+            "wait": {PRIORITY_NAMES[priority]: histogram.snapshot() for priority, histogram in sorted(self._wait.items())},
+        }
+        if reset:
+            for histogram in self._wait.values():
+                histogram.reset()
+            self.maxDepth = self.depth
+        return stats
@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+In-process pre-trade risk checks on the order send path.
+
+FIXRiskGate runs every NewOrderSingle and OrderCancelReplaceRequest through
+its checks before it is queued or encoded: kill switch, duplicate ClOrdID, max
+order quantity and notional, fat finger (quantity far above the running
+average of the symbol), price band against the last trade, and per symbol open
+order count and worst case position (position plus every open order on the
+same side filling). Each check reads a few counters of a per symbol
+SymbolRisk, so the cost does not depend on the number of orders or symbols.
+The counters are kept up to date from ExecutionReports: LastQty moves the
+position, once per ExecID so resent fills are not booked twice, LeavesQty the
+open quantity, terminal OrdStatus the open orders. An
+OrderCancelReject gives back what the rejected replace reserved, and release()
+what requests that were never sent reserved. With a price band or a max
+notional the last trade of each symbol follows the trade entries (269=2) of the
+market data as well as the fills; market orders are rejected by the notional
+check until a symbol has traded.
+
+Orders of a sendMany batch are checked and reserved one after the other and
+the whole batch is rolled back if any of them fails. A rejected order raises
+FIXRiskRejected and nothing is sent. The kill switch rejects every new order
+and sends a cancel all (7559=Y) request; it trips by itself when fills take a
+position past its limit. Checks are pluggable: addCheck(name, check) with
+check(order) returning the reject text or None.
+
+Quantities and prices are floats, or fixed-point units of their symbol when
+the gate has FIXInstruments. Limits are configured as decimals in both cases.
+With FIXInstruments an order of a symbol without an instrument definition is
+rejected.
+"""
+import asyncio
+import logging
+from collections import deque
+import simplefix
+from connectionHandler import SocketConnectionState
+from orderBook import iterEntries, MDENTRY_TRADE, MDUPDATE_DELETE
+
+TERMINAL_STATUS = frozenset([simplefix.ORDSTATUS_FILLED, simplefix.ORDSTATUS_CANCELED, simplefix.ORDSTATUS_REJECTED, simplefix.ORDSTATUS_EXPIRED, simplefix.ORDSTATUS_DONE_FOR_DAY])
+BUY_SIDES = frozenset([simplefix.SIDE_BUY, b"3"]) # Buy, Buy minus
+ORDER_MSGTYPES = frozenset([simplefix.MSGTYPE_NEW_ORDER_SINGLE, simplefix.MSGTYPE_ORDER_CANCEL_REPLACE_REQUEST])
+MARKET_DATA_MSGTYPES = (simplefix.MSGTYPE_MARKET_DATA_SNAPSHOT_FULL_REFRESH, simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH)
+
+logger = logging.getLogger(__name__)
+
+
+class FIXRiskRejected(ValueError):
+    def __init__(self, check, clOrdID, text):
+        self.check = check
+        self.clOrdID = clOrdID
+        self.text = text
+        ValueError.__init__(self, f"Order {clOrdID.decode() if isinstance(clOrdID, bytes) else clOrdID} rejected by {check}: {text}")
+
+
+def parseSymbolLimits(value):
+    """ Parse per symbol limits "BTC-USD:10/50,ETH-USD:100" (Symbol:maxPosition/maxOpenOrders, maxOpenOrders optional)
+    into {symbol: (maxPosition, maxOpenOrders)}."""
+    limits = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        symbol, _, limit = item.rpartition(":")
+        position, _, openOrders = limit.partition("/")
+        limits[symbol.strip().encode()] = (float(position) if position else None, int(openOrders) if openOrders else None)
+    return limits
+
+
+class SymbolRisk:
+    """ Limits (in the units of the symbol) and counters of one symbol."""
+    __slots__ = ("symbol", "parsePrice", "parseSize", "notionalScale", "maxOrderQty", "maxNotional", "maxPosition", "maxOpenOrders",
+                 "position", "openBuyQty", "openSellQty", "openOrders", "lastTrade", "averageQty", "orders")
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.position = 0
+        self.openBuyQty = 0
+        self.openSellQty = 0
+        self.openOrders = 0
+        self.lastTrade = None
+        self.averageQty = None
+        self.orders = 0
+
+    def __repr__(self):
+        return f"SymbolRisk(symbol={self.symbol}, position={self.position}, openBuyQty={self.openBuyQty}, openSellQty={self.openSellQty}, openOrders={self.openOrders}, lastTrade={self.lastTrade})"
+
+
+class _RiskOrder:
+    """ Open order as seen by the gate. pending is the exposure reserved by each replace request not answered yet."""
+    __slots__ = ("risk", "sign", "leaves", "cumQty", "clOrdIDs", "pending")
+
+    def __init__(self, risk, sign, leaves, clOrdID):
+        self.risk = risk
+        self.sign = sign
+        self.leaves = leaves
+        self.cumQty = 0
+        self.clOrdIDs = [clOrdID]
+        self.pending = {}
+
+
+class PreTradeOrder:
+    """ Order request passed to the checks. order is the open order a replace request refers to, exposure the
+    increase of open quantity if the request is accepted."""
+    __slots__ = ("msgType", "clOrdID", "origClOrdID", "symbol", "sign", "quantity", "price", "risk", "order", "exposure")
+
+
+class FIXRiskGate:
+    def __init__(self, maxOrderQty=None, maxNotional=None, maxPosition=None, maxOpenOrders=None, priceBand=None,
+                 fatFingerFactor=None, fatFingerOrders=100, symbolLimits=None, duplicateWindow=100000, instruments=None):
+        """ Limits are decimals, None to disable the check. priceBand is the largest relative distance to the last trade
+        (0.05 for 5%). fatFingerFactor rejects quantities above that many times the average quantity of the symbol,
+        an exponential moving average over about fatFingerOrders orders, once that many orders have been accepted.
+        symbolLimits overrides maxPosition and maxOpenOrders per symbol ({symbol: (maxPosition, maxOpenOrders)}).
+        The last duplicateWindow ClOrdIDs, and ExecIDs of the fills booked, are remembered."""
+        self._limits = (maxOrderQty, maxNotional, maxPosition, maxOpenOrders)
+        self._symbolLimits = {(symbol.encode() if isinstance(symbol, str) else symbol): limits for symbol, limits in (symbolLimits or {}).items()}
+        self._priceBand = priceBand
+        self._fatFingerFactor = fatFingerFactor
+        self._fatFingerOrders = fatFingerOrders
+        self._averageWeight = 2 / (fatFingerOrders + 1)
+        self._instruments = instruments
+        self._symbols = {}
+        self._orders = {}
+        self._clOrdIDs = set()
+        self._clOrdIDWindow = deque()
+        self._duplicateWindow = duplicateWindow
+        self._execIDs = set()
+        self._execIDWindow = deque()
+        self._engine = None
+        self._forward = {}
+        self._followsMarketData = priceBand is not None or maxNotional is not None
+        self.killed = None
+        self.cancelAll = None
+        self.cancelAllSent = None
+        self.rejects = {}
+        self._checks = [("killSwitch", self._checkKillSwitch), ("duplicateClOrdID", self._checkDuplicate)]
+        if maxOrderQty is not None:
+            self._checks.append(("maxOrderQty", self._checkOrderQty))
+        if maxNotional is not None:
+            self._checks.append(("maxNotional", self._checkNotional))
+        if fatFingerFactor is not None:
+            self._checks.append(("fatFinger", self._checkFatFinger))
+        if priceBand is not None:
+            self._checks.append(("priceBand", self._checkPriceBand))
+        if maxOpenOrders is not None or any(limits[1] is not None for limits in self._symbolLimits.values()):
+            self._checks.append(("openOrders", self._checkOpenOrders))
+        if maxPosition is not None or any(limits[0] is not None for limits in self._symbolLimits.values()):
+            self._checks.append(("position", self._checkPosition))
+
+    @staticmethod
+    def fromConfig(config, instruments=None):
+        """ FIXRiskGate from the Risk* options of a session, None unless RiskGate is set."""
+        if not config.getboolean('RiskGate', fallback=False):
+            return None
+        return FIXRiskGate(maxOrderQty=config.getfloat('RiskMaxOrderQty', fallback=None), maxNotional=config.getfloat('RiskMaxNotional', fallback=None),
+                           maxPosition=config.getfloat('RiskMaxPosition', fallback=None), maxOpenOrders=config.getint('RiskMaxOpenOrders', fallback=None),
+                           priceBand=config.getfloat('RiskPriceBand', fallback=None), fatFingerFactor=config.getfloat('RiskFatFingerFactor', fallback=None),
+                           fatFingerOrders=config.getint('RiskFatFingerOrders', fallback=100), symbolLimits=parseSymbolLimits(config.get('RiskSymbolLimits')),
+                           duplicateWindow=config.getint('RiskDuplicateWindow', fallback=100000), instruments=instruments)
+
+    def attach(self, engine, forward=True):
+        """ Follow the ExecutionReports and OrderCancelRejects of the engine, and its market data trades with a price
+        band or a max notional, and send its cancel all requests. Register after the other W and X handlers so every
+        market data message is seen. Called again for every new connection of a client so positions and the kill
+        switch survive reconnects."""
+        self._engine = engine
+        handlers = {simplefix.MSGTYPE_EXECUTION_REPORT: self.onExecutionReport, simplefix.MSGTYPE_ORDER_CANCEL_REJECT: self.onCancelReject}
+        if self._followsMarketData:
+            handlers.update((msgType, self.onMarketData) for msgType in MARKET_DATA_MSGTYPES)
+        for msgType, own in handlers.items():
+            handler = engine.getHandler(msgType)
+            if handler != own: # Not attached to this engine yet
+                self._forward[msgType] = handler if forward else None
+                engine.registerHandler(msgType, own)
+
+    def addCheck(self, name, check):
+        """ Run check(order) on every order request after the built-in checks. It returns the reject text or None."""
+        self._checks.append((name, check))
+
+    def getChecks(self):
+        return list(self._checks)
+
+    def getSymbolRisk(self, symbol):
+        """ Counters of a symbol, created on first use."""
+        symbol = symbol.encode() if isinstance(symbol, str) else symbol
+        risk = self._symbols.get(symbol)
+        if risk is None:
+            risk = self._symbols[symbol] = self._symbolRisk(symbol)
+        return risk
+
+    def _symbolRisk(self, symbol):
+        risk = SymbolRisk(symbol)
+        maxOrderQty, maxNotional, maxPosition, maxOpenOrders = self._limits
+        symbolPosition, symbolOpenOrders = self._symbolLimits.get(symbol, (None, None))
+        maxPosition = symbolPosition if symbolPosition is not None else maxPosition
+        risk.maxOpenOrders = symbolOpenOrders if symbolOpenOrders is not None else maxOpenOrders
+        if self._instruments is None:
+            risk.parsePrice = risk.parseSize = float
+            risk.notionalScale = 1
+            toSize = toNotional = lambda value: value
+        else:
+            priceCodec, sizeCodec = self._instruments.codecs(symbol)
+            risk.parsePrice = priceCodec.decode
+            risk.parseSize = sizeCodec.decode
+            risk.notionalScale = priceCodec.scale * sizeCodec.scale
+            toSize = sizeCodec.fromFloat
+            toNotional = lambda value: round(value * risk.notionalScale)
+        risk.maxOrderQty = toSize(maxOrderQty) if maxOrderQty is not None else None
+        risk.maxNotional = toNotional(maxNotional) if maxNotional is not None else None
+        risk.maxPosition = toSize(maxPosition) if maxPosition is not None else None
+        return risk
+
+    # Send path
+    def check(self, messages):
+        """ Check and reserve the order requests among messages. Raises FIXRiskRejected, with nothing reserved, if any fails."""
+        reserved = []
+        try:
+            for message in messages:
+                msgType = message.get(simplefix.TAG_MSGTYPE)
+                if msgType in ORDER_MSGTYPES:
+                    order = self._order(msgType, message)
+                    for name, check in self._checks:
+                        text = check(order)
+                        if text is not None:
+                            self.rejects[name] = self.rejects.get(name, 0) + 1
+                            raise FIXRiskRejected(name, order.clOrdID, text)
+                    reserved.append(self._reserve(order))
+        except Exception:
+            for undo in reversed(reserved):
+                self._release(*undo)
+            raise
+
+    def _order(self, msgType, message):
+        order = PreTradeOrder()
+        order.msgType = msgType
+        order.clOrdID = message.get(simplefix.TAG_CLORDID)
+        order.origClOrdID = message.get(simplefix.TAG_ORIGCLORDID)
+        symbol = message.get(simplefix.TAG_SYMBOL)
+        order.symbol = symbol
+        risk = self._symbols.get(symbol)
+        if risk is None:
+            risk = self._knownRisk(symbol)
+            if risk is None:
+                self.rejects["instrument"] = self.rejects.get("instrument", 0) + 1
+                raise FIXRiskRejected("instrument", order.clOrdID, "no Symbol" if symbol is None else f"no instrument definition for {symbol.decode()}")
+        order.risk = risk
+        order.sign = 1 if message.get(simplefix.TAG_SIDE) in BUY_SIDES else -1
+        quantity = message.get(simplefix.TAG_ORDERQTY)
+        price = message.get(simplefix.TAG_PRICE)
+        order.price = risk.parsePrice(price) if price is not None else None
+        order.order = self._orders.get(order.origClOrdID) if msgType == simplefix.MSGTYPE_ORDER_CANCEL_REPLACE_REQUEST else None
+        if quantity is not None:
+            order.quantity = risk.parseSize(quantity)
+        else: # Replace keeping the quantity
+            order.quantity = order.order.leaves + order.order.cumQty if order.order is not None else 0
+        if order.order is None:
+            order.exposure = order.quantity
+        else: # Replaced quantity includes what is already filled
+            order.exposure = max(order.quantity - order.order.cumQty - order.order.leaves, 0)
+        return order
+
+    def _reserve(self, order):
+        risk = order.risk
+        clOrdID = order.clOrdID
+        self._clOrdIDs.add(clOrdID)
+        self._clOrdIDWindow.append(clOrdID)
+        evicted = self._clOrdIDWindow.popleft() if len(self._clOrdIDWindow) > self._duplicateWindow else None
+        if evicted is not None:
+            self._clOrdIDs.discard(evicted)
+        if order.sign > 0:
+            risk.openBuyQty += order.exposure
+        else:
+            risk.openSellQty += order.exposure
+        previousAverage = risk.averageQty
+        risk.averageQty = order.quantity if previousAverage is None else previousAverage + (order.quantity - previousAverage) * self._averageWeight
+        risk.orders += 1
+        riskOrder = order.order
+        if riskOrder is None:
+            riskOrder = _RiskOrder(risk, order.sign, order.quantity, clOrdID)
+            risk.openOrders += 1
+        else:
+            riskOrder.leaves += order.exposure
+            riskOrder.clOrdIDs.append(clOrdID)
+            riskOrder.pending[clOrdID] = order.exposure
+        self._orders[clOrdID] = riskOrder
+        return order, previousAverage, evicted
+
+    def _release(self, order, previousAverage, evicted):
+        """ Undo _reserve of a batch that failed."""
+        risk = order.risk
+        self._clOrdIDs.discard(order.clOrdID)
+        self._clOrdIDWindow.pop()
+        if evicted is not None:
+            self._clOrdIDWindow.appendleft(evicted)
+            self._clOrdIDs.add(evicted)
+        if order.sign > 0:
+            risk.openBuyQty -= order.exposure
+        else:
+            risk.openSellQty -= order.exposure
+        risk.averageQty = previousAverage
+        risk.orders -= 1
+        riskOrder = self._orders.pop(order.clOrdID)
+        if order.order is None:
+            risk.openOrders -= 1
+        else:
+            riskOrder.leaves -= order.exposure
+            riskOrder.clOrdIDs.pop()
+            del riskOrder.pending[order.clOrdID]
+
+    def release(self, messages):
+        """ Give back what the order requests among messages reserved, for requests that were never sent (discarded
+        at disconnect). Their ClOrdIDs stay in the duplicate window."""
+        for message in messages:
+            if message.get(simplefix.TAG_MSGTYPE) not in ORDER_MSGTYPES:
+                continue
+            clOrdID = message.get(simplefix.TAG_CLORDID)
+            riskOrder = self._orders.get(clOrdID)
+            if riskOrder is None:
+                continue
+            if clOrdID in riskOrder.pending:
+                self._rollbackReplace(riskOrder, clOrdID)
+            elif riskOrder.clOrdIDs == [clOrdID] and riskOrder.cumQty == 0: # New order nobody has seen
+                risk = riskOrder.risk
+                if riskOrder.sign > 0:
+                    risk.openBuyQty -= riskOrder.leaves
+                else:
+                    risk.openSellQty -= riskOrder.leaves
+                risk.openOrders -= 1
+                del self._orders[clOrdID]
+
+    def _rollbackReplace(self, riskOrder, clOrdID):
+        """ Give back the exposure of a replace request that was rejected or never sent."""
+        exposure = riskOrder.pending.pop(clOrdID)
+        risk = riskOrder.risk
+        riskOrder.leaves -= exposure
+        if riskOrder.sign > 0:
+            risk.openBuyQty -= exposure
+        else:
+            risk.openSellQty -= exposure
+        riskOrder.clOrdIDs.remove(clOrdID)
+        del self._orders[clOrdID]
+
+    # Checks
+    def _checkKillSwitch(self, order):
+        if self.killed is not None:
+            return f"kill switch on: {self.killed}"
+        return None
+
+    def _checkDuplicate(self, order):
+        if order.clOrdID in self._clOrdIDs:
+            return "duplicate ClOrdID"
+        return None
+
+    def _checkOrderQty(self, order):
+        if order.quantity > order.risk.maxOrderQty:
+            return f"OrderQty above {order.risk.maxOrderQty}"
+        return None
+
+    def _checkNotional(self, order):
+        risk = order.risk
+        price = order.price if order.price is not None else risk.lastTrade
+        if price is None:
+            return "no price or last trade to check the notional"
+        if order.quantity * price > risk.maxNotional:
+            return f"notional above {risk.maxNotional / risk.notionalScale}"
+        return None
+
+    def _checkFatFinger(self, order):
+        risk = order.risk
+        if risk.orders >= self._fatFingerOrders and order.quantity > risk.averageQty * self._fatFingerFactor:
+            return f"OrderQty more than {self._fatFingerFactor} times the average"
+        return None
+
+    def _checkPriceBand(self, order):
+        lastTrade = order.risk.lastTrade
+        if order.price is not None and lastTrade is not None and abs(order.price - lastTrade) > lastTrade * self._priceBand:
+            return f"Price more than {self._priceBand:.2%} away from the last trade"
+        return None
+
+    def _checkOpenOrders(self, order):
+        risk = order.risk
+        if order.order is None and risk.maxOpenOrders is not None and risk.openOrders >= risk.maxOpenOrders:
+            return f"{risk.openOrders} open orders"
+        return None
+
+    def _checkPosition(self, order):
+        risk = order.risk
+        if risk.maxPosition is None:
+            return None
+        if order.sign > 0:
+            if risk.position + risk.openBuyQty + order.exposure > risk.maxPosition:
+                return "worst case long position above the limit"
+        elif risk.position - risk.openSellQty - order.exposure < -risk.maxPosition:
+            return "worst case short position above the limit"
+        return None
+
+    # Counters
+    async def onExecutionReport(self, message):
+        self.applyExecutionReport(message)
+        forward = self._forward.get(simplefix.MSGTYPE_EXECUTION_REPORT)
+        if forward is not None:
+            await forward(message)
+
+    async def onCancelReject(self, message):
+        self.applyCancelReject(message)
+        forward = self._forward.get(simplefix.MSGTYPE_ORDER_CANCEL_REJECT)
+        if forward is not None:
+            await forward(message)
+
+    async def onMarketData(self, message):
+        self.applyMarketData(message)
+        forward = self._forward.get(message.get(simplefix.TAG_MSGTYPE))
+        if forward is not None:
+            await forward(message)
+
+    def _knownRisk(self, symbol):
+        """ SymbolRisk of a symbol, None without Symbol or, with instruments, an instrument definition."""
+        risk = self._symbols.get(symbol)
+        if risk is None and symbol is not None and (self._instruments is None or self._instruments.find(symbol) is not None):
+            risk = self.getSymbolRisk(symbol)
+        return risk
+
+    def applyExecutionReport(self, message):
+        clOrdID = message.get(simplefix.TAG_CLORDID)
+        riskOrder = self._orders.get(clOrdID) or self._orders.get(message.get(simplefix.TAG_ORIGCLORDID))
+        risk = riskOrder.risk if riskOrder is not None else self._knownRisk(message.get(simplefix.TAG_SYMBOL))
+        if risk is None: # Not an order of ours and no symbol to book the fill against
+            return
+        lastQty = message.get(simplefix.TAG_LASTQTY)
+        if lastQty is not None and message.get(simplefix.TAG_EXECTYPE) == simplefix.EXECTYPE_TRADE:
+            execID = message.get(simplefix.TAG_EXECID)
+            if execID is not None:
+                if execID in self._execIDs: # Fill resent (PossDupFlag) after a resend or gap fill
+                    return
+                self._execIDs.add(execID)
+                self._execIDWindow.append(execID)
+                if len(self._execIDWindow) > self._duplicateWindow:
+                    self._execIDs.discard(self._execIDWindow.popleft())
+            quantity = risk.parseSize(lastQty)
+            risk.position += quantity if message.get(simplefix.TAG_SIDE) in BUY_SIDES else -quantity
+            lastPx = message.get(simplefix.TAG_LASTPX)
+            if lastPx is not None:
+                risk.lastTrade = risk.parsePrice(lastPx)
+            if risk.maxPosition is not None and abs(risk.position) > risk.maxPosition and self.killed is None:
+                self.kill(f"{risk.symbol.decode()} position {risk.position} above the limit")
+        if riskOrder is None:
+            return
+        cumQty = message.get(simplefix.TAG_CUMQTY)
+        if cumQty is not None:
+            riskOrder.cumQty = risk.parseSize(cumQty)
+        status = message.get(simplefix.TAG_ORDSTATUS)
+        if status == simplefix.ORDSTATUS_REJECTED and clOrdID in riskOrder.pending: # Replace rejected, the order keeps working
+            self._rollbackReplace(riskOrder, clOrdID)
+            return
+        if riskOrder.pending:
+            riskOrder.pending.pop(clOrdID, None) # Replace answered
+        leavesQty = message.get(simplefix.TAG_LEAVESQTY)
+        if status in TERMINAL_STATUS:
+            leaves = 0
+        elif leavesQty is not None: # Replaces still pending keep their reservation
+            leaves = risk.parseSize(leavesQty) + (sum(riskOrder.pending.values()) if riskOrder.pending else 0)
+        else:
+            leaves = riskOrder.leaves
+        if riskOrder.sign > 0:
+            risk.openBuyQty += leaves - riskOrder.leaves
+        else:
+            risk.openSellQty += leaves - riskOrder.leaves
+        riskOrder.leaves = leaves
+        if status in TERMINAL_STATUS:
+            risk.openOrders -= 1
+            riskOrder.pending.clear()
+            for alias in riskOrder.clOrdIDs:
+                self._orders.pop(alias, None)
+
+    def applyCancelReject(self, message):
+        """ A rejected replace gives back what it reserved. The order keeps working as it was."""
+        clOrdID = message.get(simplefix.TAG_CLORDID)
+        riskOrder = self._orders.get(clOrdID)
+        if riskOrder is not None and clOrdID in riskOrder.pending:
+            self._rollbackReplace(riskOrder, clOrdID)
+
+    def applyMarketData(self, message):
+        """ Last trade of the symbols with trade entries (269=2) in a W or X message."""
+        isSnapshot = message.get(simplefix.TAG_MSGTYPE) == simplefix.MSGTYPE_MARKET_DATA_SNAPSHOT_FULL_REFRESH
+        symbol = message.get(simplefix.TAG_SYMBOL)
+        for action, entryType, entrySymbol, price, size in iterEntries(message, isSnapshot):
+            if entryType == MDENTRY_TRADE and price is not None and action != MDUPDATE_DELETE:
+                risk = self._knownRisk(entrySymbol or symbol)
+                if risk is not None:
+                    risk.lastTrade = risk.parsePrice(price)
+
+    def updateLastTrade(self, symbol, price):
+        """ Last trade of a symbol (a price in the units of the symbol), for the price band and the notional of
+        market orders, from a source other than the market data of the attached engine."""
+        self.getSymbolRisk(symbol).lastTrade = price
+
+    # Kill switch
+    def kill(self, reason):
+        """ Reject every new order from now on and cancel all open orders (7559=Y) on the attached engine.
+        Returns the task sending the cancel all request, also kept in cancelAll. cancelAllSent turns True once it
+        is sent, False if it could not be."""
+        if self.killed is None:
+            self.killed = reason
+            logger.error(f"Kill switch: {reason}")
+        if self._engine is None:
+            return None
+        self.cancelAllSent = None
+        self.cancelAll = asyncio.ensure_future(self._sendCancelAll(self._engine))
+        self.cancelAll.add_done_callback(self._cancelAllDone)
+        return self.cancelAll
+
+    async def _sendCancelAll(self, engine):
+        if engine.getConnectionState() not in (SocketConnectionState.CONNECTED, SocketConnectionState.LOGGED_IN):
+            raise ConnectionError("Session closed")
+        await engine.sendMessage(engine.clientMessage.orderCancelRequest(cancelAll=True))
+
+    def _cancelAllDone(self, task):
+        if task is not self.cancelAll: # Superseded by a later kill
+            return
+        if task.cancelled():
+            self.cancelAllSent = False
+            logger.error("Kill switch: cancel all request cancelled before it was sent")
+        elif task.exception() is not None:
+            self.cancelAllSent = False
+            logger.error("Kill switch: cancel all request not sent", exc_info=task.exception())
+        else:
+            self.cancelAllSent = True
+
+    def reset(self):
+        """ Accept orders again after the kill switch."""
+        self.killed = None
+
+    def getStats(self):
+        return {
+            "killed": self.killed,
+            "cancelAllSent": self.cancelAllSent,
+            "rejects": dict(self.rejects),
+            "openOrders": len(set(map(id, self._orders.values()))),
+            "symbols": {symbol.decode(): {"position": risk.position, "openBuyQty": risk.openBuyQty, "openSellQty": risk.openSellQty, "openOrders": risk.openOrders, "lastTrade": risk.lastTrade} for symbol, risk in self._symbols.items()},
+        }
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+Sequence numbers of a FIX session persisted in a memory mapped file.
+
+The file holds a header, the last outbound MsgSeqNum and the next expected
+inbound MsgSeqNum. Both are written in place on every change with a single
+pack_into over the mapping, so they survive a crash of the process as soon as
+they are set. flush() (called on close) msyncs them for an OS crash or power
+loss. A session that finds numbers in the file resumes with them instead of
+logging on with ResetSeqNumFlag=Y.
+"""
+import mmap
+import os
+import struct
+
+HEADER = struct.Struct("<4sI")
+SEQNO = struct.Struct("<Q")
+MAGIC = b"FXSQ"
+VERSION = 1
+OUTBOUND_OFFSET = HEADER.size
+INBOUND_OFFSET = HEADER.size + SEQNO.size
+FILE_SIZE = HEADER.size + 2 * SEQNO.size
+
+
+class FIXSequenceStore:
+    def __init__(self, filename):
+        with open(filename, "a+b") as f:
+            if os.path.getsize(filename) < FILE_SIZE:
+                f.truncate(FILE_SIZE)
+        self._file = open(filename, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), FILE_SIZE)
+        magic, version = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            if magic != bytes(len(MAGIC)):
+                self.close()
+                raise ValueError(f"{filename} is not a sequence number file")
+            HEADER.pack_into(self._map, 0, MAGIC, VERSION)
+            self.store(0, 1)
+        elif version != VERSION:
+            self.close()
+            raise ValueError(f"{filename}: unsupported sequence number file version {version}")
+
+    def load(self):
+        """ (last outbound MsgSeqNum, next expected inbound MsgSeqNum)."""
+        return SEQNO.unpack_from(self._map, OUTBOUND_OFFSET)[0], SEQNO.unpack_from(self._map, INBOUND_OFFSET)[0]
+
+    def setOutboundSeqNo(self, seqNo):
+        SEQNO.pack_into(self._map, OUTBOUND_OFFSET, seqNo)
+
+    def setNextExpectedSeqNo(self, seqNo):
+        SEQNO.pack_into(self._map, INBOUND_OFFSET, seqNo)
+
+    def store(self, outboundSeqNo, nextExpectedSeqNo):
+        self.setOutboundSeqNo(outboundSeqNo)
+        self.setNextExpectedSeqNo(nextExpectedSeqNo)
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        if self._map.closed:
+            return
+        self.flush()
+        self._map.close()
+        self._file.close()
@@ -30,12 +30,20 @@ logger.setLevel(logging.INFO)
 # logging.basicConfig(filename='logs/fix_logs.log', format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
 class FIXSessionHandler:
-    def __init__(self, targetCompID, senderCompID):
+    def __init__(self, targetCompID, senderCompID, sequenceStore=None, gapBufferSize=0):
+        """ sequenceStore (FIXSequenceStore) persists the sequence numbers and provides the initial ones.
+        gapBufferSize bounds the number of messages held back while waiting for a resend."""
         self._targetCompID = targetCompID
         self._senderCompID = senderCompID
+        self._sequenceStore = sequenceStore
 
         self._outboundSeqNo = 0
         self._nextExpectedSeqNo = 1
+        if sequenceStore is not None:
+            self._outboundSeqNo, self._nextExpectedSeqNo = sequenceStore.load()
+        self._gapBufferSize = gapBufferSize
+        self._buffered = {}
+        self._resendRequestedTo = 0
 
     def validateCompIDs(self, targetCompID, senderCompID):
         return self._targetCompID == targetCompID and self._senderCompID == senderCompID
@@ -47,15 +55,76 @@ class FIXSessionHandler:
         else:
             return True, msgSeqNo
     
+    def getOutboundSeqNo(self):
+        return self._outboundSeqNo
+
+    def getNextExpectedSeqNo(self):
+        return self._nextExpectedSeqNo
+
+    def isResumable(self):
+        """ True when persisted sequence numbers are in use, so Logon must not reset them."""
+        return self._sequenceStore is not None and (self._outboundSeqNo > 0 or self._nextExpectedSeqNo > 1)
+
     def resetSeqNo(self):
         self._outboundSeqNo = 0
         self._nextExpectedSeqNo = 1
+        self._buffered.clear()
+        self._resendRequestedTo = 0
+        if self._sequenceStore is not None:
+            self._sequenceStore.store(0, 1)
     
     def updateRecvSeqNo(self, msgSeqNo):
-        self._nextExpectedSeqNo = int(msgSeqNo) + 1
+        # Never move backwards. A SequenceReset may already have advanced the expected number
+        nextExpectedSeqNo = int(msgSeqNo) + 1
+        if nextExpectedSeqNo > self._nextExpectedSeqNo:
+            if self._buffered and nextExpectedSeqNo > self._nextExpectedSeqNo + 1:
+                for seqNo in [seqNo for seqNo in self._buffered if seqNo < nextExpectedSeqNo]: # Skipped by a SequenceReset
+                    del self._buffered[seqNo]
+            self._nextExpectedSeqNo = nextExpectedSeqNo
+            if self._sequenceStore is not None:
+                self._sequenceStore.setNextExpectedSeqNo(nextExpectedSeqNo)
+
+    def bufferMessage(self, msgSeqNo, message):
+        """ Hold a message received ahead of the expected sequence number. message None marks a sequence number
+        already processed (e.g. a Logon). Returns the range (begin, end) to request again if this message opened a
+        new gap, None otherwise. Raises OverflowError when the gap buffer is full."""
+        if msgSeqNo not in self._buffered and len(self._buffered) >= self._gapBufferSize:
+            raise OverflowError(f"Gap buffer full: {len(self._buffered)} messages waiting for {self._nextExpectedSeqNo}")
+        self._buffered[msgSeqNo] = message
+        if msgSeqNo - 1 <= self._resendRequestedTo or msgSeqNo - 1 in self._buffered:
+            return None
+        begin = max(self._nextExpectedSeqNo, self._resendRequestedTo + 1)
+        self._resendRequestedTo = msgSeqNo - 1
+        return begin, msgSeqNo - 1
+
+    def popBuffered(self):
+        """ Next held back message once it is in sequence as (MsgSeqNum, message), None if there is none."""
+        while self._buffered:
+            message = self._buffered.pop(self._nextExpectedSeqNo, False)
+            if message is False:
+                return None
+            if message is not None:
+                return self._nextExpectedSeqNo, message
+            self.updateRecvSeqNo(self._nextExpectedSeqNo)
+        return None
+
+    def getBufferedCount(self):
+        return len(self._buffered)
 
     def sequenceNumHandler(self, message: simplefix.FixMessage):
         """ Append Correct Sequence Number to FIX Message."""
         assert isinstance(message, simplefix.FixMessage)
+        seqNo = self.nextOutboundSeqNo()
+        message.append_pair(34, seqNo, header=True)
+        return seqNo
+
+    def nextOutboundSeqNo(self):
+        """ Reserve the next outbound Sequence Number."""
         self._outboundSeqNo += 1
-        message.append_pair(34, self._outboundSeqNo, header=True)        
\ No newline at end of file
+        if self._sequenceStore is not None:
+            self._sequenceStore.setOutboundSeqNo(self._outboundSeqNo)
+        return self._outboundSeqNo
+
+    def close(self):
+        if self._sequenceStore is not None:
+            self._sequenceStore.close()
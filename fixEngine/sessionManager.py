@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Runs every gateway section of a configuration file as a FIX session on one event loop.
+
+Sessions are plain asyncio tasks, so dozens of them share a single thread. A
+supervisor task samples each session every SupervisorInterval seconds to compute
+throughput and restarts sessions that dropped, after ReconnectInterval seconds
+doubled for every consecutive failed attempt (see FIXClient.nextReconnectDelay).
+uvloop is used when installed.
+"""
+import asyncio
+import configparser
+import logging
+from fixEngine import FIXClient
+from connectionHandler import SocketConnectionState
+
+logger = logging.getLogger(__name__)
+
+
+def createEventLoop(useUvloop=True):
+    """ New event loop. uvloop when available and requested, asyncio default loop otherwise."""
+    if useUvloop:
+        try:
+            import uvloop
+            return uvloop.new_event_loop()
+        except ImportError:
+            logger.info("uvloop not installed. Using default asyncio event loop")
+    return asyncio.new_event_loop()
+
+
+class FIXSessionManager:
+    def __init__(self, configFile, listener, gateways=None, supervisorInterval=1.0):
+        """ listener is a coroutine function used by every session or a dict of gateway -> listener.
+        gateways defaults to every section of the file with a SocketHost option, in file order."""
+        parser = configparser.ConfigParser()
+        parser.read(configFile)
+        if gateways is None:
+            gateways = [section for section in parser.sections() if parser.has_option(section, 'SocketHost')]
+        self._configFile = configFile
+        self._gateways = list(gateways)
+        self._clients = {}
+        for gateway in self._gateways:
+            sessionListener = listener.get(gateway) if isinstance(listener, dict) else listener
+            self._clients[gateway] = FIXClient(configFile, gateway, sessionListener)
+        self._supervisorInterval = supervisorInterval
+        self._supervisor = None
+        self._restarting = set()
+        self._stopping = False
+        self._stats = {gateway: {} for gateway in self._gateways}
+        self._lastSample = {}
+
+    def getGateways(self):
+        return list(self._gateways)
+
+    def getClient(self, gateway):
+        return self._clients[gateway]
+
+    def getSession(self, gateway):
+        """ FixEngine of a gateway, None until connected."""
+        return self._clients[gateway].getClient()
+
+    async def start(self):
+        """ Connect every session concurrently and start the supervisor."""
+        self._stopping = False
+        results = await asyncio.gather(*(self._startSession(gateway) for gateway in self._gateways), return_exceptions=True)
+        for gateway, result in zip(self._gateways, results):
+            if isinstance(result, Exception):
+                logger.error(f"{gateway} failed to start: {result}")
+        self._supervisor = asyncio.ensure_future(self._supervise())
+
+    async def _startSession(self, gateway):
+        await self._clients[gateway].startClient()
+        logger.info(f"{gateway} session started")
+
+    async def _restartSession(self, gateway):
+        try:
+            await asyncio.sleep(self._clients[gateway].nextReconnectDelay())
+            if not self._stopping:
+                await self._startSession(gateway)
+        except Exception as e:
+            logger.error(f"{gateway} failed to restart: {e}")
+        finally:
+            self._restarting.discard(gateway)
+
+    async def _supervise(self):
+        loop = asyncio.get_event_loop()
+        while not self._stopping:
+            await asyncio.sleep(self._supervisorInterval)
+            now = loop.time()
+            for gateway in self._gateways:
+                session = self.getSession(gateway)
+                if session is None or session.getConnectionState() == SocketConnectionState.DISCONNECTED:
+                    self._stats[gateway] = {"state": SocketConnectionState.DISCONNECTED.name}
+                    if gateway not in self._restarting and not self._stopping:
+                        logger.warning(f"{gateway} session down. Restarting")
+                        self._restarting.add(gateway)
+                        asyncio.ensure_future(self._restartSession(gateway))
+                    continue
+                stats = session.getStats()
+                previous = self._lastSample.get(gateway)
+                if previous is not None and previous[0] is session and now > previous[1]:
+                    elapsed = now - previous[1]
+                    stats["receivedPerSecond"] = (stats["messagesReceived"] - previous[2]["messagesReceived"]) / elapsed
+                    stats["sentPerSecond"] = (stats["messagesSent"] - previous[2]["messagesSent"]) / elapsed
+                self._lastSample[gateway] = (session, now, stats)
+                self._stats[gateway] = stats
+
+    def getStats(self):
+        """ Latest health and throughput sample per gateway."""
+        return {gateway: dict(stats) for gateway, stats in self._stats.items()}
+
+    def getLatencySnapshots(self, reset=False):
+        """ Latency histogram summaries per connected gateway with LatencyMetrics enabled."""
+        return self._collect("getLatencySnapshot", reset)
+
+    def getSchedulerStats(self, reset=False):
+        """ Outbound rate limiter queue statistics per connected gateway with RateLimit configured."""
+        return self._collect("getSchedulerStats", reset)
+
+    def getDispatchStats(self, reset=False):
+        """ Listener dispatch queue statistics per connected gateway with DispatchWorkers configured."""
+        return self._collect("getDispatchStats", reset)
+
+    def _collect(self, method, reset):
+        results = {}
+        for gateway in self._gateways:
+            session = self.getSession(gateway)
+            result = getattr(session, method)(reset) if session is not None else None
+            if result is not None:
+                results[gateway] = result
+        return results
+
+    async def stop(self, logoutTimeout=None):
+        """ Logout and close every session, one after the other in configuration order."""
+        self._stopping = True
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            self._supervisor = None
+        for gateway in self._gateways:
+            session = self.getSession(gateway)
+            if session is not None and session.getConnectionState() != SocketConnectionState.DISCONNECTED:
+                logger.info(f"{gateway} session stopping")
+                await session.disconnect(logoutTimeout)
+
+    def run(self, useUvloop=True):
+        """ Run every session until interrupted, then shut them down."""
+        loop = createEventLoop(useUvloop)
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.start())
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            loop.run_until_complete(self.stop())
+            loop.close()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExchangeConnector fixEngine
+
+Copyright (c) 2020 Hugo Nistal Gonzalez
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Single producer, multi consumer ring buffer in shared memory used to fan decoded
+market data and execution events out to strategy processes.
+
+The engine process writes fixed-size records into a multiprocessing.shared_memory
+segment and never waits for readers. Every consumer process attaches by name and
+keeps its own sequence cursor, so a slow strategy only falls behind itself. A
+consumer lapped by the producer detects the overrun, counts the lost records and
+resumes from the oldest record still in the ring. RingBufferReader.wait blocks
+until the cursor moves: it busy polls, then yields the CPU, then sleeps, so
+consumers sharing cores with the producer do not starve it.
+
+Segment layout (native byte order, every sequence field 8 byte aligned):
+    0    <8s magic><uint32 recordSize><uint32 capacity>
+    64   <uint64 cursor>  last published sequence number, 0 while empty
+    128  capacity slots of <uint64 sequence><recordSize bytes, padded to 8>
+
+Publishing a record zeroes the slot sequence, writes the record, stores the slot
+sequence and finally advances the cursor. Readers check the slot sequence before
+and after copying a record, so a record overwritten while being read is reported
+as an overrun instead of being returned torn. This relies on the stores becoming
+visible in program order, which x86 guarantees.
+"""
+import logging
+import math
+import os
+import struct
+import time
+from collections import namedtuple
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+import simplefix
+from orderBook import iterEntries
+
+MAGIC = b"FIXRING1"
+HEADER = struct.Struct("=8sII")
+CURSOR_WORD = 8
+SLOTS_OFFSET = 128
+SLOTS_WORD = SLOTS_OFFSET // 8
+
+# Event records. Every record starts with <int64 timestamp ns><int64 MsgSeqNum><1 byte MsgType>
+SYMBOL_SIZE = 24
+MDREQID_SIZE = 24
+ID_SIZE = 40 # ClOrdID and OrderID
+MARKET_DATA_RECORD = struct.Struct(f"=qqccc5x{SYMBOL_SIZE}s{MDREQID_SIZE}sdd")
+EXECUTION_RECORD = struct.Struct(f"=qqcccc4x{SYMBOL_SIZE}s{ID_SIZE}s{ID_SIZE}sddddd")
+EVENT_RECORD_SIZE = max(MARKET_DATA_RECORD.size, EXECUTION_RECORD.size)
+MSGTYPE_OFFSET = 16
+
+MarketDataEvent = namedtuple("MarketDataEvent", "timestamp msgSeqNum msgType updateAction entryType symbol mdReqID price size")
+ExecutionEvent = namedtuple("ExecutionEvent", "timestamp msgSeqNum msgType execType ordStatus side symbol clOrdID orderID lastPx lastQty cumQty leavesQty avgPx")
+
+TAG_MDREQID = 262
+NAN = math.nan
+# RingBufferReader.wait strategy
+SPIN_POLLS = 2000
+YIELD_POLLS = 200
+SLEEP_SECONDS = 20e-6
+MAX_SLEEP_SECONDS = 100e-6
+_yield = getattr(os, "sched_yield", lambda: time.sleep(0))
+
+logger = logging.getLogger(__name__)
+_created = set()
+
+
+class SharedRingBuffer:
+    """ Producer side. Creates the shared memory segment, capacity is rounded up to a power of two."""
+    def __init__(self, name=None, recordSize=EVENT_RECORD_SIZE, capacity=65536):
+        capacity = 1 << max(capacity - 1, 1).bit_length()
+        self.recordSize = recordSize
+        self.capacity = capacity
+        self._slotWords = 1 + (recordSize + 7) // 8
+        self._mask = capacity - 1
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=SLOTS_OFFSET + capacity * self._slotWords * 8)
+        self._buffer = self._shm.buf
+        self._words = self._buffer.cast("Q") # Sequence fields are written as single aligned 8 byte stores
+        HEADER.pack_into(self._buffer, 0, MAGIC, recordSize, capacity)
+        self._words[CURSOR_WORD] = 0
+        self._next = 1
+        self.name = self._shm.name
+        _created.add(self.name)
+
+    def publish(self, record, *values):
+        """ Pack values with the record Struct straight into the next slot. Returns its sequence number."""
+        sequence = self._next
+        index = SLOTS_WORD + (sequence & self._mask) * self._slotWords
+        words = self._words
+        words[index] = 0
+        record.pack_into(self._buffer, index * 8 + 8, *values)
+        words[index] = sequence
+        words[CURSOR_WORD] = sequence
+        self._next = sequence + 1
+        return sequence
+
+    def publishBytes(self, data):
+        """ Copy an already packed record (at most recordSize bytes) into the next slot."""
+        sequence = self._next
+        index = SLOTS_WORD + (sequence & self._mask) * self._slotWords
+        words = self._words
+        words[index] = 0
+        offset = index * 8 + 8
+        self._buffer[offset:offset + len(data)] = data
+        words[index] = sequence
+        words[CURSOR_WORD] = sequence
+        self._next = sequence + 1
+        return sequence
+
+    def lastSequence(self):
+        return self._next - 1
+
+    def close(self):
+        """ Release and unlink the segment. Attached readers keep their mapping until they close."""
+        if self._shm is None:
+            return
+        self._words.release()
+        self._words = self._buffer = None
+        self._shm.close()
+        self._shm.unlink()
+        _created.discard(self.name)
+        self._shm = None
+
+
+class RingBufferReader:
+    """ Consumer side. Attaches to an existing segment by name, starting at the oldest record unless fromLatest."""
+    def __init__(self, name, fromLatest=False):
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError: # Python < 3.13 registers attached segments with the resource tracker
+            self._shm = shared_memory.SharedMemory(name=name)
+            if multiprocessing.parent_process() is None and name not in _created: # Own tracker, it would unlink the segment when this process exits
+                resource_tracker.unregister(self._shm._name, "shared_memory")
+        self._buffer = self._shm.buf
+        magic, self.recordSize, self.capacity = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            self._buffer = None
+            self._shm.close()
+            raise ValueError(f"{name} is not a FIX ring buffer")
+        self._words = self._buffer.cast("Q")
+        self._slotWords = 1 + (self.recordSize + 7) // 8
+        self._mask = self.capacity - 1
+        cursor = self.cursor()
+        self._next = cursor + 1 if fromLatest else max(1, cursor - self.capacity + 1)
+        self.received = 0
+        self.lost = 0
+        self.overruns = 0
+
+    def cursor(self):
+        """ Last sequence number published by the producer."""
+        return self._words[CURSOR_WORD]
+
+    def lag(self):
+        """ Records published but not yet read."""
+        return self.cursor() - self._next + 1
+
+    def wait(self, timeout=None, spins=SPIN_POLLS, yields=YIELD_POLLS, sleep=SLEEP_SECONDS, maxSleep=MAX_SLEEP_SECONDS):
+        """ Block until a record not yet read is published or timeout seconds pass. Returns whether one is there.
+        Busy polls the cursor spins times, then gives the CPU away yields times, then sleeps doubling from sleep
+        up to maxSleep. Spinning is fastest with a core per process, yielding and sleeping leave the CPU to the
+        producer when processes share cores."""
+        words = self._words
+        last = self._next - 1
+        for _ in range(spins):
+            if words[CURSOR_WORD] != last:
+                return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for _ in range(yields):
+            if words[CURSOR_WORD] != last:
+                return True
+            _yield()
+        while words[CURSOR_WORD] == last:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                sleep = min(sleep, remaining)
+            time.sleep(sleep)
+            sleep = min(sleep * 2, maxSleep)
+        return True
+
+    def poll(self, maxRecords=1024, record=None):
+        """ Read up to maxRecords new records without blocking. Records are returned as bytes or,
+        with a record Struct, as unpacked tuples. Overruns are counted in lost and overruns."""
+        words = self._words
+        buffer = self._buffer
+        cursor = words[CURSOR_WORD]
+        sequence = self._skipOverrun(cursor)
+        last = min(cursor, sequence + maxRecords - 1)
+        recordSize = self.recordSize
+        slotWords = self._slotWords
+        mask = self._mask
+        records = []
+        while sequence <= last:
+            index = SLOTS_WORD + (sequence & mask) * slotWords
+            if words[index] != sequence:
+                break
+            offset = index * 8 + 8
+            if record is None:
+                value = bytes(buffer[offset:offset + recordSize])
+            else:
+                value = record.unpack_from(buffer, offset)
+            if words[index] != sequence:
+                break # Overwritten while being read
+            records.append(value)
+            sequence += 1
+        self._next = sequence
+        self.received += len(records)
+        if sequence <= last:
+            self._skipOverrun(words[CURSOR_WORD], force=True)
+        return records
+
+    def _skipOverrun(self, cursor, force=False):
+        oldest = max(1, cursor - self.capacity + 1)
+        if force:
+            oldest += 1 # The producer is writing the oldest slot
+        if self._next < oldest:
+            self.lost += oldest - self._next
+            self.overruns += 1
+            self._next = oldest
+        return self._next
+
+    def close(self):
+        if self._shm is None:
+            return
+        self._words.release()
+        self._words = self._buffer = None
+        self._shm.close()
+        self._shm = None
+
+
+def _text(value):
+    if value is None:
+        return b""
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+def _field(value, size, name):
+    """ Text of a fixed size record field. struct would silently truncate it."""
+    value = _text(value)
+    if len(value) > size:
+        raise ValueError(f"{name} {value!r} longer than the {size} bytes of its record field")
+    return value
+
+
+def _number(value, parse=float):
+    return NAN if value is None else parse(value)
+
+
+def _strip(value):
+    return value.rstrip(b"\0")
+
+
+def decodeEvent(data):
+    """ MarketDataEvent or ExecutionEvent from a packed event record."""
+    if data[MSGTYPE_OFFSET:MSGTYPE_OFFSET + 1] == simplefix.MSGTYPE_EXECUTION_REPORT:
+        values = EXECUTION_RECORD.unpack_from(data)
+        return ExecutionEvent(*values[:6], _strip(values[6]), _strip(values[7]), _strip(values[8]), *values[9:])
+    values = MARKET_DATA_RECORD.unpack_from(data)
+    return MarketDataEvent(*values[:5], _strip(values[5]), _strip(values[6]), *values[7:])
+
+
+class FIXEventReader(RingBufferReader):
+    """ RingBufferReader for rings written by FIXEventPublisher."""
+    def pollEvents(self, maxRecords=1024):
+        return [decodeEvent(data) for data in self.poll(maxRecords)]
+
+
+class FIXEventPublisher:
+    """ Writes one record per MD entry of W/X messages and one per ExecutionReport into a SharedRingBuffer.
+    W entries of one snapshot share its MsgSeqNum, so consumers clear the book on the first of them."""
+    def __init__(self, ring, parsePrice=float, parseSize=float):
+        self._ring = ring
+        self._parsePrice = parsePrice
+        self._parseSize = parseSize
+        self._forward = {}
+
+    def attach(self, engine, forward=True):
+        """ Register in front of the current W, X and 8 handlers (e.g. the Order Cache). With forward they still get every message."""
+        for msgType in (simplefix.MSGTYPE_MARKET_DATA_SNAPSHOT_FULL_REFRESH, simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH, simplefix.MSGTYPE_EXECUTION_REPORT):
+            self._forward[msgType] = engine.getHandler(msgType) if forward else None
+            engine.registerHandler(msgType, self.onMessage)
+
+    async def onMessage(self, message):
+        try:
+            self.publish(message)
+        except ValueError as e:
+            logger.error(f"Message {message.get(simplefix.TAG_MSGSEQNUM)} not published: {e}")
+        forward = self._forward.get(message.get(simplefix.TAG_MSGTYPE))
+        if forward is not None:
+            await forward(message)
+
+    def publish(self, message, timestamp=None):
+        """ Publish the events of a W, X or 8 message. Returns the number of records written. Raises ValueError,
+        publishing nothing, when a Symbol, MDReqID, ClOrdID or OrderID does not fit its record field."""
+        if timestamp is None:
+            timestamp = time.time_ns()
+        msgType = message.get(simplefix.TAG_MSGTYPE)
+        msgSeqNum = int(message.get(simplefix.TAG_MSGSEQNUM) or 0)
+        if msgType == simplefix.MSGTYPE_EXECUTION_REPORT:
+            self._ring.publish(EXECUTION_RECORD, timestamp, msgSeqNum, msgType,
+                               _text(message.get(simplefix.TAG_EXECTYPE)), _text(message.get(simplefix.TAG_ORDSTATUS)), _text(message.get(simplefix.TAG_SIDE)),
+                               _field(message.get(simplefix.TAG_SYMBOL), SYMBOL_SIZE, "Symbol"), _field(message.get(simplefix.TAG_CLORDID), ID_SIZE, "ClOrdID"),
+                               _field(message.get(simplefix.TAG_ORDERID), ID_SIZE, "OrderID"),
+                               _number(message.get(simplefix.TAG_LASTPX)), _number(message.get(simplefix.TAG_LASTQTY)), _number(message.get(simplefix.TAG_CUMQTY)),
+                               _number(message.get(simplefix.TAG_LEAVESQTY)), _number(message.get(simplefix.TAG_AVGPX)))
+            return 1
+        isSnapshot = msgType == simplefix.MSGTYPE_MARKET_DATA_SNAPSHOT_FULL_REFRESH
+        mdReqID = _field(message.get(TAG_MDREQID), MDREQID_SIZE, "MDReqID")
+        symbol = message.get(simplefix.TAG_SYMBOL)
+        entries = [(_text(action), _text(entryType), _field(entrySymbol or symbol, SYMBOL_SIZE, "Symbol"), _number(price, self._parsePrice), _number(size, self._parseSize))
+                   for action, entryType, entrySymbol, price, size in iterEntries(message, isSnapshot)] # Nothing is published unless every entry fits
+        publish = self._ring.publish
+        for action, entryType, entrySymbol, price, size in entries:
+            publish(MARKET_DATA_RECORD, timestamp, msgSeqNum, msgType, action, entryType, entrySymbol, mdReqID, price, size)
+        return len(entries)
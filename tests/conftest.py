@@ -0,0 +1,51 @@
+import configparser
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixEngine"))
+
+
+class NullWriter:
+    """ StreamWriter stand-in that keeps what is written."""
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(bytes(data))
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def nullWriter():
+    return NullWriter()
+
+
+@pytest.fixture
+def makeConfig(tmp_path):
+    """ Factory of a session configuration section writing its logs to tmp_path."""
+    def make(**options):
+        config = configparser.ConfigParser()
+        config.optionxform = str
+        config["TEST"] = {
+            "SocketHost": "127.0.0.1",
+            "SocketPort": "0",
+            "SenderCompID": "CLIENT",
+            "TargetCompID": "SERVER",
+            "SenderPassword": "password",
+            "BeginString": "FIX.4.4",
+            "HeartBeatInterval": "30",
+            "MaxReconnectAttemps": "3",
+            "ReconnectInterval": "1",
+            "HumanReadableLog": "false",
+            "FileLogPath": str(tmp_path),
+        }
+        config["TEST"].update({key: str(value) for key, value in options.items()})
+        return config["TEST"]
+    return make
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+import simplefix
+
+from connectionHandler import FIXConnectionHandler
+
+
+def encodedMessages(count):
+    """ Messages from a few bytes of payload to several read buffers long."""
+    messages = []
+    for seqNo in range(1, count + 1):
+        message = simplefix.FixMessage()
+        message.append_pair(simplefix.TAG_BEGINSTRING, "FIX.4.4", header=True)
+        message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_NEWS if seqNo % 3 else simplefix.MSGTYPE_HEARTBEAT, header=True)
+        message.append_pair(simplefix.TAG_SENDER_COMPID, "SERVER", header=True)
+        message.append_pair(simplefix.TAG_TARGET_COMPID, "CLIENT", header=True)
+        message.append_pair(simplefix.TAG_MSGSEQNUM, seqNo, header=True)
+        if seqNo % 3:
+            message.append_pair(148, "x" * (seqNo * 37 % 700)) # Headline
+        messages.append(message.encode())
+    return messages
+
+
+def bursts(stream):
+    """ Split the stream into writes that cut messages in the middle and carry several messages at once."""
+    sizes = [1, 7, 64, 128, 129, 500, 3000, 11]
+    chunks = []
+    position = 0
+    index = 0
+    while position < len(stream):
+        size = sizes[index % len(sizes)]
+        chunks.append(stream[position:position + size])
+        position += size
+        index += 1
+    return chunks
+
+
+async def receive(config, chunks):
+    async def serve(reader, writer):
+        for chunk in chunks:
+            writer.write(chunk)
+            await writer.drain()
+            await asyncio.sleep(0)
+        writer.close()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    handler = FIXConnectionHandler(config, reader, writer, None)
+    received = []
+    async def collect(message, readTime=None, parsedTime=None):
+        received.append(message.encode())
+    handler.processMessage = collect
+    while not handler._closed.is_set():
+        await handler.readMessage()
+    server.close()
+    await server.wait_closed()
+    return received
+
+
+@pytest.mark.parametrize("messageView", [False, True])
+def testBatchReadYieldsTheSameMessages(makeConfig, messageView):
+    messages = encodedMessages(300)
+    chunks = bursts(b"".join(messages))
+    assert any(len(chunk) > 128 for chunk in chunks) and any(len(chunk) < 20 for chunk in chunks)
+    results = {}
+    for batchRead in (False, True):
+        config = makeConfig(BatchRead=batchRead, MessageView=messageView, ReadBufferSize=128)
+        results[batchRead] = asyncio.run(receive(config, chunks))
+    assert results[False] == messages
+    assert results[True] == messages
+
+
+def testIterMessagesYieldsEveryMessage(makeConfig):
+    messages = encodedMessages(100)
+    async def run():
+        async def serve(reader, writer):
+            for chunk in bursts(b"".join(messages)):
+                writer.write(chunk)
+                await writer.drain()
+            writer.close()
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        handler = FIXConnectionHandler(makeConfig(BatchRead=True, MessageView=True), reader, writer, None)
+        received = [message.encode() for message in [message async for message in handler.iterMessages()]]
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return received
+    assert asyncio.run(run()) == messages
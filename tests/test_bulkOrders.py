@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+import simplefix
+
+from acceptorSimulator import executionReport
+from connectionHandler import SocketConnectionState
+from fixEngine import FixEngine
+from riskGate import FIXRiskRejected
+
+TAG_CANCEL_ALL = 7559
+BUY, SELL = simplefix.SIDE_BUY, simplefix.SIDE_SELL
+
+
+def sent(chunk):
+    parser = simplefix.FixParser()
+    parser.append_buffer(chunk)
+    messages = []
+    message = parser.get_message()
+    while message is not None:
+        messages.append(message)
+        message = parser.get_message()
+    return messages
+
+
+def runEngine(makeConfig, writer, test, **options):
+    """ Run test(engine, template) on a logged in FixEngine whose Logon (MsgSeqNum 1) is already written."""
+    async def run():
+        reader = asyncio.StreamReader()
+        engine = FixEngine(makeConfig(OrderCache=True, **options), reader, writer, None)
+        await asyncio.sleep(0) # Logon
+        engine._connectionState = SocketConnectionState.LOGGED_IN
+        template = engine.clientMessage.newOrderSingleTemplate("P1", 3, "USD", simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+        try:
+            return await test(engine, template)
+        finally:
+            reader.feed_eof()
+            await engine.waitClosed()
+    return asyncio.run(run())
+
+
+def acknowledge(engine, handles):
+    for index, handle in enumerate(handles):
+        order = {"orderID": f"O{index}", "clOrdID": handle.clOrdID, "ordStatus": simplefix.ORDSTATUS_NEW, "symbol": handle.symbol, "side": handle.side,
+                 "orderQty": "1", "price": "100", "cumQty": "0", "leavesQty": "1"}
+        engine.orderCache.applyExecutionReport(executionReport("FIX.4.4", order, simplefix.EXECTYPE_NEW, f"E{index}"))
+
+
+def testSendOrdersIsOneWriteWithConsecutiveSeqNos(makeConfig, nullWriter):
+    async def test(engine, template):
+        return await engine.sendOrders(template, [(None, BUY, "BTC-USD", 1, 100), ("C2", SELL, "ETH-USD", 2, 10)])
+    handles = runEngine(makeConfig, nullWriter, test)
+    assert len(nullWriter.written) == 2
+    orders = sent(nullWriter.written[1])
+    assert [int(order.get(simplefix.TAG_MSGSEQNUM)) for order in orders] == [2, 3]
+    assert [order.get(simplefix.TAG_CLORDID) for order in orders] == [handle.clOrdID for handle in handles]
+    assert handles[1].clOrdID == b"C2"
+    assert [handle.state.ordStatus for handle in handles] == [simplefix.ORDSTATUS_PENDING_NEW] * 2
+
+
+@pytest.mark.parametrize("orders, error", [
+    ([("C1", BUY, "BTC-USD", 1, 100), ("C2", BUY, "BTC-USD", 1, 0)], "Order 1 \\(C2\\): Price must be positive"),
+    ([("C1", BUY, "BTC-USD", 1, 100), ("C1", SELL, "BTC-USD", 1, 100)], "duplicate ClOrdID"),
+    ([("C1", "9", "BTC-USD", 1, 100)], "invalid Side"),
+])
+def testInvalidBatchSendsNothing(makeConfig, nullWriter, orders, error):
+    async def test(engine, template):
+        with pytest.raises(ValueError, match=error):
+            await engine.sendOrders(template, orders)
+        return engine._session.getOutboundSeqNo()
+    assert runEngine(makeConfig, nullWriter, test) == 1
+    assert len(nullWriter.written) == 1
+
+
+def testRiskRejectedBatchSendsNothing(makeConfig, nullWriter):
+    async def test(engine, template):
+        with pytest.raises(FIXRiskRejected, match="maxOrderQty"):
+            await engine.sendOrders(template, [("C1", BUY, "BTC-USD", 1, 100), ("C2", BUY, "BTC-USD", 50, 100)])
+        handles = await engine.sendOrders(template, [("C3", BUY, "BTC-USD", 1, 100)])
+        return handles, engine.riskGate.getSymbolRisk("BTC-USD").openOrders
+    handles, openOrders = runEngine(makeConfig, nullWriter, test, RiskGate=True, RiskMaxOrderQty=10)
+    assert [int(order.get(simplefix.TAG_MSGSEQNUM)) for order in sent(nullWriter.written[-1])] == [2]
+    assert openOrders == 1
+
+
+def testReplaceOrdersIsOneWrite(makeConfig, nullWriter):
+    async def test(engine, template):
+        handles = await engine.sendOrders(template, [("C1", BUY, "BTC-USD", 1, 100), ("C2", BUY, "BTC-USD", 1, 99)])
+        acknowledge(engine, handles)
+        replaced = await engine.replaceOrders([("C1", 101), ("C2", 100, 3)])
+        with pytest.raises(ValueError, match="already pending"):
+            await engine.replaceOrders([("C1", 102)])
+        return replaced
+    replaced = runEngine(makeConfig, nullWriter, test)
+    assert len(nullWriter.written) == 3
+    replaces = sent(nullWriter.written[2])
+    assert [int(message.get(simplefix.TAG_MSGSEQNUM)) for message in replaces] == [4, 5]
+    assert [message.get(simplefix.TAG_ORIGCLORDID) for message in replaces] == [b"C1", b"C2"]
+    assert [message.get(simplefix.TAG_CLORDID) for message in replaces] == [handle.clOrdID for handle in replaced]
+    assert replaces[1].get(simplefix.TAG_ORDERQTY) == b"3"
+
+
+def testCancelOrdersBySideAndAll(makeConfig, nullWriter):
+    async def test(engine, template):
+        handles = await engine.sendOrders(template, [("C1", BUY, "BTC-USD", 1, 100), ("C2", SELL, "BTC-USD", 1, 101), ("C3", BUY, "ETH-USD", 1, 10)])
+        acknowledge(engine, handles)
+        buys = await engine.cancelOrders(side=BUY)
+        everything = await engine.cancelOrders(symbol="BTC-USD")
+        return buys, everything
+    buys, everything = runEngine(makeConfig, nullWriter, test)
+    cancels = sent(nullWriter.written[2])
+    assert [message.get(simplefix.TAG_ORIGCLORDID) for message in cancels] == [handle.clOrdID for handle in buys]
+    assert sorted(handle.clOrdID for handle in buys) == [b"C1", b"C3"]
+    assert [int(message.get(simplefix.TAG_MSGSEQNUM)) for message in cancels] == [5, 6]
+    cancelAll = sent(nullWriter.written[3])
+    assert len(cancelAll) == 1
+    assert (cancelAll[0].get(TAG_CANCEL_ALL), cancelAll[0].get(simplefix.TAG_SYMBOL)) == (b"Y", b"BTC-USD")
+    assert sorted(handle.clOrdID for handle in everything) == [b"C1", b"C2"]
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+import simplefix
+
+from acceptorSimulator import executionReport
+from connectionHandler import FIXConnectionHandler
+from dataDictionary import (FIXDataDictionary, FIXValidationError, REASON_INCORRECT_FORMAT, REASON_INVALID_TAG,
+                            REASON_REQUIRED_TAG_MISSING, REASON_VALUE_OUT_OF_RANGE)
+from fixClientMessages import FixClientMessages
+
+FILL = {"orderID": "O1", "clOrdID": "C1", "ordStatus": simplefix.ORDSTATUS_FILLED, "symbol": "BTC-USD", "side": "1",
+        "orderQty": "2", "price": "100", "cumQty": "2", "leavesQty": "0"}
+
+
+def inbound(message, seqNo=1):
+    message.append_pair(simplefix.TAG_SENDER_COMPID, "SERVER", header=True)
+    message.append_pair(simplefix.TAG_TARGET_COMPID, "CLIENT", header=True)
+    message.append_pair(simplefix.TAG_MSGSEQNUM, seqNo, header=True)
+    message.append_utc_timestamp(simplefix.TAG_SENDING_TIME, header=True)
+    parser = simplefix.FixParser()
+    parser.append_buffer(message.encode())
+    return parser.get_message()
+
+
+def fill(*extra, seqNo=1):
+    message = executionReport("FIX.4.4", FILL, simplefix.EXECTYPE_TRADE, "E1", lastQty="2", lastPx="100")
+    for tag, value in extra:
+        message.append_pair(tag, value)
+    return inbound(message, seqNo)
+
+
+def testFieldsTheDictionaryDoesNotListAreLetThrough():
+    dictionary = FIXDataDictionary.default()
+    assert dictionary.validate(fill((30, "XNAS"), (1057, "Y"), (9999, "custom"))) is None
+
+
+def testUnlistedFieldsOfKnownFormatAreChecked():
+    error = FIXDataDictionary.default().validate(fill((30, "XNAS"), (264, "abc")))
+    assert (error.reason, error.refTagID) == (REASON_INCORRECT_FORMAT, b"264")
+
+
+def testKnownFieldsAreChecked():
+    dictionary = FIXDataDictionary.default()
+    message = executionReport("FIX.4.4", dict(FILL, ordStatus="Z"), simplefix.EXECTYPE_TRADE, "E1")
+    error = dictionary.validate(inbound(message))
+    assert (error.reason, error.refTagID) == (REASON_VALUE_OUT_OF_RANGE, b"39")
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_BEGINSTRING, "FIX.4.4")
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_TEST_REQUEST)
+    error = dictionary.validate(inbound(message))
+    assert (error.reason, error.refTagID) == (REASON_REQUIRED_TAG_MISSING, b"112")
+
+
+def testUserDefinedTagsCanBeRefused():
+    error = FIXDataDictionary(allowUserDefined=False).validate(fill((9999, "custom")))
+    assert (error.reason, error.refTagID) == (REASON_INVALID_TAG, b"9999")
+
+
+def testOutboundCheckRaises():
+    clientMessages = FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30)
+    order = clientMessages.newOrderSingle("C1", "PARTY", 3, "USD", "1", "BTC-USD", 1, 100, simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+    FIXDataDictionary.default().check(order)
+    order.append_pair(simplefix.TAG_STOPPX, "x")
+    with pytest.raises(FIXValidationError):
+        FIXDataDictionary.default().check(order)
+
+
+@pytest.mark.parametrize("gapBuffer", [0, 10])
+def testRejectedInboundMessageIsStillDispatched(makeConfig, nullWriter, gapBuffer):
+    async def run():
+        handler = FIXConnectionHandler(makeConfig(Validation="full", GapBufferSize=gapBuffer), None, nullWriter, None)
+        handler.clientMessage = FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30)
+        dispatched = []
+        async def onExecutionReport(message):
+            dispatched.append(message.get(simplefix.TAG_EXECID))
+        handler.registerHandler(simplefix.MSGTYPE_EXECUTION_REPORT, onExecutionReport)
+        await handler.processMessage(fill((44, "abc")))
+        return dispatched, handler._session.getNextExpectedSeqNo()
+    dispatched, nextExpected = asyncio.run(run())
+    assert dispatched == [b"E1"]
+    assert nextExpected == 2
+    sent = simplefix.FixParser()
+    sent.append_buffer(b"".join(nullWriter.written))
+    reject = sent.get_message()
+    assert (reject.get(simplefix.TAG_MSGTYPE), reject.get(45), reject.get(371)) == (b"3", b"1", b"44")
@@ -0,0 +1,34 @@
+import asyncio
+
+import simplefix
+
+from connectionHandler import FIXConnectionHandler
+
+
+def news(seqNo, headline):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_BEGINSTRING, "FIX.4.4", header=True)
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_NEWS, header=True)
+    message.append_pair(simplefix.TAG_SENDER_COMPID, "SERVER", header=True)
+    message.append_pair(simplefix.TAG_TARGET_COMPID, "CLIENT", header=True)
+    message.append_pair(simplefix.TAG_MSGSEQNUM, seqNo, header=True)
+    message.append_pair(148, headline)
+    return message.encode()
+
+
+def testFailingHandlerDoesNotStopTheSession(makeConfig, nullWriter):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"".join(news(seqNo, "bad" if seqNo == 2 else "good") for seqNo in range(1, 4)))
+        reader.feed_eof()
+        handler = FIXConnectionHandler(makeConfig(), reader, nullWriter, None)
+        handled = []
+        async def onNews(message):
+            if message.get(148) == b"bad":
+                raise ValueError("cannot handle")
+            handled.append(int(message.get(simplefix.TAG_MSGSEQNUM)))
+        handler.registerHandler(simplefix.MSGTYPE_NEWS, onNews)
+        while not handler._closed.is_set():
+            await handler.readMessage()
+        return handled, handler._session.getNextExpectedSeqNo()
+    assert asyncio.run(run()) == ([1, 3], 4)
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+import simplefix
+
+from acceptorSimulator import tradeCaptureReport
+from connectionHandler import SocketConnectionState
+from dropCopy import DropCopyPipeline, TradeCaptureStore
+from fixClientMessages import FixClientMessages
+
+
+class FailingEngine:
+    """ Engine stand-in whose first sendMany fails."""
+    def __init__(self):
+        self.failures = 1
+        self.sent = []
+        self.state = SocketConnectionState.LOGGED_IN
+
+    def getConnectionState(self):
+        return self.state
+
+    async def sendMany(self, messages):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("disconnected")
+        self.sent += [message.get(571) for message in messages]
+
+
+def report(tradeReportID):
+    trade = {"execID": f"E{tradeReportID}", "symbol": "BTC-USD", "lastQty": 1, "lastPx": "100.5", "tradeDate": "20260101", "side": "1", "orderID": "O1", "clOrdID": "C1"}
+    return tradeCaptureReport("FIX.4.4", tradeReportID, None, trade)
+
+
+def testAcksStayPendingWhenTheSendFails(tmp_path):
+    async def run():
+        pipeline = DropCopyPipeline(TradeCaptureStore(str(tmp_path)), FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30), ackBatchSize=100)
+        engine = FailingEngine()
+        pipeline._engine = engine
+        for tradeReportID in ("T1", "T2"):
+            pipeline.apply(report(tradeReportID))
+        with pytest.raises(ConnectionError):
+            await pipeline.flushAcks()
+        assert pipeline.getStats()["pendingAcks"] == 2
+        pipeline.apply(report("T3"))
+        await pipeline.flushAcks()
+        pipeline.close()
+        return engine.sent, pipeline.getStats()
+    sent, stats = asyncio.run(run())
+    assert sent == [b"T1", b"T2", b"T3"]
+    assert stats["acked"] == 3 and stats["pendingAcks"] == 0
+
+
+def testAcksStayPendingWhileTheSessionIsClosed(tmp_path):
+    async def run():
+        pipeline = DropCopyPipeline(TradeCaptureStore(str(tmp_path)), FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30))
+        engine = FailingEngine()
+        engine.failures = 0
+        engine.state = SocketConnectionState.DISCONNECTED
+        pipeline._engine = engine
+        pipeline.apply(report("T1"))
+        with pytest.raises(ConnectionError):
+            await pipeline.flushAcks()
+        closedStats = pipeline.getStats()
+        engine.state = SocketConnectionState.LOGGED_IN
+        await pipeline.flushAcks()
+        return closedStats, engine.sent, pipeline.getStats()
+    closedStats, sent, stats = asyncio.run(run())
+    assert (closedStats["acked"], closedStats["pendingAcks"]) == (0, 1)
+    assert sent == [b"T1"] and (stats["acked"], stats["pendingAcks"]) == (1, 0)
+
+
+def testClosedStoreRefusesAppends(tmp_path):
+    store = TradeCaptureStore(str(tmp_path))
+    pipeline = DropCopyPipeline(store, FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30))
+    pipeline.apply(report("T1"))
+    pipeline.close()
+    pipeline.close()
+    store.flush()
+    with pytest.raises(ValueError, match="closed"):
+        pipeline.apply(report("T2"))
+    assert len(TradeCaptureStore(str(tmp_path))) == 1
@@ -0,0 +1,67 @@
+import pytest
+import simplefix
+
+from fixedPoint import FixedPointCodec, FIXInstruments
+from orderBook import OrderBookManager
+from orderCache import OrderCache
+
+
+def incrementalRefresh(*entries):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH)
+    message.append_pair(262, "md-1")
+    message.append_pair(268, len(entries))
+    for symbol, price, size in entries:
+        message.append_pair(279, "0")
+        message.append_pair(269, "0")
+        message.append_pair(simplefix.TAG_SYMBOL, symbol)
+        message.append_pair(270, price)
+        message.append_pair(271, size)
+    return message
+
+
+def executionReport(clOrdID, symbol=None):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_EXECUTION_REPORT)
+    message.append_pair(simplefix.TAG_CLORDID, clOrdID)
+    message.append_pair(simplefix.TAG_ORDERID, "venue-" + clOrdID)
+    if symbol is not None:
+        message.append_pair(simplefix.TAG_SYMBOL, symbol)
+    message.append_pair(simplefix.TAG_ORDSTATUS, simplefix.ORDSTATUS_NEW)
+    message.append_pair(simplefix.TAG_ORDERQTY, "1.5")
+    message.append_pair(simplefix.TAG_PRICE, "100.25")
+    return message
+
+
+def testNegativeDecimalsAreRejected():
+    with pytest.raises(ValueError, match="non-negative"):
+        FixedPointCodec(-1)
+
+
+def testUnknownSymbolsHaveNoCodecs():
+    instruments = FIXInstruments({"BTC-USD": (2, 4)})
+    assert instruments.find("BTC-USD") is instruments.codecs(b"BTC-USD")
+    assert instruments.find(b"ETH-USD") is None
+    assert instruments.find(None) is None
+    with pytest.raises(KeyError, match="ETH-USD"):
+        instruments.codecs(b"ETH-USD")
+    with pytest.raises(KeyError, match="None"):
+        instruments.codecs(None)
+    assert FIXInstruments({}, priceDecimals=1).find(None) is None
+
+
+def testOrderBookSkipsUnknownSymbols():
+    manager = OrderBookManager(instruments=FIXInstruments({"BTC-USD": (2, 4)}))
+    changed = manager.apply(incrementalRefresh(("ETH-USD", "10.5", "1"), ("BTC-USD", "100.25", "0.5")))
+    assert [book.symbol for book in changed] == [b"BTC-USD"]
+    assert manager.getBook("ETH-USD") is None
+    assert manager.getBook("BTC-USD").bestBid() == (10025, 5000)
+
+
+def testOrderCacheSkipsUnknownSymbols():
+    cache = OrderCache(None, instruments=FIXInstruments({"BTC-USD": (2, 4)}))
+    assert cache.applyExecutionReport(executionReport("1", "ETH-USD")) is None
+    assert cache.applyExecutionReport(executionReport("2")) is None
+    order = cache.applyExecutionReport(executionReport("3", "BTC-USD"))
+    assert (order.orderQty, order.price) == (15000, 10025)
+    assert cache.getByClOrdID("1") is None and cache.getByClOrdID("3") is order
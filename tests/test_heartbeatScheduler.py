@@ -0,0 +1,78 @@
+import asyncio
+
+from heartbeatScheduler import FIXHeartbeatScheduler, SEND_HEARTBEAT, SEND_TEST_REQUEST, SESSION_DEAD
+
+
+class VirtualClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def makeScheduler(interval=30, maxMissed=2):
+    """ 30s HeartBtInt: TestRequest after 36s of silence, dead after 72s."""
+    return FIXHeartbeatScheduler(interval, maxMissed, graceRatio=0.2, clock=VirtualClock())
+
+
+def testHeartbeatWhenIdle():
+    scheduler = makeScheduler()
+    assert scheduler.poll(10) == ([], 30)
+    assert scheduler.poll(30) == ([SEND_HEARTBEAT], 36)
+    assert scheduler.lastSent == 30
+    scheduler.lastReceived = 35
+    assert scheduler.poll(40) == ([], 60)
+    assert scheduler.poll(60) == ([SEND_HEARTBEAT], 71)
+
+
+def testOutboundTrafficDelaysTheHeartbeat():
+    scheduler = makeScheduler()
+    scheduler.lastSent = scheduler.lastReceived = 25
+    assert scheduler.poll(30) == ([], 55)
+    assert scheduler.poll(55) == ([SEND_HEARTBEAT], 61)
+
+
+def testTestRequestAfterSilenceThenAnswered():
+    scheduler = makeScheduler()
+    assert scheduler.poll(36) == ([SEND_TEST_REQUEST], 66)
+    assert scheduler.nextTestReqID() == "TEST1"
+    assert scheduler.poll(50) == ([], 66) # Waiting for the answer, no second TestRequest
+    scheduler.lastReceived = 51
+    assert scheduler.poll(52) == ([], 66)
+    assert scheduler.poll(87) == ([SEND_TEST_REQUEST], 117)
+    assert scheduler.nextTestReqID() == "TEST2"
+
+
+def testSessionDeadWhenTestRequestIsNotAnswered():
+    scheduler = makeScheduler()
+    assert scheduler.poll(36)[0] == [SEND_TEST_REQUEST]
+    assert scheduler.poll(71.9)[0] == [SEND_HEARTBEAT]
+    assert scheduler.poll(72) == ([SESSION_DEAD], None)
+
+
+def testMaxMissedHeartbeats():
+    scheduler = makeScheduler(interval=10, maxMissed=4)
+    assert scheduler.poll(12)[0] == [SEND_TEST_REQUEST]
+    assert scheduler.poll(47.9)[0] != [SESSION_DEAD]
+    assert scheduler.poll(48) == ([SESSION_DEAD], None)
+
+
+def testSendFailureClosesTheSession():
+    async def run():
+        clock = VirtualClock(100.0)
+        scheduler = FIXHeartbeatScheduler(30, clock=clock)
+        reasons = []
+        async def sendHeartbeat():
+            raise ConnectionResetError("reset")
+        async def sendTestRequest(testReqID):
+            pass
+        async def sessionDead(reason):
+            reasons.append(reason)
+        scheduler.start(sendHeartbeat, sendTestRequest, sessionDead)
+        clock.now = 130.0
+        scheduler.lastReceived = 129.0
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return reasons, scheduler._task
+    assert asyncio.run(run()) == (["Heartbeat could not be sent"], None)
@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+import pytest
+import simplefix
+
+from connectionHandler import FIXConnectionHandler
+from fixClientMessages import FixClientMessages
+from latencyMetrics import BUCKETS, FIXLatencyMetrics, LatencyHistogram, bucketIndex, bucketValue
+
+
+def news(seqNo):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_BEGINSTRING, "FIX.4.4", header=True)
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_NEWS, header=True)
+    message.append_pair(simplefix.TAG_SENDER_COMPID, "SERVER", header=True)
+    message.append_pair(simplefix.TAG_TARGET_COMPID, "CLIENT", header=True)
+    message.append_pair(simplefix.TAG_MSGSEQNUM, seqNo, header=True)
+    message.append_pair(148, "headline")
+    return message.encode()
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 129, 1000, 65535, 1 << 20, 123456789, (1 << 40) - 1])
+def testBucketsBoundTheRelativeError(value):
+    index = bucketIndex(value)
+    assert bucketValue(index) >= value
+    assert bucketValue(index) - value <= value / 64
+    assert index == 0 or bucketValue(index - 1) < value
+    histogram = LatencyHistogram()
+    histogram.record(value)
+    assert histogram.counts[index] == 1 # record inlines bucketIndex
+
+
+def testValuesAboveTheRangeAreCountedInTheLastBucket():
+    histogram = LatencyHistogram()
+    histogram.record(1 << 45)
+    assert bucketIndex(1 << 45) == BUCKETS - 1
+    assert histogram.counts[-1] == 1
+    assert histogram.percentile(0.5) == 1 << 45
+
+
+def testPercentiles():
+    histogram = LatencyHistogram()
+    for value in range(1000, 101000, 10): # 10000 values, 1 to 101 microseconds
+        histogram.record(value)
+    for q, exact in ((0.5, 50990), (0.99, 99990), (0.999, 100890)):
+        assert abs(histogram.percentile(q) - exact) <= exact / 64
+    summary = histogram.snapshot()
+    assert (summary["count"], summary["min"], summary["max"]) == (10000, 1.0, 100.99)
+    assert summary["mean"] == pytest.approx(50.995)
+
+
+def testSnapshotMergesMsgTypesAndResets():
+    metrics = FIXLatencyMetrics("CLIENT")
+    metrics.record("write", b"D", 1000)
+    metrics.record("write", b"F", 3000)
+    metrics.recordInbound(b"8", 0, 100, 300, 600, 1000)
+    snapshot = json.loads(metrics.dumps(reset=True))
+    stages = snapshot["stages"]
+    assert snapshot["session"] == "CLIENT"
+    assert (stages["write"]["D"]["count"], stages["write"]["ALL"]["count"], stages["write"]["ALL"]["max"]) == (1, 2, 3.0)
+    assert [stages[stage]["8"]["max"] for stage in ("parse", "queue", "handler", "sequence", "inboundTotal")] == [0.1, 0.2, 0.3, 0.4, 1.0]
+    assert metrics.snapshot()["stages"]["write"]["ALL"]["count"] == 0
+
+
+def testSessionRecordsEveryStage(makeConfig, nullWriter):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(news(1) + news(2))
+        reader.feed_eof()
+        async def ignore(message):
+            pass
+        handler = FIXConnectionHandler(makeConfig(LatencyMetrics=True), reader, nullWriter, ignore)
+        handler.clientMessage = FixClientMessages("CLIENT", "SERVER", "password", "FIX.4.4", 30)
+        await handler.sendMessage(handler.clientMessage.sendHeartbeat())
+        while not handler._closed.is_set():
+            await handler.readMessage()
+        return handler.getLatencySnapshot()
+    stages = asyncio.run(run())["stages"]
+    for stage in ("parse", "queue", "handler", "sequence", "inboundTotal"):
+        assert stages[stage]["B"]["count"] == 2
+    for stage in ("encode", "write", "drain"):
+        assert stages[stage]["0"]["count"] == 1
+
+
+def testSessionWithoutLatencyMetrics(makeConfig, nullWriter):
+    async def run():
+        return FIXConnectionHandler(makeConfig(), None, nullWriter, None).getLatencySnapshot()
+    assert asyncio.run(run()) is None
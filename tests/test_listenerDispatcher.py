@@ -0,0 +1,55 @@
+import asyncio
+
+import simplefix
+
+from listenerDispatcher import CONFLATE, FIXListenerDispatcher, conflationKey
+
+
+def marketData(msgType, seqNo, symbol="BTC-USD"):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_MSGTYPE, msgType, header=True)
+    message.append_pair(simplefix.TAG_MSGSEQNUM, seqNo, header=True)
+    message.append_pair(262, "BOOK")
+    message.append_pair(simplefix.TAG_SYMBOL, symbol)
+    return message
+
+
+def executionReport(seqNo, execType, clOrdID="C1"):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_EXECUTION_REPORT, header=True)
+    message.append_pair(simplefix.TAG_MSGSEQNUM, seqNo, header=True)
+    message.append_pair(simplefix.TAG_SYMBOL, "BTC-USD")
+    message.append_pair(simplefix.TAG_CLORDID, clOrdID)
+    message.append_pair(simplefix.TAG_EXECTYPE, execType)
+    return message
+
+
+def deliver(messages):
+    """ Put every message before the worker runs once, as a reader outrunning the listener does."""
+    async def run():
+        delivered = []
+        async def listener(message):
+            delivered.append(int(message.get(simplefix.TAG_MSGSEQNUM)))
+        dispatcher = FIXListenerDispatcher(listener, workers=1, queueSize=100, overflow=CONFLATE)
+        for message in messages:
+            await dispatcher.put(message)
+        await dispatcher.join()
+        return delivered, dispatcher.getStats()["conflated"]
+    return asyncio.run(run())
+
+
+def testIncrementalRefreshesAreNeverConflated():
+    assert deliver([marketData(simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH, seqNo) for seqNo in range(1, 6)]) == ([1, 2, 3, 4, 5], 0)
+
+
+def testConsecutiveSnapshotsAreConflated():
+    W = simplefix.MSGTYPE_MARKET_DATA_SNAPSHOT_FULL_REFRESH
+    X = simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH
+    messages = [marketData(W, 1), marketData(W, 2), marketData(W, 3, "ETH-USD"), marketData(W, 4, "ETH-USD"), marketData(X, 5), marketData(W, 6), marketData(X, 7)]
+    assert deliver(messages) == ([2, 4, 5, 6, 7], 2) # The W after an X keeps its place
+
+
+def testOnlyOrderStatusReportsAreConflated():
+    messages = [executionReport(1, "I"), executionReport(2, "I"), executionReport(3, "F"), executionReport(4, "F"), executionReport(5, "I", "C2")]
+    assert deliver(messages) == ([2, 3, 4, 5], 1)
+    assert conflationKey(executionReport(1, "F")) is None
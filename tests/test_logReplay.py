@@ -0,0 +1,55 @@
+import asyncio
+
+import simplefix
+
+from connectionHandler import FIXConnectionHandler, SocketConnectionState
+from fixClientMessages import FixClientMessages
+from logReplay import FIXLogReplay
+from messageJournal import INBOUND
+
+
+def testTextLogKeepsSeparatorsInsideValues(tmp_path):
+    message = simplefix.FixMessage()
+    message.append_pair(8, "FIX.4.4")
+    message.append_pair(35, "3")
+    message.append_pair(49, "SERVER")
+    message.append_pair(56, "CLIENT")
+    message.append_pair(34, 2)
+    message.append_pair(58, "bad|value |x")
+    encoded = message.encode()
+    logFile = tmp_path / "CLIENT-fixMessages.log"
+    line = b"2026-10-17 10:00:00,123 - " + encoded.replace(b"\x01", b"|") + b"\n"
+    logFile.write_bytes(line * 2)
+    replayed = list(FIXLogReplay(str(logFile), direction=INBOUND))
+    assert len(replayed) == 2
+    for timestamp, direction, view in replayed:
+        assert direction == INBOUND
+        assert view.get(58) == b"bad|value |x"
+        assert view.encode() == encoded
+
+
+def testLogonDisconnectsAfterMaxAttempts(makeConfig, nullWriter):
+    async def run():
+        handler = FIXConnectionHandler(makeConfig(MaxReconnectAttemps=2, ReconnectInterval=0, LogoutTimeout=0.01), None, nullWriter, None)
+        handler.clientMessage = FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30)
+        for _ in range(2):
+            await handler.logon()
+        sent = len(nullWriter.written)
+        await handler.logon()
+        return sent, handler._connectionState
+    sent, state = asyncio.run(run())
+    assert sent == 2
+    assert state == SocketConnectionState.DISCONNECTED
+
+
+def testLogonsAreSpacedByAFractionalInterval(makeConfig, nullWriter):
+    async def run():
+        handler = FIXConnectionHandler(makeConfig(ReconnectInterval=0.05), None, nullWriter, None)
+        handler.clientMessage = FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30)
+        loop = asyncio.get_event_loop()
+        await handler.logon()
+        start = loop.time()
+        await handler.logon()
+        return loop.time() - start
+    assert asyncio.run(run()) >= 0.04
+    assert len(nullWriter.written) == 2
@@ -0,0 +1,93 @@
+import asyncio
+import math
+
+import simplefix
+
+from acceptorSimulator import marketDataIncrementalRefresh, marketDataSnapshot
+from connectionHandler import FIXConnectionHandler
+from marketDataCache import MarketDataConflationCache
+from orderBook import OrderBookManager
+
+NEW, CHANGE, DELETE = "0", "1", "2"
+BID, OFFER, TRADE = "0", "1", "2"
+
+
+def parsed(message):
+    parser = simplefix.FixParser()
+    parser.append_buffer(message.encode())
+    return parser.get_message()
+
+
+def refresh(*entries):
+    return parsed(marketDataIncrementalRefresh("FIX.4.4", "md-1", list(entries)))
+
+
+def testKeepsTheLatestValuePerKey():
+    cache = MarketDataConflationCache(capacity=8)
+    consumer = cache.consumer()
+    cache.apply(refresh((CHANGE, BID, "BTC-USD", "99", "1"), (CHANGE, OFFER, "BTC-USD", "101", "1")))
+    cache.apply(refresh((CHANGE, BID, "BTC-USD", "99.5", "2")))
+    cache.apply(refresh((CHANGE, BID, "BTC-USD", "99.75", "3"), (CHANGE, BID, "ETH-USD", "10", "1")))
+    assert consumer.lag() == 5
+    values = consumer.read()
+    assert [(value.symbol, value.entryType, value.price, value.size, value.updates) for value in values] == [
+        (b"BTC-USD", b"1", 101.0, 1.0, 1), (b"BTC-USD", b"0", 99.75, 3.0, 3), (b"ETH-USD", b"0", 10.0, 1.0, 1)]
+    assert (consumer.conflated, consumer.received, consumer.lag()) == (2, 3, 0)
+    assert consumer.read() == []
+    assert cache.get("BTC-USD", BID).price == 99.75
+
+
+def testConsumersReadIndependently():
+    cache = MarketDataConflationCache(capacity=8)
+    early = cache.consumer()
+    cache.apply(refresh((CHANGE, BID, "BTC-USD", "99", "1"), (CHANGE, OFFER, "BTC-USD", "101", "1")))
+    assert len(early.read()) == 2
+    late = cache.consumer(fromStart=False)
+    assert late.read() == []
+    cache.apply(refresh((DELETE, OFFER, "BTC-USD", "101", "1"), (CHANGE, OFFER, "BTC-USD", "102", "4")))
+    for consumer in (early, late):
+        values = consumer.read()
+        assert [(value.entryType, value.action, value.price) for value in values] == [(b"1", b"1", 102.0)]
+        assert consumer.conflated == 1
+    assert cache.consumer().read()[0].entryType == b"0" # A new consumer gets every key, least recent first
+
+
+def testFullCacheCountsOverflows():
+    cache = MarketDataConflationCache(capacity=2)
+    cache.apply(refresh((CHANGE, BID, "BTC-USD", "99", "1"), (CHANGE, OFFER, "BTC-USD", "101", "1"), (CHANGE, BID, "ETH-USD", "10", "1")))
+    assert (len(cache.keys()), cache.overflows) == (2, 1)
+    assert cache.get("ETH-USD", BID) is None
+
+
+def testBooksConflateTopOfBook():
+    cache = MarketDataConflationCache(capacity=8, books=OrderBookManager())
+    consumer = cache.consumer()
+    cache.apply(parsed(marketDataSnapshot("FIX.4.4", "md-1", "BTC-USD", 100, 3)))
+    assert [(value.entryType, value.price, value.size) for value in consumer.read()] == [(b"0", 99.5, 1.0), (b"1", 100.5, 1.0)]
+    cache.apply(refresh((CHANGE, BID, "BTC-USD", "98.50", "7"))) # Below the top: nothing changes for the consumer
+    assert consumer.read() == []
+    cache.apply(refresh((DELETE, OFFER, "BTC-USD", "100.50", "1"), (NEW, TRADE, "BTC-USD", "100.25", "0.5")))
+    assert [(value.entryType, value.price, value.size) for value in consumer.read()] == [(b"1", 101.0, 2.0), (b"2", 100.25, 0.5)]
+    cache.apply(refresh((DELETE, BID, "BTC-USD", "99.50", "1"), (DELETE, BID, "BTC-USD", "99.00", "2"), (DELETE, BID, "BTC-USD", "98.50", "7")))
+    emptyBid = consumer.read()[0]
+    assert emptyBid.entryType == b"0" and math.isnan(emptyBid.price)
+
+
+def testWaitingConsumerWakesAndMessagesAreForwarded(makeConfig, nullWriter):
+    received = []
+    async def listener(message):
+        received.append(message.get(simplefix.TAG_MSGTYPE))
+    async def run():
+        engine = FIXConnectionHandler(makeConfig(), None, nullWriter, listener)
+        cache = MarketDataConflationCache(capacity=8)
+        cache.attach(engine)
+        consumer = cache.consumer()
+        waiting = asyncio.ensure_future(consumer.wait())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        await engine.dispatch(refresh((CHANGE, BID, "BTC-USD", "99", "1")))
+        await asyncio.wait_for(waiting, 1)
+        return consumer.read()
+    values = asyncio.run(run())
+    assert [value.price for value in values] == [99.0]
+    assert received == [b"X"]
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+
+import simplefix
+
+from connectionHandler import FIXConnectionHandler, SocketConnectionState
+from fixClientMessages import FixClientMessages
+from marketDataMultiplexer import FIXMarketDataMultiplexer
+
+
+class Engine(FIXConnectionHandler):
+    def getConnectionState(self):
+        return self._connectionState
+
+
+def engine(makeConfig, writer):
+    engine = Engine(makeConfig(), None, writer, None)
+    engine.clientMessage = FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30)
+    engine._connectionState = SocketConnectionState.LOGGED_IN
+    return engine
+
+
+def sentRequests(writer):
+    requests = []
+    for data in writer.written:
+        parser = simplefix.FixParser()
+        parser.append_buffer(data)
+        message = parser.get_message()
+        while message is not None:
+            requests.append(message)
+            message = parser.get_message()
+    return requests
+
+
+def reject(mdReqID):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_MARKET_DATA_REQUEST_REJECT)
+    message.append_pair(262, mdReqID)
+    message.append_pair(simplefix.TAG_TEXT, "unknown symbol")
+    return message
+
+
+def testDuplicateSymbolsAreSubscribedOnce(makeConfig, nullWriter):
+    async def run():
+        multiplexer = FIXMarketDataMultiplexer()
+        multiplexer.attach(engine(makeConfig, nullWriter))
+        async def listener(message):
+            pass
+        subscription = multiplexer.subscribe(["BTC-USD", "BTC-USD", b"BTC-USD"], listener)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        count = multiplexer.getSubscriberCount("BTC-USD")
+        multiplexer.unsubscribe(subscription)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return subscription.symbols, count, [request.get(263) for request in sentRequests(nullWriter)]
+    assert asyncio.run(run()) == ([b"BTC-USD"], 1, [b"1", b"2"])
+
+
+def testRejectDropsTheRequestAndReachesItsListeners(makeConfig, nullWriter):
+    async def run():
+        multiplexer = FIXMarketDataMultiplexer()
+        multiplexer.attach(engine(makeConfig, nullWriter))
+        received = []
+        async def listener(message):
+            received.append(message.get(simplefix.TAG_MSGTYPE))
+        subscription = multiplexer.subscribe(["BAD-USD"], listener)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        mdReqID = sentRequests(nullWriter)[0].get(262)
+        await multiplexer.onMessage(reject(mdReqID))
+        state = subscription.active, multiplexer.getSubscriberCount("BAD-USD"), multiplexer.getStats()["liveRequests"]
+        multiplexer.unsubscribe(subscription)
+        multiplexer.subscribe(["BAD-USD"], listener)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return received, state, [request.get(263) for request in sentRequests(nullWriter)]
+    assert asyncio.run(run()) == ([b"Y"], (False, 0, 0), [b"1", b"1"])
+
+
+def testFlushFailuresAreLogged(makeConfig, nullWriter, caplog):
+    async def run():
+        failing = engine(makeConfig, nullWriter)
+        async def sendMany(messages):
+            raise ConnectionResetError("gone")
+        failing.sendMany = sendMany
+        multiplexer = FIXMarketDataMultiplexer()
+        multiplexer.attach(failing)
+        async def listener(message):
+            pass
+        multiplexer.subscribe(["BTC-USD"], listener)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+    with caplog.at_level(logging.ERROR, logger="marketDataMultiplexer"):
+        asyncio.run(run())
+    assert "Market data requests not sent" in caplog.text
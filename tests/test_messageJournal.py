@@ -0,0 +1,66 @@
+import asyncio
+
+import simplefix
+
+from connectionHandler import FIXConnectionHandler
+from fixClientMessages import FixClientMessages
+from messageJournal import INBOUND, OUTBOUND, FIXMessageJournal
+
+
+def message(msgType, seqNum, text=None):
+    msg = simplefix.FixMessage()
+    msg.append_pair(simplefix.TAG_BEGINSTRING, "FIX.4.4", header=True)
+    msg.append_pair(simplefix.TAG_MSGTYPE, msgType, header=True)
+    msg.append_pair(simplefix.TAG_MSGSEQNUM, seqNum, header=True)
+    if text is not None:
+        msg.append_pair(simplefix.TAG_TEXT, text)
+    return msg.encode()
+
+
+def testWriteReadRoundTrip(tmp_path):
+    filename = str(tmp_path / "CLIENT.journal")
+    heartbeat, order, report = message(b"0", 1), message(b"D", 2), message(b"8", 2, "x" * 100)
+    journal = FIXMessageJournal(filename, bufferSize=64, flushInterval=10)
+    journal.record(OUTBOUND, heartbeat + order, timestamp=1)
+    journal.record(INBOUND, report[:20], timestamp=2) # One message over two socket reads
+    journal.record(INBOUND, report[20:], timestamp=3)
+    journal.close()
+    assert journal.recordsWritten == 3
+    records = list(FIXMessageJournal.readRecords(filename))
+    assert records == [(1, OUTBOUND, heartbeat + order), (2, INBOUND, report[:20]), (3, INBOUND, report[20:])]
+    messages = [(timestamp, direction, msg.get(simplefix.TAG_MSGTYPE)) for timestamp, direction, msg in FIXMessageJournal.readMessages(filename)]
+    assert messages == [(1, OUTBOUND, b"0"), (1, OUTBOUND, b"D"), (3, INBOUND, b"8")]
+    inbound = [msg.encode() for _, _, msg in FIXMessageJournal.readMessages(filename, direction=INBOUND)]
+    assert inbound == [report]
+
+
+def testAppendsToAnExistingJournal(tmp_path):
+    filename = str(tmp_path / "CLIENT.journal")
+    for seqNum in (1, 2):
+        journal = FIXMessageJournal(filename)
+        journal.record(OUTBOUND, message(b"0", seqNum))
+        journal.close()
+    seqNums = [msg.get(simplefix.TAG_MSGSEQNUM) for _, _, msg in FIXMessageJournal.readMessages(filename)]
+    assert seqNums == [b"1", b"2"]
+
+
+def testTruncatedRecordIsSkipped(tmp_path):
+    filename = str(tmp_path / "CLIENT.journal")
+    journal = FIXMessageJournal(filename)
+    journal.record(OUTBOUND, message(b"0", 1), timestamp=1)
+    journal.record(OUTBOUND, message(b"0", 2), timestamp=2)
+    journal.close()
+    with open(filename, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 5) # Crash in the middle of the last write
+    assert [timestamp for timestamp, _, _ in FIXMessageJournal.readRecords(filename)] == [1]
+
+
+def testSessionJournalsItsTraffic(makeConfig, nullWriter, tmp_path):
+    async def run():
+        handler = FIXConnectionHandler(makeConfig(MessageJournal=True), None, nullWriter, None)
+        handler.clientMessage = FixClientMessages("CLIENT", "SERVER", "password", "FIX.4.4", 30)
+        await handler.sendMessage(handler.clientMessage.sendHeartbeat())
+        await handler.handleClose()
+    asyncio.run(run())
+    records = list(FIXMessageJournal.readRecords(str(tmp_path / "CLIENT-fixMessages.journal")))
+    assert [(direction, data) for _, direction, data in records] == [(OUTBOUND, nullWriter.written[0])]
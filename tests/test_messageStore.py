@@ -0,0 +1,36 @@
+import os
+
+import simplefix
+
+from connectionHandler import FIXConnectionHandler
+from fixClientMessages import FixClientMessages
+from messageStore import FIXMessageStore
+
+
+def testIndexEntriesPastTheDataAreDroppedOnOpen(tmp_path):
+    store = FIXMessageStore(str(tmp_path), segmentMessages=8)
+    for seqNo in range(1, 6):
+        store.append(seqNo, b"message%d" % seqNo)
+    store.close()
+    os.truncate(tmp_path / "segment-0000000000.dat", len(b"message1") * 3 + 2) # Crash in the middle of message 4
+    store = FIXMessageStore(str(tmp_path), segmentMessages=8)
+    assert store.lastSeqNo == 3
+    assert [None if store.get(seqNo) is None else bytes(store.get(seqNo)) for seqNo in range(1, 6)] == [b"message1", b"message2", b"message3", None, None]
+
+
+def testPossDuplicateSplicesTheStoredBytes():
+    clientMessages = FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30)
+    template = clientMessages.newOrderSingleTemplate("PARTY", 3, "USD", simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+    stored = template.message("C1", simplefix.SIDE_BUY, "BTC-USD", 1, 100.5).encode(7)
+    resent = FIXConnectionHandler._possDuplicate(stored, b"20260101-00:00:00.000")
+    parser = simplefix.FixParser()
+    parser.append_buffer(resent)
+    message = parser.get_message()
+    original = dict(field.split(b"=", 1) for field in stored.split(b"\x01") if field)
+    assert message.get(simplefix.TAG_POSSDUPFLAG) == b"Y"
+    assert message.get(simplefix.TAG_ORIGSENDINGTIME) == original[b"52"]
+    assert message.get(simplefix.TAG_SENDING_TIME) == b"20260101-00:00:00.000"
+    assert all(message.get(tag) == value for tag, value in original.items() if tag not in (b"9", b"10", b"52"))
+    assert int(message.get(simplefix.TAG_BODYLENGTH)) == len(resent) - resent.index(b"35=") - 7
+    assert int(message.get(simplefix.TAG_CHECKSUM)) == sum(resent[:-7]) % 256
+    assert FIXConnectionHandler._storedMsgType(stored) == simplefix.MSGTYPE_NEW_ORDER_SINGLE
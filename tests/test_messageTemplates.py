@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+import simplefix
+
+from connectionHandler import FIXConnectionHandler
+from fixClientMessages import FixClientMessages
+
+HEADER_TAGS = (b"8", b"9", b"35", b"49", b"56", b"34", b"52", b"10")
+
+
+@pytest.fixture
+def clientMessage():
+    return FixClientMessages("CLIENT", "SERVER", "password", "FIX.4.4", 30)
+
+
+def parse(raw):
+    parser = simplefix.FixParser()
+    parser.append_buffer(raw)
+    return parser.get_message()
+
+
+def reference(built, seqNo, encoded):
+    """ simplefix encoding of a built message with the MsgSeqNum and timestamps of a template encoding."""
+    message = simplefix.FixMessage()
+    for tag in (8, 35, 49, 56):
+        message.append_pair(tag, built.get(tag), header=True)
+    message.append_pair(simplefix.TAG_MSGSEQNUM, seqNo, header=True)
+    message.append_pair(simplefix.TAG_SENDING_TIME, encoded.get(simplefix.TAG_SENDING_TIME), header=True)
+    for tag, value in built.pairs:
+        if tag not in HEADER_TAGS:
+            message.append_pair(tag, encoded.get(tag) if tag == b"60" else value)
+    return message.encode()
+
+
+@pytest.mark.parametrize("seqNo, values", [
+    (1, ("C1", "1", "BTC-USD", "1.5", "100.25")),
+    (123456789, ("C-000000000002", "2", "ETH-USD", "1000000", "0.00000001")),
+])
+def testNewOrderSingleTemplateMatchesSimplefix(clientMessage, seqNo, values):
+    template = clientMessage.newOrderSingleTemplate("P1", 3, "USD", simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+    raw = template.encode(seqNo, values)
+    clOrdID, side, symbol, quantity, price = values
+    built = clientMessage.newOrderSingle(clOrdID, "P1", 3, "USD", side, symbol, quantity, price, simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+    encoded = parse(raw)
+    assert encoded.get(simplefix.TAG_SENDING_TIME) == encoded.get(simplefix.TAG_TRANSACTTIME)
+    assert raw == reference(built, seqNo, encoded)
+
+
+def testReplaceTemplateMatchesSimplefix(clientMessage):
+    template = clientMessage.orderCancelReplaceRequestTemplate(simplefix.ORDTYPE_LIMIT, currency="USD", tif=simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+    raw = template.encode(42, ("O1", "C1", "C2", "1", "BTC-USD", "3", "99.5"))
+    built = clientMessage.orderCancelReplaceRequest("C2", "O1", "C1", "1", "BTC-USD", "99.5", simplefix.ORDTYPE_LIMIT, quantity="3", currency="USD", tif=simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+    assert raw == reference(built, 42, parse(raw))
+
+
+def testTemplateMessageLookups(clientMessage):
+    template = clientMessage.newOrderSingleTemplate("P1", 3, "USD", simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+    message = template.message("C1", "1", "BTC-USD", 2, 100)
+    assert message.get(simplefix.TAG_MSGTYPE) == simplefix.MSGTYPE_NEW_ORDER_SINGLE
+    assert message.get(simplefix.TAG_CLORDID) == b"C1"
+    assert message.get(simplefix.TAG_ORDERQTY) == b"2"
+    assert message.get(simplefix.TAG_CURRENCY) == b"USD"
+    assert message.get(simplefix.TAG_STOPPX) is None
+
+
+def testTemplateMessagesTakeTheSessionSeqNo(makeConfig, nullWriter, clientMessage):
+    async def run():
+        handler = FIXConnectionHandler(makeConfig(), None, nullWriter, None)
+        handler.clientMessage = clientMessage
+        template = clientMessage.newOrderSingleTemplate("P1", 3, "USD", simplefix.ORDTYPE_LIMIT, 4, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL)
+        await handler.sendMessage(clientMessage.sendHeartbeat())
+        await handler.sendMessage(template.message("C1", "1", "BTC-USD", 2, 100))
+    asyncio.run(run())
+    sent = parse(nullWriter.written[1])
+    assert sent.get(simplefix.TAG_MSGSEQNUM) == b"2"
+    assert sent.encode() == nullWriter.written[1]
@@ -0,0 +1,45 @@
+import simplefix
+
+from messageView import FIXViewParser
+
+
+def heartbeat(seqNo):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_BEGINSTRING, "FIX.4.4", header=True)
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_HEARTBEAT, header=True)
+    message.append_pair(simplefix.TAG_MSGSEQNUM, seqNo, header=True)
+    return message.encode()
+
+
+def parse(*chunks):
+    parser = FIXViewParser()
+    messages = []
+    for chunk in chunks:
+        parser.append_buffer(chunk)
+        messages += [int(message.get(simplefix.TAG_MSGSEQNUM)) for message in parser.get_messages()]
+    return messages
+
+
+def withBodyLength(message, change):
+    start = message.index(b"\x019=") + 3
+    end = message.index(b"\x01", start)
+    return message[:start] + b"%d" % (int(message[start:end]) + change) + message[end:]
+
+
+def testWrongBodyLengthResyncsToTheNextMessage():
+    assert parse(heartbeat(1) + withBodyLength(heartbeat(2), -5) + heartbeat(3)) == [1, 3]
+    assert parse(heartbeat(1) + withBodyLength(heartbeat(2), 20) + heartbeat(3) + heartbeat(4)) == [1, 3, 4]
+
+
+def testTooLongBodyLengthWaitsForMoreData():
+    assert parse(heartbeat(1) + withBodyLength(heartbeat(2), 200), heartbeat(3), heartbeat(4) * 10) == [1, 3] + [4] * 10
+
+
+def testNonNumericBodyLengthIsSkipped():
+    garbled = heartbeat(2).replace(b"\x019=", b"\x019=x", 1)
+    assert parse(heartbeat(1) + garbled + heartbeat(3)) == [1, 3]
+
+
+def testMessagesSplitAcrossBuffers():
+    stream = b"".join(heartbeat(seqNo) for seqNo in range(1, 6))
+    assert parse(*[stream[i:i + 7] for i in range(0, len(stream), 7)]) == [1, 2, 3, 4, 5]
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+import simplefix
+
+from acceptorSimulator import marketDataIncrementalRefresh, marketDataSnapshot
+from connectionHandler import FIXConnectionHandler
+from fixedPoint import FIXInstruments
+from messageView import FIXViewParser
+from orderBook import OrderBookManager
+
+NEW, CHANGE, DELETE = "0", "1", "2"
+BID, OFFER, TRADE = "0", "1", "2"
+
+
+def parse(message, view):
+    parser = FIXViewParser() if view else simplefix.FixParser()
+    parser.append_buffer(message.encode())
+    return parser.get_message()
+
+
+def messages(view):
+    snapshot = marketDataSnapshot("FIX.4.4", "md-1", "BTC-USD", 100, 3) # Bids 99.50 99.00 98.50, offers 100.50 101.00 101.50
+    incremental = marketDataIncrementalRefresh("FIX.4.4", "md-1", [
+        (CHANGE, BID, "BTC-USD", "99.50", "5.00"),
+        (DELETE, OFFER, "BTC-USD", "100.50", "1.00"),
+        (NEW, BID, "BTC-USD", "99.75", "0.25"),
+        (NEW, TRADE, "BTC-USD", "100.25", "0.50"),
+        (NEW, BID, "ETH-USD", "10.00", "1.00"),
+    ])
+    return parse(snapshot, view), parse(incremental, view)
+
+
+@pytest.mark.parametrize("view", [False, True])
+def testSnapshotThenIncremental(view):
+    manager = OrderBookManager()
+    snapshot, incremental = messages(view)
+    manager.apply(snapshot)
+    book = manager.getBook("BTC-USD")
+    assert (book.bestBid(), book.bestOffer()) == ((99.5, 1.0), (100.5, 1.0))
+    changed = manager.apply(incremental)
+    assert changed == {book, manager.getBook("ETH-USD", "md-1")}
+    assert (book.bestBid(), book.bestOffer(), book.lastTrade) == ((99.75, 0.25), (101.0, 2.0), (100.25, 0.5))
+    bidPrices, bidSizes, offerPrices, offerSizes = book.depthArrays(2)
+    assert (list(bidPrices), list(bidSizes), list(offerPrices), list(offerSizes)) == ([99.75, 99.5], [0.25, 5.0], [101.0, 101.5], [2.0, 3.0])
+    manager.apply(snapshot) # A new snapshot replaces the book
+    assert (book.bestBid(), len(book.bids), len(book.offers)) == ((99.5, 1.0), 3, 3)
+
+
+@pytest.mark.parametrize("view", [False, True])
+def testFixedPointBooksSkipUnknownSymbols(view):
+    manager = OrderBookManager(instruments=FIXInstruments({"BTC-USD": (2, 2)}))
+    for message in messages(view):
+        manager.apply(message)
+    book = manager.getBook("BTC-USD")
+    assert (book.bestBid(), book.bestOffer(), book.lastTrade) == ((9975, 25), (10100, 200), (10025, 50))
+    bidPrices = book.depthArrays()[0]
+    assert bidPrices.dtype.name == "int64" and list(bidPrices) == [9975, 9950, 9900, 9850]
+    assert manager.getBook("ETH-USD") is None
+
+
+def testAttachedBooksForwardToTheListener(makeConfig, nullWriter):
+    received = []
+    async def listener(message):
+        received.append(message.get(simplefix.TAG_MSGTYPE))
+    async def run():
+        engine = FIXConnectionHandler(makeConfig(), None, nullWriter, listener)
+        manager = OrderBookManager()
+        manager.attach(engine)
+        for message in messages(True):
+            await engine.dispatch(message)
+        return manager
+    manager = asyncio.run(run())
+    assert manager.getBook("BTC-USD").bestBid() == (99.75, 0.25)
+    assert received == [b"W", b"X"]
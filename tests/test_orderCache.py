@@ -0,0 +1,110 @@
+import simplefix
+
+from acceptorSimulator import executionReport
+from fixClientMessages import FixClientMessages
+from orderCache import OrderCache
+
+EXECTYPE_ORDER_STATUS = "I"
+
+
+def order(clOrdID, origClOrdID=None, orderID=None, quantity="1", price="100", symbol="BTC-USD"):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_ORDER_CANCEL_REPLACE_REQUEST if origClOrdID else simplefix.MSGTYPE_NEW_ORDER_SINGLE, header=True)
+    if orderID is not None:
+        message.append_pair(simplefix.TAG_ORDERID, orderID)
+    message.append_pair(simplefix.TAG_CLORDID, clOrdID)
+    if origClOrdID is not None:
+        message.append_pair(simplefix.TAG_ORIGCLORDID, origClOrdID)
+    message.append_pair(simplefix.TAG_SIDE, simplefix.SIDE_BUY)
+    message.append_pair(simplefix.TAG_SYMBOL, symbol)
+    message.append_pair(simplefix.TAG_ORDERQTY, quantity)
+    message.append_pair(simplefix.TAG_ORDTYPE, simplefix.ORDTYPE_LIMIT)
+    message.append_pair(simplefix.TAG_PRICE, price)
+    return message
+
+
+def report(clOrdID, orderID, ordStatus, execType, origClOrdID=None, price="100", **kwargs):
+    fields = {"orderID": orderID, "clOrdID": clOrdID, "ordStatus": ordStatus, "symbol": "BTC-USD", "side": simplefix.SIDE_BUY,
+              "orderQty": "1", "price": price, "cumQty": "0", "leavesQty": "1"}
+    message = executionReport("FIX.4.4", fields, execType, f"E-{clOrdID}-{execType}", origClOrdID=origClOrdID, **kwargs)
+    return _parsed(message)
+
+
+def _parsed(message):
+    parser = simplefix.FixParser()
+    parser.append_buffer(message.encode())
+    return parser.get_message()
+
+
+def makeCache(**kwargs):
+    cache = OrderCache(FixClientMessages("CLIENT", "SERVER", "password", "FIX.4.4", 30), **kwargs)
+    for clOrdID, orderID in (("1", "O1"), ("2", "O2")):
+        cache.onOutbound(order(clOrdID))
+        cache.applyExecutionReport(report(clOrdID, orderID, simplefix.ORDSTATUS_NEW, simplefix.EXECTYPE_NEW))
+    return cache
+
+
+def massStatusRequest(cache):
+    message, requestID = cache._clientMessage.orderMassStatusRequest()
+    cache.onOutbound(message)
+    return requestID
+
+
+def testReplaceAcceptedRenamesTheOrder():
+    cache = makeCache()
+    cache.onOutbound(order("3", origClOrdID="1", orderID="O1", price="101"))
+    assert cache.getByClOrdID("3") is cache.getByClOrdID("1")
+    cache.applyExecutionReport(report("3", "O1", simplefix.ORDSTATUS_REPLACED, simplefix.EXECTYPE_REPLACE, origClOrdID="1", price="101"))
+    replaced = cache.getByClOrdID("3")
+    assert (replaced.clOrdID, replaced.origClOrdID, replaced.pendingClOrdID, replaced.price) == (b"3", b"1", None, 101.0)
+    assert cache.getByOrderID("O1") is replaced
+
+
+def testReplaceRejectedByExecutionReportKeepsTheOrder():
+    cache = makeCache()
+    cache.onOutbound(order("3", origClOrdID="1", orderID="O1", price="101"))
+    rejected = cache.applyExecutionReport(report("3", "O1", simplefix.ORDSTATUS_REJECTED, simplefix.EXECTYPE_REJECTED, origClOrdID="1", price="101"))
+    live = cache.getByClOrdID("1")
+    assert rejected is live
+    assert (live.clOrdID, live.ordStatus, live.pendingClOrdID, live.price) == (b"1", simplefix.ORDSTATUS_NEW, None, 100.0)
+    assert cache.getByClOrdID("3") is None
+    assert live in cache.openOrders("BTC-USD")
+
+
+def testNewOrderRejected():
+    cache = makeCache()
+    cache.onOutbound(order("3"))
+    cache.applyExecutionReport(report("3", "NONE", simplefix.ORDSTATUS_REJECTED, simplefix.EXECTYPE_REJECTED))
+    assert cache.getByClOrdID("3").ordStatus == simplefix.ORDSTATUS_REJECTED
+    assert len(cache.openOrders()) == 2
+
+
+def testMassStatusReconcilesUnreportedOrders():
+    cache = makeCache()
+    requestID = massStatusRequest(cache)
+    cache.applyExecutionReport(report("1", "O1", simplefix.ORDSTATUS_NEW, EXECTYPE_ORDER_STATUS, massStatusReqID=requestID, lastReport=True))
+    assert cache.getByClOrdID("1").isOpen()
+    assert cache.getByClOrdID("2").ordStatus == simplefix.ORDSTATUS_CANCELED
+    assert cache._massStatus == {}
+
+
+def testRejectedMassStatusRequestIsDropped():
+    cache = makeCache()
+    requestID = massStatusRequest(cache)
+    reject = simplefix.FixMessage()
+    reject.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_BUSINESS_MESSAGE_REJECT, header=True)
+    reject.append_pair(372, simplefix.MSGTYPE_ORDER_MASS_STATUS_REQUEST)
+    reject.append_pair(379, requestID)
+    reject.append_pair(380, 3)
+    cache.applyBusinessReject(reject)
+    assert cache._massStatus == {}
+    cache.applyExecutionReport(report("1", "O1", simplefix.ORDSTATUS_NEW, EXECTYPE_ORDER_STATUS, massStatusReqID=requestID, lastReport=True))
+    assert len(cache.openOrders()) == 2
+
+
+def testMassStatusRequestExpires():
+    cache = makeCache(massStatusTimeout=0)
+    requestID = massStatusRequest(cache)
+    cache.applyExecutionReport(report("1", "O1", simplefix.ORDSTATUS_NEW, EXECTYPE_ORDER_STATUS, massStatusReqID=requestID, lastReport=True))
+    assert cache._massStatus == {}
+    assert len(cache.openOrders()) == 2
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+import simplefix
+
+from connectionHandler import FIXConnectionHandler
+from fixClientMessages import FixClientMessages
+from outboundScheduler import FIXOutboundScheduler, TokenBucket, VirtualClock
+
+
+def message(msgType, cancelAll=False):
+    msg = simplefix.FixMessage()
+    msg.append_pair(simplefix.TAG_MSGTYPE, msgType, header=True)
+    if cancelAll:
+        msg.append_pair(7559, "Y")
+    return msg
+
+
+def releasedTypes(released):
+    return [msg.get(simplefix.TAG_MSGTYPE) + (b"*" if msg.get(7559) else b"") for entry in released for msg in entry.messages]
+
+
+def drive(scheduler, clock, until):
+    """ Poll at every release time up to until. Returns [(time, MsgTypes released)]."""
+    timeline = []
+    idlePolls = 0
+    while clock.now <= until:
+        released, nextRelease = scheduler.poll(clock.now)
+        if released:
+            timeline.append((round(clock.now, 6), releasedTypes(released)))
+            idlePolls = 0
+        else:
+            idlePolls += 1
+            assert idlePolls < 3, "poll released nothing at its own release time"
+        if nextRelease is None:
+            break
+        clock.now = max(nextRelease, clock.now)
+    return timeline
+
+
+def testReleasePriority():
+    clock = VirtualClock()
+    scheduler = FIXOutboundScheduler(rate=10, burst=1, now=clock.now)
+    scheduler.consume(simplefix.MSGTYPE_HEARTBEAT, clock.now) # Session traffic bypasses the queue and takes the token
+    for msg in (message(simplefix.MSGTYPE_NEW_ORDER_SINGLE), message(simplefix.MSGTYPE_ORDER_CANCEL_REPLACE_REQUEST),
+                message(simplefix.MSGTYPE_ORDER_CANCEL_REQUEST), message(simplefix.MSGTYPE_ORDER_CANCEL_REQUEST, cancelAll=True)):
+        scheduler.submit([msg], clock.now)
+    assert scheduler.poll(clock.now) == ([], 0.1)
+    assert drive(scheduler, clock, 1) == [(0.1, [b"F*"]), (0.2, [b"F"]), (0.3, [b"G"]), (0.4, [b"D"])]
+    assert scheduler.getStats()["released"] == {"cancelAll": 1, "cancel": 1, "replace": 1, "new": 1}
+
+
+def testSessionTrafficGoesFirstAndOrdersQueueBehindIt():
+    clock = VirtualClock()
+    scheduler = FIXOutboundScheduler(rate=10, burst=2, now=clock.now)
+    assert scheduler.tryRelease(simplefix.MSGTYPE_NEW_ORDER_SINGLE, clock.now)
+    scheduler.submit([message(simplefix.MSGTYPE_NEW_ORDER_SINGLE)], clock.now)
+    scheduler.consume(simplefix.MSGTYPE_TEST_REQUEST, clock.now) # Takes the last token ahead of the queued order
+    assert scheduler.poll(clock.now) == ([], 0.1)
+    assert not scheduler.tryRelease(simplefix.MSGTYPE_NEW_ORDER_SINGLE, clock.advance(0.1)) # A token is back but the queue goes first
+    assert drive(scheduler, clock, 1) == [(0.1, [b"D"])]
+
+
+def testTokenRefillAndBurst():
+    clock = VirtualClock()
+    scheduler = FIXOutboundScheduler(rate=5, burst=3, now=clock.now)
+    assert [scheduler.tryRelease(simplefix.MSGTYPE_NEW_ORDER_SINGLE, clock.now) for _ in range(4)] == [True, True, True, False]
+    assert not scheduler.tryRelease(simplefix.MSGTYPE_NEW_ORDER_SINGLE, clock.advance(0.19))
+    assert scheduler.tryRelease(simplefix.MSGTYPE_NEW_ORDER_SINGLE, clock.advance(0.01))
+    clock.advance(60) # Refill stops at the burst
+    assert [scheduler.tryRelease(simplefix.MSGTYPE_NEW_ORDER_SINGLE, clock.now) for _ in range(4)] == [True, True, True, False]
+
+
+def testMsgTypeLimitDoesNotBlockLowerPriorities():
+    clock = VirtualClock()
+    scheduler = FIXOutboundScheduler(msgTypeLimits={simplefix.MSGTYPE_ORDER_CANCEL_REQUEST: (1, 1)}, now=clock.now)
+    for msgType in (simplefix.MSGTYPE_ORDER_CANCEL_REQUEST, simplefix.MSGTYPE_ORDER_CANCEL_REQUEST, simplefix.MSGTYPE_NEW_ORDER_SINGLE):
+        scheduler.submit([message(msgType)], clock.now)
+    assert drive(scheduler, clock, 5) == [(0, [b"F", b"D"]), (1, [b"F"])]
+
+
+def testBatchLargerThanTheBurstLeavesDebt():
+    clock = VirtualClock()
+    scheduler = FIXOutboundScheduler(rate=10, burst=2, now=clock.now)
+    assert scheduler.tryRelease(simplefix.MSGTYPE_NEW_ORDER_SINGLE, clock.now)
+    scheduler.submit([message(simplefix.MSGTYPE_NEW_ORDER_SINGLE) for _ in range(5)], clock.now) # Waits for a full bucket
+    scheduler.submit([message(simplefix.MSGTYPE_NEW_ORDER_SINGLE)], clock.now)
+    timeline = drive(scheduler, clock, 5)
+    assert timeline == [(0.1, [b"D"] * 5), (0.5, [b"D"])] # 2 - 5 tokens: the debt of 3 plus one token takes 0.4s
+    assert timeline[-1][0] * 10 + 2 >= 7 # Never above rate * time + burst
+
+
+def testTokenBucketDebt():
+    bucket = TokenBucket(10, 2)
+    bucket.take(0, 5)
+    assert bucket.tokens == -3
+    assert bucket.delay(0.3) == pytest.approx(0.1)
+    assert not bucket.available(0.39)
+    assert bucket.available(0.4)
+
+
+def testDrainReturnsEveryQueuedEntry():
+    scheduler = FIXOutboundScheduler(rate=1, burst=1)
+    scheduler.consume(None, 0)
+    entries = [scheduler.submit([message(simplefix.MSGTYPE_NEW_ORDER_SINGLE)], 0) for _ in range(3)]
+    assert scheduler.drain() == entries
+    assert scheduler.depth == 0
+    assert scheduler.poll(10) == ([], None)
+
+
+def testMessagesDiscardedAtDisconnectFailTheirSenders(makeConfig, nullWriter):
+    async def run():
+        handler = FIXConnectionHandler(makeConfig(RateLimit=1, RateLimitBurst=1), asyncio.StreamReader(), nullWriter, None)
+        clientMessages = FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30)
+        order = lambda clOrdID: clientMessages.newOrderSingle(clOrdID, "PARTY", 3, "USD", "1", "BTC-USD", 1, 100, "2", 4, "1")
+        await handler.sendMessage(order("C1"))
+        queued = asyncio.ensure_future(handler.sendMessage(order("C2")))
+        await asyncio.sleep(0)
+        assert not queued.done()
+        await handler.handleClose()
+        with pytest.raises(ConnectionError):
+            await queued
+        return len(nullWriter.written)
+    assert asyncio.run(run()) == 1
@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+import simplefix
+
+from acceptorSimulator import executionReport, orderCancelReject
+from connectionHandler import FIXConnectionHandler
+from fixClientMessages import FixClientMessages
+from fixedPoint import FIXInstruments
+from riskGate import FIXRiskGate, FIXRiskRejected
+
+
+def order(clOrdID, quantity, price=None, origClOrdID=None, symbol="BTC-USD"):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_BEGINSTRING, "FIX.4.4", header=True)
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_ORDER_CANCEL_REPLACE_REQUEST if origClOrdID else simplefix.MSGTYPE_NEW_ORDER_SINGLE, header=True)
+    message.append_pair(simplefix.TAG_CLORDID, clOrdID)
+    if origClOrdID is not None:
+        message.append_pair(simplefix.TAG_ORIGCLORDID, origClOrdID)
+    message.append_pair(simplefix.TAG_SIDE, simplefix.SIDE_BUY)
+    message.append_pair(simplefix.TAG_SYMBOL, symbol)
+    message.append_pair(simplefix.TAG_ORDERQTY, quantity)
+    message.append_pair(simplefix.TAG_ORDTYPE, simplefix.ORDTYPE_LIMIT if price is not None else simplefix.ORDTYPE_MARKET)
+    if price is not None:
+        message.append_pair(simplefix.TAG_PRICE, price)
+    return message
+
+
+def trades(symbol, price):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH)
+    message.append_pair(262, "md-1")
+    message.append_pair(268, 2)
+    for entryType, entryPrice in (("0", "1"), ("2", price)):
+        message.append_pair(279, "0")
+        message.append_pair(269, entryType)
+        message.append_pair(simplefix.TAG_SYMBOL, symbol)
+        message.append_pair(270, entryPrice)
+        message.append_pair(271, "1")
+    return message
+
+
+def testMarketDataTradesFeedThePriceBand():
+    gate = FIXRiskGate(priceBand=0.1)
+    gate.applyMarketData(trades("BTC-USD", "100"))
+    assert gate.getSymbolRisk("BTC-USD").lastTrade == 100.0
+    gate.check((order("1", "1", "105"),))
+    with pytest.raises(FIXRiskRejected, match="priceBand"):
+        gate.check((order("2", "1", "120"),))
+
+
+def testMarketOrdersNeedAReferencePrice():
+    gate = FIXRiskGate(maxNotional=1000)
+    with pytest.raises(FIXRiskRejected, match="maxNotional"):
+        gate.check((order("1", "1"),))
+    gate.applyMarketData(trades("BTC-USD", "100"))
+    gate.check((order("2", "1"),))
+    with pytest.raises(FIXRiskRejected, match="maxNotional"):
+        gate.check((order("3", "20"),))
+
+
+def testExecutionReportsWithoutSymbolAreSkipped():
+    gate = FIXRiskGate(maxPosition=10)
+    report = simplefix.FixMessage()
+    report.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_EXECUTION_REPORT)
+    report.append_pair(simplefix.TAG_CLORDID, "unknown")
+    report.append_pair(simplefix.TAG_ORDSTATUS, simplefix.ORDSTATUS_REJECTED)
+    gate.applyExecutionReport(report)
+    assert gate.getStats()["symbols"] == {}
+
+
+def testCancelRejectRollsBackTheReplace():
+    gate = FIXRiskGate(maxPosition=10)
+    gate.check((order("1", "4", "100"),))
+    gate.check((order("2", "8", "100", origClOrdID="1"),))
+    risk = gate.getSymbolRisk("BTC-USD")
+    assert (risk.openBuyQty, risk.openOrders) == (8, 1)
+    gate.applyCancelReject(orderCancelReject("FIX.4.4", "2", "1", "O1", "2", "too late"))
+    assert (risk.openBuyQty, risk.openOrders) == (4, 1)
+    gate.check((order("3", "6", "100", origClOrdID="1"),))
+    assert risk.openBuyQty == 6
+
+
+def testRejectedReplaceReportRollsBackTheReplace():
+    gate = FIXRiskGate(maxPosition=10)
+    gate.check((order("1", "4", "100"),))
+    gate.check((order("2", "8", "100", origClOrdID="1"),))
+    rejected = {"orderID": "O1", "clOrdID": "2", "ordStatus": simplefix.ORDSTATUS_REJECTED, "symbol": "BTC-USD", "side": "1",
+                "orderQty": "8", "price": "100", "cumQty": "0", "leavesQty": "0"}
+    gate.applyExecutionReport(executionReport("FIX.4.4", rejected, simplefix.EXECTYPE_REJECTED, "E1", origClOrdID="1"))
+    risk = gate.getSymbolRisk("BTC-USD")
+    assert (risk.openBuyQty, risk.openOrders) == (4, 1)
+    gate.check((order("3", "6", "100", origClOrdID="1"),))
+    assert risk.openBuyQty == 6
+
+
+def testPendingReplaceSurvivesAnExecutionReport():
+    gate = FIXRiskGate(maxPosition=10)
+    gate.check((order("1", "4", "100"),))
+    gate.check((order("2", "8", "100", origClOrdID="1"),))
+    fill = {"orderID": "O1", "clOrdID": "1", "ordStatus": simplefix.ORDSTATUS_PARTIALLY_FILLED, "symbol": "BTC-USD", "side": "1",
+            "orderQty": "4", "price": "100", "cumQty": "1", "leavesQty": "3"}
+    gate.applyExecutionReport(executionReport("FIX.4.4", fill, simplefix.EXECTYPE_TRADE, "E1", lastQty="1", lastPx="100"))
+    risk = gate.getSymbolRisk("BTC-USD")
+    assert (risk.position, risk.openBuyQty) == (1, 7)
+    gate.applyCancelReject(orderCancelReject("FIX.4.4", "2", "1", "O1", "2", "too late"))
+    assert risk.openBuyQty == 3
+
+
+def testUnsentOrdersAreReleasedAtDisconnect(makeConfig, nullWriter):
+    async def run(**options):
+        handler = FIXConnectionHandler(makeConfig(LogoutTimeout=0.01, **options), None, nullWriter, None)
+        handler.clientMessage = FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30)
+        handler.riskGate = gate = FIXRiskGate(maxOpenOrders=10)
+        sends = [asyncio.ensure_future(handler.sendMessage(order(str(clOrdID), "1", "100"))) for clOrdID in range(3)]
+        await asyncio.sleep(0)
+        await handler.handleClose()
+        await asyncio.gather(*sends, return_exceptions=True)
+        risk = gate.getSymbolRisk("BTC-USD")
+        return risk.openOrders, risk.openBuyQty
+    assert asyncio.run(run(RateLimit=1, RateLimitBurst=1)) == (1, 1)
+    assert asyncio.run(run(CoalesceWrites=True)) == (0, 0)
+
+
+def testKillReportsWhetherTheCancelAllWasSent(makeConfig, nullWriter):
+    class Engine(FIXConnectionHandler):
+        def getConnectionState(self):
+            return self._connectionState
+    async def run():
+        engine = Engine(makeConfig(), None, nullWriter, None)
+        engine.clientMessage = FixClientMessages("CLIENT", "SERVER", "", "FIX.4.4", 30)
+        gate = FIXRiskGate()
+        gate.attach(engine)
+        await gate.kill("test")
+        sent = gate.cancelAllSent, len(nullWriter.written)
+        await engine.handleClose()
+        with pytest.raises(ConnectionError):
+            await gate.kill("again")
+        return sent, gate.cancelAllSent
+    assert asyncio.run(run()) == ((True, 1), False)
+
+
+def testOrdersOfUnknownInstrumentsAreRejected():
+    gate = FIXRiskGate(maxOrderQty=10, instruments=FIXInstruments({"BTC-USD": (2, 4)}))
+    gate.check((order("1", "1", "100"),))
+    with pytest.raises(FIXRiskRejected, match="no instrument definition for ETH-USD"):
+        gate.check((order("2", "1", "100"), order("3", "1", "100", symbol="ETH-USD")))
+    assert gate.getStats()["rejects"] == {"instrument": 1}
+    assert gate.getSymbolRisk("BTC-USD").openOrders == 1
+
+
+def testResentFillsAreBookedOnce():
+    gate = FIXRiskGate(maxPosition=3)
+    gate.check((order("1", "2", "100"),))
+    partial = {"orderID": "O1", "clOrdID": "1", "ordStatus": simplefix.ORDSTATUS_PARTIALLY_FILLED, "symbol": "BTC-USD", "side": "1",
+               "orderQty": "2", "price": "100", "cumQty": "1", "leavesQty": "1"}
+    report = executionReport("FIX.4.4", partial, simplefix.EXECTYPE_TRADE, "E1", lastQty="1", lastPx="100")
+    gate.applyExecutionReport(report)
+    report.append_pair(simplefix.TAG_POSSDUPFLAG, simplefix.POSSDUPFLAG_YES, header=True)
+    for _ in range(3):
+        gate.applyExecutionReport(report)
+    risk = gate.getSymbolRisk("BTC-USD")
+    assert (risk.position, risk.openBuyQty, gate.killed) == (1, 1, None)
@@ -0,0 +1,99 @@
+import asyncio
+
+import simplefix
+
+from conftest import NullWriter
+from connectionHandler import FIXConnectionHandler, SocketConnectionState
+from fixClientMessages import FixClientMessages
+
+
+class SlowWriter(NullWriter):
+    """ Writer whose drain waits until released, counting the writes still waiting for it."""
+    def __init__(self):
+        NullWriter.__init__(self)
+        self.released = asyncio.Event()
+        self.drained = 0
+
+    async def drain(self):
+        await self.released.wait()
+        self.drained = len(self.written)
+
+
+class FailingWriter(NullWriter):
+    def write(self, data):
+        raise ConnectionResetError("reset by peer")
+
+
+def handler(config, writer):
+    handler = FIXConnectionHandler(config, None, writer, None)
+    handler.clientMessage = FixClientMessages("CLIENT", "SERVER", "password", "FIX.4.4", 30)
+    return handler
+
+
+def seqNos(chunk):
+    parser = simplefix.FixParser()
+    parser.append_buffer(chunk)
+    numbers = []
+    message = parser.get_message()
+    while message is not None:
+        numbers.append(int(message.get(simplefix.TAG_MSGSEQNUM)))
+        message = parser.get_message()
+    return numbers
+
+
+def testSendManyIsOneWriteWithConsecutiveSeqNos(makeConfig, nullWriter):
+    async def run():
+        session = handler(makeConfig(), nullWriter)
+        await session.sendMessage(session.clientMessage.sendHeartbeat())
+        await session.sendMany([session.clientMessage.sendTestRequest(f"T{i}") for i in range(5)])
+    asyncio.run(run())
+    assert [seqNos(chunk) for chunk in nullWriter.written] == [[1], [2, 3, 4, 5, 6]]
+
+
+def testCoalescedSendsShareAWriteAndFlushWaitsForTheDrain(makeConfig):
+    async def run():
+        writer = SlowWriter()
+        session = handler(makeConfig(CoalesceWrites=True), writer)
+        await asyncio.gather(*(session.sendMessage(session.clientMessage.sendTestRequest(f"T{i}")) for i in range(4)))
+        flush = asyncio.ensure_future(session.flush())
+        await asyncio.sleep(0.01)
+        pending = flush.done(), len(writer.written)
+        writer.released.set()
+        await asyncio.wait_for(flush, 1)
+        return pending, writer
+    pending, writer = asyncio.run(run())
+    assert pending == (False, 1)
+    assert [seqNos(chunk) for chunk in writer.written] == [[1, 2, 3, 4]]
+    assert writer.drained == 1
+
+
+def testSendersWaitForQueueSpace(makeConfig):
+    async def run():
+        writer = SlowWriter()
+        session = handler(makeConfig(CoalesceWrites=True, SendQueueSize=2), writer)
+        depths = []
+        async def send(i):
+            await session.sendMessage(session.clientMessage.sendTestRequest(f"T{i}"))
+            depths.append(len(session._sendQueue))
+        senders = asyncio.gather(*(send(i) for i in range(8)))
+        for _ in range(20):
+            await asyncio.sleep(0)
+        blocked = len(depths)
+        writer.released.set()
+        await asyncio.wait_for(senders, 1)
+        await session.flush()
+        return blocked, depths, writer
+    blocked, depths, writer = asyncio.run(run())
+    assert blocked < 8
+    assert max(depths) <= 2
+    assert [seqNo for chunk in writer.written for seqNo in seqNos(chunk)] == list(range(1, 9))
+
+
+def testWriteFailureClosesTheSession(makeConfig):
+    async def run():
+        session = handler(makeConfig(CoalesceWrites=True), FailingWriter())
+        await session.sendMessage(session.clientMessage.sendHeartbeat())
+        await asyncio.wait_for(session.waitClosed(), 1)
+        await asyncio.wait_for(session.flush(), 1)
+        return session._connectionState
+    assert asyncio.run(run()) == SocketConnectionState.DISCONNECTED
@@ -0,0 +1,92 @@
+import asyncio
+import configparser
+
+from acceptorSimulator import FIXAcceptorSimulator
+from connectionHandler import SocketConnectionState
+from sessionManager import FIXSessionManager
+
+GATEWAYS = ["GW1", "GW2"]
+
+
+def writeConfig(directory, port):
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config["Logging"] = {"Level": "INFO"} # Not a gateway: no SocketHost
+    for gateway in GATEWAYS:
+        config[gateway] = {
+            "SocketHost": "127.0.0.1",
+            "SocketPort": str(port),
+            "SenderCompID": f"CLIENT-{gateway}",
+            "TargetCompID": "SIMULATOR",
+            "SenderPassword": "password",
+            "BeginString": "FIX.4.4",
+            "HeartBeatInterval": "30",
+            "MaxReconnectAttemps": "3",
+            "ReconnectInterval": "0.01",
+            "ReconnectJitter": "0",
+            "HumanReadableLog": "false",
+            "FileLogPath": str(directory),
+        }
+    filename = str(directory / "sessions.ini")
+    with open(filename, "w") as f:
+        config.write(f)
+    return filename
+
+
+async def waitFor(condition, timeout=5):
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def loggedIn(manager):
+    sessions = [manager.getSession(gateway) for gateway in manager.getGateways()]
+    return all(session is not None and session.getConnectionState() == SocketConnectionState.LOGGED_IN for session in sessions)
+
+
+async def ignore(message):
+    pass
+
+
+def testSessionsRunOnOneLoop(tmp_path):
+    async def run():
+        simulator = FIXAcceptorSimulator(password="password")
+        port = await simulator.start()
+        manager = FIXSessionManager(writeConfig(tmp_path, port), {gateway: ignore for gateway in GATEWAYS}, supervisorInterval=0.02)
+        await manager.start()
+        try:
+            await waitFor(lambda: loggedIn(manager))
+            await waitFor(lambda: all("sentPerSecond" in stats for stats in manager.getStats().values()))
+            stats = manager.getStats()
+            sessions = {manager.getSession(gateway).clientMessage._senderCompID for gateway in GATEWAYS}
+        finally:
+            await manager.stop(logoutTimeout=1)
+            await simulator.stop()
+        states = [manager.getSession(gateway).getConnectionState() for gateway in GATEWAYS]
+        return manager.getGateways(), stats, sessions, states
+    gateways, stats, sessions, states = asyncio.run(run())
+    assert gateways == GATEWAYS
+    assert sessions == {"CLIENT-GW1", "CLIENT-GW2"}
+    assert all(stats[gateway]["state"] == "LOGGED_IN" and stats[gateway]["messagesSent"] >= 1 for gateway in GATEWAYS)
+    assert states == [SocketConnectionState.DISCONNECTED] * 2
+
+
+def testDroppedSessionIsRestarted(tmp_path):
+    async def run():
+        simulator = FIXAcceptorSimulator(password="password")
+        port = await simulator.start()
+        manager = FIXSessionManager(writeConfig(tmp_path, port), ignore, supervisorInterval=0.02)
+        await manager.start()
+        try:
+            await waitFor(lambda: loggedIn(manager))
+            before = {gateway: manager.getSession(gateway) for gateway in GATEWAYS}
+            await simulator.sessions[0].close()
+            await waitFor(lambda: any(manager.getSession(gateway) is not before[gateway] for gateway in GATEWAYS) and loggedIn(manager))
+            restarted = [gateway for gateway in GATEWAYS if manager.getSession(gateway) is not before[gateway]]
+        finally:
+            await manager.stop(logoutTimeout=1)
+            await simulator.stop()
+        return restarted
+    assert len(asyncio.run(run())) == 1
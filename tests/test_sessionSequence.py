@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+import simplefix
+
+from connectionHandler import FIXConnectionHandler
+from fixClientMessages import FixClientMessages
+from fixEngine import FIXClient
+from sequenceStore import FIXSequenceStore
+from sessionHandler import FIXSessionHandler
+
+
+def news(seqNo, possDup=False):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_BEGINSTRING, "FIX.4.4", header=True)
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_NEWS, header=True)
+    message.append_pair(simplefix.TAG_SENDER_COMPID, "SERVER", header=True)
+    message.append_pair(simplefix.TAG_TARGET_COMPID, "CLIENT", header=True)
+    message.append_pair(simplefix.TAG_MSGSEQNUM, seqNo, header=True)
+    if possDup:
+        message.append_pair(simplefix.TAG_POSSDUPFLAG, simplefix.POSSDUPFLAG_YES, header=True)
+    message.append_pair(148, f"news {seqNo}")
+    parser = simplefix.FixParser()
+    parser.append_buffer(message.encode())
+    return parser.get_message()
+
+
+def sent(writer):
+    parser = simplefix.FixParser()
+    parser.append_buffer(b"".join(writer.written))
+    messages = []
+    message = parser.get_message()
+    while message is not None:
+        messages.append(message)
+        message = parser.get_message()
+    return messages
+
+
+async def ignore(message):
+    pass
+
+
+def handler(config, writer):
+    handler = FIXConnectionHandler(config, None, writer, ignore)
+    handler.clientMessage = FixClientMessages("CLIENT", "SERVER", "password", "FIX.4.4", 30)
+    return handler
+
+
+def testGapIsBufferedAndDispatchedInOrder(makeConfig, nullWriter):
+    async def run():
+        session = handler(makeConfig(GapBufferSize=10), nullWriter)
+        dispatched = []
+        async def onNews(message):
+            dispatched.append(int(message.get(simplefix.TAG_MSGSEQNUM)))
+        session.registerHandler(simplefix.MSGTYPE_NEWS, onNews)
+        for seqNo, possDup in ((1, False), (3, False), (4, False), (2, True), (3, True)):
+            await session.processMessage(news(seqNo, possDup))
+        return dispatched, session._session.getNextExpectedSeqNo(), session._session.getBufferedCount()
+    assert asyncio.run(run()) == ([1, 2, 3, 4], 5, 0)
+    requests = [message for message in sent(nullWriter) if message.get(simplefix.TAG_MSGTYPE) == simplefix.MSGTYPE_RESEND_REQUEST]
+    assert [(request.get(simplefix.TAG_BEGINSEQNO), request.get(simplefix.TAG_ENDSEQNO)) for request in requests] == [(b"2", b"2")]
+
+
+def testGapFillReleasesTheBufferedMessages():
+    session = FIXSessionHandler("SERVER", "CLIENT", gapBufferSize=2)
+    session.updateRecvSeqNo(1)
+    assert session.bufferMessage(5, "five") == (2, 4)
+    assert session.bufferMessage(6, "six") is None
+    assert session.popBuffered() is None
+    with pytest.raises(OverflowError):
+        session.bufferMessage(7, "seven")
+    session.updateRecvSeqNo(4) # SequenceReset-GapFill with NewSeqNo 5
+    assert session.popBuffered() == (5, "five")
+    session.updateRecvSeqNo(5)
+    assert session.popBuffered() == (6, "six")
+    session.updateRecvSeqNo(6)
+    assert session.popBuffered() is None and session.getNextExpectedSeqNo() == 7
+
+
+def testSequenceNumbersSurviveARestart(makeConfig, nullWriter, tmp_path):
+    async def run():
+        first = handler(makeConfig(SequenceStore=True, LogoutTimeout=0.01), nullWriter)
+        await first.logon()
+        await first.sendMessage(first.clientMessage.sendHeartbeat())
+        await first.processMessage(news(1))
+        await first.processMessage(news(2))
+        await first.handleClose()
+        second = handler(makeConfig(SequenceStore=True, ReconnectInterval=0), nullWriter)
+        state = second._session.getOutboundSeqNo(), second._session.getNextExpectedSeqNo(), second._session.isResumable()
+        nullWriter.written.clear()
+        await second.logon()
+        return state
+    assert asyncio.run(run()) == (2, 3, True)
+    logon = sent(nullWriter)[0]
+    assert (logon.get(simplefix.TAG_MSGSEQNUM), logon.get(simplefix.TAG_RESETSEQNUMFLAG)) == (b"3", b"N")
+
+
+def testSequenceStoreRefusesOtherFiles(tmp_path):
+    path = tmp_path / "other.dat"
+    path.write_bytes(b"not a sequence file")
+    with pytest.raises(ValueError):
+        FIXSequenceStore(str(path))
+    store = FIXSequenceStore(str(tmp_path / "new.dat"))
+    assert store.load() == (0, 1)
+    store.store(7, 9)
+    store.close()
+    assert FIXSequenceStore(str(tmp_path / "new.dat")).load() == (7, 9)
+
+
+def testReconnectDelayBacksOffUpToTheCap(tmp_path):
+    configFile = tmp_path / "client.ini"
+    configFile.write_text("[TEST]\nReconnectInterval = 1\nReconnectMaxInterval = 8\nReconnectJitter = 0\n")
+    client = FIXClient(str(configFile), "TEST", None)
+    assert [client.nextReconnectDelay() for _ in range(6)] == [1, 2, 4, 8, 8, 8]
+    for _ in range(100): # Deep into the backoff the exponent is bounded
+        client.nextReconnectDelay()
+    assert client.nextReconnectDelay() == 8
+    client.getConfig()["ReconnectJitter"] = "0.5"
+    delays = [client.nextReconnectDelay() for _ in range(200)]
+    assert all(4 <= delay <= 8 for delay in delays) and len(set(delays)) > 1
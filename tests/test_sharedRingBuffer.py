@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+import simplefix
+
+from sharedRingBuffer import FIXEventPublisher, FIXEventReader, SharedRingBuffer, ID_SIZE, SYMBOL_SIZE
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRingBuffer(capacity=16)
+    yield ring
+    ring.close()
+
+
+def executionReport(symbol="BTC-USD", clOrdID="C1"):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_EXECUTION_REPORT, header=True)
+    message.append_pair(simplefix.TAG_MSGSEQNUM, 7, header=True)
+    for tag, value in ((simplefix.TAG_EXECTYPE, "F"), (simplefix.TAG_ORDSTATUS, "2"), (simplefix.TAG_SIDE, "1"), (simplefix.TAG_SYMBOL, symbol),
+                       (simplefix.TAG_CLORDID, clOrdID), (simplefix.TAG_ORDERID, "O1"), (simplefix.TAG_LASTPX, "100.5"), (simplefix.TAG_LASTQTY, "2")):
+        message.append_pair(tag, value)
+    return message
+
+
+def marketData(symbols):
+    message = simplefix.FixMessage()
+    message.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_MARKET_DATA_INCREMENTAL_REFRESH, header=True)
+    message.append_pair(simplefix.TAG_MSGSEQNUM, 8, header=True)
+    message.append_pair(262, "BOOK")
+    message.append_pair(268, len(symbols))
+    for symbol in symbols:
+        for tag, value in ((279, "0"), (269, "0"), (simplefix.TAG_SYMBOL, symbol), (270, "100.5"), (271, "1")):
+            message.append_pair(tag, value)
+    return message
+
+
+def testFieldsAtTheirSizeArePublished(ring):
+    reader = FIXEventReader(ring.name)
+    FIXEventPublisher(ring).publish(executionReport("S" * SYMBOL_SIZE, "C" * ID_SIZE))
+    event, = reader.pollEvents()
+    assert event.symbol == b"S" * SYMBOL_SIZE and event.clOrdID == b"C" * ID_SIZE
+    reader.close()
+
+
+def testOversizedFieldsAreRejected(ring):
+    publisher = FIXEventPublisher(ring)
+    with pytest.raises(ValueError):
+        publisher.publish(executionReport(clOrdID="C" * (ID_SIZE + 1)))
+    with pytest.raises(ValueError):
+        publisher.publish(marketData(["BTC-USD", "S" * (SYMBOL_SIZE + 1)]))
+    assert ring.lastSequence() == 0 # Not even the entries that fit
+    assert publisher.publish(marketData(["BTC-USD", "ETH-USD"])) == 2
+
+
+def testWait(ring):
+    reader = FIXEventReader(ring.name, fromLatest=True)
+    assert not reader.wait(0.01)
+    timer = threading.Timer(0.02, lambda: FIXEventPublisher(ring).publish(executionReport()))
+    timer.start()
+    assert reader.wait(5)
+    timer.join()
+    assert len(reader.pollEvents()) == 1
+    reader.close()